@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: DeviceIndex against raw list_all() dicts and PurePosixPath.
+
+Generates a synthetic device listing, then measures CPU time per entry and
+the memory retained after listing a sync base folder both ways:
+
+    python benchmarks/device_index_benchmark.py --entries 50000
+"""
+
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+from pathlib import PurePosixPath
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from quaderno_gui.core.device_index import DeviceIndex  # noqa: E402
+
+
+REMOTE_BASE = 'Document/Zotero'
+
+
+def synthetic_listing(count, folders=500):
+    """
+    Return `count` entries shaped like the JSON that list_all() decodes.
+    """
+    folder_paths = [f'{REMOTE_BASE}/Collection {i % 40}/Topic {i}' for i in range(folders)]
+    entries = [
+        {'entry_path': path, 'entry_type': 'folder', 'entry_id': f'folder-{i:08d}', 'entry_name': path.rsplit('/', 1)[1],
+         'created_date': '2024-01-01T00:00:00Z', 'is_new': 'false', 'parent_folder_id': 'root'}
+        for i, path in enumerate(folder_paths)
+    ]
+
+    for i in range(count - folders):
+        folder = folder_paths[i % folders] if i % 10 else 'Document/Other'
+        name = f'Paper number {i} on something (itemID {i}).pdf'
+        entries.append({
+            'entry_path': f'{folder}/{name}',
+            'entry_type': 'document',
+            'entry_id': f'{i:08d}-0000-4000-8000-{i:012d}',
+            'entry_name': name,
+            'file_size': str(100000 + i),
+            'created_date': '2024-01-01T00:00:00Z',
+            'modified_date': f'2024-02-{1 + i % 28:02d}T10:00:00Z',
+            'mime_type': 'application/pdf',
+            'document_type': 'normal',
+            'title': f'Paper number {i}',
+            'author': 'Someone',
+            'total_page': str(i % 300),
+            'is_new': 'false',
+            'parent_folder_id': f'folder-{i % folders:08d}',
+        })
+
+    # Decode from JSON so strings are not shared with the generator, as with a real response.
+    return json.loads(json.dumps(entries))
+
+
+def _normalize_relative_path(full_path, remote_base):
+    """The per-entry normalization the sync engine used before DeviceIndex."""
+    full_posix = PurePosixPath(full_path.replace('\\', '/'))
+    base_posix = PurePosixPath(remote_base.replace('\\', '/'))
+
+    try:
+        relative = full_posix.relative_to(base_posix)
+    except ValueError:
+        return None
+
+    rel_posix = relative.as_posix()
+    return '' if rel_posix == '.' else rel_posix
+
+
+def dict_approach(entries):
+    """Keep the raw dicts and normalize every path with PurePosixPath."""
+    files = {}
+    folders = set()
+
+    for entry in entries:
+        rel = _normalize_relative_path(entry.get('entry_path', ''), REMOTE_BASE)
+
+        if rel is None:
+            continue
+
+        if entry.get('entry_type') == 'document':
+            if rel:
+                files[rel] = int(entry.get('file_size') or 0)
+        else:
+            folders.add(rel)
+
+    return entries, files, folders
+
+
+def index_approach(entries):
+    """Build a DeviceIndex; the raw dicts can be dropped afterwards."""
+    index = DeviceIndex.from_entries(entries)
+    files = index.documents_under(REMOTE_BASE)
+    folders, _exists = index.folders_under(REMOTE_BASE)
+
+    return index, files, folders
+
+
+def measure(approach, count, repeat):
+    best = None
+
+    for _ in range(repeat):
+        entries = synthetic_listing(count)
+        gc.collect()
+        start = time.perf_counter()
+        approach(entries)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    gc.collect()
+    tracemalloc.start()
+    entries = synthetic_listing(count)
+    result = approach(entries)
+    # The listing is dropped; whatever the approach still refers to stays allocated.
+    del entries
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+
+    return best, retained
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--entries', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    print(f'{args.entries} entries, listing {REMOTE_BASE}')
+    print(f"{'approach':<26}{'us/entry':>10}{'bytes/entry':>14}")
+
+    for label, approach in (('dict + PurePosixPath', dict_approach), ('DeviceIndex', index_approach)):
+        seconds, retained = measure(approach, args.entries, args.repeat)
+        print(f'{label:<26}{seconds / args.entries * 1e6:>10.2f}{retained / args.entries:>14.0f}')
+
+
+if __name__ == '__main__':
+    main()
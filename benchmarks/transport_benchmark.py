@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Benchmark: the threaded dptrp1 client against the asyncio transport.
+
+Starts a mock DigitalPaper REST server in a separate process that adds a
+fixed latency to every request, then runs the same batch of path checks,
+uploads, downloads and deletions at several concurrency levels, once with
+`DigitalPaper` calls on a thread pool and once with `AsyncTransport.map`
+on one event loop (needs aiohttp):
+
+    python benchmarks/transport_benchmark.py --latency 0.03 --files 64 --concurrency 1 4 16
+"""
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote_plus, urlsplit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from quaderno_gui.core.async_transport import AsyncDigitalPaper, AsyncTransport  # noqa: E402
+
+
+FOLDER = 'Document/Benchmark'
+
+
+class MockDevice:
+    """
+    In-memory folder tree answering the endpoints the clients use.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.entries = {}
+        self.blobs = {}
+        self.add('Document', 'folder', None)
+
+    def add(self, path, kind, parent_id):
+        entry_id = f'{kind}-{next(self.ids)}'
+        self.entries[path] = {
+            'entry_path': path,
+            'entry_name': path.rsplit('/', 1)[-1],
+            'entry_type': kind,
+            'entry_id': entry_id,
+            'parent_folder_id': parent_id,
+            'file_size': '0',
+            'modified_date': '2024-01-01T00:00:00Z',
+        }
+        return entry_id
+
+    def by_id(self, entry_id):
+        return next((path for path, entry in self.entries.items() if entry['entry_id'] == entry_id), None)
+
+    def handle(self, method, path, body):
+        """
+        Return (status, JSON-able answer or bytes) for one request.
+        """
+        with self.lock:
+            if method == 'GET' and path.startswith('/resolve/entry/path/'):
+                entry = self.entries.get(unquote_plus(path[len('/resolve/entry/path/'):]))
+                return (200, entry) if entry else (404, {'message': 'not found'})
+
+            if method == 'GET' and path == '/documents2':
+                return 200, {'entry_list': list(self.entries.values())}
+
+            if method == 'GET' and path == '/system/status/storage':
+                return 200, {'capacity': '16000000000', 'available': '8000000000'}
+
+            match = re.fullmatch(r'/folders/([^/]+)/entries', path)
+
+            if method == 'GET' and match:
+                folder = self.by_id(match.group(1))
+                return 200, {'entry_list': [
+                    entry for key, entry in self.entries.items() if key.rpartition('/')[0] == folder
+                ]}
+
+            if method == 'POST' and path in ('/folders2', '/documents2'):
+                info = json.loads(body)
+                parent = self.by_id(info['parent_folder_id'])
+                name = info.get('folder_name') or info.get('file_name')
+
+                if parent is None:
+                    return 404, {'message': 'no parent'}
+
+                if parent + '/' + name in self.entries:
+                    return 400, {'message': 'exists'}
+
+                kind = 'folder' if path == '/folders2' else 'document'
+                entry_id = self.add(parent + '/' + name, kind, info['parent_folder_id'])
+                return 200, {'folder_id' if kind == 'folder' else 'document_id': entry_id}
+
+            match = re.fullmatch(r'/documents/([^/]+)/file', path)
+
+            if match:
+                document = self.by_id(match.group(1))
+
+                if document is None:
+                    return 404, {'message': 'not found'}
+
+                if method == 'GET':
+                    return 200, self.blobs.get(document, b'')
+
+                # Multipart body with one part: headers, blank line, file, closing boundary.
+                start = body.index(b'\r\n\r\n') + 4
+                end = body.rindex(b'\r\n--', 0, len(body) - 2)
+                self.blobs[document] = body[start:end]
+                self.entries[document]['file_size'] = str(end - start)
+                return 200, {}
+
+            match = re.fullmatch(r'/(documents|folders)/([^/]+)', path)
+
+            if method == 'DELETE' and match:
+                target = self.by_id(match.group(2))
+
+                for key in [key for key in self.entries if key == target or key.startswith(f'{target}/')]:
+                    del self.entries[key]
+                    self.blobs.pop(key, None)
+
+                return 204, b''
+
+        return 404, {'message': 'unknown endpoint'}
+
+
+def serve(port, latency, ready):
+    device = MockDevice()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # Headers and body are written separately; do not let them wait for an ACK.
+        disable_nagle_algorithm = True
+
+        def log_message(self, *_args):
+            pass
+
+        def answer(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            time.sleep(latency)
+            status, payload = device.handle(self.command, urlsplit(self.path).path, body)
+            data = payload if isinstance(payload, bytes) else json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        do_GET = do_POST = do_PUT = do_DELETE = answer
+
+    class Server(ThreadingHTTPServer):
+        daemon_threads = True
+        request_queue_size = 128
+
+    server = Server(('127.0.0.1', port), Handler)
+    ready.set()
+    server.serve_forever()
+
+
+def threaded_client(port, connections):
+    import requests
+    from dptrp1.dptrp1 import DigitalPaper
+
+    class LocalDigitalPaper(DigitalPaper):
+        @property
+        def base_url(self):
+            return f'http://127.0.0.1:{port}'
+
+    dp = LocalDigitalPaper(addr='127.0.0.1', quiet=True)
+    # As many pooled connections as threads, so neither client reconnects.
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=connections)
+    dp.session.mount('http://', adapter)
+    return dp
+
+
+def run_threaded(dp, name, calls, concurrency):
+    def call(args):
+        try:
+            return getattr(dp, name)(*args)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(call, calls))
+
+
+def measure(run):
+    done = threading.Event()
+
+    def sample():
+        while not done.wait(0.005):
+            peak[0] = max(peak[0], threading.active_count())
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    # Threads started by the run, besides the ones already there (the sampler included).
+    threads = threading.active_count()
+    peak = [threads]
+    started, cpu = time.perf_counter(), time.process_time()
+
+    try:
+        results = run()
+    finally:
+        done.set()
+        sampler.join()
+
+    failures = sum(isinstance(result, Exception) for result in results)
+    return time.perf_counter() - started, time.process_time() - cpu, peak[0] - threads, failures
+
+
+def workload(directory, count, size, tag):
+    local = os.path.join(directory, 'upload.pdf')
+
+    with open(local, 'wb') as fh:
+        fh.write(os.urandom(size))
+
+    paths = [f'{FOLDER}/{tag}-{i}.pdf' for i in range(count)]
+    return [
+        ('path_exists', [(path,) for path in paths]),
+        ('upload_file', [(local, path) for path in paths]),
+        ('download', [(path,) for path in paths]),
+        ('delete_document', [(path,) for path in paths]),
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--latency', type=float, default=0.03, help='seconds added to every request')
+    parser.add_argument('--files', type=int, default=64, help='documents per operation batch')
+    parser.add_argument('--size', type=int, default=256 * 1024, help='bytes per document')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args(argv)
+
+    ready = multiprocessing.Event()
+    server = multiprocessing.Process(target=serve, args=(args.port, args.latency, ready), daemon=True)
+    server.start()
+    ready.wait()
+
+    print(f'{args.files} documents of {args.size // 1024} KiB, {args.latency * 1000:.0f} ms latency per request')
+    print(f"{'client':<10}{'conc':>5}  {'operation':<16}{'seconds':>9}{'ops/s':>9}{'cpu s':>8}{'threads':>9}{'failed':>8}")
+
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            for concurrency in args.concurrency:
+                dp = threaded_client(args.port, concurrency)
+                dp.new_folder(FOLDER)
+                client = AsyncDigitalPaper(dp.base_url, connections=concurrency)
+                transport = AsyncTransport(dp, client=client).start()
+
+                for label, run in (
+                    ('threaded', lambda name, calls: run_threaded(dp, name, calls, concurrency)),
+                    ('asyncio', lambda name, calls: transport.map(name, calls, limit=concurrency)),
+                ):
+                    for name, calls in workload(directory, args.files, args.size, f'{label}-{concurrency}'):
+                        seconds, cpu, threads, failed = measure(lambda: run(name, calls))
+                        print(
+                            f'{label:<10}{concurrency:>5}  {name:<16}{seconds:>9.2f}{len(calls) / seconds:>9.0f}'
+                            f'{cpu:>8.2f}{threads:>9}{failed:>8}'
+                        )
+
+                transport.stop()
+    finally:
+        server.terminate()
+
+
+if __name__ == '__main__':
+    main()
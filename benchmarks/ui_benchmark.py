@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+Benchmark: GUI responsiveness with a large device, offscreen.
+
+Drives `MainWindow` against an in-process mock device holding tens of
+thousands of documents and measures, per device size:
+
+- time to list the Files page and the Folders page (one listing and folder by folder),
+- latency of switching between folders on the Folders page,
+- sync log throughput while syncing a synthetic Zotero library to the mock device,
+- the longest event loop stall in each phase.
+
+Results are written as JSON; `--compare` checks them against an earlier
+run and exits with status 1 when a metric got worse beyond `--tolerance`:
+
+    python benchmarks/ui_benchmark.py --documents 10000 100000 --out ui-0.2.json
+    python benchmarks/ui_benchmark.py --documents 10000 100000 --compare ui-0.1.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+FORMAT_VERSION = 1
+REMOTE_BASE = 'Document/Zotero'
+COLLECTIONS = 40
+# Metrics where a larger value is better; for all others smaller is better.
+HIGHER_IS_BETTER = ('sync_log.lines_per_s',)
+# Changes of times and stalls below this many seconds are timer noise.
+NOISE_FLOOR = 0.02
+
+
+class MockDevice:
+    """
+    DigitalPaper stand-in with a synthetic tree of `documents` documents.
+
+    Listings are decoded from JSON on every call, as the real client does,
+    and every request sleeps `latency` seconds.
+    """
+
+    def __init__(self, documents, topics=500, latency=0.0):
+        self.latency = latency
+        self.addr = 'mock'
+        folders = [f'{REMOTE_BASE}/Collection {i % COLLECTIONS}/Topic {i}' for i in range(topics)]
+        entries = [{'entry_path': 'Document', 'entry_type': 'folder', 'entry_id': 'root'}]
+        entries += [
+            {'entry_path': path, 'entry_type': 'folder', 'entry_id': 'folder-' + path}
+            for path in [REMOTE_BASE] + [f'{REMOTE_BASE}/Collection {i}' for i in range(COLLECTIONS)] + folders
+        ]
+
+        for i in range(documents):
+            folder = folders[i % topics]
+            entries.append({
+                'entry_path': f'{folder}/Paper {i} (itemID {i}).pdf',
+                'entry_type': 'document',
+                'entry_id': f'doc-{i}',
+                'file_size': str(100000 + i),
+                'modified_date': '2024-02-01T10:00:00Z',
+            })
+
+        self.folders = folders
+        self._entries = {entry['entry_path']: entry for entry in entries}
+        self._listing = json.dumps(entries)
+        self._children = {}
+
+        for entry in entries:
+            self._children.setdefault(entry['entry_path'].rpartition('/')[0], []).append(entry)
+
+    def _request(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def list_all(self):
+        self._request()
+        return json.loads(self._listing)
+
+    def list_documents(self):
+        return [entry for entry in self.list_all() if entry['entry_type'] == 'document']
+
+    def list_objects_in_folder(self, path):
+        self._request()
+        return json.loads(json.dumps(self._children.get(path, [])))
+
+    def path_exists(self, path):
+        self._request()
+        return path in self._entries
+
+    def get_storage(self):
+        self._request()
+        return {'capacity': str(64 * 1024 ** 3), 'available': str(32 * 1024 ** 3)}
+
+    # Changes are accepted but not applied, so every run sees the same device.
+    def new_folder(self, path):
+        self._request()
+
+    def upload_file(self, local_path, remote_path):
+        self._request()
+
+    def delete_document(self, path):
+        self._request()
+
+    def delete_folder(self, path):
+        self._request()
+
+
+def synthetic_zotero(directory, items):
+    """
+    Write a minimal Zotero database and storage folder with `items` PDF attachments.
+    """
+    storage = os.path.join(directory, 'storage')
+    os.makedirs(storage, exist_ok=True)
+    db_path = os.path.join(directory, 'zotero.sqlite')
+    conn = sqlite3.connect(db_path)
+    conn.executescript('''
+        CREATE TABLE collections (collectionID INTEGER PRIMARY KEY, collectionName TEXT, parentCollectionID INT, key TEXT);
+        CREATE TABLE deletedCollections (collectionID INT);
+        CREATE TABLE collectionItems (collectionID INT, itemID INT);
+        CREATE TABLE items (itemID INTEGER PRIMARY KEY, itemTypeID INT, key TEXT, dateAdded TEXT, dateModified TEXT);
+        CREATE TABLE itemAttachments (itemID INT, parentItemID INT, contentType TEXT, path TEXT);
+        CREATE TABLE deletedItems (itemID INT);
+        CREATE TABLE tags (tagID INTEGER PRIMARY KEY, name TEXT);
+        CREATE TABLE itemTags (itemID INT, tagID INT, type INT);
+    ''')
+    conn.executemany(
+        'INSERT INTO collections VALUES (?, ?, NULL, ?)',
+        [(i + 1, f'Collection {i}', f'C{i:07d}') for i in range(COLLECTIONS)],
+    )
+
+    for i in range(1, items + 1):
+        parent, key = 10 ** 7 + i, f'K{i:07d}'
+        conn.execute('INSERT INTO items VALUES (?, 1, ?, ?, ?)', (parent, 'P' + key, '2024-01-01 10:00:00', '2024-02-01 10:00:00'))
+        conn.execute('INSERT INTO items VALUES (?, 3, ?, ?, ?)', (i, key, '2024-01-01 10:00:00', '2024-02-01 10:00:00'))
+        conn.execute('INSERT INTO itemAttachments VALUES (?, ?, ?, ?)', (i, parent, 'application/pdf', f'storage:paper{i}.pdf'))
+        conn.execute('INSERT INTO collectionItems VALUES (?, ?)', (i % COLLECTIONS + 1, parent))
+        os.makedirs(os.path.join(storage, key), exist_ok=True)
+
+        with open(os.path.join(storage, key, f'paper{i}.pdf'), 'wb') as fh:
+            fh.write(b'%PDF-1.4\n')
+
+    conn.commit()
+    conn.close()
+    return db_path, storage
+
+
+class Harness:
+    """
+    Runs GUI actions inside the event loop and records the stalls around them.
+    """
+
+    def __init__(self, app):
+        from PyQt5.QtCore import QEventLoop, QTimer
+
+        from quaderno_gui.core.diagnostics import get_diagnostics
+        from quaderno_gui.gui.diagnostics_page import StallMonitor
+
+        self.app = app
+        self.QEventLoop = QEventLoop
+        self.QTimer = QTimer
+        self.stalls = get_diagnostics().stalls
+        # Every timer that fires more than 5 ms late counts.
+        self.monitor = StallMonitor(interval_ms=10, threshold=0.005)
+        self.monitor.start()
+
+    def run(self, action, until=None, timeout=600):
+        """
+        Run `action` from the event loop, then wait until `until()` is true if given.
+
+        Returns (seconds, longest stall in seconds). Background work is
+        polled every few milliseconds rather than waited for by signal, so
+        a worker that finishes before anyone listens is not missed.
+        """
+        loop = self.QEventLoop()
+        poll = self.QTimer()
+        poll.setInterval(5)
+        timing = {}
+
+        def check():
+            if until is None or until():
+                timing['end'] = time.perf_counter()
+                poll.stop()
+                loop.quit()
+
+        def start():
+            timing['start'] = time.perf_counter()
+            action()
+            check()
+
+            if 'end' not in timing:
+                poll.start()
+
+        poll.timeout.connect(check)
+        # Let the monitor tick once, so work done before the phase is not counted in it.
+        self.idle(0.02)
+        self.stalls.clear()
+        self.QTimer.singleShot(0, start)
+        self.QTimer.singleShot(int(timeout * 1000), loop.quit)
+        loop.exec_()
+        poll.stop()
+
+        # Give the monitor a tick to notice a stall that ended the phase.
+        self.idle(0.05)
+        stalls = [seconds for _when, seconds in self.stalls]
+        return timing.get('end', time.perf_counter()) - timing['start'], max(stalls, default=0.0)
+
+    def idle(self, seconds):
+        loop = self.QEventLoop()
+        self.QTimer.singleShot(int(seconds * 1000), loop.quit)
+        loop.exec_()
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def benchmark_size(harness, window, documents, args, workdir):
+    """
+    Run every phase against a device with `documents` documents; return the flat metrics dict.
+    """
+    dp = MockDevice(documents, latency=args.latency)
+    metrics = {}
+    pages = {attribute: index for index, (_t, attribute, *_rest) in enumerate(window.page_specs)}
+
+    window.sidebar.setCurrentRow(pages['files_page'])
+    files_page = window.files_page
+    seconds, stall = harness.run(lambda: files_page.set_digital_paper(dp))
+    metrics['files.time_to_list_s'] = seconds
+    metrics['files.max_stall_s'] = stall
+    metrics['files.rows'] = files_page.files_list.count()
+
+    window.sidebar.setCurrentRow(pages['folders_page'])
+    folders_page = window.folders_page
+    folders_page.crawl_check.setChecked(False)
+    seconds, stall = harness.run(lambda: folders_page.set_digital_paper(dp))
+    metrics['folders.time_to_list_s'] = seconds
+    metrics['folders.max_stall_s'] = stall
+
+    # Folder by folder: the crawl worker lists in the background while the tree is shown.
+    folders_page.crawl_check.setChecked(True)
+    seconds, stall = harness.run(folders_page.refresh_folders, until=lambda: folders_page.crawl_worker is None)
+    folders_page.crawl_check.setChecked(False)
+
+    metrics['folders.crawl_time_to_list_s'] = seconds
+    metrics['folders.crawl_max_stall_s'] = stall
+
+    rng = random.Random(documents)
+    targets = [folder[len('Document/'):] for folder in rng.sample(dp.folders, min(args.switches, len(dp.folders)))]
+    latencies = []
+    worst_stall = 0.0
+
+    for folder in targets:
+        seconds, stall = harness.run(lambda: folders_page.select_folder(folder))
+        latencies.append(seconds)
+        worst_stall = max(worst_stall, stall)
+
+    metrics['folders.switch_median_s'] = statistics.median(latencies)
+    metrics['folders.switch_p95_s'] = _percentile(latencies, 0.95)
+    metrics['folders.switch_max_stall_s'] = worst_stall
+
+    window.sidebar.setCurrentRow(pages['zotero_sync_page'])
+    sync_page = window.zotero_sync_page
+    sync_page.set_digital_paper(dp)
+    db_path, storage = synthetic_zotero(os.path.join(workdir, f'zotero-{documents}'), args.sync_items)
+    sync_page.db_path_edit.setText(db_path)
+    sync_page.storage_path_edit.setText(storage)
+    # The mock device drops the uploads, so this is a full sync with one log line per operation.
+    # sync_finished re-enables the buttons once the worker is done.
+    seconds, stall = harness.run(
+        lambda: sync_page.start_sync(),
+        until=lambda: sync_page.sync_button.isEnabled(),
+    )
+    lines = sync_page.log.document().blockCount()
+    metrics['sync_log.lines'] = lines
+    metrics['sync_log.seconds'] = seconds
+    metrics['sync_log.lines_per_s'] = lines / seconds if seconds else 0.0
+    metrics['sync_log.max_stall_s'] = stall
+
+    metrics['max_stall_s'] = max(value for key, value in metrics.items() if key.endswith('max_stall_s'))
+    return metrics
+
+
+def compare(current, baseline, tolerance):
+    """
+    Print the metrics of `current` next to `baseline`; return the number of regressions.
+    """
+    previous = {run['documents']: run['metrics'] for run in baseline['runs']}
+    regressions = 0
+    print(f"\nCompared with {baseline.get('revision') or baseline.get('timestamp')} (tolerance {tolerance:.0%}):")
+
+    for run in current['runs']:
+        old = previous.get(run['documents'])
+
+        if old is None:
+            print(f"  {run['documents']} documents: not in the baseline")
+            continue
+
+        for key, value in run['metrics'].items():
+            if key not in old or not isinstance(value, float):
+                continue
+
+            before = old[key]
+            higher_better = key in HIGHER_IS_BETTER
+            change = (value - before) / before if before else 0.0
+            worse = -change if higher_better else change
+            regressed = worse > tolerance and (higher_better or abs(value - before) > NOISE_FLOOR)
+            regressions += regressed
+            flag = 'REGRESSION' if regressed else ''
+            print(f"  {run['documents']:>7} {key:<32}{before:>10.4f}{value:>10.4f}{change:>+9.0%}  {flag}")
+
+    return regressions
+
+
+def _revision():
+    try:
+        return subprocess.run(
+            ['git', 'describe', '--always', '--dirty'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--documents', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--sync-items', type=int, default=5000, help='attachments in the synced Zotero library')
+    parser.add_argument('--switches', type=int, default=30, help='folder switches to time')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every device request')
+    parser.add_argument('--out', default=None, help='write the results to this JSON file')
+    parser.add_argument('--compare', default=None, metavar='JSON', help='results of an earlier run to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='relative change reported as a regression')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # Offscreen, and with settings and caches that do not touch the user's.
+        os.environ['QT_QPA_PLATFORM'] = 'offscreen'
+
+        for variable in ('XDG_CONFIG_HOME', 'XDG_DATA_HOME', 'XDG_CACHE_HOME'):
+            os.environ[variable] = os.path.join(workdir, variable.lower())
+
+        from PyQt5.QtCore import QT_VERSION_STR
+        from PyQt5.QtWidgets import QApplication
+
+        from quaderno_gui.gui.main_window import MainWindow
+
+        app = QApplication(sys.argv[:1])
+        window = MainWindow()
+        window.show()
+        harness = Harness(app)
+        results = {
+            'format': FORMAT_VERSION,
+            'revision': _revision(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'qt': QT_VERSION_STR,
+            'platform': platform.platform(),
+            'parameters': {
+                'sync_items': args.sync_items,
+                'switches': args.switches,
+                'latency': args.latency,
+            },
+            'runs': [],
+        }
+
+        for documents in args.documents:
+            metrics = benchmark_size(harness, window, documents, args, workdir)
+            results['runs'].append({'documents': documents, 'metrics': metrics})
+            print(f'{documents} documents')
+
+            for key, value in metrics.items():
+                print(f'  {key:<32}{value:>12.4f}' if isinstance(value, float) else f'  {key:<32}{value:>12}')
+
+        harness.monitor.stop()
+        window.close()
+
+    if args.out:
+        with open(args.out, 'w') as fh:
+            json.dump(results, fh, indent=2)
+
+    if args.compare:
+        with open(args.compare) as fh:
+            baseline = json.load(fh)
+
+        return 1 if compare(results, baseline, args.tolerance) else 0
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
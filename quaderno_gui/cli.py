@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+"""
+Headless entry point for running a Zotero sync without the GUI.
+
+This module must not import PyQt5 so that it starts quickly from cron.
+"""
+
+import argparse
+import json
+import os
+import signal
+import sys
+
+from quaderno_gui.core.backup import DeviceBackup
+from quaderno_gui.core.device import BACKENDS, THREADED_BACKEND
+from quaderno_gui.core.diagnostics import enable_diagnostics
+from quaderno_gui.core.fingerprint import FingerprintService
+from quaderno_gui.core.multi_sync import MultiDeviceSync
+from quaderno_gui.core.pdf_optimize import DEFAULT_CACHE_BYTES, PdfOptimizer, optimization_available
+from quaderno_gui.core.plan_report import write_plan
+from quaderno_gui.core.reverse_sync import ReverseSync
+from quaderno_gui.core.scheduler import DEFAULT_POLICY, POLICIES
+from quaderno_gui.core.sync_engine import SyncControl, SyncEngine
+from quaderno_gui.core.watch import WatchSync
+
+
+DEFAULT_REMOTE_BASE = 'Document/Zotero'
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='quaderno-sync',
+        description='Synchronize the Zotero library with a DigitalPaper device.',
+    )
+    parser.add_argument(
+        '--address',
+        action='append',
+        default=None,
+        help='device address; repeat to sync several devices at once (default: $QUADERNO_ADDRESS, comma-separated)',
+    )
+    parser.add_argument('--serial', default=None, help='device serial number')
+    parser.add_argument('--simulate', action='store_true', help='only report what would change')
+    parser.add_argument('--db', default=None, help='Zotero database file')
+    parser.add_argument('--storage', default=None, help='Zotero storage folder')
+    parser.add_argument(
+        '--remote-base',
+        default=DEFAULT_REMOTE_BASE,
+        help=f'device folder to sync into (default: {DEFAULT_REMOTE_BASE})',
+    )
+    parser.add_argument('--json', action='store_true', help='print a JSON summary on stdout')
+    parser.add_argument(
+        '--plan-out',
+        default=None,
+        metavar='FILE',
+        help='with --simulate, write the plan to FILE (.json or .csv); several devices get one file each',
+    )
+    parser.add_argument(
+        '--order',
+        choices=sorted(POLICIES),
+        default=DEFAULT_POLICY,
+        help=f'upload order (default: {DEFAULT_POLICY})',
+    )
+    parser.add_argument(
+        '--priority-collection',
+        action='append',
+        default=[],
+        metavar='COLLECTION',
+        help='collection to upload first with --order collections (repeatable)',
+    )
+    parser.add_argument(
+        '--bandwidth-limit',
+        type=float,
+        default=0,
+        metavar='KIB_PER_S',
+        help='cap the average upload rate (default: unlimited)',
+    )
+    parser.add_argument(
+        '--stream',
+        action='store_true',
+        help='start uploading while the Zotero database is read; uploads follow database order',
+    )
+    parser.add_argument(
+        '--crawl',
+        action='store_true',
+        help='list only the sync folder on the device, folder by folder, instead of the whole device at once',
+    )
+    parser.add_argument(
+        '--transport',
+        choices=BACKENDS,
+        default=THREADED_BACKEND,
+        help='device client: threaded requests (default) or one asyncio event loop (needs aiohttp)',
+    )
+    parser.add_argument(
+        '--content-hashes',
+        action='store_true',
+        help='re-upload files whose content changed without a new Zotero modification date',
+    )
+    parser.add_argument(
+        '--watch',
+        action='store_true',
+        help='keep running and sync Zotero changes as they happen, until interrupted (one device only)',
+    )
+    selection = parser.add_argument_group('selective sync')
+    selection.add_argument('--include-collection', action='append', default=[], metavar='COLLECTION')
+    selection.add_argument('--exclude-collection', action='append', default=[], metavar='COLLECTION')
+    selection.add_argument('--include-tag', action='append', default=[], metavar='TAG')
+    selection.add_argument('--exclude-tag', action='append', default=[], metavar='TAG')
+    selection.add_argument('--max-size', type=float, default=0, metavar='MIB', help='skip larger attachments')
+    selection.add_argument('--modified-days', type=int, default=0, metavar='N', help='only attachments modified in the last N days')
+    selection.add_argument(
+        '--fit-to-storage',
+        action='store_true',
+        help="skip the lowest-priority uploads that do not fit into the device's free space",
+    )
+    optimize = parser.add_argument_group('PDF optimization (needs pikepdf and Pillow)')
+    optimize.add_argument('--optimize', action='store_true', help='upload device-optimized copies of the PDFs')
+    optimize.add_argument('--optimize-grayscale', action='store_true', help='convert images to grayscale')
+    optimize.add_argument(
+        '--optimize-cache-size',
+        type=float,
+        default=DEFAULT_CACHE_BYTES / (1024 * 1024),
+        metavar='MIB',
+        help='size limit of the optimized PDF cache',
+    )
+    pull = parser.add_argument_group('reverse sync')
+    pull.add_argument(
+        '--pull',
+        action='store_true',
+        help='download documents changed on the device (e.g. annotated) instead of uploading',
+    )
+    pull.add_argument(
+        '--pull-folder',
+        default=None,
+        metavar='DIR',
+        help='write pulled documents here instead of next to the matching Zotero attachments',
+    )
+    pull.add_argument(
+        '--replace-attachments',
+        action='store_true',
+        help='replace the matching Zotero attachments with the pulled documents (originals are kept as .orig)',
+    )
+    backup = parser.add_argument_group('backup')
+    backup.add_argument(
+        '--backup',
+        default=None,
+        metavar='DIR',
+        help='mirror everything on the device into DIR instead of syncing (one subfolder per device with several)',
+    )
+    backup.add_argument('--backup-folder', default='Document', metavar='PATH', help='device folder to back up')
+    backup.add_argument(
+        '--snapshots',
+        action='store_true',
+        help='keep a dated snapshot per backup, hard-linking unchanged documents',
+    )
+    backup.add_argument('--keep-snapshots', type=int, default=0, metavar='N', help='delete all but the N newest snapshots')
+    parser.add_argument(
+        '--checkpoint',
+        default=None,
+        help='file to resume from and to write the remaining operations to when interrupted; '
+        'with --simulate, the plan for the next run to apply if nothing changes',
+    )
+    parser.add_argument(
+        '--diagnostics',
+        nargs='?',
+        const='',
+        default=None,
+        metavar='DIR',
+        help='profile the run and write a diagnostics bundle (to DIR, default: the application data folder)',
+    )
+    return parser
+
+
+def _load_checkpoints(path):
+    if not path or not os.path.isfile(path):
+        return {}
+
+    try:
+        with open(path) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+
+def _store_checkpoints(path, checkpoints):
+    if not path:
+        return
+
+    checkpoints = {name: checkpoint for name, checkpoint in checkpoints.items() if checkpoint}
+
+    if checkpoints:
+        with open(path, 'w') as fh:
+            json.dump(checkpoints, fh)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def _write_plans(path, summaries, log):
+    plans = {name: summary['plan'] for name, summary in summaries.items() if summary.get('plan')}
+
+    for name, plan in plans.items():
+        target = path
+
+        if len(plans) > 1:
+            stem, ext = os.path.splitext(path)
+            target = stem + '-' + ''.join(c if c.isalnum() else '_' for c in name) + ext
+
+        write_plan(plan, target)
+        log('Plan written to ' + target)
+
+
+def _addresses(args):
+    if args.address:
+        return args.address
+
+    return [address.strip() for address in os.environ.get('QUADERNO_ADDRESS', '').split(',') if address.strip()]
+
+
+def _pull(args, devices, log):
+    control = SyncControl()
+    signal.signal(signal.SIGINT, lambda _signum, _frame: control.cancel())
+    summaries = {}
+
+    for name, dp in devices.items():
+        summaries[name] = ReverseSync(
+            dp,
+            args.remote_base,
+            device_name=name,
+            storage_path=args.storage,
+            db_path=args.db,
+            target_dir=args.pull_folder,
+            replace_attachments=args.replace_attachments,
+            log=log if len(devices) == 1 else lambda message, prefix=f'[{name}] ': log(prefix + message),
+            control=control,
+        ).run()
+
+    if args.json:
+        json.dump({'devices': summaries}, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+
+    if any(summary['aborted'] or summary['cancelled'] for summary in summaries.values()):
+        return 2
+
+    return 1 if any(summary['errors'] for summary in summaries.values()) else 0
+
+
+def _backup(args, devices, log):
+    control = SyncControl()
+    signal.signal(signal.SIGINT, lambda _signum, _frame: control.cancel())
+    summaries = {}
+
+    for name, dp in devices.items():
+        target = args.backup if len(devices) == 1 else os.path.join(
+            args.backup, ''.join(c if c.isalnum() else '_' for c in name)
+        )
+        summaries[name] = DeviceBackup(
+            dp,
+            target,
+            remote_base=args.backup_folder,
+            snapshots=args.snapshots,
+            keep_snapshots=args.keep_snapshots,
+            log=log if len(devices) == 1 else lambda message, prefix=f'[{name}] ': log(prefix + message),
+            control=control,
+        ).run()
+
+    if args.json:
+        json.dump({'devices': summaries}, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+
+    if any(summary['aborted'] or summary['cancelled'] for summary in summaries.values()):
+        return 2
+
+    return 1 if any(summary['errors'] for summary in summaries.values()) else 0
+
+
+def _watch(args, devices, options, log):
+    if len(devices) != 1:
+        log('--watch syncs a single device; pass one --address.')
+        return 2
+
+    name, dp = next(iter(devices.items()))
+    errors = []
+
+    def synced(summary):
+        errors.extend(summary['errors'])
+
+        if args.json:
+            json.dump(summary, sys.stdout)
+            sys.stdout.write('\n')
+            sys.stdout.flush()
+
+    WatchSync(dp, args.remote_base, on_sync=synced, device_name=name, **options).run()
+    return 1 if errors else 0
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    diagnostics = enable_diagnostics([], force=args.diagnostics is not None, output_dir=args.diagnostics)
+
+    with diagnostics.profile('quaderno-sync'):
+        status = _run(args)
+
+    if diagnostics.enabled:
+        print('Diagnostics bundle written to ' + str(diagnostics.dump_bundle()), file=sys.stderr)
+
+    return status
+
+
+def _run(args):
+    addresses = _addresses(args)
+
+    if not addresses:
+        print('quaderno-sync: a device address is required (--address or $QUADERNO_ADDRESS).', file=sys.stderr)
+        return 2
+
+    # With --json, stdout is reserved for the summary.
+    log_stream = sys.stderr if args.json else sys.stdout
+
+    def log(message):
+        print(message, file=log_stream, flush=True)
+
+    from quaderno_gui.core.device import connect_device, open_transport
+
+    devices = {}
+
+    for address in addresses:
+        try:
+            devices[address] = open_transport(connect_device(address, args.serial, log=log), args.transport)
+        except Exception as e:
+            log(f'Connection error ({address}): {e}')
+
+    if not devices:
+        return 2
+
+    if args.pull:
+        return _pull(args, devices, log) if len(devices) == len(addresses) else 2
+
+    if args.backup:
+        return _backup(args, devices, log) if len(devices) == len(addresses) else 2
+
+    optimizer = None
+
+    if args.optimize:
+        if optimization_available():
+            optimizer = PdfOptimizer(
+                max_cache_bytes=int(args.optimize_cache_size * 1024 * 1024),
+                settings={'grayscale': args.optimize_grayscale},
+            )
+        else:
+            log('PDF optimization needs pikepdf and Pillow; uploading originals.')
+
+    control = SyncControl()
+
+    def interrupt(_signum, _frame):
+        log('Interrupted; stopping after the current operation...')
+        control.cancel()
+
+    signal.signal(signal.SIGINT, interrupt)
+    signal.signal(signal.SIGTERM, interrupt)
+
+    options = dict(
+        storage_path=args.storage,
+        db_path=args.db,
+        simulate=args.simulate,
+        log=log,
+        control=control,
+        order=args.order,
+        priority_collections=args.priority_collection,
+        bandwidth_limit=args.bandwidth_limit * 1024 or None,
+        filters={
+            'include_collections': args.include_collection,
+            'exclude_collections': args.exclude_collection,
+            'include_tags': args.include_tag,
+            'exclude_tags': args.exclude_tag,
+            'max_size': int(args.max_size * 1024 * 1024),
+            'modified_days': args.modified_days,
+        },
+        fit_to_storage=args.fit_to_storage,
+        optimizer=optimizer,
+        stream=args.stream,
+        fingerprints=FingerprintService() if args.content_hashes else None,
+        crawl=args.crawl,
+    )
+    if args.watch:
+        return _watch(args, devices, options, log)
+
+    checkpoints = _load_checkpoints(args.checkpoint)
+
+    if len(devices) == 1:
+        name, dp = next(iter(devices.items()))
+        result = SyncEngine(dp, args.remote_base, device_name=name, **options).run(checkpoints.get(name))
+        summaries = {name: result}
+    else:
+        result = MultiDeviceSync(devices, args.remote_base, checkpoints=checkpoints, **options).run()
+        summaries = result['devices']
+
+    if not result['aborted']:
+        _store_checkpoints(args.checkpoint, {
+            name: summary.get('applicable_plan') or summary['checkpoint']
+            for name, summary in summaries.items() if not summary['aborted']
+        })
+
+    if args.plan_out:
+        _write_plans(args.plan_out, summaries, log)
+
+    if args.json:
+        json.dump(result, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+
+    if result['aborted'] or len(devices) < len(addresses):
+        return 2
+
+    if any(summary['aborted'] or summary['cancelled'] for summary in summaries.values()):
+        return 2
+
+    return 1 if any(summary['errors'] for summary in summaries.values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
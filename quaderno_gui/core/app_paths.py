@@ -0,0 +1,71 @@
+"""
+Per-user cache and data locations for QuadernoGUI.
+"""
+
+import hashlib
+import json
+import os
+import sys
+from pathlib import Path
+
+
+APP_NAME = 'quaderno-gui'
+
+
+def _base_dir(env_var, posix_default, windows_env):
+    if sys.platform == 'win32':
+        return Path(os.environ.get(windows_env) or Path.home() / 'AppData' / 'Local')
+
+    if sys.platform == 'darwin':
+        return Path.home() / 'Library' / ('Caches' if env_var == 'XDG_CACHE_HOME' else 'Application Support')
+
+    return Path(os.environ.get(env_var) or Path.home() / posix_default)
+
+
+def user_cache_dir(*parts):
+    """
+    Return (without creating it) a cache directory for QuadernoGUI.
+    """
+    return _base_dir('XDG_CACHE_HOME', '.cache', 'LOCALAPPDATA').joinpath(APP_NAME, *parts)
+
+
+def user_data_dir(*parts):
+    """
+    Return (without creating it) a data directory for state that should persist.
+    """
+    return _base_dir('XDG_DATA_HOME', '.local/share', 'APPDATA').joinpath(APP_NAME, *parts)
+
+
+def device_state_path(kind, device_name, remote_base):
+    """
+    Return the JSON file that keeps `kind` state for a device and device folder.
+    """
+    key = hashlib.sha1(f'{device_name}\n{remote_base}'.encode('utf-8')).hexdigest()[:16]
+    return user_data_dir(kind, key + '.json')
+
+
+def load_json_state(path):
+    """
+    Return the dict stored at `path`, or None if it is missing or unreadable.
+    """
+    try:
+        with open(path) as fh:
+            state = json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+    return state if isinstance(state, dict) else None
+
+
+def store_json_state(path, state):
+    """
+    Atomically write a dict to `path`, creating its directory.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_suffix('.part')
+
+    with open(partial, 'w') as fh:
+        json.dump(state, fh)
+
+    os.replace(partial, path)
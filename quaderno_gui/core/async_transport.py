@@ -0,0 +1,386 @@
+"""
+asyncio transport for DigitalPaper sessions.
+
+`dptrp1.DigitalPaper` is a blocking `requests` client, so every request in
+flight holds a thread. `AsyncDigitalPaper` implements the calls used for
+syncs and batch transfers (listing, upload, download, folder creation,
+deletion, path checks) as coroutines on one `aiohttp` session with a
+bounded, reused connection pool. `AsyncTransport` runs it on a single event
+loop thread and gives it the blocking method names of `DigitalPaper`, so it
+can stand in for the session behind `DeviceArbiter` and `ResilientDevice`.
+
+aiohttp is optional; see `device.async_available()` and `device.open_transport()`.
+"""
+
+import asyncio
+import os
+import threading
+from contextlib import asynccontextmanager
+from urllib.parse import quote_plus
+
+from quaderno_gui.core.upload_stream import CHUNK_SIZE, FileBody
+
+
+DEFAULT_CONNECTIONS = 4
+# Seconds without a byte from the device before a request fails.
+DEFAULT_TIMEOUT = 60.0
+
+
+class DeviceHTTPError(Exception):
+    """
+    Raised when the device answers a request with an error status.
+    """
+
+    def __init__(self, status, message=''):
+        super().__init__(f'Device answered {status}' + (': ' + message if message else ''))
+        self.status = status
+
+
+async def _body_chunks(body):
+    # Touching a memory-mapped page that is not in memory yet blocks on the
+    # disk, so the file is read on the default executor, not on the loop.
+    loop = asyncio.get_running_loop()
+
+    while True:
+        chunk = await loop.run_in_executor(None, body.read, CHUNK_SIZE)
+
+        if not chunk:
+            return
+
+        yield chunk
+
+
+class AsyncDigitalPaper:
+    """
+    Coroutine client for the DigitalPaper REST API.
+
+    Requests are sent like `DigitalPaper` sends them, with the credentials
+    of an authenticated session; at most `connections` are open at once.
+    Connection failures and timeouts are raised as the builtin
+    `ConnectionError` and `TimeoutError`, error answers as `DeviceHTTPError`.
+    """
+
+    def __init__(self, base_url, credentials=None, connections=DEFAULT_CONNECTIONS, timeout=DEFAULT_TIMEOUT):
+        self.base_url = base_url.rstrip('/') + '/'
+        self.credentials = credentials
+        self.connections = connections
+        self.timeout = timeout
+        self._session = None
+
+    @classmethod
+    def from_device(cls, dp, **options):
+        """
+        Return a client for the device of the `DigitalPaper` session `dp`, using its credentials.
+        """
+        session = getattr(dp, 'session', None)
+        credentials = session.cookies.get('Credentials') if session is not None else None
+        return cls(dp.base_url, credentials, **options)
+
+    def _client(self):
+        if self._session is None:
+            import aiohttp
+
+            # The device's cookie format is not parsed by cookie jars; send it as dptrp1 does.
+            headers = {'Cookie': 'Credentials=' + self.credentials} if self.credentials else {}
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.connections, ssl=False),
+                headers=headers,
+                cookie_jar=aiohttp.DummyCookieJar(),
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=self.timeout, sock_read=self.timeout),
+            )
+
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    @asynccontextmanager
+    async def _request(self, method, endpoint, **kwargs):
+        import aiohttp
+        from yarl import URL
+
+        # Paths are quoted by the caller, like in DigitalPaper._endpoint_request.
+        url = URL(self.base_url + endpoint.lstrip('/'), encoded=True)
+
+        try:
+            async with self._client().request(method, url, **kwargs) as response:
+                yield response
+        except asyncio.TimeoutError as e:
+            raise TimeoutError(f'{method} {endpoint} timed out') from e
+        except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError) as e:
+            raise ConnectionError(str(e) or type(e).__name__) from e
+
+    async def _send(self, method, endpoint, data=None, client_errors=True):
+        """
+        Send a JSON request and return the decoded answer (None if empty).
+
+        With `client_errors` False, 4xx answers are ignored the way
+        `DigitalPaper` ignores them, e.g. for a folder that already exists.
+        """
+        kwargs = {} if data is None else {'json': data}
+
+        async with self._request(method, endpoint, **kwargs) as response:
+            body = await response.read()
+
+            if response.status >= 500 or (response.status >= 400 and client_errors):
+                raise DeviceHTTPError(response.status, body.decode('utf-8', 'replace')[:200])
+
+            return await response.json(content_type=None) if body else None
+
+    async def resolve(self, path):
+        """
+        Return the entry at `path`, or None if there is none.
+        """
+        async with self._request('GET', '/resolve/entry/path/' + quote_plus(path)) as response:
+            # Reading the whole answer lets the connection be reused.
+            await response.read()
+
+            if response.status >= 500:
+                raise DeviceHTTPError(response.status)
+
+            if response.status >= 400:
+                return None
+
+            return await response.json(content_type=None)
+
+    async def entry_id(self, path):
+        """
+        Return the id of the entry at `path`, raising `ResolveObjectFailed` like `DigitalPaper`.
+        """
+        entry = await self.resolve(path)
+
+        if entry is None:
+            from dptrp1.dptrp1 import ResolveObjectFailed
+
+            raise ResolveObjectFailed(path, 'not found')
+
+        return entry['entry_id']
+
+    async def path_exists(self, path):
+        return await self.resolve(path) is not None
+
+    async def list_all(self):
+        return (await self._send('GET', '/documents2?entry_type=all'))['entry_list']
+
+    async def list_folder_entries_by_id(self, folder_id):
+        return (await self._send('GET', f'/folders/{folder_id}/entries'))['entry_list']
+
+    async def list_objects_in_folder(self, path):
+        return await self.list_folder_entries_by_id(await self.entry_id(path))
+
+    async def list_documents(self):
+        entries = await self.list_all()
+        return [entry for entry in entries if entry.get('entry_type') == 'document']
+
+    async def get_storage(self):
+        return await self._send('GET', '/system/status/storage')
+
+    async def new_folder(self, path):
+        parent, name = os.path.dirname(path), os.path.basename(path)
+
+        if not parent:
+            return
+
+        parent_entry = await self.resolve(parent)
+
+        if parent_entry is None:
+            await self.new_folder(parent)
+            parent_entry = {'entry_id': await self.entry_id(parent)}
+
+        info = {'folder_name': name, 'parent_folder_id': parent_entry['entry_id']}
+        await self._send('POST', '/folders2', info, client_errors=False)
+
+    async def _delete(self, path, kind):
+        entry = await self.resolve(path)
+
+        if entry is not None:
+            await self._send('DELETE', f"/{kind}/{entry['entry_id']}", {})
+
+    async def delete_document(self, path):
+        await self._delete(path, 'documents')
+
+    async def delete_folder(self, path):
+        await self._delete(path, 'folders')
+
+    async def _create_document(self, remote_path):
+        # Same steps as DigitalPaper.upload for a new document.
+        directory = os.path.dirname(remote_path)
+        await self.new_folder(directory)
+        info = {
+            'file_name': os.path.basename(remote_path),
+            'parent_folder_id': await self.entry_id(directory),
+            'document_source': '',
+        }
+        return (await self._send('POST', '/documents2', info))['document_id']
+
+    async def upload_file(self, local_path, remote_path, progress=None):
+        """
+        Upload `local_path` to `remote_path` (a document path or a folder), streamed from the file.
+        """
+        entry = await self.resolve(remote_path.rstrip('/'))
+
+        if remote_path.endswith('/') or (entry is not None and entry.get('entry_type') == 'folder'):
+            remote_path = remote_path.rstrip('/') + '/' + os.path.basename(local_path)
+            entry = await self.resolve(remote_path)
+
+        doc_id = entry['entry_id'] if entry is not None else await self._create_document(remote_path)
+
+        with FileBody(local_path, quote_plus(os.path.basename(remote_path)), progress=progress) as body:
+            headers = {'Content-Type': body.content_type, 'Content-Length': str(len(body))}
+
+            async with self._request('PUT', f'/documents/{doc_id}/file', data=_body_chunks(body),
+                                     headers=headers) as response:
+                await response.read()
+
+                if response.status >= 400:
+                    raise DeviceHTTPError(response.status)
+
+    async def iter_document(self, entry_id, chunk_size=CHUNK_SIZE):
+        """
+        Yield the bytes of the document with `entry_id` in chunks.
+        """
+        async with self._request('GET', f'/documents/{entry_id}/file') as response:
+            if response.status >= 400:
+                raise DeviceHTTPError(response.status)
+
+            async for chunk in response.content.iter_chunked(chunk_size):
+                yield chunk
+
+    async def download(self, remote_path):
+        chunks = [chunk async for chunk in self.iter_document(await self.entry_id(remote_path))]
+        return b''.join(chunks)
+
+
+class AsyncTransport:
+    """
+    Blocking `DigitalPaper`-style view of an `AsyncDigitalPaper` running on one event loop.
+
+    Any thread may call the methods; each waits for its request on the
+    loop, so concurrent callers share the connection pool instead of each
+    holding a connection of their own. The loop runs in `run_forever`, on
+    a thread of the caller's choosing (`start` makes one; the GUI uses a
+    `TransportThread`). Other attributes come from the wrapped session.
+    """
+
+    # Streamed requests built on `session` (upload_stream, reverse_sync)
+    # fall back to the methods below, which stream on the loop instead.
+    session = None
+    streams_uploads = True
+
+    def __init__(self, dp, connections=DEFAULT_CONNECTIONS, client=None):
+        self.device = dp
+        self.client = client or AsyncDigitalPaper.from_device(dp, connections=connections)
+        self.loop = asyncio.new_event_loop()
+        self._thread = None
+
+    def __getattr__(self, name):
+        if name == 'device':
+            raise AttributeError(name)
+
+        return getattr(self.device, name)
+
+    def run_forever(self):
+        """
+        Run the event loop in the calling thread until `stop` is called.
+        """
+        asyncio.set_event_loop(self.loop)
+
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.run_until_complete(self.client.close())
+            self.loop.run_until_complete(self.loop.shutdown_default_executor())
+            self.loop.close()
+
+    def start(self):
+        """
+        Run the event loop on a daemon thread of its own.
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run_forever, name='device-transport', daemon=True)
+            self._thread.start()
+
+        return self
+
+    def stop(self):
+        """
+        Close the connections and stop the loop; calls made afterwards fail.
+        """
+        if not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, coroutine):
+        """
+        Schedule `coroutine` on the loop and return a `concurrent.futures.Future` for its result.
+        """
+        if self.loop.is_closed():
+            coroutine.close()
+            raise ConnectionError('The device transport is closed.')
+
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def run(self, coroutine):
+        return self.submit(coroutine).result()
+
+    def map(self, name, calls, limit=None):
+        """
+        Run the client method `name` once per argument tuple in `calls`, concurrently on the loop.
+
+        Returns the results in order; a failed call's exception takes its
+        place. At most `limit` calls (default: the pool size) are in flight.
+        """
+        method = getattr(self.client, name)
+
+        async def run_all():
+            semaphore = asyncio.Semaphore(limit or self.client.connections)
+
+            async def bounded(args):
+                async with semaphore:
+                    return await method(*args)
+
+            return await asyncio.gather(*(bounded(args) for args in calls), return_exceptions=True)
+
+        return self.run(run_all())
+
+    def list_all(self):
+        return self.run(self.client.list_all())
+
+    def list_documents(self):
+        return self.run(self.client.list_documents())
+
+    def list_objects_in_folder(self, remote_path):
+        return self.run(self.client.list_objects_in_folder(remote_path))
+
+    def list_folder_entries_by_id(self, folder_id):
+        return self.run(self.client.list_folder_entries_by_id(folder_id))
+
+    def _get_object_id(self, remote_path):
+        return self.run(self.client.entry_id(remote_path))
+
+    def path_exists(self, remote_path):
+        return self.run(self.client.path_exists(remote_path))
+
+    def get_storage(self):
+        return self.run(self.client.get_storage())
+
+    def new_folder(self, remote_path):
+        return self.run(self.client.new_folder(remote_path))
+
+    def delete_document(self, remote_path):
+        return self.run(self.client.delete_document(remote_path))
+
+    def delete_folder(self, remote_path):
+        return self.run(self.client.delete_folder(remote_path))
+
+    def upload_file(self, local_path, remote_path, progress=None):
+        return self.run(self.client.upload_file(local_path, remote_path, progress))
+
+    def download(self, remote_path):
+        return self.run(self.client.download(remote_path))
+
@@ -0,0 +1,350 @@
+"""
+Back up everything on the device into a local folder.
+
+`DeviceBackup` reproduces the device tree below a local directory. One
+`list_all()` is compared with the sizes and modified dates kept in the
+backup's metadata file, so only new or changed documents are downloaded,
+a few at a time. With snapshots, every run writes a dated folder and
+hard-links the documents that did not change from the previous snapshot,
+so an unchanged night costs one listing and no downloads.
+"""
+
+import os
+import re
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+
+from quaderno_gui.core.app_paths import load_json_state, store_json_state
+from quaderno_gui.core.device_arbiter import BULK, with_priority
+from quaderno_gui.core.device_index import KIND_DOCUMENT, KIND_FOLDER, DeviceIndex
+from quaderno_gui.core.resilience import BULK_POLICY, resilient
+from quaderno_gui.core.reverse_sync import stream_document
+from quaderno_gui.core.scheduler import ThroughputMeter
+from quaderno_gui.core.sync_engine import SyncControl
+
+
+DEFAULT_REMOTE_BASE = 'Document'
+DEFAULT_WORKERS = 4
+METADATA_FILE = '.quaderno-backup.json'
+SNAPSHOT_FORMAT = '%Y-%m-%d'
+SNAPSHOT_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}(-\d{6}(-\d+)?)?$')
+# A snapshot is written under this suffix and renamed when it is complete.
+PARTIAL_SUFFIX = '.partial'
+
+
+def _noop(*_args):
+    pass
+
+
+def _has_size(path, size):
+    try:
+        return path.stat().st_size == size
+    except OSError:
+        return False
+
+
+def _set_mtime(path, modified):
+    try:
+        timestamp = datetime.fromisoformat(modified).timestamp()
+    except (TypeError, ValueError):
+        return
+
+    os.utime(path, (timestamp, timestamp))
+
+
+def _safe(rel):
+    return all(part not in ('', '.', '..') for part in rel.split('/'))
+
+
+class DeviceBackup:
+    """
+    Mirror the documents below `remote_base` into `target_dir`.
+
+    Without snapshots the mirror is updated in place and documents deleted
+    on the device are deleted locally as well. With `snapshots`, each run
+    creates `target_dir/YYYY-MM-DD` and older snapshots stay untouched;
+    `keep_snapshots` (0 keeps all) prunes the oldest ones. Files in the
+    target that the backup did not write are never deleted.
+    """
+
+    def __init__(self, dp, target_dir, remote_base=DEFAULT_REMOTE_BASE, snapshots=False, keep_snapshots=0,
+                 workers=DEFAULT_WORKERS, log=None, progress=None, control=None):
+        self.target_dir = Path(target_dir).expanduser()
+        self.remote_base = remote_base.strip('/')
+        self.snapshots = snapshots
+        self.keep_snapshots = keep_snapshots
+        self.workers = workers
+        self.log = log or _noop
+        self.progress = progress or _noop
+        self.control = control or SyncControl()
+        self.dp = resilient(with_priority(dp, BULK), BULK_POLICY, log=self.log, sleep=self.control.sleep)
+        self.metadata_path = self.target_dir / METADATA_FILE
+        self.meter = ThroughputMeter()
+
+    def list_device(self):
+        """
+        Return ({rel: {'entry_id', 'size', 'modified'}}, folder rels) below remote_base.
+        """
+        index = DeviceIndex.from_entries(self.dp.list_all())
+        documents = {
+            rel: {'entry_id': index.entry_ids[i], 'size': index.sizes[i], 'modified': index.modified[i]}
+            for rel, i in index.entries_under(self.remote_base, KIND_DOCUMENT)
+            if _safe(rel)
+        }
+        folders = {rel for rel, _i in index.entries_under(self.remote_base, KIND_FOLDER) if _safe(rel)}
+        return documents, folders
+
+    def _local(self, root, rel):
+        return root.joinpath(*rel.split('/'))
+
+    def snapshot_name(self):
+        name = time.strftime(SNAPSHOT_FORMAT)
+
+        if (self.target_dir / name).exists():
+            name = time.strftime(SNAPSHOT_FORMAT + '-%H%M%S')
+
+        base, number = name, 1
+
+        while (self.target_dir / name).exists():
+            number += 1
+            name = f'{base}-{number}'
+
+        return name
+
+    def snapshot_names(self):
+        """
+        Return the names of the complete snapshots in the target, oldest first.
+        """
+        try:
+            return sorted(
+                entry.name for entry in os.scandir(self.target_dir)
+                if entry.is_dir() and SNAPSHOT_PATTERN.match(entry.name)
+            )
+        except OSError:
+            return []
+
+    def plan(self, documents, known, previous_root):
+        """
+        Split device documents into (download, keep) relative paths.
+
+        A document is kept when its size and modified date match the metadata
+        and the previous copy is still on disk.
+        """
+        download = []
+        keep = []
+
+        for rel, state in sorted(documents.items()):
+            previous = known.get(rel)
+            same = previous is not None and previous['size'] == state['size'] \
+                and previous['modified'] == state['modified']
+
+            if same and previous_root is not None and _has_size(self._local(previous_root, rel), state['size']):
+                keep.append(rel)
+            else:
+                download.append(rel)
+
+        return download, keep
+
+    def download(self, rel, state, root):
+        """
+        Stream one document below `root`; return the bytes written.
+        """
+        target = self._local(root, rel)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        partial = target.with_name(target.name + '.part')
+        written = 0
+
+        try:
+            with open(partial, 'wb') as fh:
+                for chunk in stream_document(self.dp, state['entry_id'], self.remote_base + '/' + rel):
+                    fh.write(chunk)
+                    written += len(chunk)
+
+            _set_mtime(partial, state['modified'])
+            os.replace(partial, target)
+        finally:
+            if partial.exists():
+                partial.unlink()
+
+        return written
+
+    def _fetch(self, rel, state, root):
+        if not self.control.wait():
+            return None
+
+        return self.download(rel, state, root)
+
+    def _link(self, source, target):
+        target.parent.mkdir(parents=True, exist_ok=True)
+
+        try:
+            os.link(source, target)
+        except OSError:
+            # File systems without hard links get a copy.
+            shutil.copy2(source, target)
+
+    def _remove(self, root, removed, folders):
+        """
+        Delete local copies of documents gone from the device, and their emptied folders.
+        """
+        for rel in removed:
+            try:
+                self._local(root, rel).unlink()
+            except FileNotFoundError:
+                pass
+
+            parent = rel.rpartition('/')[0]
+
+            while parent and parent not in folders:
+                try:
+                    self._local(root, parent).rmdir()
+                except OSError:
+                    break
+
+                parent = parent.rpartition('/')[0]
+
+    def prune_snapshots(self):
+        """
+        Delete the oldest snapshots beyond `keep_snapshots`; return their names.
+        """
+        names = self.snapshot_names()
+
+        if not self.keep_snapshots or len(names) <= self.keep_snapshots:
+            return []
+
+        pruned = names[:len(names) - self.keep_snapshots]
+
+        for name in pruned:
+            shutil.rmtree(self.target_dir / name, ignore_errors=True)
+            self.log('Removed old snapshot: ' + name)
+
+        return pruned
+
+    def run(self):
+        """
+        Back up the device and return a summary dict.
+        """
+        started = time.monotonic()
+        summary = {
+            'aborted': False,
+            'cancelled': False,
+            'target': str(self.target_dir),
+            'snapshot': None,
+            'downloaded': 0,
+            'bytes': 0,
+            'kept': 0,
+            'removed': 0,
+            'errors': [],
+            'duration': 0.0,
+        }
+        self.log(f'Backing up {self.remote_base} to {self.target_dir}...')
+
+        try:
+            documents, folders = self.list_device()
+        except Exception as e:
+            self.log('Could not list the device: ' + str(e))
+            summary['aborted'] = True
+            return summary
+
+        metadata = load_json_state(self.metadata_path) or {}
+
+        if metadata.get('remote_base') != self.remote_base or bool(metadata.get('snapshot')) != self.snapshots:
+            metadata = {}
+
+        known = metadata.get('documents', {})
+
+        if self.snapshots:
+            previous = metadata.get('snapshot')
+            previous_root = self.target_dir / previous if previous else None
+            name = self.snapshot_name()
+            root = self.target_dir / (name + PARTIAL_SUFFIX)
+
+            # Left behind by an interrupted run.
+            for partial in self.target_dir.glob('*' + PARTIAL_SUFFIX):
+                shutil.rmtree(partial, ignore_errors=True)
+        else:
+            previous_root = root = self.target_dir
+
+        root.mkdir(parents=True, exist_ok=True)
+
+        for folder in folders:
+            self._local(root, folder).mkdir(parents=True, exist_ok=True)
+
+        download, keep = self.plan(documents, known, previous_root)
+        updated = {rel: known[rel] for rel in keep}
+
+        if self.snapshots:
+            for rel in keep:
+                self._link(self._local(previous_root, rel), self._local(root, rel))
+        else:
+            removed = [rel for rel in known if rel not in documents]
+            self._remove(root, removed, folders)
+            summary['removed'] = len(removed)
+
+        summary['kept'] = len(keep)
+        self.log(f'{len(keep)} documents unchanged, {len(download)} to download.')
+        self.meter = ThroughputMeter(sum(documents[rel]['size'] for rel in download))
+        total = len(download)
+
+        if download:
+            with ThreadPoolExecutor(max_workers=min(self.workers, total)) as pool:
+                futures = {pool.submit(self._fetch, rel, documents[rel], root): rel for rel in download}
+                last = time.monotonic()
+
+                for done, future in enumerate(as_completed(futures), 1):
+                    rel = futures[future]
+
+                    try:
+                        written = future.result()
+                    except Exception as e:
+                        self.log(f'Download failed for {rel}: {e}')
+                        summary['errors'].append({'rel': rel, 'error': str(e)})
+                        written = None
+
+                    if written is not None:
+                        state = documents[rel]
+                        updated[rel] = {'size': state['size'], 'modified': state['modified']}
+                        summary['downloaded'] += 1
+                        summary['bytes'] += written
+                        # Downloads overlap, so the rate is measured between completions.
+                        now = time.monotonic()
+                        self.meter.record(written, now - last)
+                        last = now
+
+                    self.progress(done, total, rel, self.meter.stats())
+
+        if self.control.cancelled:
+            summary['cancelled'] = True
+
+            if self.snapshots:
+                shutil.rmtree(root, ignore_errors=True)
+                self.log('Backup cancelled; the incomplete snapshot was removed.')
+                return summary
+
+            self.log('Backup cancelled; the next backup continues with the remaining documents.')
+        elif self.snapshots:
+            os.replace(root, self.target_dir / name)
+            summary['snapshot'] = name
+
+        store_json_state(self.metadata_path, {
+            'remote_base': self.remote_base,
+            'snapshot': summary['snapshot'] if self.snapshots else None,
+            'documents': updated,
+        })
+
+        if self.snapshots:
+            self.prune_snapshots()
+
+        summary['duration'] = time.monotonic() - started
+
+        if summary['cancelled']:
+            return summary
+
+        self.log(
+            f"Backup complete: {summary['downloaded']} downloaded, {summary['kept']} unchanged, "
+            f"{summary['removed']} removed, {len(summary['errors'])} errors."
+        )
+        return summary
@@ -0,0 +1,93 @@
+"""
+Delete many documents and folders from the device in one job.
+
+`BulkDelete` runs the deletions on a small thread pool and verifies them
+with a single listing at the end, instead of checking each path.
+"""
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from quaderno_gui.core.device_index import DeviceIndex
+
+
+DEFAULT_WORKERS = 4
+
+
+def _noop(*_args):
+    pass
+
+
+def _within(path, folders):
+    return any(path.startswith(folder + '/') for folder in folders)
+
+
+class BulkDelete:
+    """
+    Delete `documents` and `folders` (full device paths) with at most `workers` requests at a time.
+
+    Documents and folders inside another folder of the job are left to that
+    folder's deletion. The progress callback receives (done, total, path).
+    """
+
+    def __init__(self, dp, documents=(), folders=(), workers=DEFAULT_WORKERS, log=None, progress=None):
+        self.dp = dp
+        self.folders = sorted({folder.rstrip('/') for folder in folders})
+        self.folders = [folder for folder in self.folders if not _within(folder, self.folders)]
+        self.documents = sorted({doc for doc in documents if not _within(doc, self.folders)})
+        self.workers = workers
+        self.log = log or _noop
+        self.progress = progress or _noop
+
+    def _delete(self, path, is_folder):
+        if is_folder:
+            self.dp.delete_folder(path)
+        else:
+            self.dp.delete_document(path)
+
+    def verify(self, paths):
+        """
+        Return the paths that still exist, using one device listing.
+        """
+        index = DeviceIndex.from_entries(self.dp.list_all())
+        existing = {index.path(i) for i in range(len(index))}
+        return [path for path in paths if path in existing]
+
+    def run(self):
+        """
+        Delete everything and return a summary dict.
+        """
+        jobs = [(path, False) for path in self.documents] + [(path, True) for path in self.folders]
+        summary = {'deleted': [], 'failed': [], 'remaining': []}
+        total = len(jobs)
+
+        if not jobs:
+            return summary
+
+        with ThreadPoolExecutor(max_workers=min(self.workers, total)) as pool:
+            futures = {pool.submit(self._delete, path, is_folder): path for path, is_folder in jobs}
+
+            for done, future in enumerate(as_completed(futures), 1):
+                path = futures[future]
+
+                try:
+                    future.result()
+                except Exception as e:
+                    summary['failed'].append({'path': path, 'error': str(e)})
+                    self.log(f'Failed to delete {path}: {e}')
+                else:
+                    summary['deleted'].append(path)
+
+                self.progress(done, total, path)
+
+        try:
+            summary['remaining'] = self.verify(summary['deleted'])
+        except Exception as e:
+            self.log('Could not verify the deletions: ' + str(e))
+
+        for path in summary['remaining']:
+            self.log('Warning: Still exists after deletion attempt: ' + path)
+
+        remaining = set(summary['remaining'])
+        summary['deleted'] = [path for path in summary['deleted'] if path not in remaining]
+        self.log(f"Deleted {len(summary['deleted'])} of {total} items.")
+        return summary
@@ -2,9 +2,10 @@
 Device connection functionality for QuadernoGUI.
 """
 
-import os
 from PyQt5.QtCore import QThread, pyqtSignal
-from dptrp1.dptrp1 import DigitalPaper, find_auth_files, get_default_auth_files
+
+from quaderno_gui.core.device import connect_device
+
 
 class ConnectionWorker(QThread):
     """
@@ -21,29 +22,29 @@ class ConnectionWorker(QThread):
 
     def run(self):
         try:
-            self.log_signal.emit(f'Connecting to device at {self.address}...')
-
-            dp = DigitalPaper(addr=self.address, id=self.serial, quiet=True)
-
-            found_client, found_key = find_auth_files()
-
-            if os.path.exists(found_client) and os.path.exists(found_key):
-                with open(found_client) as fh:
-                    client_id = fh.readline().strip()
-                with open(found_key, 'rb') as fh:
-                    key = fh.read()
-                try:
-                    dp.authenticate(client_id, key)
-                    self.log_signal.emit('Authenticated successfully.')
-                except Exception as e:
-                    self.log_signal.emit('Authentication failed: ' + str(e))
-            else:
-                self.log_signal.emit('Auth files not found. Please register first.')
-
-            info = dp.get_info()
-            serial_number = info.get('serial_number', 'unknown')
-            self.log_signal.emit('Connected (internal serial: ' + serial_number + ').')
+            dp = connect_device(self.address, self.serial, log=self.log_signal.emit)
             self.finished_signal.emit(dp)
         except Exception as e:
             self.log_signal.emit('Connection error: ' + str(e))
             self.finished_signal.emit(None)
+
+
+class TransportThread(QThread):
+    """
+    Thread that runs the event loop of an `AsyncTransport` while the device is connected.
+
+    Workers and pages call the transport's blocking methods from their own
+    threads; the requests themselves all run on this one.
+    """
+
+    def __init__(self, transport, parent=None):
+        super().__init__(parent)
+
+        self.transport = transport
+
+    def run(self):
+        self.transport.run_forever()
+
+    def stop(self):
+        self.transport.stop()
+        self.wait()
@@ -0,0 +1,74 @@
+"""
+Qt-free device session helpers for QuadernoGUI.
+"""
+
+import importlib.util
+import os
+
+
+THREADED_BACKEND = 'threaded'
+ASYNC_BACKEND = 'asyncio'
+BACKENDS = (THREADED_BACKEND, ASYNC_BACKEND)
+
+
+def _noop(*_args):
+    pass
+
+
+def connect_device(address, serial=None, log=None):
+    """
+    Connect and authenticate with a DigitalPaper device, returning the session.
+
+    Authentication problems are logged rather than raised so that the caller
+    still gets a session for unauthenticated calls; connection errors propagate.
+    """
+    # dptrp1 pulls in requests and the crypto stack; import it only when connecting.
+    from dptrp1.dptrp1 import DigitalPaper, find_auth_files
+
+    log = log or _noop
+    log(f'Connecting to device at {address}...')
+
+    dp = DigitalPaper(addr=address, id=serial, quiet=True)
+
+    found_client, found_key = find_auth_files()
+
+    if os.path.exists(found_client) and os.path.exists(found_key):
+        with open(found_client) as fh:
+            client_id = fh.readline().strip()
+        with open(found_key, 'rb') as fh:
+            key = fh.read()
+        try:
+            dp.authenticate(client_id, key)
+            log('Authenticated successfully.')
+        except Exception as e:
+            log('Authentication failed: ' + str(e))
+    else:
+        log('Auth files not found. Please register first.')
+
+    info = dp.get_info()
+    serial_number = info.get('serial_number', 'unknown')
+    log('Connected (internal serial: ' + serial_number + ').')
+
+    return dp
+
+
+def async_available():
+    """
+    Return True if aiohttp, needed by the asyncio backend, is installed, without importing it.
+    """
+    return importlib.util.find_spec('aiohttp') is not None
+
+
+def open_transport(dp, backend=THREADED_BACKEND):
+    """
+    Return `dp` for the threaded backend, or an `AsyncTransport` running on a thread of its own.
+    """
+    if backend != ASYNC_BACKEND:
+        return dp
+
+    if not async_available():
+        raise RuntimeError('The asyncio backend needs aiohttp (pip install aiohttp).')
+
+    from quaderno_gui.core.async_transport import AsyncTransport
+
+    return AsyncTransport(dp).start()
@@ -0,0 +1,253 @@
+"""
+Shared, prioritized access to one DigitalPaper session.
+
+The GUI pages and background syncs use the same session. `DeviceArbiter`
+owns it and admits at most `limit` requests at a time, of which at most
+`bulk_limit` may be sync traffic, so one slot is always left for the GUI.
+Waiting interactive requests (browsing a folder, a single download) are
+admitted before waiting bulk requests, in arrival order within each class.
+With a `controller` (see `quaderno_gui.core.link_control`), the limit
+follows the measured link quality instead, still leaving one slot free of
+sync traffic.
+"""
+
+import collections
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from quaderno_gui.core.resilience import TRANSIENT, ResilientDevice, classify_error
+
+
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+
+
+class DeviceArbiter:
+    """
+    Admission control for the requests made on one DigitalPaper session.
+
+    `session(priority)` returns a view of the device whose method calls wait
+    for a slot of that priority. A thread that already holds a slot (a
+    device method calling another one) is not queued again. Every request
+    that completes is reported to the `controller`, if any, with its
+    latency, size and whether it failed with a transient error.
+    """
+
+    def __init__(self, dp, limit=2, bulk_limit=1, controller=None):
+        self.device = dp
+        self.limit = limit
+        self.bulk_limit = min(bulk_limit, limit)
+        self.controller = controller
+        self._condition = threading.Condition()
+        self._tickets = itertools.count()
+        self._waiting = {INTERACTIVE: collections.deque(), BULK: collections.deque()}
+        self._active = {INTERACTIVE: 0, BULK: 0}
+        self._held = threading.local()
+        self._stats = {priority: {'requests': 0, 'waited': 0.0, 'max_wait': 0.0} for priority in self._active}
+
+    def session(self, priority=INTERACTIVE):
+        return ArbitratedDevice(self, priority)
+
+    def limits(self):
+        """
+        Return the current (total, bulk) request limits.
+        """
+        if self.controller is None:
+            return self.limit, self.bulk_limit
+
+        limit = self.controller.limit
+        return limit, max(1, limit - 1)
+
+    def max_slots(self, priority=INTERACTIVE):
+        """
+        Return how many requests of `priority` may ever be in flight at once.
+        """
+        limit = self.limit if self.controller is None else self.controller.max_limit
+        bulk_limit = self.bulk_limit if self.controller is None else max(1, limit - 1)
+        return bulk_limit if priority == BULK else limit
+
+    def _may_start(self, priority, ticket):
+        if self._waiting[priority][0] != ticket:
+            return False
+
+        limit, bulk_limit = self.limits()
+
+        if sum(self._active.values()) >= limit:
+            return False
+
+        if priority == BULK:
+            return self._active[BULK] < bulk_limit and not self._waiting[INTERACTIVE]
+
+        return True
+
+    @contextmanager
+    def slot(self, priority=INTERACTIVE, name='request', nbytes=0):
+        """
+        Hold a request slot of the given priority for the duration of the block.
+
+        `name` and `nbytes` (None for a download of unknown size) describe
+        the request to the controller.
+        """
+        if getattr(self._held, 'depth', 0):
+            self._held.depth += 1
+
+            try:
+                yield
+            finally:
+                self._held.depth -= 1
+            return
+
+        started = time.monotonic()
+
+        with self._condition:
+            ticket = next(self._tickets)
+            queue = self._waiting[priority]
+            queue.append(ticket)
+
+            try:
+                self._condition.wait_for(lambda: self._may_start(priority, ticket))
+            finally:
+                queue.remove(ticket)
+
+            self._active[priority] += 1
+            waited = time.monotonic() - started
+            stats = self._stats[priority]
+            stats['requests'] += 1
+            stats['waited'] += waited
+            stats['max_wait'] = max(stats['max_wait'], waited)
+            # The next waiter in line may now be the one allowed to start.
+            self._condition.notify_all()
+
+        self._held.depth = 1
+        served = time.monotonic()
+        failed = False
+
+        try:
+            yield
+        except Exception as e:
+            failed = classify_error(e) == TRANSIENT
+            raise
+        finally:
+            self._held.depth = 0
+            seconds = time.monotonic() - served
+
+            with self._condition:
+                limit, _bulk_limit = self.limits()
+                saturated = sum(self._active.values()) >= limit or any(self._waiting.values())
+                self._active[priority] -= 1
+
+                if self.controller is not None:
+                    self.controller.record(name, seconds, failed, nbytes, saturated)
+
+                self._condition.notify_all()
+
+    def stats(self):
+        """
+        Return per-priority request counts and waiting times, plus the current queue.
+
+        With a controller, `link` holds its limit and link statistics.
+        """
+        with self._condition:
+            stats = {
+                priority: dict(
+                    stats,
+                    active=self._active[priority],
+                    queued=len(self._waiting[priority]),
+                )
+                for priority, stats in self._stats.items()
+            }
+
+        if self.controller is not None:
+            stats['link'] = self.link_stats()
+
+        return stats
+
+    def link_stats(self):
+        """
+        Return the controller's limit and link statistics with the requests in flight, or None.
+        """
+        if self.controller is None:
+            return None
+
+        with self._condition:
+            in_flight = sum(self._active.values())
+
+        return dict(self.controller.stats(), in_flight=in_flight)
+
+
+def _request_bytes(name, args):
+    # Uploads are judged against uploads of a similar size; the size of a
+    # download is not known before it arrives (None).
+    if name == 'upload_file' and args and isinstance(args[0], str) and os.path.isfile(args[0]):
+        return os.path.getsize(args[0])
+
+    return None if name == 'download' else 0
+
+
+class ArbitratedDevice:
+    """
+    View of an arbitrated DigitalPaper session whose method calls run in a slot of `priority`.
+    """
+
+    def __init__(self, arbiter, priority=INTERACTIVE):
+        self.arbiter = arbiter
+        self.priority = priority
+
+    def with_priority(self, priority):
+        return self.arbiter.session(priority)
+
+    def __getattr__(self, name):
+        attribute = getattr(self.arbiter.device, name)
+
+        if not callable(attribute) or name.startswith('__'):
+            return attribute
+
+        def call(*args, **kwargs):
+            with self.arbiter.slot(self.priority, name, _request_bytes(name, args)):
+                return attribute(*args, **kwargs)
+
+        return call
+
+
+def with_priority(dp, priority):
+    """
+    Return a view of `dp` whose requests use `priority`; sessions without an arbiter are returned as is.
+    """
+    if isinstance(dp, ResilientDevice):
+        device = with_priority(dp.device, priority)
+        return dp if device is dp.device else ResilientDevice(device, dp.policy, dp.breaker, dp.log)
+
+    if isinstance(dp, ArbitratedDevice):
+        return dp.with_priority(priority)
+
+    return dp
+
+
+def parallel_slots(dp):
+    """
+    Return how many requests `dp` may have in flight at once: 1 unless its arbiter adapts the limit.
+    """
+    if isinstance(dp, ResilientDevice):
+        dp = dp.device
+
+    if isinstance(dp, ArbitratedDevice) and dp.arbiter.controller is not None:
+        return dp.arbiter.max_slots(dp.priority)
+
+    return 1
+
+
+@contextmanager
+def request_slot(dp, name='request', nbytes=0):
+    """
+    Hold a request slot of `dp` while talking to its session directly, e.g. for a streamed download.
+    """
+    arbiter = getattr(dp, 'arbiter', None)
+
+    if arbiter is None:
+        yield
+    else:
+        with arbiter.slot(dp.priority, name, nbytes):
+            yield
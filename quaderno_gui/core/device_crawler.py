@@ -0,0 +1,105 @@
+"""
+Folder-by-folder device listing.
+
+`list_all()` returns every entry on the device in one response, which on a
+heavily used device is slow to arrive and has to be parsed in one piece.
+`crawl_folder` lists one subtree instead, breadth-first, with a few folder
+requests in flight at a time, and yields each folder's entries as soon as
+they arrive. The entries have the same shape as those of `list_all()`, so
+`DeviceIndex.from_entries` can consume them while the crawl is running.
+"""
+
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+DEFAULT_CRAWL_WORKERS = 4
+
+
+class _Folder:
+    __slots__ = ('path', 'entry_id')
+
+    def __init__(self, path, entry_id):
+        self.path = path
+        self.entry_id = entry_id
+
+
+def _root_entry(dp, root):
+    """
+    Return the folder entry of `root`, or None if it does not exist.
+    """
+    if hasattr(dp, 'list_folder_entries_by_id'):
+        from dptrp1.dptrp1 import ResolveObjectFailed
+
+        try:
+            entry_id = dp._get_object_id(root)
+        except ResolveObjectFailed:
+            return None
+    elif dp.path_exists(root):
+        entry_id = None
+    else:
+        return None
+
+    return {'entry_path': root, 'entry_type': 'folder', 'entry_id': entry_id}
+
+
+def _list(dp, folder):
+    # Listing by id saves resolving every folder path on the device.
+    if folder.entry_id is not None and hasattr(dp, 'list_folder_entries_by_id'):
+        return dp.list_folder_entries_by_id(folder.entry_id)
+
+    return dp.list_objects_in_folder(folder.path)
+
+
+def crawl_folder(dp, root='Document', workers=DEFAULT_CRAWL_WORKERS, control=None):
+    """
+    Yield lists of `list_all()` style entries for `root` and everything below it.
+
+    The first list holds the entry of `root` itself; it is empty if `root`
+    does not exist. Each further list holds the entries of one folder, in
+    the order the listings complete. At most `workers` folders are listed at
+    once. The crawl stops early when `control` (a `SyncControl`) is
+    cancelled; a failed folder listing is raised after the running ones end.
+    """
+    root = root.replace('\\', '/').strip('/')
+    entry = _root_entry(dp, root)
+
+    if entry is None:
+        yield []
+        return
+
+    yield [entry]
+    queued = deque([_Folder(root, entry['entry_id'])])
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while queued or running:
+            if control is not None and control.cancelled:
+                for future in running:
+                    future.cancel()
+
+                return
+
+            while queued and len(running) < workers:
+                folder = queued.popleft()
+                running[pool.submit(_list, dp, folder)] = folder
+
+            done, _pending = wait(running, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                del running[future]
+                entries = future.result()
+
+                for child in entries:
+                    if child.get('entry_type') == 'folder':
+                        queued.append(_Folder(child['entry_path'], child.get('entry_id')))
+
+                yield entries
+
+
+def crawl_entries(dp, root='Document', workers=DEFAULT_CRAWL_WORKERS, control=None):
+    """
+    Yield the entries of `crawl_folder` one by one.
+    """
+    for entries in crawl_folder(dp, root, workers, control):
+        yield from entries
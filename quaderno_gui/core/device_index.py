@@ -0,0 +1,250 @@
+"""
+Compact in-memory index of a DigitalPaper device listing.
+
+`dp.list_all()` returns one dict per entry with a dozen keys. Devices with
+tens of thousands of entries make holding on to those dicts, and building
+`PurePosixPath` objects for every entry, the dominant cost of a sync.
+`DeviceIndex` keeps only what the GUI and the sync engine use, in parallel
+arrays, and stores every folder path once in a prefix table so that
+selecting the entries below a folder is a string-prefix check per folder
+rather than a path computation per entry.
+"""
+
+import hashlib
+import sys
+from array import array
+
+
+KIND_FOLDER = 0
+KIND_DOCUMENT = 1
+
+
+class DeviceIndex:
+    """
+    Parallel-array index of device entries.
+
+    Entry `i` is described by `parents[i]` (an id into `folders`),
+    `names[i]`, `kinds[i]`, `sizes[i]`, `modified[i]` and `entry_ids[i]`.
+    `folders` holds each folder path once; `folder_ids` maps it back to its id
+    and `listed[id]` tells whether the folder itself was in the listing.
+    Folder id 0 is the empty path, the parent of top-level entries.
+    """
+
+    __slots__ = ('folders', 'folder_ids', 'listed', 'parents', 'names', 'kinds', 'sizes', 'modified', 'entry_ids')
+
+    def __init__(self):
+        self.folders = ['']
+        self.folder_ids = {'': 0}
+        self.listed = bytearray(1)
+        self.parents = array('l')
+        self.names = []
+        self.kinds = bytearray()
+        self.sizes = array('q')
+        self.modified = []
+        self.entry_ids = []
+
+    @classmethod
+    def from_entries(cls, entries):
+        """
+        Build an index from `list_all()` style entry dicts.
+        """
+        index = cls()
+        index.extend(entries)
+        return index
+
+    def extend(self, entries):
+        """
+        Add `list_all()` style entry dicts, e.g. as a folder-by-folder listing arrives.
+        """
+        for entry in entries:
+            entry_type = entry.get('entry_type')
+
+            if entry_type == 'document':
+                kind = KIND_DOCUMENT
+            elif entry_type == 'folder':
+                kind = KIND_FOLDER
+            else:
+                continue
+
+            path = entry.get('entry_path') or ''
+
+            if '\\' in path:
+                path = path.replace('\\', '/')
+
+            path = path.strip('/')
+
+            if not path:
+                continue
+
+            parent, _, name = path.rpartition('/')
+
+            if kind == KIND_FOLDER:
+                self.listed[self.folder_id(path)] = 1
+
+            self.parents.append(self.folder_id(parent))
+            self.names.append(sys.intern(name))
+            self.kinds.append(kind)
+            self.sizes.append(int(entry.get('file_size') or 0))
+            self.modified.append(entry.get('modified_date'))
+            self.entry_ids.append(entry.get('entry_id'))
+
+    def __len__(self):
+        return len(self.names)
+
+    def folder_id(self, path):
+        """
+        Return the id of a folder path, adding it and its parents to the table if needed.
+        """
+        folder_id = self.folder_ids.get(path)
+
+        if folder_id is None:
+            parent, _, _ = path.rpartition('/')
+
+            if parent:
+                self.folder_id(parent)
+
+            folder_id = len(self.folders)
+            self.folders.append(sys.intern(path))
+            self.listed.append(0)
+            self.folder_ids[path] = folder_id
+
+        return folder_id
+
+    def path(self, i):
+        parent = self.folders[self.parents[i]]
+        return parent + '/' + self.names[i] if parent else self.names[i]
+
+    def _relative_prefixes(self, base):
+        """
+        Return, per folder id, the prefix of its children relative to `base`, or None outside it.
+        """
+        base = base.replace('\\', '/').strip('/')
+        start = base + '/'
+        prefixes = []
+
+        for folder in self.folders:
+            if folder == base:
+                prefixes.append('')
+            elif not base or folder.startswith(start):
+                prefixes.append(folder[len(start):] + '/' if base else folder + '/')
+            else:
+                prefixes.append(None)
+
+        return prefixes
+
+    def entries_under(self, base, kind=None):
+        """
+        Yield (relative path, entry number) for the entries below `base`.
+        """
+        prefixes = self._relative_prefixes(base)
+        names = self.names
+        kinds = self.kinds
+
+        for i, parent in enumerate(self.parents):
+            prefix = prefixes[parent]
+
+            if prefix is None or (kind is not None and kinds[i] != kind):
+                continue
+
+            yield prefix + names[i], i
+
+    def documents_under(self, base):
+        """
+        Return {relative path: size} for the documents below `base`.
+        """
+        sizes = self.sizes
+        return {rel: sizes[i] for rel, i in self.entries_under(base, KIND_DOCUMENT)}
+
+    def folders_under(self, base):
+        """
+        Return the relative paths of the folders below `base` and whether `base` itself exists.
+        """
+        base = base.replace('\\', '/').strip('/')
+        folders = {rel for rel, _i in self.entries_under(base, KIND_FOLDER)}
+        base_id = self.folder_ids.get(base)
+
+        return folders, base_id is not None and bool(self.listed[base_id])
+
+    def fingerprint(self, base):
+        """
+        Return a hash of the entries below `base` with their sizes and modification dates.
+        """
+        sizes = self.sizes
+        modified = self.modified
+        kinds = self.kinds
+        _folders, base_exists = self.folders_under(base)
+        digest = hashlib.sha1(b'1' if base_exists else b'0')
+
+        for rel, i in sorted(self.entries_under(base)):
+            digest.update(f'\0{rel}\0{kinds[i]}\0{sizes[i]}\0{modified[i]}'.encode('utf-8'))
+
+        return digest.hexdigest()
+
+    def folder_tree(self):
+        return FolderTree(self)
+
+
+class FolderTree:
+    """
+    Folder hierarchy of a `DeviceIndex` with document counts and sizes.
+
+    `subfolders[f]` holds the ids of the child folders of folder id `f` and
+    `documents[f]` the entry numbers of the documents directly in it.
+    `total_documents[f]` and `total_bytes[f]` include all subfolders; they
+    are aggregated bottom-up in one pass, relying on a folder's parents
+    always having lower ids than the folder itself.
+    """
+
+    __slots__ = ('index', 'subfolders', 'documents', 'total_documents', 'total_bytes')
+
+    def __init__(self, index):
+        folders = index.folders
+        count = len(folders)
+        parent_ids = array('l', [0]) * count
+        self.index = index
+        self.subfolders = [[] for _ in range(count)]
+        self.documents = [[] for _ in range(count)]
+        self.total_documents = array('l', [0]) * count
+        self.total_bytes = array('q', [0]) * count
+
+        for folder_id in range(1, count):
+            parent_id = index.folder_ids[folders[folder_id].rpartition('/')[0]]
+            parent_ids[folder_id] = parent_id
+            self.subfolders[parent_id].append(folder_id)
+
+        sizes = index.sizes
+        kinds = index.kinds
+
+        for i, parent_id in enumerate(index.parents):
+            if kinds[i] == KIND_DOCUMENT:
+                self.documents[parent_id].append(i)
+                self.total_documents[parent_id] += 1
+                self.total_bytes[parent_id] += sizes[i]
+
+        for folder_id in range(count - 1, 0, -1):
+            parent_id = parent_ids[folder_id]
+            self.total_documents[parent_id] += self.total_documents[folder_id]
+            self.total_bytes[parent_id] += self.total_bytes[folder_id]
+
+    def folder_id(self, path):
+        """
+        Return the id of a folder path, or None if the listing has no such folder.
+        """
+        return self.index.folder_ids.get(path.replace('\\', '/').strip('/'))
+
+    def name(self, folder_id):
+        return self.index.folders[folder_id].rpartition('/')[2]
+
+    def children(self, folder_id):
+        """
+        Return the child folder ids of a folder, sorted by name.
+        """
+        return sorted(self.subfolders[folder_id], key=self.name)
+
+    def files(self, folder_id):
+        """
+        Return (name, size) for the documents directly in a folder, sorted by name.
+        """
+        names = self.index.names
+        sizes = self.index.sizes
+        return sorted((names[i], sizes[i]) for i in self.documents[folder_id])
@@ -0,0 +1,289 @@
+"""
+Profiling and diagnostics for slow syncs and refreshes.
+
+Enabled with `quaderno-gui --diagnostics`, `quaderno-sync --diagnostics`,
+`QUADERNO_DIAGNOSTICS=1` (or a directory to write bundles to), or from the
+hidden Diagnostics page (Ctrl+Shift+D). While enabled, sections marked with
+`profile` or `profiled` run under cProfile and tracemalloc, device calls
+record their latency and the GUI records event loop stalls. `dump_bundle`
+writes everything to a directory:
+
+- `profiles/*.prof` – one cProfile dump per section, for `python -m pstats`
+  or snakeviz;
+- `memory.txt` – the largest allocations per section and overall;
+- `diagnostics.json` – section timings, device latencies, stalls and a summary.
+"""
+
+import cProfile
+import collections
+import functools
+import json
+import os
+import platform
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+
+from quaderno_gui.core.app_paths import user_data_dir
+
+
+ENV_VAR = 'QUADERNO_DIAGNOSTICS'
+
+MEMORY_TOP = 25
+_MAX_SECTIONS = 100
+_MAX_SAMPLES = 5000
+
+# cProfile can only profile one section per process at a time.
+_profiler_lock = threading.Lock()
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else None
+
+
+class Diagnostics:
+    """
+    Collects profiles, memory statistics, timings, device latencies and stalls.
+
+    Only one section in the process is profiled at a time. Sections that
+    start while another one is being profiled, in any thread, are timed and
+    measured but not profiled; nested ones appear in the outer profile.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.output_dir = None
+        self.sections = collections.deque(maxlen=_MAX_SECTIONS)
+        self.latencies = collections.deque(maxlen=_MAX_SAMPLES)
+        self.stalls = collections.deque(maxlen=_MAX_SAMPLES)
+        self._lock = threading.Lock()
+        self._started_tracing = False
+        self._count = 0
+
+    def enable(self, output_dir=None):
+        if output_dir:
+            self.output_dir = Path(output_dir).expanduser()
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(5)
+            self._started_tracing = True
+
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    @contextmanager
+    def profile(self, label):
+        """
+        Profile the block under `label` while diagnostics are enabled.
+        """
+        if not self.enabled:
+            yield
+            return
+
+        before = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+        started = time.time()
+        begin = time.perf_counter()
+        profiler = self._start_profiler()
+
+        try:
+            yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                _profiler_lock.release()
+
+            seconds = time.perf_counter() - begin
+            memory_top = []
+
+            if before is not None and tracemalloc.is_tracing():
+                after = tracemalloc.take_snapshot()
+                memory_top = [str(stat) for stat in after.compare_to(before, 'lineno')[:MEMORY_TOP]]
+
+            with self._lock:
+                self._count += 1
+                self.sections.append({
+                    'number': self._count,
+                    'label': label,
+                    'thread': threading.current_thread().name,
+                    'started': started,
+                    'seconds': seconds,
+                    'memory_top': memory_top,
+                    'profiler': profiler,
+                })
+
+    @staticmethod
+    def _start_profiler():
+        if not _profiler_lock.acquire(blocking=False):
+            return None
+
+        profiler = cProfile.Profile()
+
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler (a debugger, an outside cProfile run) is active.
+            _profiler_lock.release()
+            return None
+
+        return profiler
+
+    def profiled(self, label):
+        """
+        Decorator form of `profile`.
+        """
+        def decorate(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.profile(label):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorate
+
+    def record_latency(self, method, seconds, ok=True):
+        self.latencies.append((time.time(), method, seconds, ok))
+
+    def record_stall(self, seconds):
+        self.stalls.append((time.time(), seconds))
+
+    def summary(self):
+        """
+        Return per-section timings, per-method device latencies and stall totals.
+        """
+        with self._lock:
+            sections = list(self.sections)
+
+        timings = collections.defaultdict(list)
+        for section in sections:
+            timings[section['label']].append(section['seconds'])
+
+        latencies = collections.defaultdict(list)
+        failures = collections.Counter()
+        for _when, method, seconds, ok in list(self.latencies):
+            latencies[method].append(seconds)
+            failures[method] += not ok
+
+        stalls = [seconds for _when, seconds in list(self.stalls)]
+
+        return {
+            'enabled': self.enabled,
+            'sections': {
+                label: {'count': len(values), 'total': sum(values), 'max': max(values)}
+                for label, values in timings.items()
+            },
+            'device_latency': {
+                method: {
+                    'count': len(values),
+                    'failed': failures[method],
+                    'p50': _percentile(values, 0.5),
+                    'p95': _percentile(values, 0.95),
+                    'max': max(values),
+                }
+                for method, values in latencies.items()
+            },
+            'stalls': {
+                'count': len(stalls),
+                'total': sum(stalls),
+                'max': max(stalls) if stalls else None,
+            },
+            'memory': dict(zip(('current', 'peak'), tracemalloc.get_traced_memory())) if tracemalloc.is_tracing()
+            else None,
+        }
+
+    def dump_bundle(self, directory=None, extra=None):
+        """
+        Write a diagnostics bundle into a new timestamped directory and return its path.
+        """
+        base = Path(directory).expanduser() if directory else self.output_dir or user_data_dir('diagnostics')
+        bundle = base / time.strftime('quaderno-diagnostics-%Y%m%d-%H%M%S')
+        profiles = bundle / 'profiles'
+        profiles.mkdir(parents=True, exist_ok=True)
+
+        with self._lock:
+            sections = list(self.sections)
+
+        with open(bundle / 'memory.txt', 'w') as fh:
+            for section in sections:
+                if section['memory_top']:
+                    print(f"== {section['number']:03d} {section['label']} ({section['seconds']:.3f}s)", file=fh)
+                    print('\n'.join(section['memory_top']), file=fh)
+                    print(file=fh)
+
+            if tracemalloc.is_tracing():
+                print('== Largest live allocations now', file=fh)
+                for stat in tracemalloc.take_snapshot().statistics('lineno')[:MEMORY_TOP]:
+                    print(stat, file=fh)
+
+        rows = []
+
+        for section in sections:
+            row = {key: value for key, value in section.items() if key not in ('profiler', 'memory_top')}
+
+            if section['profiler'] is not None:
+                name = f"{section['number']:03d}-{''.join(c if c.isalnum() else '_' for c in section['label'])}.prof"
+                section['profiler'].dump_stats(str(profiles / name))
+                row['profile'] = 'profiles/' + name
+
+            rows.append(row)
+
+        report = {
+            'created': time.time(),
+            'environment': {
+                'python': sys.version,
+                'platform': platform.platform(),
+                'pid': os.getpid(),
+            },
+            'summary': self.summary(),
+            'sections': rows,
+            'device_latency': [
+                {'time': when, 'method': method, 'seconds': seconds, 'ok': ok}
+                for when, method, seconds, ok in list(self.latencies)
+            ],
+            'stalls': [{'time': when, 'seconds': seconds} for when, seconds in list(self.stalls)],
+        }
+
+        if extra:
+            report.update(extra)
+
+        with open(bundle / 'diagnostics.json', 'w') as fh:
+            json.dump(report, fh, indent=2, default=str)
+
+        return bundle
+
+
+_diagnostics = Diagnostics()
+
+
+def get_diagnostics():
+    return _diagnostics
+
+
+def enable_diagnostics(argv=None, force=False, output_dir=None):
+    """
+    Enable diagnostics if requested by flag, environment or `force`; strips the flag from argv.
+
+    A `QUADERNO_DIAGNOSTICS` value other than `1` names the bundle directory.
+    """
+    argv = sys.argv if argv is None else argv
+    value = os.environ.get(ENV_VAR, '')
+    requested = force or value not in ('', '0')
+
+    if '--diagnostics' in argv:
+        argv.remove('--diagnostics')
+        requested = True
+
+    if requested:
+        _diagnostics.enable(output_dir or (value if value not in ('', '0', '1') else None))
+
+    return _diagnostics
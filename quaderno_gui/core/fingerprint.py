@@ -0,0 +1,175 @@
+"""
+Content fingerprints of Zotero attachments with a persistent hash cache.
+
+`FingerprintService` hashes files in a thread pool (hashlib releases the GIL
+on large buffers) with memory-mapped reads, and remembers every digest in a
+small SQLite database keyed by (path, size, mtime_ns, inode), so files that
+have not changed are never read again.
+"""
+
+import hashlib
+import mmap
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from quaderno_gui.core.app_paths import user_cache_dir
+
+
+_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def hash_file(path, chunk_size=_CHUNK_SIZE):
+    """
+    Return the SHA-256 hex digest of a file, read through a memory map.
+    """
+    digest = hashlib.sha256()
+
+    with open(path, 'rb') as fh:
+        size = os.fstat(fh.fileno()).st_size
+
+        if size == 0:
+            return digest.hexdigest()
+
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+
+            try:
+                for offset in range(0, size, chunk_size):
+                    digest.update(view[offset:offset + chunk_size])
+            finally:
+                view.release()
+
+    return digest.hexdigest()
+
+
+class HashCache:
+    """
+    SQLite store of file digests keyed by path and validated by size, mtime_ns and inode.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or user_cache_dir('content-hashes.sqlite')
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS hashes ('
+                ' path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, inode INTEGER, digest TEXT)'
+            )
+
+        return self._conn
+
+    def load(self):
+        """
+        Return {path: (size, mtime_ns, inode, digest)} for every cached file.
+        """
+        with self._lock:
+            rows = self._connect().execute('SELECT path, size, mtime_ns, inode, digest FROM hashes')
+            return {row[0]: row[1:] for row in rows}
+
+    def store(self, records):
+        """
+        Save (path, size, mtime_ns, inode, digest) records.
+        """
+        if not records:
+            return
+
+        with self._lock:
+            conn = self._connect()
+
+            with conn:
+                conn.executemany('INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?)', records)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class FingerprintService:
+    """
+    Hash many files in parallel, reading only those not in the cache.
+
+    After each call to `fingerprint`, `stats` holds the number of files, cache
+    hits, bytes hashed and the hash throughput of that call.
+    """
+
+    def __init__(self, cache=None, workers=None):
+        self.cache = cache if cache is not None else HashCache()
+        self.workers = workers or min(8, (os.cpu_count() or 1) * 2)
+        self.stats = {}
+
+    def fingerprint(self, paths, should_continue=None):
+        """
+        Return {path: sha256 hex digest} for the given paths; unreadable files are left out.
+        """
+        started = time.monotonic()
+        known = self.cache.load()
+        digests = {}
+        pending = {}
+
+        for path in dict.fromkeys(paths):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+
+            key = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+            cached = known.get(path)
+
+            if cached is not None and tuple(cached[:3]) == key:
+                digests[path] = cached[3]
+            else:
+                pending[path] = key
+
+        hits = len(digests)
+        hashed_bytes = 0
+        hash_seconds = 0.0
+        records = []
+
+        if pending:
+            hash_started = time.monotonic()
+
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(pending))) as pool:
+                futures = {pool.submit(hash_file, path): path for path in pending}
+
+                for future in as_completed(futures):
+                    path = futures[future]
+
+                    if should_continue is not None and not should_continue():
+                        for other in futures:
+                            other.cancel()
+                        break
+
+                    try:
+                        digest = future.result()
+                    except OSError:
+                        continue
+
+                    size, mtime_ns, inode = pending[path]
+                    digests[path] = digest
+                    hashed_bytes += size
+                    records.append((path, size, mtime_ns, inode, digest))
+
+            hash_seconds = time.monotonic() - hash_started
+            self.cache.store(records)
+
+        total = hits + len(pending)
+        self.stats = {
+            'files': total,
+            'hits': hits,
+            'hit_rate': hits / total if total else 1.0,
+            'hashed_bytes': hashed_bytes,
+            'throughput': hashed_bytes / hash_seconds if hash_seconds > 0 else None,
+            'duration': time.monotonic() - started,
+        }
+
+        return digests
@@ -0,0 +1,186 @@
+"""
+Adaptive request concurrency for one device link.
+
+How many requests the Quaderno serves well at once depends on the Wi-Fi
+link and on what the device is busy with, so no fixed number fits.
+`AdaptiveConcurrency` sets the in-flight limit of a `DeviceArbiter` the way
+TCP sets its window, with additive increase and multiplicative decrease:
+after each window of completed requests the limit grows by one if it was
+reached and the requests kept their usual latency, and shrinks when
+requests failed with transient errors or took `latency_tolerance` times
+longer than usual for their kind. The measurements of the last window are
+kept as link statistics for display.
+"""
+
+import statistics
+import threading
+import time
+
+from quaderno_gui.core.scheduler import format_size
+
+
+DEFAULT_MIN_LIMIT = 2
+DEFAULT_MAX_LIMIT = 8
+WINDOW_SECONDS = 1.0
+LATENCY_TOLERANCE = 2.0
+ERROR_DECREASE = 0.5
+LATENCY_DECREASE = 0.75
+# How quickly the usual latency of a request kind follows slower requests.
+BASELINE_DRIFT = 0.05
+# Latencies below this are treated as equal; they are dominated by noise.
+LATENCY_FLOOR = 0.005
+
+
+def request_kind(name, nbytes=0):
+    """
+    Return the key under which the latency of a request is compared.
+    """
+    # Transfers are compared with transfers within a factor of two in size.
+    return f'{name}:{nbytes.bit_length()}' if nbytes else name
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD controller for the number of requests in flight on one device.
+
+    `record` is called once per completed request, with whether requests
+    were queued behind the limit at the time; `limit` is the current
+    in-flight limit between `min_limit` and `max_limit`. Thread-safe.
+    """
+
+    def __init__(self, initial=DEFAULT_MIN_LIMIT, min_limit=DEFAULT_MIN_LIMIT, max_limit=DEFAULT_MAX_LIMIT,
+                 window=WINDOW_SECONDS, latency_tolerance=LATENCY_TOLERANCE, clock=time.monotonic):
+        self.min_limit = min_limit
+        self.max_limit = max(max_limit, min_limit)
+        self.window = window
+        self.latency_tolerance = latency_tolerance
+        self.clock = clock
+        self._limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self._lock = threading.Lock()
+        self._baselines = {}
+        self._last_request = None
+        self._link = {
+            'requests_per_second': 0.0,
+            'bytes_per_second': 0.0,
+            'latency': None,
+            'error_rate': 0.0,
+            'change': None,
+        }
+        self._totals = {'requests': 0, 'errors': 0, 'increases': 0, 'decreases': 0}
+        self._start_window()
+
+    @property
+    def limit(self):
+        return int(self._limit)
+
+    def _start_window(self):
+        self._window_start = None
+        self._latencies = []
+        self._ratios = []
+        self._errors = 0
+        self._bytes = 0
+        self._saturated = False
+
+    def record(self, name, seconds, error=False, nbytes=0, saturated=False):
+        """
+        Add a completed request of `name` that took `seconds` and moved `nbytes`.
+
+        An `nbytes` of None marks a transfer of unknown size, whose latency
+        says nothing about the link and is not compared.
+        """
+        with self._lock:
+            now = self.clock()
+            self._last_request = now
+
+            if self._window_start is None:
+                self._window_start = now - seconds
+
+            self._latencies.append(seconds)
+            self._bytes += nbytes or 0
+            self._saturated = self._saturated or saturated
+            self._totals['requests'] += 1
+
+            if error:
+                self._errors += 1
+                self._totals['errors'] += 1
+            elif nbytes is not None:
+                self._ratios.append(self._latency_ratio(request_kind(name, nbytes), seconds))
+
+            elapsed = now - self._window_start
+
+            if elapsed >= self.window:
+                self._adjust(elapsed)
+                self._start_window()
+
+    def _latency_ratio(self, kind, seconds):
+        seconds = max(seconds, LATENCY_FLOOR)
+        baseline = self._baselines.get(kind)
+
+        if baseline is None or seconds < baseline:
+            self._baselines[kind] = seconds
+            return 1.0
+
+        self._baselines[kind] = baseline + (seconds - baseline) * BASELINE_DRIFT
+        return seconds / baseline
+
+    def _adjust(self, elapsed):
+        count = len(self._latencies)
+        ratio = statistics.median(self._ratios) if self._ratios else 1.0
+        previous = self._limit
+
+        if self._errors:
+            self._limit = max(self.min_limit, self._limit * ERROR_DECREASE)
+            change = 'errors'
+        elif ratio > self.latency_tolerance:
+            self._limit = max(self.min_limit, self._limit * LATENCY_DECREASE)
+            change = 'latency'
+        elif self._saturated:
+            self._limit = min(self.max_limit, self._limit + 1)
+            change = 'increase'
+        else:
+            change = None
+
+        if self._limit > previous:
+            self._totals['increases'] += 1
+        elif self._limit < previous:
+            self._totals['decreases'] += 1
+
+        self._link = {
+            'requests_per_second': count / elapsed,
+            'bytes_per_second': self._bytes / elapsed,
+            'latency': statistics.median(self._latencies),
+            'error_rate': self._errors / count,
+            'change': change if self._limit != previous else None,
+        }
+
+    def stats(self):
+        """
+        Return the current limit and the link statistics of the last window.
+        """
+        with self._lock:
+            idle = self._last_request is None or self.clock() - self._last_request > 2 * self.window
+            return dict(
+                self._link,
+                **self._totals,
+                limit=self.limit,
+                min_limit=self.min_limit,
+                max_limit=self.max_limit,
+                idle=idle,
+            )
+
+
+def format_link_stats(stats):
+    """
+    Format the statistics of `AdaptiveConcurrency.stats()` as one short line.
+    """
+    text = f"{stats['limit']} parallel requests (max {stats['max_limit']})"
+
+    if stats['idle'] or stats['latency'] is None:
+        return text + ', idle'
+
+    text += f", {stats['latency'] * 1000:.0f} ms, {stats['requests_per_second']:.1f} requests/s"
+
+    if stats['bytes_per_second']:
+        text += f", {format_size(stats['bytes_per_second'])}/s"
+
+    return text + f", {stats['error_rate']:.0%} errors"
@@ -0,0 +1,109 @@
+"""
+Sync one Zotero library to several devices at once.
+
+The Zotero database is read once; each device is then listed, diffed and
+updated by its own `SyncEngine` in a separate thread.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+from quaderno_gui.core.sync_engine import SyncAborted, SyncControl, SyncEngine
+
+
+def _noop(*_args):
+    pass
+
+
+class MultiDeviceSync:
+    """
+    Run the same Zotero sync against several DigitalPaper sessions concurrently.
+
+    `devices` maps a device name to its session. Log messages are prefixed with
+    the device name; the progress callback receives the device name followed by
+    the usual (done, total, operation, stats) arguments.
+    """
+
+    def __init__(self, devices, remote_base, storage_path=None, db_path=None, simulate=False, log=None,
+                 progress=None, control=None, checkpoints=None, **engine_options):
+        self.devices = dict(devices)
+        self.remote_base = remote_base
+        self.storage_path = storage_path
+        self.db_path = db_path
+        self.simulate = simulate
+        self.log = log or _noop
+        self.progress = progress or _noop
+        self.control = control or SyncControl()
+        self.checkpoints = checkpoints or {}
+        self.engine_options = engine_options
+
+    def _engine(self, name, dp):
+        prefix = f'[{name}] '
+
+        return SyncEngine(
+            dp,
+            self.remote_base,
+            storage_path=self.storage_path,
+            db_path=self.db_path,
+            simulate=self.simulate,
+            log=lambda message: self.log(prefix + message),
+            progress=lambda done, total, operation, stats: self.progress(name, done, total, operation, stats),
+            control=self.control,
+            device_name=name,
+            **self.engine_options,
+        )
+
+    def _run_device(self, name, dp, snapshot):
+        try:
+            return self._engine(name, dp).run(self.checkpoints.get(name), snapshot=snapshot)
+        except Exception as exc:
+            self.log(f'[{name}] Sync failed: {exc}')
+            return {'aborted': True, 'cancelled': False, 'errors': [{'error': str(exc)}], 'checkpoint': None}
+
+    def run(self):
+        """
+        Read Zotero once, sync every device in parallel and return per-device summaries.
+        """
+        result = {'aborted': False, 'devices': {}}
+
+        if not self.devices:
+            self.log('No devices to sync.')
+            return result
+
+        reader = SyncEngine(
+            None,
+            self.remote_base,
+            storage_path=self.storage_path,
+            db_path=self.db_path,
+            log=self.log,
+            **self.engine_options,
+        )
+
+        fingerprint = reader.snapshot_fingerprint()
+        checkpoints = [self.checkpoints.get(name) or {} for name in self.devices]
+
+        if not self.simulate and all(checkpoint.get('fingerprint') == fingerprint for checkpoint in checkpoints):
+            # Every device resumes or applies a plan for this Zotero snapshot; a
+            # device whose listing changed since reads Zotero itself.
+            snapshot = None
+            self.log(f'Zotero library unchanged since the last plans; syncing {len(self.devices)} devices.')
+        else:
+            try:
+                snapshot = reader.read_snapshot()
+            except SyncAborted as exc:
+                self.log(str(exc))
+                self.log('Zotero sync aborted.')
+                result['aborted'] = True
+                return result
+
+            self.log(f"Read {len(snapshot['files'])} Zotero attachments; syncing {len(self.devices)} devices.")
+
+        with ThreadPoolExecutor(max_workers=len(self.devices)) as pool:
+            futures = {
+                name: pool.submit(self._run_device, name, dp, snapshot)
+                for name, dp in self.devices.items()
+            }
+
+        for name, future in futures.items():
+            result['devices'][name] = future.result()
+
+        return result
@@ -0,0 +1,332 @@
+"""
+Optional pre-upload PDF optimization for QuadernoGUI.
+
+Zotero PDFs are often scans with images at a far higher resolution than the
+e-ink screen can show. `PdfOptimizer` downsamples and recompresses those
+images and merges duplicate image streams in a process pool, and keeps the
+results in a content-addressed cache so every PDF is optimized only once.
+
+Optimization needs the optional `pikepdf` and `Pillow` packages
+(`pip install quaderno_gui[optimize]`); without them it is unavailable.
+"""
+
+import collections
+import hashlib
+import importlib.util
+import io
+import json
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from quaderno_gui.core.app_paths import user_cache_dir
+
+
+DEFAULT_SETTINGS = {
+    # Longest image edge kept, in pixels; the A4 Quaderno screen is 1650 x 2200.
+    'max_image_px': 2200,
+    'jpeg_quality': 70,
+    'grayscale': False,
+}
+
+DEFAULT_CACHE_BYTES = 2 * 1024 * 1024 * 1024
+
+_HASH_CHUNK = 1024 * 1024
+
+
+def optimization_available():
+    """
+    Return True if the optional PDF libraries are installed, without importing them.
+    """
+    return all(importlib.util.find_spec(name) is not None for name in ('pikepdf', 'PIL'))
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(_HASH_CHUNK), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def _settings_key(settings):
+    return hashlib.sha1(json.dumps(settings, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+
+
+def _image_streams(page):
+    import pikepdf
+
+    resources = page.obj.get('/Resources')
+    xobjects = resources.get('/XObject') if resources is not None else None
+
+    if xobjects is None:
+        return None, []
+
+    names = [
+        name for name in list(xobjects.keys())
+        if isinstance(xobjects[name], pikepdf.Stream) and xobjects[name].get('/Subtype') == '/Image'
+    ]
+    return xobjects, names
+
+
+def _deduplicate_images(pdf):
+    """
+    Point identical image streams on all pages at a single object.
+    """
+    seen = {}
+
+    for page in pdf.pages:
+        xobjects, names = _image_streams(page)
+
+        for name in names:
+            image = xobjects[name]
+            header = sorted((str(k), str(v)) for k, v in image.items() if k != '/Length')
+            digest = hashlib.sha1(repr(header).encode('utf-8') + image.read_raw_bytes()).digest()
+            canonical = seen.setdefault(digest, image)
+
+            if canonical.objgen != image.objgen:
+                xobjects[name] = canonical
+
+
+def _recompress_images(pdf, settings):
+    """
+    Downsample and JPEG-recompress images that are larger than the settings allow.
+    """
+    from pikepdf import Name, PdfImage
+    from PIL import Image
+
+    done = set()
+
+    for page in pdf.pages:
+        xobjects, names = _image_streams(page)
+
+        for name in names:
+            image = xobjects[name]
+
+            if image.objgen in done or image.get('/ImageMask') or image.get('/BitsPerComponent') == 1:
+                continue
+
+            done.add(image.objgen)
+
+            try:
+                pil_image = PdfImage(image).as_pil_image()
+            except Exception:
+                continue
+
+            width, height = pil_image.size
+            scale = min(1.0, settings['max_image_px'] / max(width, height))
+
+            if scale == 1.0 and image.get('/Filter') == Name.DCTDecode:
+                continue
+
+            mode = 'L' if settings['grayscale'] or pil_image.mode in ('1', 'L') else 'RGB'
+            pil_image = pil_image.convert(mode)
+
+            if scale < 1.0:
+                new_size = (max(1, int(width * scale)), max(1, int(height * scale)))
+                pil_image = pil_image.resize(new_size, Image.LANCZOS)
+
+            buffer = io.BytesIO()
+            pil_image.save(buffer, 'JPEG', quality=settings['jpeg_quality'], optimize=True)
+            data = buffer.getvalue()
+
+            if len(data) >= len(image.read_raw_bytes()):
+                continue
+
+            image.write(data, filter=Name.DCTDecode)
+            image.Width, image.Height = pil_image.size
+            image.ColorSpace = Name.DeviceGray if mode == 'L' else Name.DeviceRGB
+            image.BitsPerComponent = 8
+
+            for key in ('/DecodeParms', '/Decode', '/SMaskInData'):
+                if key in image:
+                    del image[key]
+
+
+def _optimize_file(source, target, settings):
+    import pikepdf
+
+    with pikepdf.open(source) as pdf:
+        _deduplicate_images(pdf)
+        _recompress_images(pdf, settings)
+        pdf.remove_unreferenced_resources()
+        pdf.save(
+            target,
+            compress_streams=True,
+            object_stream_mode=pikepdf.ObjectStreamMode.generate,
+        )
+
+
+def _optimize_job(source, cache_dir, settings):
+    """
+    Process-pool job: return the cached or newly optimized file for `source`.
+
+    A file that does not get smaller is recorded with an empty `.keep` marker
+    so it is not retried; the original is then uploaded.
+    """
+    source_size = os.path.getsize(source)
+    key = _file_sha256(source) + '-' + _settings_key(settings)
+    target = Path(cache_dir) / key[:2] / (key + '.pdf')
+    marker = target.with_suffix('.keep')
+
+    if target.is_file():
+        return {'source': source, 'path': str(target), 'size': target.stat().st_size, 'hit': True}
+
+    if marker.is_file():
+        return {'source': source, 'path': source, 'size': source_size, 'hit': True}
+
+    target.parent.mkdir(parents=True, exist_ok=True)
+    partial = target.with_suffix(f'.{os.getpid()}.part')
+
+    try:
+        _optimize_file(source, str(partial), settings)
+
+        if partial.stat().st_size < source_size:
+            os.replace(partial, target)
+            return {'source': source, 'path': str(target), 'size': target.stat().st_size, 'hit': False}
+    except Exception:
+        pass
+    finally:
+        if partial.exists():
+            partial.unlink()
+
+    marker.touch()
+    return {'source': source, 'path': source, 'size': source_size, 'hit': False}
+
+
+def _unchanged(source):
+    try:
+        size = os.path.getsize(source)
+    except OSError:
+        size = 0
+
+    return {'source': source, 'path': source, 'size': size, 'hit': False}
+
+
+class PdfOptimizer:
+    """
+    Optimize PDFs in a process pool with a size-bounded, content-addressed cache.
+
+    Cache entries are keyed by the SHA-256 of the source file and the
+    settings. Entries are touched when used, and `evict` deletes the least
+    recently used ones once the cache exceeds `max_cache_bytes`. Entries
+    returned by `optimize` are pinned until they are passed to `release`,
+    so a sync's copies are not evicted before they are uploaded.
+    """
+
+    def __init__(self, cache_dir=None, max_cache_bytes=DEFAULT_CACHE_BYTES, settings=None, workers=None):
+        self.cache_dir = Path(cache_dir) if cache_dir else user_cache_dir('optimized-pdfs')
+        self.max_cache_bytes = max_cache_bytes
+        self.settings = dict(DEFAULT_SETTINGS, **(settings or {}))
+        self.workers = workers or os.cpu_count() or 1
+        # Devices synced in parallel share one optimizer; the second device then hits the cache.
+        self._lock = threading.Lock()
+        self._pin_lock = threading.Lock()
+        self._pinned = collections.Counter()
+
+    def optimize(self, paths, should_continue=None):
+        """
+        Return a list with a result dict for each source path, once all are done.
+
+        Each result has `source`, `path` (the file to upload), `size` and `hit`.
+        A source that cannot be read or optimized is returned unchanged.
+        Remaining work is dropped as soon as `should_continue()` returns False.
+        Optimized copies stay pinned until `release` is called with them.
+        """
+        paths = list(dict.fromkeys(paths))
+
+        if not paths:
+            return []
+
+        return self._optimize_all(paths, should_continue)
+
+    def _optimize_all(self, paths, should_continue):
+        # Collected before returning, so the lock is not held while the caller iterates.
+        results = []
+
+        with self._lock:
+            pool = ProcessPoolExecutor(max_workers=min(self.workers, len(paths)))
+
+            try:
+                futures = {
+                    pool.submit(_optimize_job, path, str(self.cache_dir), self.settings): path
+                    for path in paths
+                }
+
+                for future in as_completed(futures):
+                    try:
+                        result = future.result()
+                    except Exception:
+                        result = _unchanged(futures[future])
+
+                    if result['path'] != result['source']:
+                        with self._pin_lock:
+                            self._pinned[result['path']] += 1
+
+                        os.utime(result['path'])
+
+                    results.append(result)
+
+                    if should_continue is not None and not should_continue():
+                        break
+            finally:
+                pool.shutdown(wait=True, cancel_futures=True)
+
+        return results
+
+    def release(self, paths):
+        """
+        Unpin optimized copies returned by `optimize` once they are no longer needed.
+        """
+        with self._pin_lock:
+            for path in paths:
+                self._pinned[path] -= 1
+
+                if self._pinned[path] <= 0:
+                    del self._pinned[path]
+
+    def evict(self):
+        """
+        Delete least recently used cache entries until the cache fits its size limit.
+
+        Pinned entries are kept even if the cache stays over the limit.
+        """
+        if not self.cache_dir.is_dir():
+            return 0
+
+        with self._pin_lock:
+            pinned = set(self._pinned)
+
+        entries = []
+        total = 0
+
+        for path in self.cache_dir.glob('*/*.pdf'):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        removed = 0
+
+        for _mtime, size, path in sorted(entries):
+            if total <= self.max_cache_bytes:
+                break
+
+            if str(path) in pinned:
+                continue
+
+            try:
+                path.unlink()
+            except OSError:
+                continue
+
+            total -= size
+            removed += 1
+
+        return removed
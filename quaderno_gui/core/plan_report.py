@@ -0,0 +1,147 @@
+"""
+Structured sync plans for simulate runs.
+
+`build_plan_report` turns the operations of a simulated sync into a report
+with per-operation rows, totals per operation type and per collection, and
+a duration estimate from the throughput measured in earlier real runs of
+the same device. Reports can be written as JSON or CSV.
+"""
+
+import csv
+import json
+import time
+
+from quaderno_gui.core.app_paths import device_state_path, load_json_state, store_json_state
+
+
+PLAN_COLUMNS = ('op', 'path', 'size', 'collection', 'reason')
+
+# Weight of the latest run in the remembered throughput.
+_HISTORY_WEIGHT = 0.5
+
+
+def _collection(operation):
+    if operation['op'] == 'upload':
+        return operation.get('folder', '')
+
+    rel = operation.get('rel', '')
+    return rel if operation['op'] in ('create_folder', 'delete_folder') else rel.rpartition('/')[0]
+
+
+def load_throughput(device_name, remote_base):
+    """
+    Return the remembered transfer rates of a device, or None before the first real run.
+    """
+    return load_json_state(device_state_path('throughput', device_name, remote_base))
+
+
+def record_throughput(device_name, remote_base, timing):
+    """
+    Blend the timings of a finished run into the remembered rates of a device.
+
+    `timing` holds `upload_bytes`, `upload_seconds`, `other_count` and
+    `other_seconds` (the time spent on folder and delete operations).
+    """
+    if not timing['upload_bytes'] and not timing['other_count']:
+        return
+
+    path = device_state_path('throughput', device_name, remote_base)
+    history = load_json_state(path) or {}
+    samples = {}
+
+    if timing['upload_bytes'] and timing['upload_seconds'] > 0:
+        samples['bytes_per_second'] = timing['upload_bytes'] / timing['upload_seconds']
+
+    if timing['other_count']:
+        samples['seconds_per_operation'] = timing['other_seconds'] / timing['other_count']
+
+    for key, value in samples.items():
+        previous = history.get(key)
+        history[key] = value if previous is None else _HISTORY_WEIGHT * value + (1 - _HISTORY_WEIGHT) * previous
+
+    history['runs'] = history.get('runs', 0) + 1
+    history['updated'] = time.time()
+    store_json_state(path, history)
+
+
+def estimate_duration(upload_bytes, other_count, history, rate_cap=None):
+    """
+    Return the estimated seconds for a plan, or None without usable history.
+    """
+    if not history or not history.get('bytes_per_second'):
+        return None
+
+    rate = history['bytes_per_second']
+
+    if rate_cap:
+        rate = min(rate, rate_cap)
+
+    return upload_bytes / rate + other_count * history.get('seconds_per_operation', 0.0)
+
+
+def build_plan_report(operations, remote_base, history=None, skipped=(), rate_cap=None):
+    """
+    Return a JSON-serializable report of planned operations with totals and an estimate.
+    """
+    rows = []
+    by_op = {}
+    by_collection = {}
+
+    for operation in operations:
+        kind = operation['op']
+        size = operation.get('size', 0) if kind == 'upload' else 0
+        collection = _collection(operation)
+        rows.append({
+            'op': 'replace' if operation.get('replace') else kind,
+            'path': operation['remote_path'],
+            'size': size,
+            'collection': collection,
+            'reason': operation.get('reason', ''),
+        })
+
+        for totals, key in ((by_op, rows[-1]['op']), (by_collection, collection)):
+            entry = totals.setdefault(key, {'count': 0, 'bytes': 0})
+            entry['count'] += 1
+            entry['bytes'] += size
+
+    upload_bytes = sum(row['size'] for row in rows)
+    other_count = sum(1 for row in rows if row['op'] not in ('upload', 'replace'))
+    seconds = estimate_duration(upload_bytes, other_count, history, rate_cap)
+
+    return {
+        'remote_base': remote_base,
+        'generated': time.time(),
+        'operations': rows,
+        'skipped': [
+            {'op': 'skip', 'path': op['remote_path'], 'size': op.get('size', 0), 'collection': _collection(op),
+             'reason': 'does not fit the storage budget'}
+            for op in skipped
+        ],
+        'totals': {
+            'operations': len(rows),
+            'bytes': upload_bytes,
+            'by_op': by_op,
+            'by_collection': by_collection,
+        },
+        'estimate': {
+            'seconds': seconds,
+            'bytes_per_second': history.get('bytes_per_second') if history else None,
+            'seconds_per_operation': history.get('seconds_per_operation') if history else None,
+            'based_on_runs': history.get('runs', 0) if history else 0,
+        },
+    }
+
+
+def write_plan(report, path):
+    """
+    Write a plan report as CSV if `path` ends in .csv, and as JSON otherwise.
+    """
+    if str(path).lower().endswith('.csv'):
+        with open(path, 'w', newline='') as fh:
+            writer = csv.DictWriter(fh, fieldnames=PLAN_COLUMNS)
+            writer.writeheader()
+            writer.writerows(report['operations'])
+            writer.writerows(report['skipped'])
+    else:
+        with open(path, 'w') as fh:
+            json.dump(report, fh, indent=2)
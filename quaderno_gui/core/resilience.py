@@ -0,0 +1,287 @@
+"""
+Retries and a circuit breaker for DigitalPaper calls.
+
+`ResilientDevice` wraps a `DigitalPaper` session. Errors are classified as
+transient (the connection dropped, timed out, or the device answered 5xx)
+or permanent (everything else, including a missing local file). Transient
+failures are retried with jittered exponential backoff; repeated failures
+open a `CircuitBreaker` shared by every view of the device, after which
+calls fail fast with `DeviceUnavailable` until a probe gets through again.
+"""
+
+import random
+import threading
+import time
+
+from quaderno_gui.core.diagnostics import get_diagnostics
+
+
+TRANSIENT = 'transient'
+PERMANENT = 'permanent'
+
+_TRANSIENT_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+
+class DeviceUnavailable(ConnectionError):
+    """
+    Raised without contacting the device while its circuit breaker is open.
+    """
+
+
+def classify_error(exc):
+    """
+    Return TRANSIENT if retrying the failed call may succeed, PERMANENT otherwise.
+    """
+    try:
+        import requests
+    except ImportError:
+        requests = None
+
+    from quaderno_gui.core.async_transport import DeviceHTTPError
+
+    if isinstance(exc, DeviceHTTPError):
+        return TRANSIENT if exc.status in _TRANSIENT_STATUS else PERMANENT
+
+    if requests is not None:
+        if isinstance(exc, requests.HTTPError):
+            status = exc.response.status_code if exc.response is not None else None
+            return TRANSIENT if status in _TRANSIENT_STATUS else PERMANENT
+
+        if isinstance(exc, (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)):
+            return TRANSIENT
+
+    # Builtin ConnectionError covers refused, reset and aborted connections;
+    # other OSErrors (a missing local file, for one) are permanent.
+    if isinstance(exc, (ConnectionError, TimeoutError)):
+        return TRANSIENT
+
+    return PERMANENT
+
+
+class RetryPolicy:
+    """
+    Bounded retries with full-jitter exponential backoff.
+    """
+
+    def __init__(self, max_attempts=4, base_delay=0.5, max_delay=15.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt):
+        """
+        Return the seconds to wait after failed attempt number `attempt` (1-based).
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+# Sync traffic can afford to wait; GUI actions should fail quickly.
+BULK_POLICY = RetryPolicy(max_attempts=5, base_delay=1.0, max_delay=20.0)
+INTERACTIVE_POLICY = RetryPolicy(max_attempts=2, base_delay=0.3, max_delay=1.0)
+
+
+class CircuitBreaker:
+    """
+    Stop calling a device that keeps failing, and probe it again after a while.
+
+    After `failure_threshold` consecutive transient failures the breaker
+    opens and `allow` refuses calls. Once `reset_timeout` seconds have
+    passed, a single probe call is let through (half-open): success closes
+    the breaker, failure opens it again.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=10.0, clock=None):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock or time.monotonic
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+
+    @property
+    def state(self):
+        return self._state
+
+    @property
+    def is_closed(self):
+        return self._state == self.CLOSED
+
+    def allow(self):
+        """
+        Return True if a call may go to the device now.
+        """
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+
+            if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                self._state = self.HALF_OPEN
+                return True
+
+            return False
+
+    def retry_after(self):
+        """
+        Return the seconds until the next probe is allowed.
+        """
+        with self._lock:
+            if self._state != self.OPEN:
+                return 0.0
+
+            return max(0.0, self.reset_timeout - (self._clock() - self._opened_at))
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+
+
+def _folder_created(dp, args, _kwargs):
+    return dp.path_exists(args[0])
+
+
+# A retried call whose earlier attempt may have reached the device first
+# checks whether it already took effect. Uploads overwrite and deletions of
+# missing paths succeed in DigitalPaper, so only folder creation needs this.
+_ALREADY_DONE = {
+    'new_folder': _folder_created,
+}
+
+
+class ResilientDevice:
+    """
+    Proxy for a DigitalPaper session that retries transient failures.
+
+    Methods are looked up on the wrapped session and called through
+    `call`; other attributes are passed through. `with_policy` returns
+    another view of the same session and breaker with different retries.
+    """
+
+    def __init__(self, dp, policy=BULK_POLICY, breaker=None, log=None, sleep=None):
+        self.device = dp
+        self.policy = policy
+        self.breaker = breaker or CircuitBreaker()
+        self.log = log
+        self._sleep = sleep or time.sleep
+
+    def with_policy(self, policy, log=None, sleep=None):
+        return ResilientDevice(self.device, policy, self.breaker, log, sleep)
+
+    def __getattr__(self, name):
+        attribute = getattr(self.device, name)
+
+        if not callable(attribute) or name.startswith('__'):
+            return attribute
+
+        def call(*args, **kwargs):
+            return self.call(name, *args, **kwargs)
+
+        return call
+
+    def call(self, name, *args, **kwargs):
+        """
+        Call a device method with retries, raising DeviceUnavailable while the breaker is open.
+        """
+        return self.invoke(name, getattr(self.device, name), *args, **kwargs)
+
+    def invoke(self, name, method, *args, **kwargs):
+        """
+        Call `method` like a device method called `name`, with the same retries and breaker.
+
+        For requests built outside the session's methods, such as streamed
+        uploads; `method` must be safe to repeat.
+        """
+        diagnostics = get_diagnostics()
+
+        for attempt in range(1, self.policy.max_attempts + 1):
+            if not self.breaker.allow():
+                raise DeviceUnavailable(
+                    f'Device unreachable; trying again in {self.breaker.retry_after():.0f}s.'
+                )
+
+            started = time.perf_counter()
+
+            try:
+                if attempt > 1 and name in _ALREADY_DONE and _ALREADY_DONE[name](self.device, args, kwargs):
+                    result = None
+                else:
+                    result = method(*args, **kwargs)
+            except Exception as exc:
+                if diagnostics.enabled:
+                    diagnostics.record_latency(name, time.perf_counter() - started, ok=False)
+
+                if classify_error(exc) == PERMANENT:
+                    # The device answered, so it is reachable.
+                    self.breaker.record_success()
+                    raise
+
+                self.breaker.record_failure()
+
+                if attempt == self.policy.max_attempts or not self.breaker.is_closed:
+                    raise
+
+                delay = self.policy.delay(attempt)
+
+                if self.log:
+                    self.log(f'{name} failed ({exc}); retrying in {delay:.1f}s.')
+
+                self._sleep(delay)
+            else:
+                if diagnostics.enabled:
+                    diagnostics.record_latency(name, time.perf_counter() - started)
+
+                self.breaker.record_success()
+                return result
+
+    def wait_until_available(self, control, probe='get_storage'):
+        """
+        Block until a probe call succeeds; return False if `control` is cancelled first.
+
+        The probe runs whenever the breaker allows it, so a device that comes
+        back is noticed within `reset_timeout` seconds.
+        """
+        while not self.breaker.is_closed:
+            if control.cancelled:
+                return False
+
+            if self.breaker.allow():
+                try:
+                    getattr(self.device, probe)()
+                except Exception as exc:
+                    if classify_error(exc) == PERMANENT:
+                        self.breaker.record_success()
+                    else:
+                        self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                    break
+
+            control.sleep(max(0.5, self.breaker.retry_after()))
+
+        return not control.cancelled
+
+
+def resilient(dp, policy=BULK_POLICY, log=None, sleep=None):
+    """
+    Return `dp` wrapped in a ResilientDevice, sharing the breaker if it already is one.
+    """
+    if dp is None:
+        return None
+
+    if isinstance(dp, ResilientDevice):
+        return dp.with_policy(policy, log, sleep)
+
+    return ResilientDevice(dp, policy, log=log, sleep=sleep)
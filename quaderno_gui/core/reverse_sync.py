@@ -0,0 +1,285 @@
+"""
+Pull documents annotated on the device back into Zotero.
+
+`ReverseSync` compares one `list_all()` of the device with a local manifest
+of the sizes and modified dates it saw last time, and stream-downloads only
+the documents that changed on the device. A pass with nothing changed costs
+a single listing call.
+"""
+
+import hashlib
+import os
+import re
+import time
+from pathlib import Path
+
+from quaderno_gui.core.app_paths import device_state_path, load_json_state, store_json_state
+from quaderno_gui.core.device_arbiter import BULK, request_slot, with_priority
+from quaderno_gui.core.device_index import KIND_DOCUMENT, DeviceIndex
+from quaderno_gui.core.resilience import BULK_POLICY, resilient
+from quaderno_gui.core.scheduler import ThroughputMeter
+from quaderno_gui.core.sync_engine import SyncControl
+from quaderno_gui.core.zotero import ANNOTATED_SUFFIX, find_attachment_files
+
+
+ITEM_ID_PATTERN = re.compile(r'^(?P<stem>.*) \(itemID (?P<item_id>\d+)\)$')
+
+# Kept next to a Zotero attachment the first time it is replaced by a pulled copy (replace_attachments).
+ORIGINAL_SUFFIX = '.orig'
+
+_CHUNK_SIZE = 256 * 1024
+
+
+def _noop(*_args):
+    pass
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(_CHUNK_SIZE), b''):
+            digest.update(chunk)
+
+    return digest.digest()
+
+
+def stream_document(dp, entry_id, remote_path):
+    """
+    Yield a document's bytes in chunks without buffering the whole file.
+
+    Sessions without a `session` attribute (or entries without an id) fall
+    back to `dp.download`.
+    """
+    session = getattr(dp, 'session', None)
+
+    if session is None or not entry_id:
+        yield dp.download(remote_path)
+        return
+
+    # Same request construction as DigitalPaper._endpoint_request, but streamed.
+    import requests
+
+    request = requests.Request('GET', dp.base_url)
+    prepared = session.prepare_request(request)
+    prepared.url = prepared.url.replace('%25', '%') + f'documents/{entry_id}/file'
+
+    with request_slot(dp, 'download', None), session.send(prepared, stream=True) as response:
+        response.raise_for_status()
+        yield from response.iter_content(chunk_size=_CHUNK_SIZE)
+
+
+def parse_item_id(rel):
+    """
+    Return (stem, itemID) for a synced file name such as `Title (itemID 12).pdf`, or None.
+    """
+    match = ITEM_ID_PATTERN.match(Path(rel).stem)
+
+    if match is None:
+        return None
+
+    return match.group('stem'), int(match.group('item_id'))
+
+
+class ReverseSync:
+    """
+    Download documents that changed on the device since the last pull.
+
+    Each pulled document is written next to the Zotero attachment it was
+    synced from, matched by the `(itemID N)` suffix of its name, as
+    `<name>.annotated.pdf`; the attachment itself is left untouched. With
+    `replace_attachments`, the pulled document replaces the attachment
+    instead, which is kept once with an `.orig` suffix. With `target_dir`,
+    documents are written there, mirroring the device folders under
+    `remote_base`.
+
+    Documents seen for the first time are only recorded in the manifest, so
+    the first pass after a sync does not download the whole library.
+    """
+
+    def __init__(self, dp, remote_base, device_name='default', storage_path=None, db_path=None, target_dir=None,
+                 manifest_path=None, replace_attachments=False, log=None, progress=None, control=None):
+        self.remote_base = remote_base
+        self.storage_path = storage_path
+        self.db_path = db_path
+        self.target_dir = Path(target_dir).expanduser() if target_dir else None
+        self.replace_attachments = replace_attachments
+        self.manifest_path = Path(manifest_path) if manifest_path else device_state_path(
+            'pull-manifests', device_name, remote_base
+        )
+        self.log = log or _noop
+        self.progress = progress or _noop
+        self.control = control or SyncControl()
+        self.dp = resilient(with_priority(dp, BULK), BULK_POLICY, log=self.log, sleep=self.control.sleep)
+        self.meter = ThroughputMeter()
+
+    def list_device(self):
+        """
+        Return the documents under remote_base as {rel: {'entry_id', 'size', 'modified'}}.
+        """
+        index = DeviceIndex.from_entries(self.dp.list_all())
+
+        return {
+            rel: {'entry_id': index.entry_ids[i], 'size': index.sizes[i], 'modified': index.modified[i]}
+            for rel, i in index.entries_under(self.remote_base, KIND_DOCUMENT)
+        }
+
+    def diff(self, documents, known):
+        """
+        Split device documents into (changed, new) relative paths against the manifest.
+        """
+        changed = []
+        new = []
+
+        for rel, state in sorted(documents.items()):
+            previous = known.get(rel)
+
+            if previous is None:
+                new.append(rel)
+            elif previous['size'] != state['size'] or previous['modified'] != state['modified']:
+                changed.append(rel)
+
+        return changed, new
+
+    def resolve_targets(self, rels):
+        """
+        Return {rel: local path} for the documents that have somewhere to go.
+        """
+        if self.target_dir is not None:
+            return {rel: self.target_dir.joinpath(*rel.split('/')) for rel in rels}
+
+        parsed = {rel: parse_item_id(rel) for rel in rels}
+        item_ids = [match[1] for match in parsed.values() if match]
+        attachments = find_attachment_files(item_ids, self.storage_path, self.db_path) if item_ids else {}
+        targets = {}
+
+        for rel, match in parsed.items():
+            if not match or match[1] not in attachments:
+                continue
+
+            stem, item_id = match
+            candidates = attachments[item_id]
+            attachment = next((path for path in candidates if path.stem == stem), candidates[0])
+            targets[rel] = attachment if self.replace_attachments else attachment.with_name(
+                attachment.stem + ANNOTATED_SUFFIX
+            )
+
+        return targets
+
+    def download(self, rel, state, target):
+        """
+        Stream one document into `target`; return the bytes written, or 0 if the content was unchanged.
+        """
+        target = Path(target)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        partial = target.with_name(target.name + '.part')
+        digest = hashlib.sha256()
+        written = 0
+
+        try:
+            with open(partial, 'wb') as fh:
+                for chunk in stream_document(self.dp, state['entry_id'], self.remote_base + '/' + rel):
+                    fh.write(chunk)
+                    digest.update(chunk)
+                    written += len(chunk)
+
+            if target.is_file() and target.stat().st_size == written and _file_digest(target) == digest.digest():
+                return 0
+
+            if self.target_dir is None and self.replace_attachments and target.is_file():
+                original = target.with_name(target.name + ORIGINAL_SUFFIX)
+
+                if not original.exists():
+                    os.replace(target, original)
+
+            os.replace(partial, target)
+        finally:
+            if partial.exists():
+                partial.unlink()
+
+        return written
+
+    def run(self):
+        """
+        Pull changed documents and return a summary dict.
+        """
+        summary = {
+            'aborted': False,
+            'cancelled': False,
+            'pulled': [],
+            'unchanged': 0,
+            'recorded': 0,
+            'unmatched': [],
+            'errors': [],
+        }
+        self.log('Checking the device for annotated documents...')
+
+        try:
+            documents = self.list_device()
+        except Exception as e:
+            self.log('Could not list the device: ' + str(e))
+            summary['aborted'] = True
+            return summary
+
+        manifest = load_json_state(self.manifest_path) or {}
+        known = manifest.get('documents', {})
+        changed, new = self.diff(documents, known)
+        # Documents gone from the device are dropped; new ones become the baseline.
+        updated = {rel: known[rel] for rel in documents if rel in known}
+
+        for rel in new:
+            updated[rel] = {'size': documents[rel]['size'], 'modified': documents[rel]['modified']}
+
+        summary['recorded'] = len(new)
+        summary['unchanged'] = len(documents) - len(changed) - len(new)
+
+        if new:
+            self.log(f'Recorded {len(new)} new documents; later changes to them will be pulled.')
+
+        try:
+            targets = self.resolve_targets(changed) if changed else {}
+        except Exception as e:
+            self.log('Could not read Zotero data: ' + str(e))
+            targets = {}
+            summary['aborted'] = True
+
+        summary['unmatched'] = [rel for rel in changed if rel not in targets]
+
+        for rel in summary['unmatched']:
+            self.log('No Zotero attachment for changed document: ' + rel)
+
+        self.meter = ThroughputMeter(sum(documents[rel]['size'] for rel in targets))
+        total = len(targets)
+
+        for index, (rel, target) in enumerate(sorted(targets.items())):
+            if not self.control.wait():
+                summary['cancelled'] = True
+                self.log('Pull cancelled.')
+                break
+
+            state = documents[rel]
+            start = time.monotonic()
+
+            try:
+                written = self.download(rel, state, target)
+            except Exception as e:
+                self.log(f'Download failed for {rel}: {e}')
+                summary['errors'].append({'rel': rel, 'error': str(e)})
+            else:
+                updated[rel] = {'size': state['size'], 'modified': state['modified']}
+
+                if written:
+                    summary['pulled'].append({'rel': rel, 'path': str(target), 'size': written})
+                    self.log(f'Pulled: {rel} -> {target}')
+                else:
+                    self.log('Unchanged content, not replaced: ' + rel)
+
+            self.meter.record(state['size'], time.monotonic() - start)
+            self.progress(index + 1, total, rel, self.meter.stats())
+
+        if updated != known:
+            store_json_state(self.manifest_path, {'remote_base': self.remote_base, 'documents': updated})
+
+        self.log(f"Pull complete: {len(summary['pulled'])} documents updated.")
+        return summary
+
@@ -0,0 +1,210 @@
+"""
+Transfer scheduling for QuadernoGUI: upload ordering, bandwidth limiting and ETA.
+"""
+
+import threading
+import time
+
+
+POLICY_RECENT = 'recent'
+POLICY_ADDED = 'added'
+POLICY_SMALLEST = 'smallest'
+POLICY_COLLECTIONS = 'collections'
+POLICY_PATH = 'path'
+
+POLICIES = {
+    POLICY_RECENT: 'Recently modified first',
+    POLICY_ADDED: 'Recently added first',
+    POLICY_SMALLEST: 'Smallest first',
+    POLICY_COLLECTIONS: 'Chosen collections first',
+    POLICY_PATH: 'Alphabetical by path',
+}
+
+DEFAULT_POLICY = POLICY_RECENT
+
+
+def _in_collections(folder, collections):
+    folder = (folder or '').lower()
+
+    for collection in collections:
+        if folder == collection or folder.startswith(collection + '/'):
+            return True
+
+    return False
+
+
+def upload_sort_key(policy, priority_collections=()):
+    """
+    Return a sort key function for upload operations under the given policy.
+
+    Upload operations carry `size`, `mod_time`, `added_time` and `folder`;
+    ties are broken by remote path so the order is stable between runs.
+    """
+    if policy not in POLICIES:
+        raise ValueError('Unknown upload order: ' + str(policy))
+
+    collections = [c.strip('/').lower() for c in priority_collections if c.strip('/')]
+
+    def key(operation):
+        path = operation['remote_path']
+
+        if policy == POLICY_RECENT:
+            return (-operation.get('mod_time', 0), path)
+        if policy == POLICY_ADDED:
+            return (-operation.get('added_time', 0), path)
+        if policy == POLICY_SMALLEST:
+            return (operation.get('size', 0), path)
+        if policy == POLICY_COLLECTIONS:
+            chosen = _in_collections(operation.get('folder'), collections)
+            return (not chosen, -operation.get('mod_time', 0), path)
+        return (path,)
+
+    return key
+
+
+def order_operations(operations, policy=DEFAULT_POLICY, priority_collections=()):
+    """
+    Return operations with uploads reordered by policy.
+
+    Folder and delete operations keep their position ahead of the uploads, so
+    target folders exist and space is freed before anything is transferred.
+    """
+    others = [op for op in operations if op['op'] != 'upload']
+    uploads = [op for op in operations if op['op'] == 'upload']
+    uploads.sort(key=upload_sort_key(policy, priority_collections))
+
+    return others + uploads
+
+
+class BandwidthLimiter:
+    """
+    Token-bucket limiter that paces transfers to an average byte rate.
+
+    `consume` is called after a transfer with the number of bytes sent and
+    sleeps long enough to keep the average under the limit. A limit of None
+    or 0 disables limiting.
+    """
+
+    def __init__(self, bytes_per_second=None, burst_seconds=1.0, sleep=None):
+        self.rate = bytes_per_second or None
+        self.burst = (self.rate or 0) * burst_seconds
+        self._sleep = sleep or time.sleep
+        self._lock = threading.Lock()
+        self._tokens = self.burst
+        self._last = time.monotonic()
+
+    def consume(self, nbytes):
+        if not self.rate:
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= nbytes
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+        if delay > 0:
+            self._sleep(delay)
+
+
+class ThroughputMeter:
+    """
+    Tracks transferred bytes and estimates the remaining time.
+
+    The rate is an exponential moving average of per-transfer throughput, so
+    the ETA follows changing link conditions. When a bandwidth limit is in
+    force, the ETA never assumes more than `rate_cap` bytes per second.
+    A `total_bytes` of None means the total is not known yet.
+    """
+
+    def __init__(self, total_bytes=0, smoothing=0.3, rate_cap=None):
+        self.total_bytes = total_bytes
+        self.done_bytes = 0
+        self.smoothing = smoothing
+        self.rate_cap = rate_cap
+        self.rate = None
+
+    def record(self, nbytes, seconds):
+        self.done_bytes += nbytes
+
+        if nbytes <= 0 or seconds <= 0:
+            return
+
+        sample = nbytes / seconds
+        self.rate = sample if self.rate is None else self.smoothing * sample + (1 - self.smoothing) * self.rate
+
+    def eta(self):
+        """
+        Return the estimated seconds remaining, or None before the first sample.
+        """
+        if not self.rate or self.total_bytes is None:
+            return None
+
+        rate = min(self.rate, self.rate_cap) if self.rate_cap else self.rate
+        return max(0, self.total_bytes - self.done_bytes) / rate
+
+    def stats(self):
+        return {
+            'bytes_done': self.done_bytes,
+            'bytes_total': self.total_bytes,
+            'rate': self.rate,
+            'eta': self.eta(),
+        }
+
+
+def format_duration(seconds):
+    """
+    Format a duration in seconds as a short human-readable string.
+    """
+    if seconds is None:
+        return 'unknown'
+
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+
+    if hours:
+        return f'{hours}h {minutes:02d}m'
+    if minutes:
+        return f'{minutes}m {seconds:02d}s'
+    return f'{seconds}s'
+
+
+def fit_to_budget(operations, budget_bytes):
+    """
+    Keep the uploads that fit into `budget_bytes`, in order of priority.
+
+    Uploads are taken greedily in the given order; one that does not fit is
+    skipped and smaller ones after it may still be taken. Returns the kept
+    operations and the skipped uploads.
+    """
+    kept = []
+    skipped = []
+    remaining = budget_bytes
+
+    for operation in operations:
+        if operation['op'] == 'upload':
+            size = operation.get('size', 0)
+
+            if size > remaining:
+                skipped.append(operation)
+                continue
+
+            remaining -= size
+
+        kept.append(operation)
+
+    return kept, skipped
+
+
+def format_size(nbytes):
+    """
+    Format a byte count with a binary unit.
+    """
+    size = float(nbytes)
+
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if abs(size) < 1024 or unit == 'GiB':
+            return f'{size:.0f} {unit}' if unit == 'B' else f'{size:.1f} {unit}'
+        size /= 1024
@@ -0,0 +1,156 @@
+"""
+Startup time instrumentation for QuadernoGUI.
+
+Enabled with `quaderno-gui --startup-timing` or `QUADERNO_STARTUP_TIMING=1`.
+Module import times are collected by a meta path hook; page and window
+construction times are recorded with `StartupTimer.measure`.
+"""
+
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+
+ENV_VAR = 'QUADERNO_STARTUP_TIMING'
+
+
+class _TimedLoader:
+    """
+    Loader proxy that records how long a module takes to execute.
+    """
+
+    def __init__(self, loader, timer):
+        self._loader = loader
+        self._timer = timer
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        # Extension modules (PyQt5 among them) do their work here.
+        start = time.perf_counter()
+        try:
+            return self._loader.create_module(spec)
+        finally:
+            self._timer.imports[spec.name] = time.perf_counter() - start
+
+    def exec_module(self, module):
+        start = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            elapsed = time.perf_counter() - start
+            self._timer.imports[module.__name__] = self._timer.imports.get(module.__name__, 0.0) + elapsed
+
+
+class _ImportTimingFinder:
+    """
+    Meta path finder that wraps the loaders found by the remaining finders.
+    """
+
+    def __init__(self, timer):
+        self._timer = timer
+
+    def find_spec(self, fullname, path=None, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+
+            spec = finder.find_spec(fullname, path, target)
+
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+                    spec.loader = _TimedLoader(spec.loader, self._timer)
+                return spec
+
+        return None
+
+
+class StartupTimer:
+    """
+    Collects import and construction timings and prints a report.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.start = time.perf_counter()
+        self.imports = {}
+        self.steps = []
+        self._finder = None
+
+        if enabled:
+            self._finder = _ImportTimingFinder(self)
+            sys.meta_path.insert(0, self._finder)
+
+    @contextmanager
+    def measure(self, label):
+        """
+        Record the wall time spent in the block under `label`.
+        """
+        if not self.enabled:
+            yield
+            return
+
+        begin = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.steps.append((label, time.perf_counter() - begin))
+
+    def mark(self, label):
+        """
+        Record the time elapsed since startup under `label`.
+        """
+        if self.enabled:
+            self.steps.append((label, time.perf_counter() - self.start))
+
+    def stop_import_timing(self):
+        if self._finder is not None and self._finder in sys.meta_path:
+            sys.meta_path.remove(self._finder)
+        self._finder = None
+
+    def report(self, stream=None, limit=25):
+        """
+        Print the slowest imports and all recorded steps. Import times are inclusive.
+        """
+        if not self.enabled:
+            return
+
+        stream = stream or sys.stderr
+        self.stop_import_timing()
+
+        print('Startup timing (ms)', file=stream)
+        print('  Imports (inclusive, slowest first):', file=stream)
+        for name, seconds in sorted(self.imports.items(), key=lambda item: item[1], reverse=True)[:limit]:
+            print(f'    {seconds * 1000:9.1f}  {name}', file=stream)
+
+        print('  Steps:', file=stream)
+        for label, seconds in self.steps:
+            print(f'    {seconds * 1000:9.1f}  {label}', file=stream)
+
+
+_timer = StartupTimer(enabled=False)
+
+
+def get_startup_timer():
+    return _timer
+
+
+def enable_startup_timing(argv=None):
+    """
+    Enable timing if requested by flag or environment; strips the flag from argv.
+    """
+    global _timer
+
+    argv = sys.argv if argv is None else argv
+    requested = os.environ.get(ENV_VAR, '') not in ('', '0')
+
+    if '--startup-timing' in argv:
+        argv.remove('--startup-timing')
+        requested = True
+
+    if requested and not _timer.enabled:
+        _timer = StartupTimer(enabled=True)
+
+    return _timer
@@ -2,166 +2,355 @@
 Sync functionality for QuadernoGUI.
 """
 
-from pathlib import PurePosixPath
+import os
 
 from PyQt5.QtCore import QThread, pyqtSignal
 
-from quaderno_gui.core.zotero import build_zotero_file_mapping, build_zotero_folder_set
+from quaderno_gui.core.backup import DeviceBackup
+from quaderno_gui.core.bulk_delete import BulkDelete
+from quaderno_gui.core.device_crawler import crawl_folder
+from quaderno_gui.core.diagnostics import get_diagnostics
+from quaderno_gui.core.multi_sync import MultiDeviceSync
+from quaderno_gui.core.reverse_sync import ReverseSync
+from quaderno_gui.core.sync_engine import SyncControl, SyncEngine
+from quaderno_gui.core.upload_stream import Prefetcher, upload_file
+from quaderno_gui.core.watch import WatchSync
 
 
-def _normalize_relative_path(full_path, remote_base):
-    """Return a normalized relative path (POSIX style) or None if outside the base."""
-    normalized_full = full_path.replace('\\', '/')
-    normalized_base = remote_base.replace('\\', '/')
+class SyncWorker(QThread):
+    """
+    Worker thread to synchronize Zotero files with the DigitalPaper device.
 
-    full_posix = PurePosixPath(normalized_full)
-    base_posix = PurePosixPath(normalized_base)
+    `cancel`, `pause` and `resume` may be called from the GUI thread; they take
+    effect between operations. Extra keyword arguments (upload order,
+    bandwidth limit, filters, ...) are passed on to `SyncEngine`.
+    """
+    log_signal = pyqtSignal(str)
+    progress_signal = pyqtSignal(int, int, dict)
+    file_progress_signal = pyqtSignal(str, int, int)
+    finished_signal = pyqtSignal(dict)
 
-    try:
-        relative = full_posix.relative_to(base_posix)
-    except ValueError:
-        return None
+    def __init__(self, dp, simulate, remote_base, storage_path=None, db_path=None, checkpoint=None, parent=None,
+                 **engine_options):
+        super().__init__(parent)
 
-    rel_posix = relative.as_posix()
-    return '' if rel_posix == '.' else rel_posix
+        self.dp = dp
+        self.simulate = simulate
+        self.remote_base = remote_base
+        self.storage_path = storage_path
+        self.db_path = db_path
+        self.checkpoint = checkpoint
+        self.engine_options = engine_options
+        self.control = SyncControl()
 
+    def cancel(self):
+        self.control.cancel()
 
-class SyncWorker(QThread):
+    def pause(self):
+        self.control.pause()
+
+    def resume(self):
+        self.control.resume()
+
+    @get_diagnostics().profiled('SyncWorker.run')
+    def run(self):
+        engine = SyncEngine(
+            self.dp,
+            self.remote_base,
+            storage_path=self.storage_path,
+            db_path=self.db_path,
+            simulate=self.simulate,
+            log=self.log_signal.emit,
+            progress=lambda done, total, _operation, stats: self.progress_signal.emit(done, total, stats),
+            file_progress=lambda operation, sent, size: self.file_progress_signal.emit(
+                operation['remote_path'], sent, size
+            ),
+            control=self.control,
+            **self.engine_options,
+        )
+        summary = engine.run(self.checkpoint)
+        self.finished_signal.emit(summary)
+
+
+class MultiSyncWorker(QThread):
     """
-    Worker thread to synchronize Zotero files with the DigitalPaper device.
+    Worker thread to synchronize Zotero files with several devices at once.
     """
     log_signal = pyqtSignal(str)
+    progress_signal = pyqtSignal(str, int, int, dict)
     finished_signal = pyqtSignal(dict)
 
-    def __init__(self, dp, simulate, remote_base, storage_path=None, db_path=None, parent=None):
+    def __init__(self, devices, simulate, remote_base, storage_path=None, db_path=None, checkpoints=None,
+                 parent=None, **engine_options):
         super().__init__(parent)
 
-        self.dp = dp
+        self.devices = dict(devices)
         self.simulate = simulate
         self.remote_base = remote_base
         self.storage_path = storage_path
         self.db_path = db_path
+        self.checkpoints = checkpoints or {}
+        self.engine_options = engine_options
+        self.control = SyncControl()
+
+    def cancel(self):
+        self.control.cancel()
+
+    def pause(self):
+        self.control.pause()
+
+    def resume(self):
+        self.control.resume()
+
+    @get_diagnostics().profiled('MultiSyncWorker.run')
+    def run(self):
+        sync = MultiDeviceSync(
+            self.devices,
+            self.remote_base,
+            storage_path=self.storage_path,
+            db_path=self.db_path,
+            simulate=self.simulate,
+            log=self.log_signal.emit,
+            progress=lambda name, done, total, _operation, stats: self.progress_signal.emit(name, done, total, stats),
+            control=self.control,
+            checkpoints=self.checkpoints,
+            **self.engine_options,
+        )
+        result = sync.run()
+        self.finished_signal.emit(result)
+
+
+class ReverseSyncWorker(QThread):
+    """
+    Worker thread to pull documents annotated on the device back into Zotero.
+    """
+    log_signal = pyqtSignal(str)
+    progress_signal = pyqtSignal(int, int, dict)
+    finished_signal = pyqtSignal(dict)
+
+    def __init__(self, dp, remote_base, device_name='default', parent=None, **pull_options):
+        super().__init__(parent)
+
+        self.dp = dp
+        self.remote_base = remote_base
+        self.device_name = device_name
+        self.pull_options = pull_options
+        self.control = SyncControl()
+
+    def cancel(self):
+        self.control.cancel()
+
+    def pause(self):
+        self.control.pause()
+
+    def resume(self):
+        self.control.resume()
+
+    @get_diagnostics().profiled('ReverseSyncWorker.run')
+    def run(self):
+        pull = ReverseSync(
+            self.dp,
+            self.remote_base,
+            device_name=self.device_name,
+            log=self.log_signal.emit,
+            progress=lambda done, total, _rel, stats: self.progress_signal.emit(done, total, stats),
+            control=self.control,
+            **self.pull_options,
+        )
+        summary = pull.run()
+        self.finished_signal.emit(summary)
+
+
+class BulkDeleteWorker(QThread):
+    """
+    Worker thread to delete many documents and folders from the device.
+    """
+    log_signal = pyqtSignal(str)
+    progress_signal = pyqtSignal(int, int)
+    finished_signal = pyqtSignal(dict)
+
+    def __init__(self, dp, documents=(), folders=(), parent=None):
+        super().__init__(parent)
+
+        self.dp = dp
+        self.documents = list(documents)
+        self.folders = list(folders)
+
+    def run(self):
+        job = BulkDelete(
+            self.dp,
+            self.documents,
+            self.folders,
+            log=self.log_signal.emit,
+            progress=lambda done, total, _path: self.progress_signal.emit(done, total),
+        )
+        self.finished_signal.emit(job.run())
+
+
+class BackupWorker(QThread):
+    """
+    Worker thread to back up the device into a local folder.
+    """
+    log_signal = pyqtSignal(str)
+    progress_signal = pyqtSignal(int, int, dict)
+    finished_signal = pyqtSignal(dict)
 
+    def __init__(self, dp, target_dir, parent=None, **backup_options):
+        super().__init__(parent)
+
+        self.dp = dp
+        self.target_dir = target_dir
+        self.backup_options = backup_options
+        self.control = SyncControl()
+
+    def cancel(self):
+        self.control.cancel()
+
+    @get_diagnostics().profiled('BackupWorker.run')
+    def run(self):
+        backup = DeviceBackup(
+            self.dp,
+            self.target_dir,
+            log=self.log_signal.emit,
+            progress=lambda done, total, _rel, stats: self.progress_signal.emit(done, total, stats),
+            control=self.control,
+            **self.backup_options,
+        )
+        self.finished_signal.emit(backup.run())
+
+
+class UploadWorker(QThread):
+    """
+    Worker thread to upload local PDFs to document paths on the device.
+
+    `uploads` is a list of (local path, remote path) pairs, uploaded one by
+    one while the next file is read ahead. `file_progress_signal` carries
+    the bytes sent of the file being uploaded; `cancel` takes effect
+    between files.
+    """
+    log_signal = pyqtSignal(str)
+    progress_signal = pyqtSignal(int, int)
+    file_progress_signal = pyqtSignal(str, int, int)
+    finished_signal = pyqtSignal(dict)
+
+    def __init__(self, dp, uploads, parent=None):
+        super().__init__(parent)
+
+        self.dp = dp
+        self.uploads = list(uploads)
+        self.control = SyncControl()
+
+    def cancel(self):
+        self.control.cancel()
+
+    @get_diagnostics().profiled('UploadWorker.run')
     def run(self):
-        self.log_signal.emit('Starting Zotero sync...' + (' (Simulation)' if self.simulate else ''))
+        summary = {'uploaded': [], 'errors': [], 'cancelled': False}
+        prefetcher = Prefetcher()
 
         try:
-            zotero_files = build_zotero_file_mapping(self.storage_path, self.db_path)
-            zotero_folders = build_zotero_folder_set(self.db_path)
-        except FileNotFoundError as exc:
-            self.log_signal.emit(str(exc))
-            self.log_signal.emit('Zotero sync aborted.')
-            self.finished_signal.emit({})
-            return
-        except Exception as exc:
-            self.log_signal.emit('Unexpected error while reading Zotero data: ' + str(exc))
-            self.log_signal.emit('Zotero sync aborted.')
-            self.finished_signal.emit({})
-            return
-
-        # List what's on the device within remote_base.
-        device_items = self.dp.list_all()
-        device_files = {}
-        device_folders = set()
-        device_base_exists = False
-
-        for entry in device_items:
-            path = entry.get('entry_path', '')
-            entry_type = entry.get('entry_type')
-
-            relative_path = _normalize_relative_path(path, self.remote_base)
-
-            if relative_path is None:
-                continue
-
-            if entry_type == 'document':
-                if relative_path:
-                    device_files[relative_path] = 0
-            elif entry_type == 'folder':
-                if relative_path == '':
-                    device_base_exists = True
-                    device_folders.add('')
-                else:
-                    device_folders.add(relative_path)
-
-        if not device_base_exists:
-            if self.simulate:
-                self.log_signal.emit('Simulate: Would create folder: ' + self.remote_base)
-                device_folders.add('')
-                device_base_exists = True
-            else:
-                try:
-                    self.dp.new_folder(self.remote_base)
-                    self.log_signal.emit('Created folder: ' + self.remote_base)
-                    device_folders.add('')
-                    device_base_exists = True
-                except Exception as e:
-                    self.log_signal.emit('Folder creation failed (' + self.remote_base + '): ' + str(e))
+            for index, (local_path, remote_path) in enumerate(self.uploads):
+                if self.control.cancelled:
+                    summary['cancelled'] = True
+                    break
 
-        # Ensure new Zotero folders exist on the device.
-        for folder in sorted(zotero_folders):
-            normalized_folder = folder.replace('\\', '/')
-            target_path = self.remote_base if not normalized_folder else self.remote_base + '/' + normalized_folder
+                if index + 1 < len(self.uploads):
+                    prefetcher.prefetch(self.uploads[index + 1][0])
+
+                self.progress_signal.emit(index, len(self.uploads))
 
-            if normalized_folder not in device_folders:
-                if self.simulate:
-                    self.log_signal.emit('Simulate: Would create folder: ' + target_path)
-                else:
-                    try:
-                        self.dp.new_folder(target_path)
-                        self.log_signal.emit('Created folder: ' + target_path)
-                    except Exception as e:
-                        self.log_signal.emit('Folder creation failed (' + target_path + '): ' + str(e))
-
-        # Remove folders that no longer exist in Zotero.
-        for folder in sorted(device_folders, reverse=True):
-            if folder not in zotero_folders and folder != '':
-                remote_folder = self.remote_base + '/' + folder.replace('\\', '/')
-
-                if self.simulate:
-                    self.log_signal.emit('Simulate: Would delete folder: ' + remote_folder)
-                else:
-                    try:
-                        self.dp.delete_folder(remote_folder)
-                        self.log_signal.emit('Deleted folder: ' + remote_folder)
-                    except Exception as e:
-                        self.log_signal.emit('Folder deletion failed (' + remote_folder + '): ' + str(e))
-
-        # Compare files that exist in Zotero vs device.
-        zotero_rel_paths = set(zotero_files.keys())
-        device_rel_paths = set(device_files.keys())
-
-        # Delete files on device that are not in Zotero.
-        for rel in sorted(device_rel_paths - zotero_rel_paths):
-            remote_path = self.remote_base + '/' + rel
-
-            if self.simulate:
-                self.log_signal.emit('Simulate: Would delete file: ' + remote_path)
-            else:
                 try:
-                    self.dp.delete_document(remote_path)
-                    self.log_signal.emit('Deleted file: ' + remote_path)
-                    if self.dp.path_exists(remote_path):
-                        self.log_signal.emit('Warning: File still exists after deletion attempt: ' + remote_path)
+                    upload_file(
+                        self.dp,
+                        local_path,
+                        remote_path,
+                        progress=lambda sent, size, path=remote_path: self.file_progress_signal.emit(path, sent, size),
+                    )
                 except Exception as e:
-                    self.log_signal.emit('File deletion failed (' + remote_path + '): ' + str(e))
+                    self.log_signal.emit(f'Failed to upload {local_path}: {e}')
+                    summary['errors'].append((local_path, str(e)))
+                else:
+                    self.log_signal.emit(f'{os.path.basename(local_path)} uploaded as {remote_path}.')
+                    summary['uploaded'].append(remote_path)
+        finally:
+            prefetcher.close()
 
-        # Upload files that are in Zotero but not on device.
-        for rel in sorted(zotero_rel_paths):
-            remote_path = self.remote_base + '/' + rel
-            local_info = zotero_files[rel]
+        self.progress_signal.emit(len(summary['uploaded']) + len(summary['errors']), len(self.uploads))
+        self.finished_signal.emit(summary)
 
-            if rel not in device_rel_paths:
-                if self.simulate:
-                    self.log_signal.emit('Simulate: Would upload file: ' + remote_path)
-                else:
-                    try:
-                        self.dp.upload_file(local_info['abs_path'], remote_path)
-                        self.log_signal.emit('Uploaded: ' + remote_path)
-                    except Exception as e:
-                        self.log_signal.emit('File upload failed (' + remote_path + '): ' + str(e))
-            else:
-                pass
-
-        self.log_signal.emit('Zotero sync ' + ('simulation' if self.simulate else 'complete') + '.')
-        self.finished_signal.emit({})
+
+class CrawlWorker(QThread):
+    """
+    Worker thread that lists a device folder tree folder by folder.
+
+    `entries_signal` carries the entries of each listed folder as it
+    arrives; `finished_signal` carries an error message, empty on success.
+    """
+    entries_signal = pyqtSignal(list)
+    finished_signal = pyqtSignal(str)
+
+    def __init__(self, dp, root, parent=None):
+        super().__init__(parent)
+
+        self.dp = dp
+        self.root = root
+        self.control = SyncControl()
+
+    def cancel(self):
+        self.control.cancel()
+
+    def run(self):
+        try:
+            for entries in crawl_folder(self.dp, self.root, control=self.control):
+                self.entries_signal.emit(entries)
+        except Exception as e:
+            self.finished_signal.emit(str(e) or type(e).__name__)
+        else:
+            self.finished_signal.emit('')
+
+
+class WatchWorker(QThread):
+    """
+    Worker thread that syncs Zotero changes automatically until cancelled.
+
+    `synced_signal` carries the summary of every sync the watcher ran.
+    Pausing holds the watcher between polls, e.g. while a manual sync runs.
+    """
+    log_signal = pyqtSignal(str)
+    synced_signal = pyqtSignal(dict)
+
+    def __init__(self, dp, remote_base, storage_path=None, db_path=None, parent=None, **engine_options):
+        super().__init__(parent)
+
+        self.dp = dp
+        self.remote_base = remote_base
+        self.storage_path = storage_path
+        self.db_path = db_path
+        self.engine_options = engine_options
+        self.control = SyncControl()
+
+    def cancel(self):
+        self.control.cancel()
+
+    def pause(self):
+        self.control.pause()
+
+    def resume(self):
+        self.control.resume()
+
+    def run(self):
+        watch = WatchSync(
+            self.dp,
+            self.remote_base,
+            storage_path=self.storage_path,
+            db_path=self.db_path,
+            log=self.log_signal.emit,
+            control=self.control,
+            on_sync=self.synced_signal.emit,
+            **self.engine_options,
+        )
+
+        try:
+            watch.run()
+        except Exception as e:
+            self.log_signal.emit('Watch mode stopped: ' + str(e))
@@ -0,0 +1,1058 @@
+"""
+Qt-free Zotero sync engine for QuadernoGUI.
+
+The engine is shared by the GUI `SyncWorker` and the headless `quaderno-sync`
+command. Progress is reported through plain callbacks, or by iterating over
+`SyncEngine.execute`.
+"""
+
+import collections
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from quaderno_gui.core.app_paths import device_state_path, load_json_state, store_json_state
+from quaderno_gui.core.device_arbiter import BULK, parallel_slots, with_priority
+from quaderno_gui.core.device_crawler import crawl_entries
+from quaderno_gui.core.device_index import DeviceIndex
+from quaderno_gui.core.diagnostics import get_diagnostics
+from quaderno_gui.core.plan_report import build_plan_report, load_throughput, record_throughput
+from quaderno_gui.core.resilience import BULK_POLICY, TRANSIENT, ResilientDevice, classify_error, resilient
+from quaderno_gui.core.scheduler import (
+    DEFAULT_POLICY,
+    BandwidthLimiter,
+    ThroughputMeter,
+    fit_to_budget,
+    format_duration,
+    format_size,
+    order_operations,
+)
+from quaderno_gui.core.upload_stream import Prefetcher, upload_file
+from quaderno_gui.core.zotero import (
+    build_zotero_file_mapping,
+    build_zotero_folder_set,
+    count_zotero_attachments,
+    iter_zotero_files,
+    normalize_sync_filters,
+    zotero_snapshot_fingerprint,
+)
+
+
+# Free space left untouched on the device when fitting uploads into storage.
+DEFAULT_STORAGE_RESERVE = 64 * 1024 * 1024
+
+# Simulated operations logged one by one; the rest are only in the plan report.
+SIMULATE_LOG_LIMIT = 200
+
+# Parallel uploads finishing within this many seconds make one throughput sample.
+PARALLEL_SAMPLE_SECONDS = 0.5
+
+
+OP_CREATE_FOLDER = 'create_folder'
+OP_DELETE_FOLDER = 'delete_folder'
+OP_DELETE_FILE = 'delete_file'
+OP_UPLOAD = 'upload'
+
+_SIMULATE_MESSAGES = {
+    OP_CREATE_FOLDER: 'Simulate: Would create folder: ',
+    OP_DELETE_FOLDER: 'Simulate: Would delete folder: ',
+    OP_DELETE_FILE: 'Simulate: Would delete file: ',
+    OP_UPLOAD: 'Simulate: Would upload file: ',
+}
+
+_DONE_MESSAGES = {
+    OP_CREATE_FOLDER: 'Created folder: ',
+    OP_DELETE_FOLDER: 'Deleted folder: ',
+    OP_DELETE_FILE: 'Deleted file: ',
+    OP_UPLOAD: 'Uploaded: ',
+}
+
+_FAILED_MESSAGES = {
+    OP_CREATE_FOLDER: 'Folder creation failed',
+    OP_DELETE_FOLDER: 'Folder deletion failed',
+    OP_DELETE_FILE: 'File deletion failed',
+    OP_UPLOAD: 'File upload failed',
+}
+
+
+# Result of an operation left unfinished because the sync was cancelled.
+_CANCELLED = object()
+
+
+def _noop(*_args):
+    pass
+
+
+def _with_next(items):
+    """
+    Yield (item, next item or None) pairs.
+    """
+    iterator = iter(items)
+    current = next(iterator, None)
+
+    while current is not None:
+        following = next(iterator, None)
+        yield current, following
+        current = following
+
+
+def _upload_source(operation):
+    # An optimized copy may have been evicted since a checkpoint was taken.
+    upload_path = operation.get('upload_path')
+
+    if not upload_path or not os.path.isfile(upload_path):
+        upload_path = operation['local_path']
+
+    return upload_path
+
+
+class SyncAborted(Exception):
+    """
+    Raised when Zotero data cannot be read and the sync cannot start.
+    """
+
+
+class SyncControl:
+    """
+    Thread-safe cancel and pause switches checked by the engine between operations.
+    """
+
+    def __init__(self):
+        self._cancelled = threading.Event()
+        self._running = threading.Event()
+        self._running.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    @property
+    def paused(self):
+        return not self._running.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
+        self._running.set()
+
+    def pause(self):
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    def wait(self):
+        """
+        Block while paused; return False if the sync has been cancelled.
+        """
+        self._running.wait()
+        return not self._cancelled.is_set()
+
+    def sleep(self, seconds):
+        """
+        Sleep for up to `seconds`, waking early if the sync is cancelled.
+        """
+        self._cancelled.wait(seconds)
+
+
+class SyncEngine:
+    """
+    Plan and execute a one-way sync of the Zotero library to a device folder.
+
+    Operations are plain dicts with the keys `op`, `rel`, `remote_path` and,
+    for uploads, `local_path`.
+
+    A cancelled run returns a checkpoint in its summary: the remaining
+    operations together with the Zotero snapshot fingerprint they were planned
+    against. Passing it to the next `run` skips planning when the snapshot is
+    unchanged. A completed simulation returns its plan in the same form as
+    `applicable_plan`, also tagged with a fingerprint of the device listing
+    and of the options that shape a plan; a real run given that plan lists
+    the device once and, if neither side changed, executes the simulated
+    operations without reading Zotero or diffing again.
+
+    Uploads are ordered by `order` (see `quaderno_gui.core.scheduler`) and
+    optionally paced to `bandwidth_limit` bytes per second. The progress
+    callback receives (done, total, operation, stats) where stats holds the
+    transferred bytes, measured rate and ETA.
+
+    Uploads are streamed from memory-mapped files (see
+    `quaderno_gui.core.upload_stream`) while the next file is read ahead;
+    `file_progress` receives (operation, bytes sent, file size) during each.
+
+    `filters` selects part of the library (see `normalize_sync_filters`);
+    with `fit_to_storage`, uploads that would not fit into the device's free
+    space (less `storage_reserve`) are skipped, lowest priority first.
+    An `optimizer` (`quaderno_gui.core.pdf_optimize.PdfOptimizer`) adds a
+    stage that replaces each upload with a device-optimized copy.
+
+    With `stream`, the Zotero database is diffed against the device listing
+    while it is being read, and uploads start with the first new attachment.
+    Uploads then follow database order, deletions come last, and ordering,
+    the storage budget and optimization do not apply.
+
+    With `fingerprints` (`quaderno_gui.core.fingerprint.FingerprintService`),
+    the content hash of every uploaded file is recorded per device, and a
+    device copy whose Zotero file was replaced with different content is
+    uploaded again even if Zotero's modification date did not change.
+
+    With `crawl`, only `remote_base` is listed, folder by folder with a few
+    requests in parallel (see `quaderno_gui.core.device_crawler`), instead
+    of the whole device with one `list_all()`; the listing then runs while
+    Zotero is read.
+
+    With `item_keys`, only the attachments with these Zotero item keys are
+    synced (see `plan_items`); this is what watch mode runs for new files.
+
+    Device calls go through a `ResilientDevice`: transient failures are
+    retried with backoff, and when the device stops answering altogether
+    the run waits, cancellably, until it responds again and then continues
+    with the operation that failed. A session shared through a
+    `DeviceArbiter` is used at bulk priority, behind requests from the GUI;
+    when the arbiter adapts its limit to the link, consecutive uploads run
+    in parallel in as many bulk slots as it grants.
+    """
+
+    def __init__(self, dp, remote_base, storage_path=None, db_path=None, simulate=False, log=None, progress=None,
+                 control=None, order=DEFAULT_POLICY, priority_collections=(), bandwidth_limit=None,
+                 filters=None, fit_to_storage=False, storage_reserve=DEFAULT_STORAGE_RESERVE, optimizer=None,
+                 stream=False, device_name='default', fingerprints=None, item_keys=None, file_progress=None,
+                 crawl=False):
+        self.remote_base = remote_base
+        self.storage_path = storage_path
+        self.db_path = db_path
+        self.simulate = simulate
+        self.log = log or _noop
+        self.progress = progress or _noop
+        self.file_progress = file_progress or _noop
+        self.control = control or SyncControl()
+        self.dp = resilient(with_priority(dp, BULK), BULK_POLICY, log=self.log, sleep=self.control.sleep)
+        self.order = order
+        self.priority_collections = priority_collections
+        self.limiter = BandwidthLimiter(bandwidth_limit, sleep=self.control.sleep)
+        self.meter = ThroughputMeter()
+        self.filters = normalize_sync_filters(filters)
+        self.fit_to_storage = fit_to_storage
+        self.storage_reserve = storage_reserve
+        self.skipped = []
+        self.optimizer = optimizer
+        self.bytes_saved = 0
+        self.optimized_paths = []
+        self.fingerprint = None
+        self.timing = {'upload_bytes': 0, 'upload_seconds': 0.0, 'other_count': 0, 'other_seconds': 0.0}
+        self.device_index = None
+        self.stream = stream
+        self.device_name = device_name
+        self.fingerprints = fingerprints
+        self.upload_hashes = None
+        self.item_keys = item_keys
+        self.unresolved_keys = set()
+        self.crawl = crawl
+        self.device_listing = None
+        self._stats_lock = threading.Lock()
+        self._outage_lock = threading.Lock()
+        self._last_finished = 0.0
+        self._sample_seconds = 0.0
+        self._unmetered = (0, 0.0)
+
+    def read_zotero(self):
+        """
+        Read the Zotero file mapping and folder set, raising SyncAborted on failure.
+        """
+        try:
+            with get_diagnostics().profile('build_zotero_file_mapping'):
+                zotero_files = build_zotero_file_mapping(
+                    self.storage_path, self.db_path, self.filters, self.fingerprints
+                )
+            zotero_folders = build_zotero_folder_set(self.db_path, self.filters)
+        except FileNotFoundError as exc:
+            raise SyncAborted(str(exc)) from exc
+        except Exception as exc:
+            raise SyncAborted('Unexpected error while reading Zotero data: ' + str(exc)) from exc
+
+        if self.fingerprints is not None:
+            stats = self.fingerprints.stats
+            throughput = format_size(stats['throughput']) + '/s' if stats['throughput'] else 'n/a'
+            self.log(
+                f"Fingerprinted {stats['files']} files in {format_duration(stats['duration'])}: "
+                f"{stats['hit_rate']:.0%} cached, {format_size(stats['hashed_bytes'])} hashed at {throughput}."
+            )
+
+        return zotero_files, zotero_folders
+
+    def _upload_state_path(self):
+        return device_state_path('upload-hashes', self.device_name, self.remote_base)
+
+    def load_upload_hashes(self):
+        """
+        Return the recorded content hashes of the files uploaded to this device.
+        """
+        if self.upload_hashes is None:
+            state = load_json_state(self._upload_state_path()) or {}
+            self.upload_hashes = state.get('files', {})
+
+        return self.upload_hashes
+
+    def save_upload_hashes(self):
+        if self.upload_hashes is not None and not self.simulate:
+            store_json_state(self._upload_state_path(), {'remote_base': self.remote_base, 'files': self.upload_hashes})
+
+    def read_snapshot(self):
+        """
+        Read Zotero once and return a snapshot dict that can be shared between engines.
+        """
+        fingerprint = self.snapshot_fingerprint()
+        zotero_files, zotero_folders = self.read_zotero()
+
+        return {'fingerprint': fingerprint, 'files': zotero_files, 'folders': zotero_folders}
+
+    def plan_options(self):
+        """
+        Return the options besides the filters that change what a plan holds, as a JSON string.
+        """
+        return json.dumps({
+            'order': self.order,
+            'priority_collections': list(self.priority_collections),
+            'fit_to_storage': self.fit_to_storage,
+            'storage_reserve': self.storage_reserve,
+            'fingerprints': self.fingerprints is not None,
+        }, sort_keys=True)
+
+    def snapshot_fingerprint(self):
+        """
+        Fingerprint the Zotero snapshot together with the filters that select from it.
+        """
+        filters = json.dumps(self.filters, sort_keys=True)
+        return zotero_snapshot_fingerprint(self.storage_path, self.db_path) + ':' + filters
+
+    def list_device(self):
+        """
+        List the device and return (files, folders, base_exists) relative to remote_base.
+
+        The listing is kept as a compact `DeviceIndex` in `device_index`.
+        """
+        if self.crawl:
+            entries = crawl_entries(self.dp, self.remote_base, control=self.control)
+        else:
+            entries = self.dp.list_all()
+
+        self.device_index = DeviceIndex.from_entries(entries)
+        device_files = self.device_index.documents_under(self.remote_base)
+        device_folders, device_base_exists = self.device_index.folders_under(self.remote_base)
+
+        if device_base_exists:
+            device_folders.add('')
+
+        return device_files, device_folders, device_base_exists
+
+    def _remote(self, rel):
+        return self.remote_base if not rel else self.remote_base + '/' + rel
+
+    def build_plan(self, zotero_files, zotero_folders, device_files, device_folders, device_base_exists):
+        """
+        Diff Zotero against the device and return the ordered list of operations.
+        """
+        operations = []
+
+        if not device_base_exists:
+            operations.append({
+                'op': OP_CREATE_FOLDER,
+                'rel': '',
+                'remote_path': self.remote_base,
+                'reason': 'sync folder missing on device',
+            })
+
+        # Ensure new Zotero folders exist on the device.
+        for folder in sorted(zotero_folders):
+            normalized_folder = folder.replace('\\', '/')
+
+            if normalized_folder not in device_folders:
+                operations.append({
+                    'op': OP_CREATE_FOLDER,
+                    'rel': normalized_folder,
+                    'remote_path': self._remote(normalized_folder),
+                    'reason': 'collection missing on device',
+                })
+
+        # Remove folders that no longer exist in Zotero.
+        for folder in sorted(device_folders, reverse=True):
+            if folder not in zotero_folders and folder != '':
+                normalized_folder = folder.replace('\\', '/')
+                operations.append({
+                    'op': OP_DELETE_FOLDER,
+                    'rel': normalized_folder,
+                    'remote_path': self._remote(normalized_folder),
+                    'reason': 'not a synced collection',
+                })
+
+        # Delete files on device that are not in Zotero.
+        for rel in sorted(device_files):
+            if rel not in zotero_files:
+                operations.append(self._delete_file_operation(rel))
+
+        # Upload files that are in Zotero but not on device; they are ordered below.
+        upload_hashes = self.load_upload_hashes() if self.fingerprints is not None else None
+
+        for rel, local_info in zotero_files.items():
+            if rel not in device_files:
+                operations.append(self._upload_operation(rel, local_info))
+            elif upload_hashes is not None and local_info.get('sha256'):
+                recorded = upload_hashes.setdefault(rel, local_info['sha256'])
+
+                # Zotero replaced the file; the device copy is out of date.
+                if recorded != local_info['sha256']:
+                    operation = self._upload_operation(rel, local_info)
+                    operation['replace'] = True
+                    operation['reason'] = 'content changed in Zotero'
+                    operations.append(operation)
+
+        return order_operations(operations, self.order, self.priority_collections)
+
+    def _upload_operation(self, rel, local_info):
+        return {
+            'op': OP_UPLOAD,
+            'rel': rel,
+            'remote_path': self._remote(rel),
+            'local_path': local_info['abs_path'],
+            'size': local_info.get('size', 0),
+            'mod_time': local_info.get('mod_time', 0),
+            'added_time': local_info.get('added_time', 0),
+            'folder': local_info.get('folder', ''),
+            'sha256': local_info.get('sha256'),
+            'reason': 'not on device',
+        }
+
+    def _delete_file_operation(self, rel):
+        return {'op': OP_DELETE_FILE, 'rel': rel, 'remote_path': self._remote(rel), 'reason': 'not in Zotero selection'}
+
+    def stream_operations(self):
+        """
+        Start reading Zotero and return (operations, estimated total) for a streaming sync.
+
+        Folder operations are planned up front from the collection list; the
+        returned generator then yields uploads as attachment rows are read
+        and deletions once the whole library has been seen. Raises
+        SyncAborted if Zotero cannot be opened.
+        """
+        self.fingerprint = self.snapshot_fingerprint()
+
+        try:
+            zotero_folders = build_zotero_folder_set(self.db_path, self.filters)
+            attachments = iter_zotero_files(self.storage_path, self.db_path, self.filters)
+            estimate = count_zotero_attachments(self.db_path, self.filters)
+        except FileNotFoundError as exc:
+            raise SyncAborted(str(exc)) from exc
+        except Exception as exc:
+            raise SyncAborted('Unexpected error while reading Zotero data: ' + str(exc)) from exc
+
+        device_files, device_folders, device_base_exists = self.list_device()
+        folder_operations = self.build_plan({}, zotero_folders, {}, device_folders, device_base_exists)
+
+        def operations():
+            yield from folder_operations
+            # Only device files are remembered, so memory does not grow with the library.
+            unseen = set(device_files)
+
+            try:
+                for rel, local_info in attachments:
+                    if rel in device_files:
+                        unseen.discard(rel)
+                    else:
+                        yield self._upload_operation(rel, local_info)
+            except Exception as exc:
+                raise SyncAborted('Reading Zotero data failed: ' + str(exc)) from exc
+
+            for rel in sorted(unseen):
+                yield self._delete_file_operation(rel)
+
+        return operations(), len(folder_operations) + estimate
+
+    def plan_items(self):
+        """
+        Plan the uploads for the attachments in `item_keys` without listing the whole device.
+
+        Existence on the device is checked per path, so a handful of new
+        attachments costs a handful of requests. Nothing is deleted; keys
+        without an attachment to upload (removed from Zotero, or not in the
+        database yet) are left in `unresolved_keys` for a full sync.
+        """
+        try:
+            zotero_files = dict(
+                iter_zotero_files(self.storage_path, self.db_path, self.filters, keys=self.item_keys)
+            )
+        except FileNotFoundError as exc:
+            raise SyncAborted(str(exc)) from exc
+        except Exception as exc:
+            raise SyncAborted('Unexpected error while reading Zotero data: ' + str(exc)) from exc
+
+        self.unresolved_keys = set(self.item_keys) - {info['key'] for info in zotero_files.values()}
+        known = {}
+        planned = set()
+        operations = []
+
+        def exists(path):
+            if path not in known:
+                known[path] = self.dp.path_exists(path)
+
+            return known[path]
+
+        for rel, local_info in sorted(zotero_files.items()):
+            if exists(self._remote(rel)):
+                continue
+
+            folder = ''
+            parent_missing = False
+
+            for name in [''] + local_info['folder'].split('/'):
+                folder = folder + '/' + name if folder else name
+                remote_path = self._remote(folder)
+
+                if remote_path in planned:
+                    parent_missing = True
+                elif parent_missing or not exists(remote_path):
+                    operations.append({
+                        'op': OP_CREATE_FOLDER,
+                        'rel': folder,
+                        'remote_path': remote_path,
+                        'reason': 'collection missing on device',
+                    })
+                    planned.add(remote_path)
+                    parent_missing = True
+
+            operations.append(self._upload_operation(rel, local_info))
+
+        return operations
+
+    def plan(self, snapshot=None):
+        """
+        Diff a Zotero snapshot (read now if not given) against the device listing.
+        """
+        if self.device_listing is not None:
+            # Listed already while checking a simulated plan.
+            snapshot = snapshot or self.read_snapshot()
+            device_files, device_folders, device_base_exists = self.device_listing
+        elif self.crawl and snapshot is None:
+            with ThreadPoolExecutor(max_workers=1) as pool:
+                listing = pool.submit(self.list_device)
+                snapshot = self.read_snapshot()
+                device_files, device_folders, device_base_exists = listing.result()
+        else:
+            snapshot = snapshot or self.read_snapshot()
+
+            if not self.control.wait():
+                return []
+
+            device_files, device_folders, device_base_exists = self.list_device()
+
+        self.fingerprint = snapshot['fingerprint']
+
+        if not self.control.wait():
+            return []
+
+        operations = self.build_plan(
+            snapshot['files'], snapshot['folders'], device_files, device_folders, device_base_exists
+        )
+
+        if self.optimizer is not None and not self.simulate:
+            self.optimize_uploads(operations)
+
+        if self.fit_to_storage:
+            operations = self.fit_operations_to_storage(operations, device_files)
+
+        return operations
+
+    def optimize_uploads(self, operations):
+        """
+        Point uploads at optimized copies of their PDFs and record the bytes saved.
+        """
+        uploads = {}
+
+        for operation in operations:
+            if operation['op'] == OP_UPLOAD:
+                uploads.setdefault(operation['local_path'], []).append(operation)
+
+        if not uploads:
+            return
+
+        self.log(f'Optimizing {len(uploads)} PDFs for the device...')
+        hits = 0
+
+        try:
+            for result in self.optimizer.optimize(uploads, should_continue=self.control.wait):
+                hits += result['hit']
+
+                if result['path'] != result['source']:
+                    self.optimized_paths.append(result['path'])
+
+                for operation in uploads[result['source']]:
+                    if result['path'] != operation['local_path']:
+                        self.bytes_saved += operation['size'] - result['size']
+                        operation['upload_path'] = result['path']
+                        operation['source_size'] = operation['size']
+                        operation['size'] = result['size']
+        except Exception as e:
+            self.log('PDF optimization failed, uploading originals: ' + str(e))
+            return
+
+        self.log(f'PDF optimization saved {format_size(self.bytes_saved)} ({hits} cached).')
+
+    def storage_budget(self, device_files, operations):
+        """
+        Return the bytes available for uploads: free space plus space freed by deletions.
+        """
+        storage = self.dp.get_storage()
+        available = int(storage.get('available', 0))
+        freed = sum(device_files.get(op['rel'], 0) for op in operations if op['op'] == OP_DELETE_FILE)
+
+        return max(0, available + freed - self.storage_reserve)
+
+    def fit_operations_to_storage(self, operations, device_files):
+        """
+        Drop the lowest-priority uploads that would not fit on the device.
+        """
+        try:
+            budget = self.storage_budget(device_files, operations)
+        except Exception as e:
+            self.log('Could not read device storage, uploading without a budget: ' + str(e))
+            return operations
+
+        operations, self.skipped = fit_to_budget(operations, budget)
+
+        if self.skipped:
+            skipped_bytes = sum(op.get('size', 0) for op in self.skipped)
+            self.log(
+                f'Storage budget {format_size(budget)}: skipping {len(self.skipped)} '
+                f'uploads ({format_size(skipped_bytes)}) that do not fit.'
+            )
+
+        return operations
+
+    def apply(self, operation):
+        """
+        Perform a single operation on the device.
+        """
+        kind = operation['op']
+        remote_path = operation['remote_path']
+
+        if kind == OP_CREATE_FOLDER:
+            self.dp.new_folder(remote_path)
+        elif kind == OP_DELETE_FOLDER:
+            self.dp.delete_folder(remote_path)
+        elif kind == OP_DELETE_FILE:
+            self.dp.delete_document(remote_path)
+
+            if self.upload_hashes is not None:
+                self.upload_hashes.pop(operation['rel'], None)
+        elif kind == OP_UPLOAD:
+            if operation.get('replace'):
+                self.dp.delete_document(remote_path)
+
+            upload_file(
+                self.dp,
+                _upload_source(operation),
+                remote_path,
+                progress=lambda sent, size: self.file_progress(operation, sent, size),
+            )
+
+            if self.upload_hashes is not None and operation.get('sha256'):
+                self.upload_hashes[operation['rel']] = operation['sha256']
+        else:
+            raise ValueError('Unknown sync operation: ' + str(kind))
+
+    def execute(self, operations, total=None):
+        """
+        Execute operations in order, yielding (index, total, operation, error) after each.
+
+        `operations` may be a generator when `total` is given as an estimate;
+        the transfer size, and with it the ETA, is then unknown.
+        Stops early when the control is cancelled, and blocks while it is paused.
+        While a file uploads, the next one is read ahead. Uploads overlap
+        when the session has more than one request slot (`parallel_slots`).
+        """
+        if total is None:
+            total = len(operations)
+            total_bytes = sum(op.get('size', 0) for op in operations if op['op'] == OP_UPLOAD)
+        else:
+            total_bytes = None
+
+        self.meter = ThroughputMeter(total_bytes, rate_cap=self.limiter.rate)
+        self.timing = {'upload_bytes': 0, 'upload_seconds': 0.0, 'other_count': 0, 'other_seconds': 0.0}
+        self._last_finished = 0.0
+        self._unmetered = (0, 0.0)
+
+        prefetcher = Prefetcher() if not self.simulate else None
+        workers = 1 if self.simulate else parallel_slots(self.dp)
+        self._sample_seconds = PARALLEL_SAMPLE_SECONDS if workers > 1 else 0.0
+
+        try:
+            if workers > 1:
+                yield from self._execute_parallel(operations, total, prefetcher, workers)
+            else:
+                yield from self._execute(operations, total, prefetcher)
+        finally:
+            if prefetcher is not None:
+                prefetcher.close()
+
+    def _execute(self, operations, total, prefetcher):
+        for index, (operation, following) in enumerate(_with_next(operations)):
+            if not self.control.wait():
+                return
+
+            if prefetcher is not None and following is not None and following['op'] == OP_UPLOAD:
+                prefetcher.prefetch(_upload_source(following))
+
+            kind = operation['op']
+            remote_path = operation['remote_path']
+            error = None
+
+            if self.simulate:
+                if index < SIMULATE_LOG_LIMIT:
+                    if operation.get('replace'):
+                        self.log('Simulate: Would replace changed file: ' + remote_path)
+                    else:
+                        self.log(_SIMULATE_MESSAGES[kind] + remote_path)
+                elif index == SIMULATE_LOG_LIMIT:
+                    self.log('Simulate: further operations are listed in the plan only.')
+            else:
+                error = self._attempt(operation)
+
+                if error is _CANCELLED:
+                    return
+
+            yield index, total, operation, error
+
+    def _execute_parallel(self, operations, total, prefetcher, workers):
+        """
+        Like `_execute`, with up to `workers` consecutive uploads in flight.
+
+        Other operations wait for the uploads before them and run alone.
+        Results are yielded in plan order. When the sync is cancelled, the
+        uploads already under way still finish and are reported, so the
+        operations left for a checkpoint are exactly those not reported.
+        """
+        pending = collections.deque()
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='sync-upload') as pool:
+            try:
+                for index, (operation, following) in enumerate(_with_next(operations)):
+                    if not self.control.wait():
+                        break
+
+                    alone = operation['op'] != OP_UPLOAD
+
+                    while pending and (alone or len(pending) >= workers or pending[0][1]['op'] != OP_UPLOAD):
+                        yield from self._finished(pending.popleft(), total)
+
+                    if prefetcher is not None and following is not None and following['op'] == OP_UPLOAD:
+                        prefetcher.prefetch(_upload_source(following))
+
+                    pending.append((index, operation, pool.submit(self._attempt, operation)))
+
+                if self.control.cancelled:
+                    for _index, _operation, future in pending:
+                        future.cancel()
+
+                while pending:
+                    yield from self._finished(pending.popleft(), total)
+            finally:
+                for _index, _operation, future in pending:
+                    future.cancel()
+
+    def _finished(self, entry, total):
+        """
+        Yield the result of a submitted operation, unless it was cancelled before it was performed.
+        """
+        index, operation, future = entry
+
+        if future.cancelled():
+            return
+
+        error = future.result()
+
+        if error is not _CANCELLED:
+            yield index, total, operation, error
+
+    def _attempt(self, operation):
+        """
+        Perform an operation, waiting out device outages; return its error, None, or _CANCELLED.
+        """
+        kind = operation['op']
+
+        while not self.control.cancelled:
+            try:
+                self._perform(operation)
+                return None
+            except Exception as e:
+                if self.wait_for_device(e):
+                    continue
+
+                if self.control.cancelled:
+                    break
+
+                with self._stats_lock:
+                    if kind == OP_UPLOAD and self.meter.total_bytes is not None:
+                        self.meter.total_bytes -= operation.get('size', 0)
+
+                self.log(_FAILED_MESSAGES[kind] + ' (' + operation['remote_path'] + '): ' + str(e))
+                return e
+
+        # Left for the checkpoint rather than counted as failed.
+        return _CANCELLED
+
+    def _perform(self, operation):
+        kind = operation['op']
+        remote_path = operation['remote_path']
+        started = time.monotonic()
+        self.apply(operation)
+        finished = time.monotonic()
+
+        with self._stats_lock:
+            # Time since the previous operation finished, if that was later than
+            # this one started: with uploads in parallel, rates and estimates
+            # then follow their combined throughput.
+            elapsed = finished - max(started, self._last_finished)
+            self._last_finished = finished
+
+            if kind == OP_UPLOAD:
+                unmetered_bytes, unmetered_seconds = self._unmetered
+                unmetered_bytes += operation.get('size', 0)
+                unmetered_seconds += elapsed
+
+                if unmetered_seconds >= self._sample_seconds:
+                    self.meter.record(unmetered_bytes, unmetered_seconds)
+                    unmetered_bytes, unmetered_seconds = 0, 0.0
+
+                self._unmetered = (unmetered_bytes, unmetered_seconds)
+                self.timing['upload_bytes'] += operation.get('size', 0)
+                self.timing['upload_seconds'] += elapsed
+            else:
+                self.timing['other_count'] += 1
+                self.timing['other_seconds'] += elapsed
+
+        if kind == OP_UPLOAD:
+            self.limiter.consume(operation.get('size', 0))
+
+        self.log(('Replaced: ' if operation.get('replace') else _DONE_MESSAGES[kind]) + remote_path)
+
+        if kind == OP_DELETE_FILE and self.dp.path_exists(remote_path):
+            self.log('Warning: File still exists after deletion attempt: ' + remote_path)
+
+    def wait_for_device(self, error):
+        """
+        Wait out a device outage behind `error`; return True once the device answers again.
+
+        Returns False straight away for errors that are not an outage, and
+        when the sync is cancelled while waiting.
+        """
+        if not isinstance(self.dp, ResilientDevice) or classify_error(error) != TRANSIENT or self.dp.breaker.is_closed:
+            return False
+
+        # Parallel uploads hit the same outage; one of them waits it out.
+        with self._outage_lock:
+            if self.dp.breaker.is_closed:
+                return not self.control.cancelled
+
+            self.log('Device unreachable; sync paused until it responds again.')
+
+            if not self.dp.wait_until_available(self.control):
+                return False
+
+            self.log('Device reachable again; resuming sync.')
+            return True
+
+    def plan_report(self, operations):
+        """
+        Build the report of a simulated plan and log its totals and estimate.
+        """
+        history = load_throughput(self.device_name, self.remote_base)
+        report = build_plan_report(operations, self.remote_base, history, self.skipped, self.limiter.rate)
+        totals = report['totals']
+        seconds = report['estimate']['seconds']
+        estimate = format_duration(seconds) if seconds is not None else 'unknown until a real sync has run'
+        self.log(
+            f"Plan: {totals['operations']} operations, {format_size(totals['bytes'])} to upload, "
+            f"estimated time {estimate}."
+        )
+
+        return report
+
+    def checkpoint_is_valid(self, checkpoint):
+        """
+        Return True if the checkpoint was taken for this base, mode and Zotero snapshot.
+
+        A simulated plan must also match the plan options and the device
+        listing; the listing is kept for planning again if it does not.
+        """
+        if not checkpoint or not checkpoint.get('operations'):
+            return False
+
+        if checkpoint.get('remote_base') != self.remote_base or checkpoint.get('simulate') != self.simulate:
+            return False
+
+        if checkpoint.get('fingerprint') != self.snapshot_fingerprint():
+            return False
+
+        if 'options' in checkpoint and checkpoint['options'] != self.plan_options():
+            return False
+
+        if 'device' in checkpoint:
+            self.device_listing = self.list_device()
+            return self.device_index.fingerprint(self.remote_base) == checkpoint['device']
+
+        return True
+
+    def run(self, checkpoint=None, snapshot=None):
+        """
+        Run a complete sync, or resume from a checkpoint, and return a summary dict.
+
+        `snapshot` is a pre-read result of `read_snapshot`. The summary holds a
+        `checkpoint` entry when the run was cancelled with operations left, and
+        None otherwise, plus the duration and transfer statistics of the run.
+        A simulation also returns its operations as a `plan` report (see
+        `quaderno_gui.core.plan_report`) and, when it was planned in full, as
+        an `applicable_plan` checkpoint for the real run; a real run updates
+        the throughput history that plan estimates are based on.
+
+        Optimized copies stay in the optimizer's cache until the run is over;
+        the cache is trimmed to its size limit afterwards.
+        """
+        try:
+            return self._run(checkpoint, snapshot)
+        finally:
+            if self.optimizer is not None:
+                self.optimizer.release(self.optimized_paths)
+                self.optimized_paths = []
+                self.optimizer.evict()
+
+    def _run(self, checkpoint, snapshot):
+        started = time.monotonic()
+        summary = {
+            'simulate': self.simulate,
+            'remote_base': self.remote_base,
+            'aborted': False,
+            'cancelled': False,
+            'counts': {},
+            'errors': [],
+            'checkpoint': None,
+            'duration': 0.0,
+            'transfer': {},
+            'skipped': 0,
+            'bytes_saved': 0,
+        }
+        self.log('Starting Zotero sync...' + (' (Simulation)' if self.simulate else ''))
+
+        streaming = False
+        total = None
+
+        try:
+            if self.checkpoint_is_valid(checkpoint):
+                operations = checkpoint['operations']
+                self.fingerprint = checkpoint['fingerprint']
+
+                if 'device' in checkpoint:
+                    self.log(f'Nothing changed since the simulation; applying its {len(operations)} operations.')
+
+                    # Simulations leave the PDFs as they are.
+                    if self.optimizer is not None:
+                        self.optimize_uploads(operations)
+                else:
+                    self.log(f'Resuming from checkpoint: {len(operations)} operations remaining.')
+
+                if self.fingerprints is not None:
+                    self.load_upload_hashes()
+            else:
+                if checkpoint and 'device' in checkpoint:
+                    self.log('Zotero library, device or sync options changed since the simulation; '
+                             'planning from scratch.')
+                elif checkpoint:
+                    self.log('Zotero library changed since the last checkpoint; planning from scratch.')
+
+                streaming = self.stream and snapshot is None
+
+                if self.item_keys is not None:
+                    operations = self.plan_items()
+                elif streaming:
+                    operations, total = self.stream_operations()
+                else:
+                    operations = self.plan(snapshot)
+
+            summary['skipped'] = len(self.skipped)
+            summary['bytes_saved'] = self.bytes_saved
+            done = 0
+            finished = set()
+            planned = []
+
+            for index, total, operation, error in self.execute(operations, total):
+                finished.add(index)
+                done = len(finished)
+
+                if self.simulate:
+                    planned.append(operation)
+
+                self.progress(done, max(total, done), operation, self.meter.stats())
+                kind = operation['op']
+
+                if error is None:
+                    summary['counts'][kind] = summary['counts'].get(kind, 0) + 1
+                else:
+                    summary['errors'].append(
+                        {'op': kind, 'remote_path': operation['remote_path'], 'error': str(error)}
+                    )
+        except SyncAborted as exc:
+            self.log(str(exc))
+            self.log('Zotero sync aborted.')
+            summary['aborted'] = True
+            return summary
+
+        summary['duration'] = time.monotonic() - started
+        summary['transfer'] = self.meter.stats()
+
+        if self.simulate:
+            summary['plan'] = self.plan_report(planned)
+        else:
+            record_throughput(self.device_name, self.remote_base, self.timing)
+
+        if self.fingerprints is not None:
+            summary['fingerprints'] = self.fingerprints.stats
+            self.save_upload_hashes()
+
+        if streaming and not self.control.cancelled:
+            # The estimate was an upper bound; finish the progress bar.
+            self.progress(done, done, None, self.meter.stats())
+
+        if self.control.cancelled:
+            summary['cancelled'] = True
+            # A streamed run has no plan to resume; the next run diffs again.
+            remaining = [] if streaming else [op for i, op in enumerate(operations) if i not in finished]
+
+            if remaining and self.fingerprint:
+                summary['checkpoint'] = {
+                    'fingerprint': self.fingerprint,
+                    'remote_base': self.remote_base,
+                    'simulate': self.simulate,
+                    'operations': remaining,
+                }
+
+            if streaming:
+                self.log('Zotero sync cancelled; the next sync picks up the remaining files.')
+            else:
+                self.log(f'Zotero sync cancelled; {len(remaining)} operations remaining.')
+            return summary
+
+        # A streamed or item-limited plan is not a complete diff of the library.
+        complete = not streaming and self.item_keys is None and self.device_index is not None
+
+        if self.simulate and planned and self.fingerprint and complete:
+            summary['applicable_plan'] = {
+                'fingerprint': self.fingerprint,
+                'remote_base': self.remote_base,
+                'simulate': False,
+                'operations': planned,
+                'device': self.device_index.fingerprint(self.remote_base),
+                'options': self.plan_options(),
+            }
+
+        self.log('Zotero sync ' + ('simulation' if self.simulate else 'complete') + '.')
+
+        return summary
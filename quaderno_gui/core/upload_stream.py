@@ -0,0 +1,231 @@
+"""
+Streamed document uploads for QuadernoGUI.
+
+`DigitalPaper.upload_file` builds the whole multipart request in memory
+before sending it. `upload_file` here sends the same request from a
+memory-mapped file instead, so memory use does not grow with the PDF, and
+reports per-file progress. `Prefetcher` reads the next file into the page
+cache while the current one is on the wire, which hides slow local disks
+and network home directories behind the transfer.
+"""
+
+import binascii
+import mmap
+import os
+import queue
+import threading
+from urllib.parse import quote_plus
+
+from quaderno_gui.core.device_arbiter import request_slot
+from quaderno_gui.core.resilience import ResilientDevice
+
+
+CHUNK_SIZE = 1024 * 1024
+# Bytes of the next file read ahead; larger files are only partly warmed up.
+PREFETCH_BYTES = 64 * 1024 * 1024
+# Progress is reported after at least this many bytes, and at the end.
+PROGRESS_STEP = 256 * 1024
+
+
+class FileBody:
+    """
+    File-like multipart/form-data body that streams one memory-mapped file.
+
+    The part is laid out like the one `DigitalPaper.upload` sends. `progress`
+    is called with (bytes of the file sent, file size).
+    """
+
+    def __init__(self, path, filename, field='file', content_type='rb', progress=None):
+        self.boundary = binascii.hexlify(os.urandom(16)).decode('ascii')
+        head = (
+            f'--{self.boundary}\r\n'
+            f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n'
+        ).encode('utf-8')
+        tail = f'\r\n--{self.boundary}--\r\n'.encode('ascii')
+        self._fh = open(path, 'rb')
+        self.file_size = os.fstat(self._fh.fileno()).st_size
+        self._map = None
+
+        if self.file_size:
+            self._map = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+            if hasattr(mmap, 'MADV_SEQUENTIAL'):
+                self._map.madvise(mmap.MADV_SEQUENTIAL)
+
+        self._parts = [(0, head), (len(head), self._map or b''), (len(head) + self.file_size, tail)]
+        self._head_size = len(head)
+        self.length = len(head) + self.file_size + len(tail)
+        self.position = 0
+        self.progress = progress
+        self._reported = 0
+
+    @property
+    def content_type(self):
+        return 'multipart/form-data; boundary=' + self.boundary
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(CHUNK_SIZE)
+
+            if not chunk:
+                return
+
+            yield chunk
+
+    def read(self, size=-1):
+        start = self.position
+        end = self.length if size is None or size < 0 else min(self.length, start + size)
+        chunks = []
+
+        for part_start, part in self._parts:
+            part_end = part_start + len(part)
+
+            if part_end > start and part_start < end:
+                chunks.append(part[max(start, part_start) - part_start:min(end, part_end) - part_start])
+
+        self.position = end
+
+        if self.progress is not None:
+            sent = min(max(end - self._head_size, 0), self.file_size)
+
+            if sent - self._reported >= PROGRESS_STEP or (sent == self.file_size and sent != self._reported):
+                self._reported = sent
+                self.progress(sent, self.file_size)
+
+        return b''.join(chunks)
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+        self._fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_exc):
+        self.close()
+
+
+class Prefetcher:
+    """
+    Read files into the page cache on a background thread, one after the other.
+    """
+
+    def __init__(self, limit=PREFETCH_BYTES):
+        self.limit = limit
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def prefetch(self, path):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='upload-prefetch', daemon=True)
+            self._thread.start()
+
+        self._queue.put(path)
+
+    def _run(self):
+        buffer = bytearray(CHUNK_SIZE)
+
+        while True:
+            path = self._queue.get()
+
+            if path is None:
+                return
+
+            try:
+                with open(path, 'rb', buffering=0) as fh:
+                    if hasattr(os, 'posix_fadvise'):
+                        os.posix_fadvise(fh.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+
+                    remaining = self.limit
+
+                    while remaining > 0:
+                        count = fh.readinto(buffer)
+
+                        if not count:
+                            break
+
+                        remaining -= count
+            except OSError:
+                pass
+
+    def close(self):
+        """
+        Stop the thread after the file it is reading.
+        """
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread = None
+
+
+def _document_id(dp, remote_path):
+    """
+    Return the id of the document at `remote_path`, creating an empty entry if needed.
+    """
+    from dptrp1.dptrp1 import ResolveObjectFailed
+
+    try:
+        return dp._get_object_id(remote_path)
+    except ResolveObjectFailed:
+        pass
+
+    # Same steps as DigitalPaper.upload for a new document.
+    remote_directory = os.path.dirname(remote_path)
+    dp.new_folder(remote_directory)
+    info = {
+        'file_name': os.path.basename(remote_path),
+        'parent_folder_id': dp._get_object_id(remote_directory),
+        'document_source': '',
+    }
+    return dp._post_endpoint('/documents2', data=info).json()['document_id']
+
+
+def upload_file(dp, local_path, remote_path, progress=None):
+    """
+    Upload `local_path` to the document path `remote_path`, replacing an existing document.
+
+    Sessions without an HTTP `session` fall back to `dp.upload_file`, which
+    an `AsyncTransport` streams itself. With a `ResilientDevice`, the
+    streamed request is retried like any device call.
+    """
+    session = getattr(dp, 'session', None)
+
+    if session is None and getattr(dp, 'streams_uploads', False):
+        dp.upload_file(local_path, remote_path, progress=progress)
+        return
+
+    if session is None:
+        dp.upload_file(local_path, remote_path)
+
+        if progress is not None:
+            size = os.path.getsize(local_path)
+            progress(size, size)
+
+        return
+
+    import requests
+
+    doc_id = _document_id(dp, remote_path)
+    filename = quote_plus(os.path.basename(remote_path))
+
+    def put():
+        with FileBody(local_path, filename, progress=progress) as body:
+            request = requests.Request('PUT', dp.base_url, data=body, headers={'Content-Type': body.content_type})
+            prepared = session.prepare_request(request)
+            prepared.url = prepared.url.replace('%25', '%') + f'documents/{doc_id}/file'
+
+            with request_slot(dp, 'upload_file', len(body)):
+                response = session.send(prepared)
+
+            response.raise_for_status()
+
+    if isinstance(dp, ResilientDevice):
+        dp.invoke('upload_file', put)
+    else:
+        put()
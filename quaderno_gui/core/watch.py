@@ -0,0 +1,425 @@
+"""
+Watch mode: sync automatically when the Zotero library changes.
+
+`ZoteroWatcher` notices changes without rescanning the library. The
+database is checked with a stat of `zotero.sqlite` and its write-ahead log,
+confirmed with `PRAGMA data_version` when the database can be opened. The
+storage folder is watched with inotify on Linux and polled elsewhere; both
+report the item keys (storage subfolder names) that changed. `WatchSync`
+debounces bursts of changes and runs an incremental sync of the changed
+items, or a full sync when items were removed or only the database changed.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import sqlite3
+import struct
+import sys
+import time
+
+from quaderno_gui.core.sync_engine import SyncControl, SyncEngine
+from quaderno_gui.core.zotero import resolve_zotero_paths
+
+
+DEFAULT_INTERVAL = 1.0
+DEFAULT_DEBOUNCE = 2.0
+# Polling fallback: how often to stat every storage subfolder.
+DEFAULT_RESCAN_INTERVAL = 30.0
+# Minimum time between two full syncs started by database-only changes.
+DEFAULT_FULL_SYNC_INTERVAL = 60.0
+# More changed items than this are synced with a full sync.
+MAX_INCREMENTAL_KEYS = 200
+
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_Q_OVERFLOW = 0x00004000
+_IN_ISDIR = 0x40000000
+_IN_ONLYDIR = 0x01000000
+_ROOT_MASK = _IN_CREATE | _IN_DELETE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_ONLYDIR
+_ITEM_MASK = _IN_CLOSE_WRITE | _IN_CREATE | _IN_DELETE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_ONLYDIR
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+def _noop(*_args):
+    pass
+
+
+class _Inotify:
+    """
+    Minimal inotify binding through ctypes; raises OSError if inotify is unavailable.
+    """
+
+    def __init__(self):
+        if not sys.platform.startswith('linux'):
+            raise OSError(errno.ENOSYS, 'inotify is only available on Linux')
+
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+
+    def add_watch(self, path, mask):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+
+        if wd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error), str(path))
+
+        return wd
+
+    def read(self, timeout):
+        """
+        Wait up to `timeout` seconds and return a list of (wd, mask, name) events.
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+
+        if not readable:
+            return []
+
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+
+        while offset < len(data):
+            wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            events.append((wd, mask, name))
+
+        return events
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class ZoteroWatcher:
+    """
+    Report changes of the Zotero database and storage folder.
+
+    `poll(timeout)` blocks for at most `timeout` seconds and returns
+    (changed item keys, database changed, rescan needed). A rescan is needed
+    when inotify dropped events. `mode` tells whether inotify or polling is
+    used for the storage folder.
+    """
+
+    def __init__(self, storage_path=None, db_path=None, rescan_interval=DEFAULT_RESCAN_INTERVAL, use_inotify=True):
+        self.storage, self.db = resolve_zotero_paths(storage_path, db_path)
+        self.rescan_interval = rescan_interval
+        self.mode = None
+        self._inotify = None
+        self._watches = {}
+        self._conn = None
+        self._data_version = None
+        self._db_stat = self._stat_db()
+        self._storage_mtime = None
+        self._folders = {}
+        self._last_rescan = 0.0
+
+        self._open_db()
+
+        if use_inotify:
+            try:
+                self._start_inotify()
+            except OSError:
+                self._stop_inotify()
+
+        if self._inotify is None:
+            self.mode = 'polling'
+            self._folders = self._scan_folders()
+            self._storage_mtime = self._stat_mtime(self.storage)
+            self._last_rescan = time.monotonic()
+
+    def _stat_mtime(self, path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _stat_db(self):
+        signature = []
+
+        for path in (self.db, str(self.db) + '-wal'):
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_size, stat.st_mtime_ns))
+            except OSError:
+                signature.append(None)
+
+        return signature
+
+    def _open_db(self):
+        try:
+            self._conn = sqlite3.connect(f'file:{self.db}?mode=ro', uri=True, check_same_thread=False)
+            self._data_version = self._conn.execute('PRAGMA data_version').fetchone()[0]
+        except sqlite3.Error:
+            # Zotero may hold the database locked; the stat check still works.
+            self._close_db()
+
+    def _close_db(self):
+        if self._conn is not None:
+            self._conn.close()
+
+        self._conn = None
+        self._data_version = None
+
+    def _database_changed(self):
+        signature = self._stat_db()
+
+        if signature == self._db_stat:
+            return False
+
+        self._db_stat = signature
+
+        if self._conn is None:
+            self._open_db()
+            return True
+
+        try:
+            version = self._conn.execute('PRAGMA data_version').fetchone()[0]
+        except sqlite3.Error:
+            self._close_db()
+            return True
+
+        # A checkpoint of the write-ahead log changes the files, not the data.
+        changed = version != self._data_version
+        self._data_version = version
+        return changed
+
+    def _start_inotify(self):
+        self._inotify = _Inotify()
+        self._watches[self._inotify.add_watch(self.storage, _ROOT_MASK)] = None
+
+        with os.scandir(self.storage) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    self._watch_folder(entry.name)
+
+        self.mode = 'inotify'
+
+    def _stop_inotify(self):
+        if self._inotify is not None:
+            self._inotify.close()
+
+        self._inotify = None
+        self._watches = {}
+
+    def _watch_folder(self, key):
+        self._watches[self._inotify.add_watch(os.path.join(self.storage, key), _ITEM_MASK)] = key
+
+    def _scan_folders(self):
+        folders = {}
+
+        try:
+            with os.scandir(self.storage) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        folders[entry.name] = entry.stat(follow_symlinks=False).st_mtime_ns
+        except OSError:
+            pass
+
+        return folders
+
+    def _poll_inotify(self, timeout):
+        keys = set()
+        rescan = False
+
+        for wd, mask, name in self._inotify.read(timeout):
+            if mask & _IN_Q_OVERFLOW:
+                rescan = True
+                continue
+
+            key = self._watches.get(wd)
+
+            if key is None:
+                if not name or not mask & _IN_ISDIR:
+                    continue
+
+                keys.add(name)
+
+                if mask & (_IN_CREATE | _IN_MOVED_TO) and mask & _IN_ISDIR:
+                    try:
+                        self._watch_folder(name)
+                    except OSError:
+                        rescan = True
+            else:
+                keys.add(key)
+
+        return keys, rescan
+
+    def _poll_storage(self, timeout):
+        time.sleep(timeout)
+        now = time.monotonic()
+        mtime = self._stat_mtime(self.storage)
+
+        if mtime == self._storage_mtime and now - self._last_rescan < self.rescan_interval:
+            return set()
+
+        # Added and removed items change the storage folder itself; files
+        # replaced inside an item folder are only seen by the periodic rescan.
+        self._storage_mtime = mtime
+        self._last_rescan = now
+        folders = self._scan_folders()
+        keys = {key for key in folders.keys() | self._folders.keys() if folders.get(key) != self._folders.get(key)}
+        self._folders = folders
+        return keys
+
+    def poll(self, timeout):
+        if self._inotify is not None:
+            keys, rescan = self._poll_inotify(timeout)
+        else:
+            keys, rescan = self._poll_storage(timeout), False
+
+        return keys, self._database_changed(), rescan
+
+    def close(self):
+        self._stop_inotify()
+        self._close_db()
+
+
+class WatchSync:
+    """
+    Run incremental syncs whenever the Zotero library changes, until cancelled.
+
+    Changes are collected until none arrived for `debounce` seconds. Changed
+    item keys are then synced with `SyncEngine(item_keys=...)`; keys without
+    an attachment to upload (removed items), inotify overflows and changes of
+    the database alone lead to a full sync, at most once per
+    `full_sync_interval` for the latter. Changes whose sync failed, e.g.
+    because the device was unreachable, are kept and retried.
+
+    `engine_options` are passed on to `SyncEngine`; `on_sync` is called with
+    each sync summary.
+    """
+
+    def __init__(self, dp, remote_base, storage_path=None, db_path=None, log=None, control=None, on_sync=None,
+                 interval=DEFAULT_INTERVAL, debounce=DEFAULT_DEBOUNCE, full_sync_interval=DEFAULT_FULL_SYNC_INTERVAL,
+                 watcher=None, **engine_options):
+        self.dp = dp
+        self.remote_base = remote_base
+        self.storage_path = storage_path
+        self.db_path = db_path
+        self.log = log or _noop
+        self.control = control or SyncControl()
+        self.on_sync = on_sync or _noop
+        self.interval = interval
+        self.debounce = debounce
+        self.full_sync_interval = full_sync_interval
+        self.watcher = watcher
+        self.engine_options = engine_options
+        self.pending_keys = set()
+        self.pending_full = False
+        self.pending_database = False
+        self.last_full_sync = 0.0
+
+    def sync(self, item_keys=None):
+        """
+        Run one sync, of `item_keys` only if given; return the summary.
+        """
+        engine = SyncEngine(
+            self.dp,
+            self.remote_base,
+            storage_path=self.storage_path,
+            db_path=self.db_path,
+            log=self.log,
+            control=self.control,
+            item_keys=item_keys,
+            **self.engine_options,
+        )
+        summary = engine.run()
+        summary['item_keys'] = sorted(item_keys) if item_keys is not None else None
+        summary['unresolved_keys'] = sorted(engine.unresolved_keys)
+        return summary
+
+    def _succeeded(self, summary):
+        return not summary['aborted'] and not summary['cancelled'] and not summary['errors']
+
+    def flush(self):
+        """
+        Sync the collected changes.
+        """
+        keys = self.pending_keys
+        full = self.pending_full or len(keys) > MAX_INCREMENTAL_KEYS
+
+        if keys and not full:
+            self.log(f'Zotero changed: syncing {len(keys)} changed items.')
+
+            try:
+                summary = self.sync(keys)
+            except Exception as e:
+                self.log('Incremental sync failed: ' + str(e))
+                return
+
+            self.on_sync(summary)
+
+            if not self._succeeded(summary):
+                return
+
+            self.pending_keys = set()
+            # Removed items, or items not committed to the database yet.
+            full = bool(summary['unresolved_keys'])
+
+            if not full:
+                self.pending_database = False
+
+        if full or (self.pending_database and time.monotonic() - self.last_full_sync >= self.full_sync_interval):
+            self.log('Zotero changed: running a full sync.')
+
+            try:
+                summary = self.sync()
+            except Exception as e:
+                self.log('Full sync failed: ' + str(e))
+                return
+
+            self.last_full_sync = time.monotonic()
+            self.on_sync(summary)
+
+            if self._succeeded(summary):
+                self.pending_keys = set()
+                self.pending_full = False
+                self.pending_database = False
+
+    def run(self):
+        """
+        Watch until the control is cancelled; blocks while it is paused.
+        """
+        watcher = self.watcher or ZoteroWatcher(self.storage_path, self.db_path)
+        self.log(f'Watching Zotero for changes ({watcher.mode}).')
+        last_change = None
+
+        try:
+            while self.control.wait():
+                keys, database_changed, rescan = watcher.poll(self.interval)
+
+                if keys or database_changed or rescan:
+                    self.pending_keys |= keys
+                    self.pending_database |= database_changed
+                    self.pending_full |= rescan
+                    last_change = time.monotonic()
+
+                if last_change is None or time.monotonic() - last_change < self.debounce:
+                    continue
+
+                self.flush()
+                pending = self.pending_keys or self.pending_full or self.pending_database
+                # Whatever is left (failed syncs, rate-limited full syncs) is retried later.
+                last_change = time.monotonic() if pending else None
+        finally:
+            if self.watcher is None:
+                watcher.close()
+
+        self.log('Stopped watching Zotero.')
@@ -2,14 +2,28 @@
 Zotero integration functions for QuadernoGUI.
 """
 
+import hashlib
 import os
 import sqlite3
-from datetime import datetime
+from datetime import datetime, timedelta
 from pathlib import Path
 
 
 DEFAULT_STORAGE_DIR = Path.home() / 'Zotero' / 'storage'
 DEFAULT_DB_PATH = Path.home() / 'Zotero' / 'zotero.sqlite'
+UNCATEGORIZED_FOLDER = 'Uncategorized'
+# Annotated copies pulled from the device are stored next to the attachment under this suffix.
+ANNOTATED_SUFFIX = '.annotated.pdf'
+
+
+def attachment_pdfs(source_dir):
+    """
+    Return the PDF files of a Zotero storage folder, leaving out pulled annotated copies.
+    """
+    return [
+        entry for entry in source_dir.iterdir()
+        if entry.suffix.lower() == '.pdf' and not entry.name.lower().endswith(ANNOTATED_SUFFIX)
+    ]
 
 
 def resolve_zotero_paths(storage_path=None, db_path=None):
@@ -33,6 +47,92 @@ def resolve_zotero_paths(storage_path=None, db_path=None):
 
     return storage_candidate, db_candidate
 
+def zotero_snapshot_fingerprint(storage_path=None, db_path=None):
+    """
+    Return a cheap fingerprint of the Zotero database and storage folder.
+
+    Only file metadata is read: the database, its write-ahead log and the
+    storage folder itself (which changes when attachments are added or removed).
+    """
+    storage_folder, db_file = resolve_zotero_paths(storage_path, db_path)
+    parts = [str(storage_folder), str(db_file)]
+
+    for path in (db_file, Path(str(db_file) + '-wal'), storage_folder):
+        try:
+            stat = path.stat()
+            parts.append(f'{stat.st_size}:{stat.st_mtime_ns}')
+        except OSError:
+            parts.append('-')
+
+    return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()
+
+def normalize_sync_filters(filters=None):
+    """
+    Return a complete selective-sync filters dict.
+
+    Recognized keys are `include_collections`, `exclude_collections`,
+    `include_tags`, `exclude_tags` (lists of names; collections are paths such
+    as 'Physics/Quantum' and match their subcollections), `max_size` in bytes
+    and `modified_days`. Zero or empty values disable a filter. Names are
+    compared case-insensitively.
+    """
+    filters = filters or {}
+
+    def names(key):
+        cleaned = (name.strip().strip('/').lower() for name in filters.get(key) or [])
+        return sorted(name for name in cleaned if name)
+
+    return {
+        'include_collections': names('include_collections'),
+        'exclude_collections': names('exclude_collections'),
+        'include_tags': names('include_tags'),
+        'exclude_tags': names('exclude_tags'),
+        'max_size': int(filters.get('max_size') or 0),
+        'modified_days': int(filters.get('modified_days') or 0),
+    }
+
+def _matches_collection(folder, prefixes):
+    return any(folder == prefix or folder.startswith(prefix + '/') for prefix in prefixes)
+
+def collection_selected(folder, filters):
+    """
+    Return True if a collection folder passes the include/exclude collection filters.
+    """
+    folder = folder.lower()
+
+    if _matches_collection(folder, filters['exclude_collections']):
+        return False
+
+    if filters['include_collections']:
+        return _matches_collection(folder, filters['include_collections'])
+
+    return True
+
+_TAG_MATCH_SQL = '''
+          EXISTS (
+              SELECT 1 FROM itemTags it JOIN tags t ON t.tagID = it.tagID
+              WHERE it.itemID IN (i.itemID, ia.parentItemID) AND LOWER(t.name) IN ({})
+          )'''
+
+def _attachment_filter_sql(filters):
+    """
+    Return extra WHERE conditions and parameters for the tag and date filters.
+    """
+    conditions = []
+    params = []
+
+    for key, keyword in (('include_tags', 'AND'), ('exclude_tags', 'AND NOT')):
+        if filters[key]:
+            conditions.append(keyword + _TAG_MATCH_SQL.format(', '.join('?' * len(filters[key]))))
+            params.extend(filters[key])
+
+    if filters['modified_days']:
+        cutoff = datetime.utcnow() - timedelta(days=filters['modified_days'])
+        conditions.append('AND i.dateModified >= ?')
+        params.append(cutoff.strftime('%Y-%m-%d %H:%M:%S'))
+
+    return '\n'.join(conditions), params
+
 def get_full_collection_path(collection_id, collections):
     """
     Recursively build the full path for a collection given its id.
@@ -52,9 +152,101 @@ def get_full_collection_path(collection_id, collections):
 
     return coll['collectionName']
 
-def build_zotero_file_mapping(storage_folder=None, db_path=None):
+def _load_collections(cursor):
     """
-    Build a mapping of remote file paths to local file details from Zotero.
+    Return the non-deleted collections keyed by collectionID.
+    """
+    deleted_collections = set()
+    try:
+        cursor.execute('SELECT collectionID FROM deletedCollections')
+
+        for row in cursor.fetchall():
+            deleted_collections.add(row[0])
+    except sqlite3.OperationalError:
+        pass
+
+    cursor.execute('SELECT collectionID, collectionName, parentCollectionID FROM collections')
+    collections = {}
+
+    for row in cursor.fetchall():
+        collectionID, collectionName, parentCollectionID = row
+
+        if collectionID in deleted_collections:
+            continue
+
+        collections[collectionID] = {'collectionName': collectionName, 'parentCollectionID': parentCollectionID}
+
+    return collections
+
+def _collection_folders(collections):
+    """
+    Return the folder path of each collection, keyed by collectionID.
+    """
+    folders = {}
+
+    for collectionID in collections:
+        folder = get_full_collection_path(collectionID, collections)
+
+        if folder:
+            folders[collectionID] = folder.replace(os.sep, '/')
+
+    return folders
+
+def _collection_ids(value):
+    return [int(part) for part in value.split(',')] if value else []
+
+def _attachment_folder(own_ids, parent_ids, folders, filters):
+    """
+    Return the folder an attachment is synced to, or None if the collection filters leave it out.
+
+    The filters are checked against every collection of the attachment and of
+    its parent item: one excluded collection leaves the item out, and with
+    include rules one included collection is enough. The item goes to its
+    selected collection with the lowest id, its own collections first.
+    """
+    own_ids = [i for i in own_ids if i in folders]
+    parent_ids = [i for i in parent_ids if i in folders]
+
+    if not own_ids and not parent_ids:
+        return UNCATEGORIZED_FOLDER if collection_selected(UNCATEGORIZED_FOLDER, filters) else None
+
+    excluded = filters['exclude_collections']
+
+    if any(_matches_collection(folders[i].lower(), excluded) for i in own_ids + parent_ids):
+        return None
+
+    for candidates in (own_ids, parent_ids):
+        selected = [i for i in candidates if collection_selected(folders[i], filters)]
+
+        if selected:
+            return folders[min(selected)]
+
+    return None
+
+# Attachment rows fetched from SQLite at a time while streaming the library.
+ZOTERO_BATCH_SIZE = 256
+
+_ATTACHMENT_QUERY = '''
+    SELECT
+      (SELECT GROUP_CONCAT(ci.collectionID) FROM collectionItems ci
+       WHERE ci.itemID = i.itemID) as collectionIDs,
+      (SELECT GROUP_CONCAT(ci2.collectionID) FROM collectionItems ci2
+       WHERE ci2.itemID = ia.parentItemID) as parentCollectionIDs,
+      i.itemID, i.key, i.dateAdded, i.dateModified, ia.contentType
+    FROM items i
+    JOIN itemAttachments ia ON i.itemID = ia.itemID
+    WHERE i.itemTypeID = 3
+      AND NOT EXISTS (
+          SELECT 1 FROM deletedItems di
+          WHERE di.itemID IN (i.itemID, ia.parentItemID)
+      )
+      AND ia.contentType LIKE 'application/pdf'
+      {conditions}
+'''
+
+def _resolve_existing_paths(storage_folder=None, db_path=None):
+    """
+    Resolve the Zotero paths and raise FileNotFoundError if either is missing.
     """
     storage_folder, db_path = resolve_zotero_paths(storage_folder, db_path)
 
@@ -76,93 +268,155 @@ def build_zotero_file_mapping(storage_folder=None, db_path=None):
     if not db_path.is_file():
         raise FileNotFoundError(f'Zotero database not found: {db_path}')
 
-    mapping = {}
+    return storage_folder, db_path
+
+def iter_zotero_files(storage_folder=None, db_path=None, filters=None, batch_size=ZOTERO_BATCH_SIZE, keys=None):
+    """
+    Yield (remote path, file details) for each Zotero PDF attachment.
+
+    With `keys`, only the attachments with these item keys (the names of
+    their storage folders) are read.
+
+    Missing paths raise FileNotFoundError right away; the attachments are
+    then read from the database `batch_size` rows at a time and their storage
+    folders are only looked at as the rows are consumed, so memory use does
+    not grow with the library and the first files are available immediately.
+
+    Selective-sync `filters` (see `normalize_sync_filters`) are applied before
+    the storage folder of an item is looked at: tags and dates in the query,
+    collections on the fetched row (see `_attachment_folder`). Only the size
+    limit needs the file itself.
+    """
+    filters = normalize_sync_filters(filters)
+    storage_folder, db_path = _resolve_existing_paths(storage_folder, db_path)
+
+    return _iter_attachments(storage_folder, db_path, filters, batch_size, keys)
+
+def _iter_attachments(storage_folder, db_path, filters, batch_size, keys=None):
     conn = sqlite3.connect(str(db_path))
-    cursor = conn.cursor()
 
-    # Get deleted collections.
-    deleted_collections = set()
     try:
-        cursor.execute('SELECT collectionID FROM deletedCollections')
+        cursor = conn.cursor()
+        # Collection paths are shared by many attachments; resolve each once.
+        folders = _collection_folders(_load_collections(cursor))
 
-        for row in cursor.fetchall():
-            deleted_collections.add(row[0])
-    except sqlite3.OperationalError:
-        pass
+        conditions, params = _attachment_filter_sql(filters)
 
-    # Load collections (excluding deleted ones).
-    cursor.execute('SELECT collectionID, collectionName, parentCollectionID FROM collections')
-    collections = {}
+        if keys is not None:
+            keys = sorted(keys)
+            conditions += '\nAND i.key IN ({})'.format(', '.join('?' * len(keys)))
+            params.extend(keys)
 
-    for row in cursor.fetchall():
-        collectionID, collectionName, parentCollectionID = row
+        cursor.execute(_ATTACHMENT_QUERY.format(conditions=conditions), params)
 
-        if collectionID in deleted_collections:
-            continue
+        while True:
+            rows = cursor.fetchmany(batch_size)
 
-        collections[collectionID] = {'collectionName': collectionName, 'parentCollectionID': parentCollectionID}
+            if not rows:
+                break
 
-    # Query attachments (only PDFs and valid items).
-    query = '''
-        SELECT
-          COALESCE(
-            (SELECT MIN(ci.collectionID) FROM collectionItems ci WHERE ci.itemID = i.itemID),
-            (SELECT MIN(ci2.collectionID) FROM collectionItems ci2 WHERE ci2.itemID = ia.parentItemID)
-          ) as collectionID,
-          i.itemID, i.key, i.dateModified, ia.contentType
-        FROM items i
-        JOIN itemAttachments ia ON i.itemID = ia.itemID
-        WHERE i.itemTypeID = 3
-          AND NOT EXISTS (
-              SELECT 1 FROM deletedItems di
-              WHERE di.itemID IN (i.itemID, ia.parentItemID)
-          )
-          AND ia.contentType LIKE 'application/pdf'
-    '''
-    cursor.execute(query)
-    rows = cursor.fetchall()
-
-    for row in rows:
-        collectionID, itemID, key, dateModified, contentType = row
-
-        if collectionID is None or collectionID not in collections:
-            folder = 'Uncategorized'
-        else:
-            folder = get_full_collection_path(collectionID, collections)
-            if not folder:
-                folder = 'Uncategorized'
+            for row in rows:
+                entry = _attachment_entry(row, storage_folder, folders, filters)
 
-        source_dir = storage_folder / key
+                if entry is not None:
+                    yield entry
+    finally:
+        conn.close()
 
-        if not source_dir.exists():
-            continue
+def _attachment_entry(row, storage_folder, folders, filters):
+    collectionIDs, parentCollectionIDs, itemID, key, dateAdded, dateModified, contentType = row
+    own_ids, parent_ids = _collection_ids(collectionIDs), _collection_ids(parentCollectionIDs)
+    folder = _attachment_folder(own_ids, parent_ids, folders, filters)
 
-        pdf_files = [entry for entry in source_dir.iterdir() if entry.suffix.lower() == '.pdf']
-        if not pdf_files:
-            continue
+    if folder is None:
+        return None
 
-        pdf_file = pdf_files[0]
-        abs_path = pdf_file
+    source_dir = storage_folder / key
 
-        try:
-            mod_time = datetime.strptime(dateModified, '%Y-%m-%d %H:%M:%S').timestamp()
-        except Exception:
-            mod_time = pdf_file.stat().st_mtime
+    if not source_dir.exists():
+        return None
+
+    pdf_files = attachment_pdfs(source_dir)
+    if not pdf_files:
+        return None
+
+    pdf_file = pdf_files[0]
+    stat = pdf_file.stat()
+
+    if filters['max_size'] and stat.st_size > filters['max_size']:
+        return None
+
+    try:
+        mod_time = datetime.strptime(dateModified, '%Y-%m-%d %H:%M:%S').timestamp()
+    except Exception:
+        mod_time = stat.st_mtime
+
+    try:
+        added_time = datetime.strptime(dateAdded, '%Y-%m-%d %H:%M:%S').timestamp()
+    except Exception:
+        added_time = mod_time
+
+    unique_filename = f'{pdf_file.stem} (itemID {itemID}){pdf_file.suffix}'
+    remote_rel = folder + '/' + unique_filename
+
+    return remote_rel, {
+        'abs_path': str(pdf_file),
+        'mod_time': mod_time,
+        'added_time': added_time,
+        'size': stat.st_size,
+        'folder': folder,
+        'key': key,
+    }
+
+def count_zotero_attachments(db_path=None, filters=None):
+    """
+    Return the number of PDF attachment rows matching the query filters.
+
+    This is an upper bound for `iter_zotero_files`: collection and size
+    filters and missing files are not accounted for.
+    """
+    filters = normalize_sync_filters(filters)
+    _, db_path = resolve_zotero_paths(db_path=db_path)
+
+    if db_path.is_dir():
+        db_path = db_path / 'zotero.sqlite'
+
+    conn = sqlite3.connect(str(db_path))
+
+    try:
+        conditions, params = _attachment_filter_sql(filters)
+        query = 'SELECT COUNT(*) FROM (' + _ATTACHMENT_QUERY.format(conditions=conditions) + ')'
+        return conn.execute(query, params).fetchone()[0]
+    finally:
+        conn.close()
+
+def build_zotero_file_mapping(storage_folder=None, db_path=None, filters=None, fingerprints=None):
+    """
+    Build a mapping of remote file paths to local file details from Zotero.
+
+    See `iter_zotero_files` for the filters; this collects its results. With
+    a `FingerprintService`, each entry also gets the `sha256` of its file.
+    """
+    mapping = dict(iter_zotero_files(storage_folder, db_path, filters))
 
-        base = pdf_file.stem
-        ext = pdf_file.suffix
-        unique_filename = f'{base} (itemID {itemID}){ext}'
-        remote_rel = (Path(folder.replace(os.sep, '/')) / unique_filename).as_posix()
-        mapping[remote_rel] = {'abs_path': str(abs_path), 'mod_time': mod_time}
+    if fingerprints is not None:
+        digests = fingerprints.fingerprint([info['abs_path'] for info in mapping.values()])
 
-    conn.close()
+        for info in mapping.values():
+            info['sha256'] = digests.get(info['abs_path'])
 
     return mapping
 
-def build_zotero_folder_set(db_path=None):
+def build_zotero_folder_set(db_path=None, filters=None):
     """
     Build a set of folder paths from Zotero collections.
+
+    With collection filters, only selected collections and the parents of
+    included collections are kept. Attachments are placed in selected
+    collections only (see `_attachment_folder`), so their folders are always
+    part of the set.
     """
+    filters = normalize_sync_filters(filters)
     _, db_path = resolve_zotero_paths(db_path=db_path)
 
     if db_path.is_dir():
@@ -175,31 +429,60 @@ def build_zotero_folder_set(db_path=None):
         raise FileNotFoundError(f'Zotero database not found: {db_path}')
 
     conn = sqlite3.connect(str(db_path))
-    cursor = conn.cursor()
-    deleted_collections = set()
 
     try:
-        cursor.execute('SELECT collectionID FROM deletedCollections')
-        for row in cursor.fetchall():
-            deleted_collections.add(row[0])
-    except sqlite3.OperationalError:
-        pass
+        collections = _load_collections(conn.cursor())
+    finally:
+        conn.close()
 
-    cursor.execute('SELECT collectionID, collectionName, parentCollectionID FROM collections')
     folder_set = set()
-    collections = {}
 
-    for row in cursor.fetchall():
-        collectionID, collectionName, parentCollectionID = row
-        if collectionID in deleted_collections:
+    for folder in _collection_folders(collections).values():
+        lowered = folder.lower()
+        parent_of_included = any(prefix.startswith(lowered + '/') for prefix in filters['include_collections'])
+
+        if parent_of_included and not _matches_collection(lowered, filters['exclude_collections']):
+            folder_set.add(folder)
+        elif collection_selected(folder, filters):
+            folder_set.add(folder)
+
+    return folder_set
+
+def find_attachment_files(item_ids, storage_folder=None, db_path=None):
+    """
+    Return a mapping of attachment item IDs to the PDF files in their storage folders.
+
+    Only the given items are looked up, so this stays cheap when a handful of
+    documents need to be matched back to Zotero.
+    """
+    storage_folder, db_path = resolve_zotero_paths(storage_folder, db_path)
+
+    if not db_path.is_file():
+        raise FileNotFoundError(f'Zotero database not found: {db_path}')
+
+    item_ids = sorted(set(item_ids))
+    found = {}
+
+    if not item_ids:
+        return found
+
+    conn = sqlite3.connect(str(db_path))
+
+    try:
+        placeholders = ', '.join('?' for _ in item_ids)
+        rows = conn.execute(f'SELECT itemID, key FROM items WHERE itemID IN ({placeholders})', item_ids).fetchall()
+    finally:
+        conn.close()
+
+    for itemID, key in rows:
+        source_dir = storage_folder / key
+
+        if not source_dir.is_dir():
             continue
-        collections[collectionID] = {'collectionName': collectionName, 'parentCollectionID': parentCollectionID}
 
-    for collectionID in collections:
-        folder = get_full_collection_path(collectionID, collections)
-        if folder:
-            folder_set.add(folder.replace(os.sep, '/'))
+        pdf_files = attachment_pdfs(source_dir)
 
-    conn.close()
+        if pdf_files:
+            found[itemID] = pdf_files
 
-    return folder_set
+    return found
@@ -0,0 +1,71 @@
+"""
+Confirmation and background execution of bulk deletions for the device pages.
+"""
+
+from PyQt5.QtWidgets import QMessageBox
+
+from quaderno_gui.core.scheduler import format_size
+from quaderno_gui.core.sync import BulkDeleteWorker
+
+# Failures listed in the warning shown after a bulk delete.
+MAX_LISTED_FAILURES = 10
+
+
+def confirm_bulk_delete(parent, description, total_bytes):
+    """
+    Ask once whether to delete `description` (e.g. "12 documents"); return True if confirmed.
+    """
+    reply = QMessageBox.question(
+        parent,
+        "Delete",
+        f"Delete {description} ({format_size(total_bytes)})? This cannot be undone.",
+        QMessageBox.Yes | QMessageBox.No,
+    )
+    return reply == QMessageBox.Yes
+
+
+def start_bulk_delete(page, buttons, documents=(), folders=(), log=None, refresh=None):
+    """
+    Delete documents and folders in the background and return the running worker.
+
+    `buttons` are disabled while the job runs; the first one shows its
+    progress. `refresh` is called once when the job has finished.
+    """
+    worker = BulkDeleteWorker(page.dp, documents, folders, parent=page)
+    label = buttons[0].text()
+
+    for button in buttons:
+        button.setEnabled(False)
+
+    def progress(done, total):
+        buttons[0].setText(f"Deleting {done}/{total}...")
+
+    def finished(summary):
+        for button in buttons:
+            button.setEnabled(True)
+
+        buttons[0].setText(label)
+
+        if refresh is not None:
+            refresh()
+
+        failed = [f"{item['path']}: {item['error']}" for item in summary["failed"]]
+        failed += [path + ": still exists" for path in summary["remaining"]]
+
+        if failed:
+            QMessageBox.warning(
+                page,
+                "Delete",
+                f"{len(failed)} items could not be deleted:\n"
+                + "\n".join(failed[:MAX_LISTED_FAILURES])
+                + ("\n..." if len(failed) > MAX_LISTED_FAILURES else ""),
+            )
+
+    worker.progress_signal.connect(progress)
+    worker.finished_signal.connect(finished)
+
+    if log is not None:
+        worker.log_signal.connect(log)
+
+    worker.start()
+    return worker
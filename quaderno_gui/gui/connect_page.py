@@ -6,8 +6,11 @@ import os
 
 from PyQt5.QtCore import QSettings
 from PyQt5.QtWidgets import (
+    QComboBox,
+    QHBoxLayout,
     QLabel,
     QLineEdit,
+    QListWidget,
     QPushButton,
     QTextEdit,
     QVBoxLayout,
@@ -15,6 +18,7 @@ from PyQt5.QtWidgets import (
 )
 
 from quaderno_gui.core.connection import ConnectionWorker
+from quaderno_gui.core.device import ASYNC_BACKEND, THREADED_BACKEND, async_available
 
 
 class ConnectPage(QWidget):
@@ -42,10 +46,35 @@ class ConnectPage(QWidget):
         self.serial_edit.setText(self.settings.value("device/serial", ""))
         layout.addWidget(self.serial_edit)
 
+        layout.addWidget(QLabel("Transfers:"))
+        self.transport_combo = QComboBox()
+        self.transport_combo.addItem("Threaded (one thread per request)", THREADED_BACKEND)
+        self.transport_combo.addItem("asyncio (one event loop, needs aiohttp)", ASYNC_BACKEND)
+
+        if not async_available():
+            self.transport_combo.model().item(1).setEnabled(False)
+        elif self.settings.value("device/transport", THREADED_BACKEND) == ASYNC_BACKEND:
+            self.transport_combo.setCurrentIndex(1)
+
+        layout.addWidget(self.transport_combo)
+
         self.connect_button = QPushButton("Connect")
         self.connect_button.clicked.connect(self.connect_device)
         layout.addWidget(self.connect_button)
 
+        layout.addWidget(QLabel("Connected devices (select to make active):"))
+        self.device_list = QListWidget()
+        self.device_list.setSelectionMode(QListWidget.SingleSelection)
+        self.device_list.setMaximumHeight(100)
+        self.device_list.itemClicked.connect(self.activate_device)
+        layout.addWidget(self.device_list)
+
+        device_btn_layout = QHBoxLayout()
+        self.disconnect_button = QPushButton("Disconnect Selected")
+        self.disconnect_button.clicked.connect(self.disconnect_device)
+        device_btn_layout.addWidget(self.disconnect_button)
+        layout.addLayout(device_btn_layout)
+
         self.log = QTextEdit()
         self.log.setReadOnly(True)
         layout.addWidget(self.log)
@@ -63,20 +92,24 @@ class ConnectPage(QWidget):
 
         self.settings.setValue("device/address", addr)
         self.settings.setValue("device/serial", serial if serial else "")
+        backend = self.transport_combo.currentData()
+        self.settings.setValue("device/transport", backend)
         self.connect_button.setEnabled(False)
         self.log.clear()
         self.log.append("Starting connection...")
         self.worker = ConnectionWorker(addr, serial)
         self.worker.log_signal.connect(self.log.append)
-        self.worker.finished_signal.connect(self.connection_finished)
+        self.worker.finished_signal.connect(
+            lambda dp: self.connection_finished(dp, addr, backend)
+        )
         self.worker.start()
 
-    def connection_finished(self, dp):
+    def connection_finished(self, dp, name=None, backend=None):
         """
         Callback when connection attempt finishes.
         """
         if dp is not None:
-            self.parent_window.set_digital_paper(dp)
+            self.parent_window.add_device(name or dp.addr, dp, backend)
         else:
             self.log.append("Connection failed.")
 
@@ -84,6 +117,34 @@ class ConnectPage(QWidget):
 
     def set_connected(self, dp):
         """
-        Update UI after successful connection.
+        Update UI after a device is connected, removed or made active.
+        """
+        self.device_list.clear()
+
+        for name, device in self.parent_window.devices.items():
+            self.device_list.addItem(name)
+
+            if device is dp:
+                self.device_list.setCurrentRow(self.device_list.count() - 1)
+
+    def activate_device(self, item):
         """
-        pass
+        Make the clicked device the one used by the Files and Folders pages.
+        """
+        dp = self.parent_window.devices.get(item.text())
+
+        if dp is not None and dp is not self.parent_window.digital_paper:
+            self.parent_window.set_digital_paper(dp)
+            self.log.append("Active device: " + item.text())
+
+    def disconnect_device(self):
+        """
+        Forget the selected device.
+        """
+        items = self.device_list.selectedItems()
+
+        if not items:
+            return
+
+        self.parent_window.remove_device(items[0].text())
+        self.log.append("Disconnected: " + items[0].text())
@@ -0,0 +1,131 @@
+"""
+Hidden diagnostics page for QuadernoGUI, opened with Ctrl+Shift+D.
+"""
+
+import json
+import time
+
+from PyQt5.QtCore import QObject, QTimer
+from PyQt5.QtWidgets import (
+    QCheckBox,
+    QFileDialog,
+    QHBoxLayout,
+    QLabel,
+    QMessageBox,
+    QPlainTextEdit,
+    QPushButton,
+    QVBoxLayout,
+    QWidget,
+)
+
+from quaderno_gui.core.diagnostics import get_diagnostics
+
+
+class StallMonitor(QObject):
+    """
+    Records how long the GUI event loop was blocked, using a short repeating timer.
+
+    A timer that fires late by more than `threshold` seconds means the GUI
+    thread was busy for that long.
+    """
+
+    def __init__(self, parent=None, interval_ms=50, threshold=0.1):
+        super().__init__(parent)
+        self.interval = interval_ms / 1000
+        self.threshold = threshold
+        self.last = None
+        self.timer = QTimer(self)
+        self.timer.setInterval(interval_ms)
+        self.timer.timeout.connect(self.tick)
+
+    def start(self):
+        self.last = time.perf_counter()
+        self.timer.start()
+
+    def stop(self):
+        self.timer.stop()
+
+    def tick(self):
+        now = time.perf_counter()
+        stall = now - self.last - self.interval
+        self.last = now
+
+        if stall > self.threshold:
+            get_diagnostics().record_stall(stall)
+
+
+class DiagnosticsPage(QWidget):
+    """
+    Page to switch diagnostics on and off, inspect a summary and write a bundle.
+    """
+
+    def __init__(self, parent_window):
+        super().__init__()
+        self.parent_window = parent_window
+        self.dp = None
+        diagnostics = get_diagnostics()
+
+        layout = QVBoxLayout(self)
+
+        self.enable_check = QCheckBox("Collect diagnostics (profiles, memory, device latency, GUI stalls)")
+        self.enable_check.setChecked(diagnostics.enabled)
+        self.enable_check.toggled.connect(self.set_enabled)
+        layout.addWidget(self.enable_check)
+
+        button_layout = QHBoxLayout()
+        self.refresh_button = QPushButton("Refresh")
+        self.refresh_button.clicked.connect(self.refresh)
+        button_layout.addWidget(self.refresh_button)
+        self.dump_button = QPushButton("Write Bundle...")
+        self.dump_button.clicked.connect(self.dump_bundle)
+        button_layout.addWidget(self.dump_button)
+        layout.addLayout(button_layout)
+
+        layout.addWidget(QLabel("Summary:"))
+        self.summary_view = QPlainTextEdit()
+        self.summary_view.setReadOnly(True)
+        layout.addWidget(self.summary_view)
+
+        self.refresh()
+
+    def set_digital_paper(self, dp):
+        self.dp = dp
+        self.refresh()
+
+    def set_enabled(self, enabled):
+        diagnostics = get_diagnostics()
+
+        if enabled:
+            diagnostics.enable()
+            self.parent_window.start_stall_monitor()
+        else:
+            self.parent_window.stop_stall_monitor()
+            diagnostics.disable()
+
+        self.refresh()
+
+    def _arbiter_stats(self):
+        arbiter = getattr(self.dp, "arbiter", None)
+        return arbiter.stats() if arbiter is not None else None
+
+    def refresh(self):
+        summary = get_diagnostics().summary()
+        summary["device_queue"] = self._arbiter_stats()
+        self.summary_view.setPlainText(json.dumps(summary, indent=2, default=str))
+
+    def dump_bundle(self):
+        diagnostics = get_diagnostics()
+        directory = QFileDialog.getExistingDirectory(
+            self, "Choose Folder for the Diagnostics Bundle", str(diagnostics.output_dir or "")
+        )
+
+        if not directory:
+            return
+
+        try:
+            bundle = diagnostics.dump_bundle(directory, extra={"device_queue": self._arbiter_stats()})
+        except OSError as e:
+            QMessageBox.warning(self, "Error", "Could not write the diagnostics bundle: " + str(e))
+            return
+
+        QMessageBox.information(self, "Diagnostics", "Diagnostics bundle written to:\n" + str(bundle))
@@ -4,11 +4,14 @@ Files page UI for QuadernoGUI.
 
 import os
 
+from PyQt5.QtCore import QSettings, Qt
 from PyQt5.QtWidgets import (
+    QCheckBox,
     QFileDialog,
     QHBoxLayout,
     QLabel,
     QListWidget,
+    QListWidgetItem,
     QMessageBox,
     QPushButton,
     QTextEdit,
@@ -16,6 +19,10 @@ from PyQt5.QtWidgets import (
     QWidget,
 )
 
+from quaderno_gui.core.diagnostics import get_diagnostics
+from quaderno_gui.core.scheduler import format_size
+from quaderno_gui.core.sync import BackupWorker
+from quaderno_gui.gui.bulk_delete import confirm_bulk_delete, start_bulk_delete
 from quaderno_gui.gui.upload_area import UploadArea
 
 
@@ -27,6 +34,9 @@ class FilesPage(QWidget):
     def __init__(self):
         super().__init__()
         self.dp = None
+        self.delete_worker = None
+        self.backup_worker = None
+        self.settings = QSettings('QuadernoGUI', 'Backup')
 
         layout = QVBoxLayout(self)
 
@@ -34,6 +44,13 @@ class FilesPage(QWidget):
         self.refresh_button = QPushButton("Refresh File List")
         self.refresh_button.clicked.connect(self.refresh_files)
         top_btn_layout.addWidget(self.refresh_button)
+        self.backup_button = QPushButton("Back Up Device...")
+        self.backup_button.clicked.connect(self.toggle_backup)
+        top_btn_layout.addWidget(self.backup_button)
+        self.snapshots_check = QCheckBox("Dated snapshots")
+        self.snapshots_check.setToolTip("Keep one folder per backup; unchanged documents are hard-linked.")
+        self.snapshots_check.setChecked(self.settings.value('snapshots', False, type=bool))
+        top_btn_layout.addWidget(self.snapshots_check)
         layout.addLayout(top_btn_layout)
 
         self.files_list = QListWidget()
@@ -76,21 +93,24 @@ class FilesPage(QWidget):
 
         self.files_list.clear()
 
-        try:
-            docs = self.dp.list_documents()
+        with get_diagnostics().profile("FilesPage.refresh_files"):
+            try:
+                docs = self.dp.list_documents()
 
-            for doc in docs:
-                path = doc.get("entry_path", "Unknown")
-                if path.startswith("Document/"):
-                    path = path[len("Document/") :]
-                self.files_list.addItem(path)
+                for doc in docs:
+                    path = doc.get("entry_path", "Unknown")
+                    if path.startswith("Document/"):
+                        path = path[len("Document/") :]
+                    item = QListWidgetItem(path)
+                    item.setData(Qt.UserRole, int(doc.get("file_size") or 0))
+                    self.files_list.addItem(item)
 
-            self.log.append("File list refreshed.")
+                self.log.append("File list refreshed.")
 
-        except Exception as e:
-            QMessageBox.warning(
-                self, "Error", "Failed to retrieve file list: " + str(e)
-            )
+            except Exception as e:
+                QMessageBox.warning(
+                    self, "Error", "Failed to retrieve file list: " + str(e)
+                )
 
     def download_file(self, _item=None):
         """
@@ -124,7 +144,7 @@ class FilesPage(QWidget):
 
     def delete_file(self):
         """
-        Delete the selected file from the device.
+        Delete the selected files from the device after a single confirmation.
         """
         if not self.dp:
             return
@@ -134,24 +154,68 @@ class FilesPage(QWidget):
         if not items:
             return
 
-        for item in items:
-            remote_path = item.text()
-            full_remote = "Document/" + remote_path
+        description = items[0].text() if len(items) == 1 else f"{len(items)} documents"
 
-            reply = QMessageBox.question(
-                self,
-                "Delete",
-                f"Delete {remote_path}?",
-                QMessageBox.Yes | QMessageBox.No,
-            )
+        if not confirm_bulk_delete(self, description, sum(item.data(Qt.UserRole) or 0 for item in items)):
+            return
 
-            if reply == QMessageBox.Yes:
-                try:
-                    self.dp.delete_document(full_remote)
-                    self.log.append("Deleted: " + remote_path)
-                except Exception as e:
-                    QMessageBox.warning(
-                        self, "Error", "Failed to delete file: " + str(e)
-                    )
+        self.delete_worker = start_bulk_delete(
+            self,
+            [self.delete_button],
+            documents=["Document/" + item.text() for item in items],
+            log=self.log.append,
+            refresh=self.refresh_files,
+        )
 
-        self.refresh_files()
+    def toggle_backup(self):
+        """
+        Back up the whole device into a chosen folder, or cancel the running backup.
+        """
+        if self.backup_worker is not None:
+            self.backup_worker.cancel()
+            self.backup_button.setEnabled(False)
+            self.log.append("Cancelling backup...")
+            return
+
+        if not self.dp:
+            return
+
+        target = QFileDialog.getExistingDirectory(
+            self, "Select Backup Folder", self.settings.value('target', '', type=str)
+        )
+
+        if not target:
+            return
+
+        self.settings.setValue('target', target)
+        self.settings.setValue('snapshots', self.snapshots_check.isChecked())
+        self.backup_worker = BackupWorker(self.dp, target, snapshots=self.snapshots_check.isChecked(), parent=self)
+        self.backup_worker.log_signal.connect(self.log.append)
+        self.backup_worker.progress_signal.connect(self.backup_progress)
+        self.backup_worker.finished_signal.connect(self.backup_finished)
+        self.backup_button.setText("Cancel Backup")
+        self.snapshots_check.setEnabled(False)
+        self.backup_worker.start()
+
+    def backup_progress(self, done, total, _stats):
+        self.backup_button.setText(f"Cancel Backup ({done}/{total})")
+
+    def backup_finished(self, summary):
+        self.backup_worker = None
+        self.backup_button.setText("Back Up Device...")
+        self.backup_button.setEnabled(True)
+        self.snapshots_check.setEnabled(True)
+
+        if summary["aborted"] or summary["cancelled"]:
+            return
+
+        location = os.path.join(summary["target"], summary["snapshot"] or "")
+        self.log.append(
+            f"Backup saved to {location}: {summary['downloaded']} documents downloaded "
+            f"({format_size(summary['bytes'])}), {summary['kept']} unchanged."
+        )
+
+        if summary["errors"]:
+            QMessageBox.warning(
+                self, "Backup", f"{len(summary['errors'])} documents could not be backed up; see the log."
+            )
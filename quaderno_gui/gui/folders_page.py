@@ -4,30 +4,66 @@ Folders page UI for QuadernoGUI.
 
 import os
 
+from PyQt5.QtCore import QSettings, Qt, QTimer
 from PyQt5.QtWidgets import (
+    QCheckBox,
     QFileDialog,
     QHBoxLayout,
     QInputDialog,
     QLabel,
     QListWidget,
+    QListWidgetItem,
     QMessageBox,
     QPushButton,
     QTextEdit,
+    QTreeWidget,
+    QTreeWidgetItem,
     QVBoxLayout,
     QWidget,
 )
 
+from quaderno_gui.core.device_index import DeviceIndex
+from quaderno_gui.core.diagnostics import get_diagnostics
+from quaderno_gui.core.scheduler import format_size
+from quaderno_gui.core.sync import CrawlWorker
+from quaderno_gui.gui.bulk_delete import confirm_bulk_delete, start_bulk_delete
 from quaderno_gui.gui.upload_area import UploadArea
 
+ROOT_FOLDER = "Document"
+FOLDER_ROLE = Qt.UserRole
+LOADED_ROLE = Qt.UserRole + 1
+DOCUMENT_ROLE = Qt.UserRole + 2
+
 
 class FoldersPage(QWidget):
     """
     Page for managing folders and files within folders on the device.
+
+    The folder tree is built from a single device listing. Tree items are
+    only created when their parent is expanded, and every folder shows the
+    number and total size of the documents below it. Selecting a folder
+    lists its documents from the same listing, without another request.
+    Documents directly in the root folder are shown at the top of the tree.
+
+    With "List folder by folder", the listing is crawled in the background
+    and the tree is shown, and updated, while it arrives.
     """
 
     def __init__(self):
         super().__init__()
         self.dp = None
+        self.tree = None
+        self.delete_worker = None
+        self.crawl_worker = None
+        self.crawl_index = None
+        self.crawl_state = None
+        self.settings = QSettings('QuadernoGUI', 'Folders')
+
+        # Batches of a running crawl are shown at most this often.
+        self.crawl_timer = QTimer(self)
+        self.crawl_timer.setSingleShot(True)
+        self.crawl_timer.setInterval(200)
+        self.crawl_timer.timeout.connect(self.show_crawl)
 
         layout = QVBoxLayout(self)
 
@@ -41,13 +77,20 @@ class FoldersPage(QWidget):
         self.delete_folder_button = QPushButton("Delete Folder")
         self.delete_folder_button.clicked.connect(self.delete_folder)
         top_layout.addWidget(self.delete_folder_button)
+        self.crawl_check = QCheckBox("List folder by folder")
+        self.crawl_check.setToolTip("Show the folders of large devices while they are listed.")
+        self.crawl_check.setChecked(self.settings.value('crawl', False, type=bool))
+        self.crawl_check.toggled.connect(lambda checked: self.settings.setValue('crawl', checked))
+        top_layout.addWidget(self.crawl_check)
         layout.addLayout(top_layout)
 
-        self.folder_list = QListWidget()
-        self.folder_list.setSelectionMode(QListWidget.ExtendedSelection)
-        self.folder_list.itemDoubleClicked.connect(self.folder_selected)
-        layout.addWidget(QLabel("Folders (sorted):"))
-        layout.addWidget(self.folder_list)
+        self.folder_tree = QTreeWidget()
+        self.folder_tree.setHeaderLabels(["Folder", "Documents", "Size"])
+        self.folder_tree.setSelectionMode(QTreeWidget.ExtendedSelection)
+        self.folder_tree.itemExpanded.connect(self.populate_children)
+        self.folder_tree.itemDoubleClicked.connect(self.tree_item_double_clicked)
+        layout.addWidget(QLabel("Folders:"))
+        layout.addWidget(self.folder_tree)
 
         self.file_list = QListWidget()
         self.file_list.setSelectionMode(QListWidget.ExtendedSelection)
@@ -76,7 +119,7 @@ class FoldersPage(QWidget):
         layout.addWidget(QLabel("Folders Log:"))
         layout.addWidget(self.log)
 
-        self.folder_list.itemSelectionChanged.connect(self.folder_selected)
+        self.folder_tree.itemSelectionChanged.connect(self.folder_selected)
 
     def set_digital_paper(self, dp):
         """
@@ -93,96 +136,326 @@ class FoldersPage(QWidget):
 
     def refresh_folders(self):
         """
-        Retrieve and display the list of folders from the device.
+        Retrieve the folder tree from the device, keeping expanded and selected folders.
         """
         if not self.dp:
             return
 
-        self.folder_list.clear()
+        selected = self.selected_folder()
+        expanded = self._expanded_folders()
 
-        try:
-            all_entries = self.dp.list_all()
-            folders = [
-                entry.get("entry_path", "")
-                for entry in all_entries
-                if entry.get("entry_type") == "folder"
-            ]
-            # Remove the prefix if needed
-            folders = [
-                f[len("Document/") :] if f.startswith("Document/") else f
-                for f in folders
-            ]
-            folders.sort()
-            for folder in folders:
-                self.folder_list.addItem(folder)
+        if self.crawl_check.isChecked():
+            self.start_crawl(selected, expanded)
+            return
+
+        with get_diagnostics().profile("FoldersPage.refresh_folders"):
+            try:
+                index = DeviceIndex.from_entries(self.dp.list_all())
+            except Exception as e:
+                QMessageBox.warning(self, "Error", "Failed to retrieve folders: " + str(e))
+                return
+
+            self.show_index(index, selected, expanded)
             self.log_message("Folders refreshed.")
 
-        except Exception as e:
-            QMessageBox.warning(self, "Error", "Failed to retrieve folders: " + str(e))
+    def show_index(self, index, selected=None, expanded=()):
+        """
+        Rebuild the folder tree from a device index, expanding and selecting the given folders.
+        """
+        self.tree = index.folder_tree()
+        self.folder_tree.clear()
+        self.file_list.clear()
+        root = self.tree.folder_id(ROOT_FOLDER)
+
+        if root is not None:
+            self._add_children(self.folder_tree.invisibleRootItem(), root)
+
+        for folder in sorted(expanded):
+            item = self._find_item(folder)
+
+            if item is not None:
+                item.setExpanded(True)
+
+        if selected is not None:
+            self.select_folder(selected)
+
+    def start_crawl(self, selected, expanded):
+        """
+        List the folders in the background; replaces a crawl that is still running.
+        """
+        if self.crawl_worker is not None:
+            self.crawl_worker.cancel()
+
+        worker = CrawlWorker(self.dp, ROOT_FOLDER, parent=self)
+        worker.entries_signal.connect(lambda entries: self.crawl_received(worker, entries))
+        worker.finished_signal.connect(lambda error: self.crawl_finished(worker, error))
+        self.crawl_worker = worker
+        self.crawl_index = DeviceIndex()
+        self.crawl_state = (selected, set(expanded), 0)
+        self.refresh_folders_button.setText("Listing...")
+        worker.start()
+
+    def crawl_received(self, worker, entries):
+        if worker is not self.crawl_worker:
+            return
+
+        self.crawl_index.extend(entries)
+        selected, expanded, listed = self.crawl_state
+        self.crawl_state = (selected, expanded, listed + 1)
+        self.refresh_folders_button.setText(f"Listing... ({listed + 1} folders)")
+
+        if not self.crawl_timer.isActive():
+            self.crawl_timer.start()
+
+    def show_crawl(self):
+        """
+        Show what a crawl has listed so far, keeping what the user expanded or selected meanwhile.
+        """
+        if self.crawl_index is None:
+            return
+
+        selected, expanded, _listed = self.crawl_state
+        expanded |= set(self._expanded_folders())
+        self.show_index(self.crawl_index, self.selected_folder() or selected, expanded)
+
+    def crawl_finished(self, worker, error):
+        if worker is not self.crawl_worker:
+            return
+
+        self.crawl_timer.stop()
+        self.show_crawl()
+        self.crawl_worker = None
+        self.crawl_index = None
+        self.refresh_folders_button.setText("Refresh Folders")
+
+        if error:
+            QMessageBox.warning(self, "Error", "Failed to retrieve all folders: " + error)
+        else:
+            self.log_message(f"Folders refreshed ({self.crawl_state[2]} folders listed).")
+
+    def _add_children(self, parent_item, folder_id):
+        items = []
+
+        for child in self.tree.children(folder_id):
+            item = QTreeWidgetItem([
+                self.tree.name(child),
+                str(self.tree.total_documents[child]),
+                format_size(self.tree.total_bytes[child]),
+            ])
+            item.setData(0, FOLDER_ROLE, child)
+            item.setTextAlignment(1, Qt.AlignRight | Qt.AlignVCenter)
+            item.setTextAlignment(2, Qt.AlignRight | Qt.AlignVCenter)
+
+            if self.tree.subfolders[child]:
+                item.setChildIndicatorPolicy(QTreeWidgetItem.ShowIndicator)
+
+            items.append(item)
+
+        if folder_id == self.tree.folder_id(ROOT_FOLDER):
+            for name, size in self.tree.files(folder_id):
+                item = QTreeWidgetItem([name, "", format_size(size)])
+                item.setData(0, DOCUMENT_ROLE, size)
+                item.setTextAlignment(2, Qt.AlignRight | Qt.AlignVCenter)
+                items.append(item)
+
+        parent_item.addChildren(items)
+        parent_item.setData(0, LOADED_ROLE, True)
+
+    def populate_children(self, item):
+        """
+        Create the child items of a folder the first time it is expanded.
+        """
+        if not item.data(0, LOADED_ROLE):
+            self._add_children(item, item.data(0, FOLDER_ROLE))
+
+    def _folder_path(self, item):
+        return self.tree.index.folders[item.data(0, FOLDER_ROLE)][len(ROOT_FOLDER) + 1 :]
+
+    def _expanded_folders(self):
+        if self.tree is None:
+            return []
+
+        expanded = []
+        pending = [self.folder_tree.invisibleRootItem()]
+
+        while pending:
+            parent = pending.pop()
+
+            for i in range(parent.childCount()):
+                item = parent.child(i)
+
+                if item.isExpanded():
+                    expanded.append(self._folder_path(item))
+                    pending.append(item)
+
+        return expanded
+
+    def _find_item(self, folder):
+        """
+        Return the tree item of a folder path, creating the items above it as needed.
+        """
+        item = self.folder_tree.invisibleRootItem()
+        path = ROOT_FOLDER
+
+        for name in folder.split("/"):
+            if item.data(0, FOLDER_ROLE) is not None:
+                self.populate_children(item)
+
+            path += "/" + name
+            folder_id = self.tree.folder_id(path)
+
+            # A folder gone from the listing must not match the root documents, which have no folder id.
+            if folder_id is None:
+                return None
+
+            item = next(
+                (item.child(i) for i in range(item.childCount()) if item.child(i).data(0, FOLDER_ROLE) == folder_id),
+                None,
+            )
+
+            if item is None:
+                return None
+
+        return item
+
+    def select_folder(self, folder):
+        """
+        Expand the tree down to a folder and select it.
+        """
+        item = self._find_item(folder)
+
+        if item is None:
+            return
+
+        parent = item.parent()
+
+        while parent is not None:
+            parent.setExpanded(True)
+            parent = parent.parent()
+
+        self.folder_tree.setCurrentItem(item)
+
+    def selected_folders(self):
+        """
+        Return the paths (below Document) of the selected folders.
+        """
+        if self.tree is None:
+            return []
+
+        return [
+            self._folder_path(item)
+            for item in self.folder_tree.selectedItems()
+            if item.data(0, FOLDER_ROLE) is not None
+        ]
+
+    def selected_folder(self):
+        folders = self.selected_folders()
+        return folders[0] if folders else None
 
     def folder_selected(self, _item=None):
         """
-        Called when a folder is selected; refresh its file list.
+        Called when a folder is selected; show its files.
         """
-        selected_items = self.folder_list.selectedItems()
+        folder = self.selected_folder()
 
-        if selected_items:
-            folder = selected_items[0].text()
+        if folder is not None:
             self.refresh_files_in_folder(folder)
+        else:
+            self.file_list.clear()
 
     def refresh_files_in_folder(self, folder):
         """
-        Retrieve and display files within the selected folder.
+        Display the files within a folder from the current listing.
         """
-        if not self.dp:
-            return
-
         self.file_list.clear()
 
-        try:
-            entries = self.dp.list_objects_in_folder("Document/" + folder)
-            files = [
-                entry.get("entry_path", "")
-                for entry in entries
-                if entry.get("entry_type") == "document"
-            ]
-            prefix = "Document/" + folder + "/"
-            display_files = []
+        if self.tree is None:
+            return
 
-            for f in files:
-                display_files.append(f[len(prefix) :] if f.startswith(prefix) else f)
+        folder_id = self.tree.folder_id(ROOT_FOLDER + "/" + folder)
 
-            display_files.sort()
+        if folder_id is None:
+            return
 
-            for f in display_files:
-                self.file_list.addItem(f)
+        for name, size in self.tree.files(folder_id):
+            item = QListWidgetItem(name)
+            item.setToolTip(format_size(size))
+            item.setData(Qt.UserRole, size)
+            self.file_list.addItem(item)
 
-            self.log_message("Files refreshed for folder: " + folder)
+    def reload_folder(self, folder):
+        """
+        List one folder on the device again and show its documents, e.g. after an upload.
+        """
+        if not self.dp or self.tree is None:
+            self.refresh_folders()
+            return
+
+        index = self.tree.index
+        folder_id = self.tree.folder_id(ROOT_FOLDER + "/" + folder)
 
+        try:
+            entries = self.dp.list_objects_in_folder(ROOT_FOLDER + "/" + folder)
         except Exception as e:
             QMessageBox.warning(self, "Error", "Failed to retrieve files: " + str(e))
+            return
 
-    def download_file(self, _item=None):
+        known = {} if folder_id is None else {index.names[i]: i for i in self.tree.documents[folder_id]}
+        added = []
+
+        for entry in entries:
+            if entry.get("entry_type") != "document":
+                continue
+
+            i = known.get((entry.get("entry_path") or "").replace("\\", "/").rpartition("/")[2])
+
+            if i is None:
+                added.append(entry)
+            else:
+                index.sizes[i] = int(entry.get("file_size") or 0)
+                index.modified[i] = entry.get("modified_date")
+
+        index.extend(added)
+        self.show_index(index, self.selected_folder(), self._expanded_folders())
+        self.log_message("Files refreshed for folder: " + folder)
+
+    def selected_documents(self):
         """
-        Download the selected file from the current folder.
+        Return (remote path, size) for the selected root documents and files of the selected folder.
         """
-        if not self.dp:
-            return
+        documents = [
+            (ROOT_FOLDER + "/" + item.text(0), item.data(0, DOCUMENT_ROLE) or 0)
+            for item in self.folder_tree.selectedItems()
+            if item.data(0, FOLDER_ROLE) is None
+        ]
+        folder = self.selected_folder()
+
+        if folder is not None:
+            documents += [
+                (ROOT_FOLDER + "/" + folder + "/" + item.text(), item.data(Qt.UserRole) or 0)
+                for item in self.file_list.selectedItems()
+            ]
 
-        items = self.file_list.selectedItems()
+        return documents
 
-        if not items:
-            return
+    def tree_item_double_clicked(self, item, _column=0):
+        if item.data(0, FOLDER_ROLE) is None:
+            self.download_file()
 
-        filename = items[0].text()
+    def download_file(self, _item=None):
+        """
+        Download the selected file from the current folder, or the selected root document.
+        """
+        if not self.dp:
+            return
 
-        selected_folder_items = self.folder_list.selectedItems()
+        documents = self.selected_documents()
 
-        if not selected_folder_items:
+        if not documents:
             return
 
-        folder = selected_folder_items[0].text()
-        full_remote = "Document/" + folder + "/" + filename
+        full_remote = documents[-1][0]
+        filename = full_remote.rpartition("/")[2]
 
         local_file, _ = QFileDialog.getSaveFileName(self, "Save File", filename)
 
@@ -196,48 +469,37 @@ class FoldersPage(QWidget):
                     self, "Download", "File downloaded successfully."
                 )
 
-                self.refresh_files_in_folder(folder)
-
             except Exception as e:
                 QMessageBox.warning(self, "Error", "Failed to download file: " + str(e))
 
     def delete_file(self):
         """
-        Delete the selected file from the current folder.
+        Delete the selected files and root documents after a single confirmation.
         """
         if not self.dp:
             return
 
-        items = self.file_list.selectedItems()
+        documents = self.selected_documents()
 
-        if not items:
+        if not documents:
             return
 
-        selected_folder_items = self.folder_list.selectedItems()
+        description = documents[0][0].rpartition("/")[2] if len(documents) == 1 else f"{len(documents)} documents"
 
-        if not selected_folder_items:
+        if not confirm_bulk_delete(self, description, sum(size for _path, size in documents)):
             return
 
-        folder = selected_folder_items[0].text()
-
-        for item in items:
-            filename = item.text()
-            full_remote = "Document/" + folder + "/" + filename
-
-            reply = QMessageBox.question(
-                self, "Delete", f"Delete {filename}?", QMessageBox.Yes | QMessageBox.No
-            )
+        self.start_delete(documents=[path for path, _size in documents])
 
-            if reply == QMessageBox.Yes:
-                try:
-                    self.dp.delete_document(full_remote)
-                    self.log_message("Deleted: " + filename)
-                except Exception as e:
-                    QMessageBox.warning(
-                        self, "Error", "Failed to delete file: " + str(e)
-                    )
-
-        self.refresh_files_in_folder(folder)
+    def start_delete(self, documents=(), folders=()):
+        self.delete_worker = start_bulk_delete(
+            self,
+            [self.delete_button, self.delete_folder_button],
+            documents=documents,
+            folders=folders,
+            log=self.log_message,
+            refresh=self.refresh_folders,
+        )
 
     def create_folder(self):
         """
@@ -248,10 +510,10 @@ class FoldersPage(QWidget):
 
         base_folder = "Document/"
 
-        selected = self.folder_list.selectedItems()
+        selected = self.selected_folder()
 
-        if selected:
-            base_folder += selected[0].text() + "/"
+        if selected is not None:
+            base_folder += selected + "/"
 
         folder_name, ok = QInputDialog.getText(
             self, "Create Folder", "Enter new folder name:"
@@ -268,30 +530,24 @@ class FoldersPage(QWidget):
 
     def delete_folder(self):
         """
-        Delete the selected folder.
+        Delete the selected folders, with everything in them, after a single confirmation.
         """
         if not self.dp:
             return
 
-        selected = self.folder_list.selectedItems()
+        selected = self.selected_folders()
 
         if not selected:
             return
 
-        folder = "Document/" + selected[0].text()
+        # Folders inside another selected folder go with it.
+        folders = [f for f in selected if not any(f.startswith(other + "/") for other in selected)]
+        ids = [self.tree.folder_id(ROOT_FOLDER + "/" + folder) for folder in folders]
+        documents = sum(self.tree.total_documents[folder_id] for folder_id in ids)
+        total_bytes = sum(self.tree.total_bytes[folder_id] for folder_id in ids)
+        description = f"folder {folders[0]}" if len(folders) == 1 else f"{len(folders)} folders"
 
-        reply = QMessageBox.question(
-            self,
-            "Delete Folder",
-            f"Delete folder {selected[0].text()}?",
-            QMessageBox.Yes | QMessageBox.No,
-        )
+        if not confirm_bulk_delete(self, f"{description} with {documents} documents", total_bytes):
+            return
 
-        if reply == QMessageBox.Yes:
-            try:
-                self.dp.delete_folder(folder)
-                self.log_message("Deleted folder: " + selected[0].text())
-                self.refresh_folders()
-                self.file_list.clear()
-            except Exception as e:
-                QMessageBox.warning(self, "Error", "Failed to delete folder: " + str(e))
+        self.start_delete(folders=["Document/" + folder for folder in folders])
@@ -2,62 +2,241 @@
 Main window for QuadernoGUI.
 """
 
-from PyQt5.QtCore import Qt
-from PyQt5.QtWidgets import QListWidget, QMainWindow, QSplitter, QStackedWidget
+import importlib
 
-from quaderno_gui.gui.connect_page import ConnectPage
-from quaderno_gui.gui.files_page import FilesPage
-from quaderno_gui.gui.folders_page import FoldersPage
-from quaderno_gui.gui.zotero_sync_page import ZoteroSyncPage
+from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtGui import QKeySequence
+from PyQt5.QtWidgets import QLabel, QListWidget, QMainWindow, QShortcut, QSplitter, QStackedWidget, QWidget
+
+from quaderno_gui.core.device import ASYNC_BACKEND, THREADED_BACKEND
+from quaderno_gui.core.device_arbiter import INTERACTIVE, DeviceArbiter
+from quaderno_gui.core.diagnostics import get_diagnostics
+from quaderno_gui.core.link_control import AdaptiveConcurrency, format_link_stats
+from quaderno_gui.core.resilience import INTERACTIVE_POLICY, resilient
+from quaderno_gui.core.startup import get_startup_timer
 
 
 class MainWindow(QMainWindow):
     """
     Main window that hosts the sidebar and different pages.
+
+    Pages are constructed the first time they are shown; until then the
+    stack holds an empty placeholder widget. The Diagnostics page is only
+    listed when diagnostics are enabled or after pressing Ctrl+Shift+D.
+    The status bar shows the request limit and link statistics of the
+    active device.
     """
 
+    # (sidebar title, attribute, module, class, constructor takes the window)
+    PAGES = [
+        ("Connect", "connect_page", "quaderno_gui.gui.connect_page", "ConnectPage", True),
+        ("Files", "files_page", "quaderno_gui.gui.files_page", "FilesPage", False),
+        ("Folders", "folders_page", "quaderno_gui.gui.folders_page", "FoldersPage", False),
+        ("Zotero Sync", "zotero_sync_page", "quaderno_gui.gui.zotero_sync_page", "ZoteroSyncPage", False),
+    ]
+    DIAGNOSTICS_PAGE = ("Diagnostics", "diagnostics_page", "quaderno_gui.gui.diagnostics_page", "DiagnosticsPage", True)
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("QuadernoGUI")
         self.resize(1100, 700)
         self.digital_paper = None
+        self.devices = {}
+        self.transport_threads = {}
+        self.page_specs = list(self.PAGES)
+        self.diagnostics_page = None
+        self.stall_monitor = None
 
         splitter = QSplitter(Qt.Horizontal)
         self.sidebar = QListWidget()
         self.sidebar.setSelectionMode(QListWidget.SingleSelection)
-        self.sidebar.addItem("Connect")
-        self.sidebar.addItem("Files")
-        self.sidebar.addItem("Folders")
-        self.sidebar.addItem("Zotero Sync")
-        self.sidebar.currentRowChanged.connect(self.change_page)
         splitter.addWidget(self.sidebar)
 
         self.pages = QStackedWidget()
-        self.connect_page = ConnectPage(self)
-        self.files_page = FilesPage()
-        self.folders_page = FoldersPage()
-        self.zotero_sync_page = ZoteroSyncPage()
-        self.pages.addWidget(self.connect_page)
-        self.pages.addWidget(self.files_page)
-        self.pages.addWidget(self.folders_page)
-        self.pages.addWidget(self.zotero_sync_page)
+
+        for title, attribute, _module, _cls, _takes_window in self.page_specs:
+            self.sidebar.addItem(title)
+            setattr(self, attribute, None)
+            self.pages.addWidget(QWidget())
+
         splitter.addWidget(self.pages)
         splitter.setStretchFactor(1, 1)
 
         self.setCentralWidget(splitter)
 
+        self.sidebar.currentRowChanged.connect(self.change_page)
+        self.sidebar.setCurrentRow(0)
+
+        QShortcut(QKeySequence("Ctrl+Shift+D"), self, activated=self.show_diagnostics_page)
+
+        self.link_label = QLabel()
+        self.statusBar().addPermanentWidget(self.link_label)
+        self.link_timer = QTimer(self)
+        self.link_timer.setInterval(1000)
+        self.link_timer.timeout.connect(self.update_link_status)
+        self.link_timer.start()
+
+        if get_diagnostics().enabled:
+            self.add_diagnostics_page()
+            self.start_stall_monitor()
+
+    def ensure_page(self, index):
+        """
+        Return the page at `index`, constructing it on first use.
+        """
+        _title, attribute, module_name, class_name, takes_window = self.page_specs[index]
+        page = getattr(self, attribute)
+
+        if page is not None:
+            return page
+
+        timer = get_startup_timer()
+
+        with timer.measure("import " + module_name):
+            page_class = getattr(importlib.import_module(module_name), class_name)
+        with timer.measure("construct " + class_name):
+            page = page_class(self) if takes_window else page_class()
+
+        placeholder = self.pages.widget(index)
+        self.pages.insertWidget(index, page)
+        self.pages.removeWidget(placeholder)
+        placeholder.deleteLater()
+        setattr(self, attribute, page)
+
+        if self.digital_paper is not None:
+            self._apply_digital_paper(page, self.digital_paper)
+
+        return page
+
     def change_page(self, index):
         """
         Change the displayed page based on sidebar selection.
         """
+        if index < 0:
+            return
+
+        self.ensure_page(index)
         self.pages.setCurrentIndex(index)
 
+    def _apply_digital_paper(self, page, dp):
+        if hasattr(page, "set_devices"):
+            page.set_devices(self.devices)
+
+        if page is self.connect_page:
+            page.set_connected(dp)
+        else:
+            page.set_digital_paper(dp)
+
+    def _constructed_pages(self):
+        for _title, attribute, _module, _cls, _takes_window in self.page_specs:
+            page = getattr(self, attribute)
+
+            if page is not None:
+                yield page
+
+    def add_diagnostics_page(self):
+        """
+        List the Diagnostics page in the sidebar and return its index.
+        """
+        if self.DIAGNOSTICS_PAGE not in self.page_specs:
+            self.page_specs.append(self.DIAGNOSTICS_PAGE)
+            self.sidebar.addItem(self.DIAGNOSTICS_PAGE[0])
+            self.pages.addWidget(QWidget())
+
+        return self.page_specs.index(self.DIAGNOSTICS_PAGE)
+
+    def show_diagnostics_page(self):
+        self.sidebar.setCurrentRow(self.add_diagnostics_page())
+
+    def start_stall_monitor(self):
+        """
+        Start recording event loop stalls of the GUI thread.
+        """
+        if self.stall_monitor is None:
+            from quaderno_gui.gui.diagnostics_page import StallMonitor
+
+            self.stall_monitor = StallMonitor(self)
+
+        self.stall_monitor.start()
+
+    def stop_stall_monitor(self):
+        if self.stall_monitor is not None:
+            self.stall_monitor.stop()
+
     def set_digital_paper(self, dp):
         """
-        Update all pages with the connected DigitalPaper instance.
+        Update all constructed pages with the active DigitalPaper instance.
+
+        Pages that have not been shown yet receive it when they are built.
         """
         self.digital_paper = dp
-        self.connect_page.set_connected(dp)
-        self.files_page.set_digital_paper(dp)
-        self.folders_page.set_digital_paper(dp)
-        self.zotero_sync_page.set_digital_paper(dp)
+
+        for page in self._constructed_pages():
+            self._apply_digital_paper(page, dp)
+
+        self.update_link_status()
+
+    def add_device(self, name, dp, backend=THREADED_BACKEND):
+        """
+        Register a connected device under `name` and make it the active one.
+
+        The session is owned by a `DeviceArbiter`. The pages get an
+        interactive view of it with short retries, so browsing goes ahead of
+        a running sync and a flaky connection does not freeze the window;
+        syncs derive a bulk view sharing the same circuit breaker. The number
+        of requests in flight adapts to the link (`AdaptiveConcurrency`).
+        With the asyncio backend, the requests go through an `AsyncTransport`
+        whose event loop runs on a thread of its own.
+        """
+        self._stop_transport(name)
+        controller = AdaptiveConcurrency()
+
+        if backend == ASYNC_BACKEND:
+            from quaderno_gui.core.async_transport import AsyncTransport
+            from quaderno_gui.core.connection import TransportThread
+
+            dp = AsyncTransport(dp, connections=controller.max_limit)
+            thread = TransportThread(dp, parent=self)
+            thread.start()
+            self.transport_threads[name] = thread
+
+        dp = resilient(DeviceArbiter(dp, controller=controller).session(INTERACTIVE), INTERACTIVE_POLICY)
+        self.devices[name] = dp
+        self.set_digital_paper(dp)
+
+    def update_link_status(self):
+        """
+        Show the request limit and link statistics of the active device in the status bar.
+        """
+        arbiter = getattr(self.digital_paper, "arbiter", None)
+        stats = arbiter.link_stats() if arbiter is not None else None
+        self.link_label.setText("Link: " + format_link_stats(stats) if stats else "")
+
+    def _stop_transport(self, name):
+        thread = self.transport_threads.pop(name, None)
+
+        if thread is not None:
+            thread.stop()
+
+    def remove_device(self, name):
+        """
+        Forget a connected device; another device becomes active if one is left.
+        """
+        dp = self.devices.pop(name, None)
+
+        if dp is not None and dp is self.digital_paper:
+            self.set_digital_paper(next(iter(self.devices.values()), None))
+        else:
+            for page in self._constructed_pages():
+                if hasattr(page, "set_devices"):
+                    page.set_devices(self.devices)
+
+            self.connect_page.set_connected(self.digital_paper)
+
+        self._stop_transport(name)
+
+    def closeEvent(self, event):
+        for name in list(self.transport_threads):
+            self._stop_transport(name)
+
+        super().closeEvent(event)
@@ -3,9 +3,12 @@ Upload area widget for drag-and-drop PDF uploads.
 """
 
 import os
-from PyQt5.QtWidgets import QTextEdit, QMessageBox
+from PyQt5.QtWidgets import QTextEdit, QMessageBox, QProgressDialog
 from PyQt5.QtCore import Qt
 
+from quaderno_gui.core.scheduler import format_size
+from quaderno_gui.core.sync import UploadWorker
+
 
 class UploadArea(QTextEdit):
     """
@@ -16,6 +19,10 @@ class UploadArea(QTextEdit):
         super().__init__()
         self.parent_page = parent_page
         self.target = target
+        self.worker = None
+        self.progress_dialog = None
+        self.target_folder = None
+        self.upload_count = (0, 0)
         self.setAcceptDrops(True)
         self.setReadOnly(True)
         self.setText("Drop PDF files here to upload")
@@ -56,54 +63,115 @@ class UploadArea(QTextEdit):
             return
 
         if self.target == "folder":
-            selected_items = self.parent_page.folder_list.selectedItems()
+            selected_folder = self.parent_page.selected_folder()
 
-            if not selected_items:
+            if selected_folder is None:
                 QMessageBox.warning(self, "Error", "Please select a folder first.")
                 return
 
-            target_folder = "Document/" + selected_items[0].text()
+            target_folder = "Document/" + selected_folder
         else:
             target_folder = "Document"
-        for url in event.mimeData().urls():
-            local_file = url.toLocalFile()
-
-            if os.path.isfile(local_file):
-                if not local_file.lower().endswith(".pdf"):
-                    QMessageBox.warning(self, "Error", "Only PDF files are allowed.")
-                    continue
-
-                remote_path = target_folder + "/" + os.path.basename(local_file)
-
-                try:
-                    if self.parent_page.dp.path_exists(remote_path):
-                        reply = QMessageBox.question(
-                            self,
-                            "Duplicate",
-                            f"{remote_path} already exists. Overwrite?",
-                            QMessageBox.Yes | QMessageBox.No,
-                        )
-
-                        if reply != QMessageBox.Yes:
-                            continue
-
-                except Exception:
-                    pass
-                try:
-                    self.parent_page.dp.upload_file(local_file, remote_path)
-                    QMessageBox.information(
+
+        local_files = [url.toLocalFile() for url in event.mimeData().urls()]
+        self.upload_files(local_files, target_folder)
+
+    def upload_files(self, local_files, target_folder):
+        """
+        Upload dropped files in the background, showing the progress of each file.
+        """
+        if self.worker is not None:
+            QMessageBox.warning(self, "Upload", "Please wait for the running upload to finish.")
+            return
+
+        uploads = []
+
+        for local_file in local_files:
+            if not os.path.isfile(local_file):
+                continue
+
+            if not local_file.lower().endswith(".pdf"):
+                QMessageBox.warning(self, "Error", "Only PDF files are allowed.")
+                continue
+
+            remote_path = target_folder + "/" + os.path.basename(local_file)
+
+            try:
+                if self.parent_page.dp.path_exists(remote_path):
+                    reply = QMessageBox.question(
                         self,
-                        "Upload",
-                        f"{os.path.basename(local_file)} uploaded as {remote_path}.",
+                        "Duplicate",
+                        f"{remote_path} already exists. Overwrite?",
+                        QMessageBox.Yes | QMessageBox.No,
                     )
 
-                    if self.target == "folder":
-                        folder = self.parent_page.folder_list.selectedItems()[0].text()
-                        self.parent_page.refresh_files_in_folder(folder)
-                    else:
-                        self.parent_page.refresh_files()
+                    if reply != QMessageBox.Yes:
+                        continue
 
-                except Exception as e:
-                    QMessageBox.warning(
-                        self, "Error", f"Failed to upload {local_file}: " + str(e)
-                    )
+            except Exception:
+                pass
+
+            uploads.append((local_file, remote_path))
+
+        if not uploads:
+            return
+
+        self.target_folder = target_folder
+        self.progress_dialog = QProgressDialog("Uploading...", "Cancel", 0, 0, self)
+        self.progress_dialog.setWindowTitle("Upload")
+        self.progress_dialog.setMinimumDuration(0)
+        self.progress_dialog.setAutoClose(False)
+        self.progress_dialog.setAutoReset(False)
+
+        self.worker = UploadWorker(self.parent_page.dp, uploads, parent=self)
+        self.worker.log_signal.connect(self.parent_page.log.append)
+        self.worker.progress_signal.connect(self.upload_progress)
+        self.worker.file_progress_signal.connect(self.file_progress)
+        self.worker.finished_signal.connect(self.upload_finished)
+        self.progress_dialog.canceled.connect(self.worker.cancel)
+        self.worker.start()
+
+    def upload_progress(self, done, total):
+        self.upload_count = (done, total)
+
+    def file_progress(self, remote_path, sent, size):
+        """
+        Show how far the file being uploaded is.
+        """
+        if self.progress_dialog is None:
+            return
+
+        done, total = self.upload_count
+        self.progress_dialog.setLabelText(
+            f"Uploading {os.path.basename(remote_path)} ({done + 1}/{total}): "
+            f"{format_size(sent)} of {format_size(size)}"
+        )
+        self.progress_dialog.setMaximum(max(size, 1))
+        self.progress_dialog.setValue(min(sent, size))
+
+    def upload_finished(self, summary):
+        """
+        Report the uploaded files and refresh the listing once.
+        """
+        self.worker = None
+        self.progress_dialog.close()
+        self.progress_dialog = None
+
+        if summary["uploaded"]:
+            if self.target == "folder":
+                self.parent_page.reload_folder(self.target_folder[len("Document/") :])
+            else:
+                self.parent_page.refresh_files()
+
+        if summary["errors"]:
+            QMessageBox.warning(
+                self,
+                "Error",
+                "\n".join(f"Failed to upload {path}: {error}" for path, error in summary["errors"]),
+            )
+        elif summary["uploaded"]:
+            QMessageBox.information(
+                self,
+                "Upload",
+                f"{len(summary['uploaded'])} file(s) uploaded to {self.target_folder}.",
+            )
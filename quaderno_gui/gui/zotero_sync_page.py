@@ -2,20 +2,34 @@
 Zotero sync page UI for QuadernoGUI.
 """
 
-from PyQt5.QtCore import QSettings
+import json
+
+from PyQt5.QtCore import QSettings, QTimer
 from PyQt5.QtWidgets import (
+    QCheckBox,
+    QComboBox,
     QHBoxLayout,
     QFileDialog,
+    QFormLayout,
+    QGroupBox,
     QLabel,
     QLineEdit,
     QMessageBox,
+    QProgressBar,
     QPushButton,
+    QSpinBox,
+    QTableWidget,
+    QTableWidgetItem,
     QTextEdit,
     QVBoxLayout,
     QWidget,
 )
 
-from quaderno_gui.core.sync import SyncWorker
+from quaderno_gui.core.fingerprint import FingerprintService
+from quaderno_gui.core.pdf_optimize import DEFAULT_CACHE_BYTES, PdfOptimizer, optimization_available
+from quaderno_gui.core.plan_report import write_plan
+from quaderno_gui.core.scheduler import DEFAULT_POLICY, POLICIES, format_duration, format_size
+from quaderno_gui.core.sync import MultiSyncWorker, ReverseSyncWorker, SyncWorker, WatchWorker
 from quaderno_gui.core.zotero import resolve_zotero_paths
 
 
@@ -27,12 +41,13 @@ class ZoteroSyncPage(QWidget):
     def __init__(self):
         super().__init__()
         self.dp = None
+        self.devices = {}
+        self.sync_targets = []
         self.worker = None
+        self.watch_worker = None
+        self.plan = None
         self.settings = QSettings('QuadernoGUI', 'ZoteroSync')
 
-        default_storage, default_db = resolve_zotero_paths()
-        default_storage = str(default_storage)
-        default_db = str(default_db)
         saved_storage = self.settings.value('storage_path', '', type=str)
         saved_db = self.settings.value('db_path', '', type=str)
 
@@ -41,7 +56,6 @@ class ZoteroSyncPage(QWidget):
         layout.addWidget(QLabel("Zotero storage folder:"))
         storage_row = QHBoxLayout()
         self.storage_path_edit = QLineEdit(saved_storage)
-        self.storage_path_edit.setPlaceholderText(default_storage)
         storage_row.addWidget(self.storage_path_edit)
         storage_browse = QPushButton("Browse...")
         storage_browse.clicked.connect(self.browse_storage_path)
@@ -51,13 +65,110 @@ class ZoteroSyncPage(QWidget):
         layout.addWidget(QLabel("Zotero database file:"))
         db_row = QHBoxLayout()
         self.db_path_edit = QLineEdit(saved_db)
-        self.db_path_edit.setPlaceholderText(default_db)
         db_row.addWidget(self.db_path_edit)
         db_browse = QPushButton("Browse...")
         db_browse.clicked.connect(self.browse_db_path)
         db_row.addWidget(db_browse)
         layout.addLayout(db_row)
 
+        order_row = QHBoxLayout()
+        order_row.addWidget(QLabel("Upload order:"))
+        self.order_combo = QComboBox()
+        for policy, label in POLICIES.items():
+            self.order_combo.addItem(label, policy)
+        saved_order = self.settings.value('upload_order', DEFAULT_POLICY, type=str)
+        self.order_combo.setCurrentIndex(max(0, self.order_combo.findData(saved_order)))
+        order_row.addWidget(self.order_combo)
+        order_row.addWidget(QLabel("Bandwidth limit:"))
+        self.bandwidth_spin = QSpinBox()
+        self.bandwidth_spin.setRange(0, 1000000)
+        self.bandwidth_spin.setSuffix(" KiB/s")
+        self.bandwidth_spin.setSpecialValueText("Unlimited")
+        self.bandwidth_spin.setValue(self.settings.value('bandwidth_limit', 0, type=int))
+        order_row.addWidget(self.bandwidth_spin)
+        layout.addLayout(order_row)
+
+        self.stream_check = QCheckBox("Start uploading while Zotero is read (uploads in database order)")
+        self.stream_check.setChecked(self.settings.value('stream', False, type=bool))
+        layout.addWidget(self.stream_check)
+
+        self.hash_check = QCheckBox("Detect PDFs replaced in Zotero by their content (hashes are cached)")
+        self.hash_check.setChecked(self.settings.value('content_hashes', False, type=bool))
+        layout.addWidget(self.hash_check)
+
+        self.crawl_check = QCheckBox("List only the Zotero folder on the device, folder by folder (large devices)")
+        self.crawl_check.setChecked(self.settings.value('crawl', False, type=bool))
+        layout.addWidget(self.crawl_check)
+
+        layout.addWidget(QLabel("Priority collections (comma-separated, for 'Chosen collections first'):"))
+        self.priority_edit = QLineEdit(self.settings.value('priority_collections', '', type=str))
+        self.priority_edit.setPlaceholderText("e.g., Physics/Quantum, Reading list")
+        layout.addWidget(self.priority_edit)
+
+        filters_box = QGroupBox("Selective sync (comma-separated; empty means all)")
+        filters_form = QFormLayout(filters_box)
+        self.include_collections_edit = QLineEdit(self.settings.value('filters/include_collections', '', type=str))
+        filters_form.addRow("Include collections:", self.include_collections_edit)
+        self.exclude_collections_edit = QLineEdit(self.settings.value('filters/exclude_collections', '', type=str))
+        filters_form.addRow("Exclude collections:", self.exclude_collections_edit)
+        self.include_tags_edit = QLineEdit(self.settings.value('filters/include_tags', '', type=str))
+        filters_form.addRow("Include tags:", self.include_tags_edit)
+        self.exclude_tags_edit = QLineEdit(self.settings.value('filters/exclude_tags', '', type=str))
+        filters_form.addRow("Exclude tags:", self.exclude_tags_edit)
+        self.max_size_spin = QSpinBox()
+        self.max_size_spin.setRange(0, 100000)
+        self.max_size_spin.setSuffix(" MiB")
+        self.max_size_spin.setSpecialValueText("No limit")
+        self.max_size_spin.setValue(self.settings.value('filters/max_size_mib', 0, type=int))
+        filters_form.addRow("Maximum file size:", self.max_size_spin)
+        self.modified_days_spin = QSpinBox()
+        self.modified_days_spin.setRange(0, 36500)
+        self.modified_days_spin.setSuffix(" days")
+        self.modified_days_spin.setSpecialValueText("Any time")
+        self.modified_days_spin.setValue(self.settings.value('filters/modified_days', 0, type=int))
+        filters_form.addRow("Modified within:", self.modified_days_spin)
+        self.fit_storage_check = QCheckBox("Only upload what fits into the device's free space")
+        self.fit_storage_check.setChecked(self.settings.value('filters/fit_to_storage', False, type=bool))
+        filters_form.addRow(self.fit_storage_check)
+        layout.addWidget(filters_box)
+
+        optimize_row = QHBoxLayout()
+        self.optimize_check = QCheckBox("Optimize PDFs for the device before upload")
+        self.optimize_check.setChecked(self.settings.value('optimize/enabled', False, type=bool))
+        optimize_row.addWidget(self.optimize_check)
+        self.grayscale_check = QCheckBox("Grayscale images")
+        self.grayscale_check.setChecked(self.settings.value('optimize/grayscale', False, type=bool))
+        optimize_row.addWidget(self.grayscale_check)
+        optimize_row.addWidget(QLabel("Cache size:"))
+        self.optimize_cache_spin = QSpinBox()
+        self.optimize_cache_spin.setRange(64, 1000000)
+        self.optimize_cache_spin.setSuffix(" MiB")
+        self.optimize_cache_spin.setValue(
+            self.settings.value('optimize/cache_mib', DEFAULT_CACHE_BYTES // (1024 * 1024), type=int)
+        )
+        optimize_row.addWidget(self.optimize_cache_spin)
+        layout.addLayout(optimize_row)
+
+        layout.addWidget(QLabel("Folder for pulled documents (empty: next to the matching Zotero attachments):"))
+        pull_row = QHBoxLayout()
+        self.pull_folder_edit = QLineEdit(self.settings.value('pull_folder', '', type=str))
+        pull_row.addWidget(self.pull_folder_edit)
+        pull_browse = QPushButton("Browse...")
+        pull_browse.clicked.connect(self.browse_pull_folder)
+        pull_row.addWidget(pull_browse)
+        layout.addLayout(pull_row)
+        self.replace_attachments_check = QCheckBox("Replace the Zotero attachments with pulled documents (keeps .orig)")
+        self.replace_attachments_check.setChecked(self.settings.value('pull_replace', False, type=bool))
+        layout.addWidget(self.replace_attachments_check)
+
+        self.multi_check = QCheckBox("Sync all connected devices")
+        self.multi_check.setEnabled(False)
+        layout.addWidget(self.multi_check)
+
+        self.watch_check = QCheckBox("Watch Zotero and sync changes automatically")
+        self.watch_check.toggled.connect(self.toggle_watch)
+        layout.addWidget(self.watch_check)
+
         btn_layout = QHBoxLayout()
         self.simulate_button = QPushButton("Simulate Sync")
         self.simulate_button.clicked.connect(lambda: self.start_sync(simulate=True))
@@ -65,25 +176,136 @@ class ZoteroSyncPage(QWidget):
         self.sync_button = QPushButton("Perform Sync")
         self.sync_button.clicked.connect(lambda: self.start_sync(simulate=False))
         btn_layout.addWidget(self.sync_button)
+        self.pull_button = QPushButton("Pull Annotated PDFs")
+        self.pull_button.clicked.connect(self.start_pull)
+        btn_layout.addWidget(self.pull_button)
+        self.pause_button = QPushButton("Pause")
+        self.pause_button.setEnabled(False)
+        self.pause_button.clicked.connect(self.toggle_pause)
+        btn_layout.addWidget(self.pause_button)
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.setEnabled(False)
+        self.cancel_button.clicked.connect(self.cancel_sync)
+        btn_layout.addWidget(self.cancel_button)
         layout.addLayout(btn_layout)
 
+        progress_row = QHBoxLayout()
+        self.progress_bar = QProgressBar()
+        progress_row.addWidget(self.progress_bar)
+        self.eta_label = QLabel("")
+        progress_row.addWidget(self.eta_label)
+        self.file_label = QLabel("")
+        progress_row.addWidget(self.file_label)
+        layout.addLayout(progress_row)
+
+        self.device_table = QTableWidget(0, 3)
+        self.device_table.setHorizontalHeaderLabels(["Device", "Progress", "Throughput"])
+        self.device_table.horizontalHeader().setStretchLastSection(True)
+        self.device_table.setMaximumHeight(120)
+        self.device_table.hide()
+        layout.addWidget(self.device_table)
+
+        self.plan_box = QGroupBox("Simulated plan")
+        plan_layout = QVBoxLayout(self.plan_box)
+        self.plan_table = QTableWidget(0, 3)
+        self.plan_table.setHorizontalHeaderLabels(["Operation / collection", "Count", "Size"])
+        self.plan_table.horizontalHeader().setStretchLastSection(True)
+        self.plan_table.setMaximumHeight(180)
+        plan_layout.addWidget(self.plan_table)
+        plan_row = QHBoxLayout()
+        self.plan_label = QLabel("")
+        plan_row.addWidget(self.plan_label)
+        self.export_plan_button = QPushButton("Export Plan...")
+        self.export_plan_button.clicked.connect(self.export_plan)
+        plan_row.addWidget(self.export_plan_button)
+        plan_layout.addLayout(plan_row)
+        self.plan_box.hide()
+        layout.addWidget(self.plan_box)
+
         self.log = QTextEdit()
         self.log.setReadOnly(True)
         layout.addWidget(QLabel("Zotero Sync Log:"))
         layout.addWidget(self.log)
 
+        # Probing the default paths touches the home directory, which may be
+        # slow on network mounts; do it once the event loop is idle.
+        QTimer.singleShot(0, self.probe_default_paths)
+
+    def probe_default_paths(self):
+        """
+        Resolve the default Zotero paths and show them as placeholders.
+        """
+        default_storage, default_db = resolve_zotero_paths()
+        self.storage_path_edit.setPlaceholderText(str(default_storage))
+        self.db_path_edit.setPlaceholderText(str(default_db))
+
+        if not optimization_available():
+            self.optimize_check.setChecked(False)
+            self.optimize_check.setEnabled(False)
+            self.optimize_check.setToolTip("Install pikepdf and Pillow to enable PDF optimization.")
+
     def set_digital_paper(self, dp):
         """
-        Set the DigitalPaper instance.
+        Set the DigitalPaper instance; watching stops when the device changes.
         """
+        if dp is not self.dp:
+            self.stop_watch()
+
         self.dp = dp
 
+    def set_devices(self, devices):
+        """
+        Set all connected devices, keyed by name.
+        """
+        self.devices = devices
+        self.multi_check.setEnabled(len(devices) > 1)
+        self.multi_check.setText(f"Sync all connected devices ({len(devices)})")
+
+    def device_name(self, dp):
+        for name, device in self.devices.items():
+            if device is dp:
+                return name
+
+        return "default"
+
     def log_message(self, message):
         """
         Append a message to the sync log.
         """
         self.log.append(message)
 
+    def sync_options(self):
+        """
+        Read the sync settings from the form, remember them and return the engine options.
+        """
+        storage_path = self.storage_path_edit.text().strip() or None
+        db_path = self.db_path_edit.text().strip() or None
+        self.settings.setValue('storage_path', self.storage_path_edit.text().strip())
+        self.settings.setValue('db_path', self.db_path_edit.text().strip())
+        order = self.order_combo.currentData()
+        bandwidth_kib = self.bandwidth_spin.value()
+        priority_text = self.priority_edit.text().strip()
+        self.settings.setValue('upload_order', order)
+        self.settings.setValue('bandwidth_limit', bandwidth_kib)
+        self.settings.setValue('priority_collections', priority_text)
+        self.settings.setValue('stream', self.stream_check.isChecked())
+        self.settings.setValue('content_hashes', self.hash_check.isChecked())
+        self.settings.setValue('crawl', self.crawl_check.isChecked())
+        priority_collections = [c.strip() for c in priority_text.split(",") if c.strip()]
+        return dict(
+            storage_path=storage_path,
+            db_path=db_path,
+            order=order,
+            priority_collections=priority_collections,
+            bandwidth_limit=bandwidth_kib * 1024 or None,
+            filters=self.selected_filters(),
+            fit_to_storage=self.fit_storage_check.isChecked(),
+            optimizer=self.selected_optimizer(),
+            stream=self.stream_check.isChecked(),
+            fingerprints=FingerprintService() if self.hash_check.isChecked() else None,
+            crawl=self.crawl_check.isChecked(),
+        )
+
     def start_sync(self, simulate=False):
         """
         Start the sync process, either in simulation or live mode.
@@ -93,28 +315,408 @@ class ZoteroSyncPage(QWidget):
             return
 
         self.log.clear()
+        self.plan_box.hide()
         remote_base = "Document/Zotero"
-        storage_path = self.storage_path_edit.text().strip() or None
-        db_path = self.db_path_edit.text().strip() or None
-        self.settings.setValue('storage_path', self.storage_path_edit.text().strip())
-        self.settings.setValue('db_path', self.db_path_edit.text().strip())
-        self.worker = SyncWorker(self.dp, simulate, remote_base, storage_path=storage_path, db_path=db_path)
+        options = self.sync_options()
+
+        if self.multi_check.isChecked() and len(self.devices) > 1:
+            self.sync_targets = list(self.devices)
+            checkpoints = {} if simulate else {name: self.load_checkpoint(name) for name in self.sync_targets}
+            self.worker = MultiSyncWorker(self.devices, simulate, remote_base, checkpoints=checkpoints, **options)
+            self.worker.progress_signal.connect(self.update_device_progress)
+            self.worker.finished_signal.connect(self.multi_sync_finished)
+            self.reset_device_table()
+        else:
+            self.sync_targets = [self.device_name(self.dp)]
+            checkpoint = None if simulate else self.load_checkpoint(self.sync_targets[0])
+            self.worker = SyncWorker(
+                self.dp, simulate, remote_base, checkpoint=checkpoint, device_name=self.sync_targets[0], **options
+            )
+            self.worker.progress_signal.connect(self.update_progress)
+            self.worker.file_progress_signal.connect(self.update_file_progress)
+            self.worker.finished_signal.connect(self.sync_finished)
+            self.device_table.hide()
+
         self.worker.log_signal.connect(self.log_message)
-        self.worker.finished_signal.connect(self.sync_finished)
+        self.set_running(True)
         self.worker.start()
 
-    def sync_finished(self, checkpoint):
+    def start_watch(self):
+        """
+        Start syncing Zotero changes automatically with the current settings.
+        """
+        self.watch_worker = WatchWorker(
+            self.dp, "Document/Zotero", device_name=self.device_name(self.dp), parent=self, **self.sync_options()
+        )
+        self.watch_worker.log_signal.connect(self.log_message)
+        self.watch_worker.synced_signal.connect(self.watch_synced)
+        self.watch_worker.finished.connect(self.watch_finished)
+
+        if self.worker is not None and self.worker.isRunning():
+            self.watch_worker.pause()
+
+        self.watch_worker.start()
+
+    def stop_watch(self):
+        if self.watch_worker is not None:
+            self.watch_worker.cancel()
+
+    def toggle_watch(self, checked):
+        """
+        Start or stop watch mode; a watcher that is still stopping is restarted when it has finished.
+        """
+        if not checked:
+            self.stop_watch()
+            return
+
+        if not self.dp:
+            QMessageBox.warning(self, "Error", "Device not connected")
+            self.watch_check.setChecked(False)
+            return
+
+        if self.watch_worker is None:
+            self.start_watch()
+
+    def watch_synced(self, summary):
+        """
+        Report a sync started by the watcher.
+        """
+        counts = ", ".join(f"{count} {op}" for op, count in sorted(summary['counts'].items())) or "nothing to do"
+        errors = len(summary['errors'])
+        self.log_message(f"Automatic sync finished: {counts}" + (f", {errors} errors." if errors else "."))
+
+    def watch_finished(self):
+        cancelled = self.watch_worker.control.cancelled
+        self.watch_worker = None
+
+        if not cancelled or not self.dp:
+            # The watcher stopped on its own (e.g. Zotero was not found) or the device is gone.
+            self.watch_check.blockSignals(True)
+            self.watch_check.setChecked(False)
+            self.watch_check.blockSignals(False)
+        elif self.watch_check.isChecked():
+            self.start_watch()
+
+    def start_pull(self):
+        """
+        Pull documents that changed on the device back into Zotero.
+        """
+        if not self.dp:
+            QMessageBox.warning(self, "Error", "Device not connected")
+            return
+
+        self.log.clear()
+        storage_path = self.storage_path_edit.text().strip()
+        db_path = self.db_path_edit.text().strip()
+        pull_folder = self.pull_folder_edit.text().strip()
+        self.settings.setValue('storage_path', storage_path)
+        self.settings.setValue('db_path', db_path)
+        self.settings.setValue('pull_folder', pull_folder)
+        self.settings.setValue('pull_replace', self.replace_attachments_check.isChecked())
+
+        self.worker = ReverseSyncWorker(
+            self.dp,
+            "Document/Zotero",
+            device_name=self.device_name(self.dp),
+            storage_path=storage_path or None,
+            db_path=db_path or None,
+            target_dir=pull_folder or None,
+            replace_attachments=self.replace_attachments_check.isChecked(),
+        )
+        self.worker.log_signal.connect(self.log_message)
+        self.worker.progress_signal.connect(self.update_progress)
+        self.worker.finished_signal.connect(self.pull_finished)
+        self.device_table.hide()
+        self.set_running(True)
+        self.worker.start()
+
+    def selected_filters(self):
+        """
+        Read the selective sync rules from the form and remember them.
+        """
+        edits = {
+            'include_collections': self.include_collections_edit,
+            'exclude_collections': self.exclude_collections_edit,
+            'include_tags': self.include_tags_edit,
+            'exclude_tags': self.exclude_tags_edit,
+        }
+        filters = {}
+
+        for key, edit in edits.items():
+            text = edit.text().strip()
+            self.settings.setValue('filters/' + key, text)
+            filters[key] = [name.strip() for name in text.split(",") if name.strip()]
+
+        self.settings.setValue('filters/max_size_mib', self.max_size_spin.value())
+        self.settings.setValue('filters/modified_days', self.modified_days_spin.value())
+        self.settings.setValue('filters/fit_to_storage', self.fit_storage_check.isChecked())
+        filters['max_size'] = self.max_size_spin.value() * 1024 * 1024
+        filters['modified_days'] = self.modified_days_spin.value()
+
+        return filters
+
+    def selected_optimizer(self):
+        """
+        Return a PdfOptimizer for the chosen settings, or None if optimization is off.
+        """
+        self.settings.setValue('optimize/enabled', self.optimize_check.isChecked())
+        self.settings.setValue('optimize/grayscale', self.grayscale_check.isChecked())
+        self.settings.setValue('optimize/cache_mib', self.optimize_cache_spin.value())
+
+        if not self.optimize_check.isChecked() or not self.optimize_check.isEnabled():
+            return None
+
+        return PdfOptimizer(
+            max_cache_bytes=self.optimize_cache_spin.value() * 1024 * 1024,
+            settings={'grayscale': self.grayscale_check.isChecked()},
+        )
+
+    def reset_device_table(self):
+        """
+        Show one row per device taking part in a multi-device sync.
+        """
+        self.device_table.setRowCount(len(self.sync_targets))
+
+        for row, name in enumerate(self.sync_targets):
+            self.device_table.setItem(row, 0, QTableWidgetItem(name))
+            self.device_table.setItem(row, 1, QTableWidgetItem("Waiting"))
+            self.device_table.setItem(row, 2, QTableWidgetItem(""))
+
+        self.device_table.show()
+
+    def update_device_progress(self, name, done, total, stats):
+        """
+        Update the per-device progress row of a multi-device sync.
+        """
+        if name not in self.sync_targets:
+            return
+
+        row = self.sync_targets.index(name)
+        self.device_table.item(row, 1).setText(f"{done} / {total}")
+
+        if stats.get('rate'):
+            rate_kib = stats['rate'] / 1024
+            self.device_table.item(row, 2).setText(
+                f"{rate_kib:.0f} KiB/s, ETA {format_duration(stats.get('eta'))}"
+            )
+
+    def update_progress(self, done, total, stats):
+        """
+        Show operation progress and the ETA from measured throughput.
+        """
+        self.progress_bar.setMaximum(max(total, 1))
+        self.progress_bar.setValue(done)
+
+        if stats.get('rate'):
+            rate_kib = stats['rate'] / 1024
+            self.eta_label.setText(f"{rate_kib:.0f} KiB/s, ETA {format_duration(stats.get('eta'))}")
+
+    def update_file_progress(self, remote_path, sent, size):
+        """
+        Show how far the file being uploaded is.
+        """
+        name = remote_path.rsplit("/", 1)[-1]
+        self.file_label.setText(f"{name}: {sent * 100 // max(size, 1)}%" if sent < size else "")
+
+    def set_running(self, running):
+        """
+        Enable the controls that match whether a sync is in progress.
         """
-        Callback after sync is complete.
+        self.simulate_button.setEnabled(not running)
+        self.sync_button.setEnabled(not running)
+        self.pull_button.setEnabled(not running)
+        self.pause_button.setEnabled(running)
+        self.cancel_button.setEnabled(running)
+        self.pause_button.setText("Pause")
+
+        # The watcher waits while a manual sync or pull runs.
+        if self.watch_worker is not None:
+            if running:
+                self.watch_worker.pause()
+            else:
+                self.watch_worker.resume()
+
+        self.file_label.setText("")
+
+        if running:
+            self.progress_bar.setValue(0)
+            self.eta_label.setText("")
+
+    def toggle_pause(self):
+        """
+        Pause or resume the running sync between operations.
+        """
+        if not self.worker:
+            return
+
+        if self.worker.control.paused:
+            self.worker.resume()
+            self.pause_button.setText("Pause")
+            self.log_message("Sync resumed.")
+        else:
+            self.worker.pause()
+            self.pause_button.setText("Resume")
+            self.log_message("Sync paused after the current operation.")
+
+    def cancel_sync(self):
         """
+        Ask the running sync to stop after the current operation.
+        """
+        if not self.worker:
+            return
+
+        self.worker.cancel()
+        self.cancel_button.setEnabled(False)
+        self.pause_button.setEnabled(False)
+        self.log_message("Cancelling sync after the current operation...")
+
+    def load_checkpoint(self, name):
+        """
+        Return the checkpoint or simulated plan saved by the last sync of a device, or None.
+        """
+        raw = self.settings.value('checkpoint/' + name, '', type=str)
+
+        if not raw:
+            return None
+
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return None
+
+    def save_checkpoint(self, name, checkpoint):
+        self.settings.setValue('checkpoint/' + name, json.dumps(checkpoint) if checkpoint else '')
+
+    def keep_checkpoint(self, name, summary):
+        """
+        Save what the next sync of a device can start from: the checkpoint of
+        a cancelled live run, or the plan of a completed simulation.
+        """
+        if summary.get('aborted'):
+            return
+
+        if not summary.get('simulate'):
+            self.save_checkpoint(name, summary.get('checkpoint'))
+        elif summary.get('applicable_plan'):
+            self.save_checkpoint(name, summary['applicable_plan'])
+
+    def sync_finished(self, summary):
+        """
+        Callback after sync is complete; keeps the checkpoint or simulated plan for the next run.
+        """
+        self.keep_checkpoint(self.sync_targets[0], summary)
+
+        self.set_running(False)
+        if summary.get('plan'):
+            self.show_plan(summary['plan'])
+
+        if summary.get('bytes_saved'):
+            self.log_message("PDF optimization saved " + format_size(summary['bytes_saved']) + ".")
+
         self.log_message("Sync operation finished.")
 
+    def pull_finished(self, summary):
+        """
+        Callback after pulling annotated documents from the device.
+        """
+        self.set_running(False)
+
+        if summary.get('unmatched'):
+            self.log_message(
+                f"{len(summary['unmatched'])} changed documents have no Zotero attachment; "
+                "choose a folder for pulled documents to save them."
+            )
+
+        self.log_message("Pull finished.")
+
+    def multi_sync_finished(self, result):
+        """
+        Callback after a multi-device sync; reports and keeps per-device results.
+        """
+        for row, name in enumerate(self.sync_targets):
+            summary = result.get('devices', {}).get(name)
+
+            if summary is None:
+                continue
+
+            self.keep_checkpoint(name, summary)
+
+            if summary.get('aborted'):
+                status = "Failed"
+            elif summary.get('cancelled'):
+                status = "Cancelled"
+            else:
+                status = f"Done, {len(summary.get('errors', []))} errors"
+
+            self.device_table.item(row, 1).setText(status)
+
+        plans = [
+            summary['plan'] for summary in result.get('devices', {}).values() if summary.get('plan')
+        ]
+        if plans:
+            # The table shows the first device; every device's plan is in the log.
+            self.show_plan(plans[0])
+
+        self.set_running(False)
+        self.log_message("Sync operation finished.")
+
+    def show_plan(self, plan):
+        """
+        Fill the plan table with totals per operation type and per collection.
+        """
+        self.plan = plan
+        totals = plan['totals']
+        rows = [(op, entry) for op, entry in sorted(totals['by_op'].items())]
+        rows += [
+            ("  " + (collection or "(sync folder)"), entry)
+            for collection, entry in sorted(totals['by_collection'].items())
+        ]
+        self.plan_table.setRowCount(len(rows))
+
+        for row, (label, entry) in enumerate(rows):
+            self.plan_table.setItem(row, 0, QTableWidgetItem(label))
+            self.plan_table.setItem(row, 1, QTableWidgetItem(str(entry['count'])))
+            self.plan_table.setItem(row, 2, QTableWidgetItem(format_size(entry['bytes'])))
+
+        seconds = plan['estimate']['seconds']
+        estimate = format_duration(seconds) if seconds is not None else "unknown until a real sync has run"
+        self.plan_label.setText(
+            f"{totals['operations']} operations, {format_size(totals['bytes'])} to upload, "
+            f"estimated time {estimate}"
+        )
+        self.plan_box.show()
+
+    def export_plan(self):
+        """
+        Save the last simulated plan as JSON or CSV.
+        """
+        if not self.plan:
+            return
+
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Export Sync Plan", "sync-plan.json", "JSON (*.json);;CSV (*.csv)"
+        )
+        if not path:
+            return
+
+        try:
+            write_plan(self.plan, path)
+            self.log_message("Plan exported to " + path)
+        except OSError as e:
+            QMessageBox.warning(self, "Error", "Failed to export plan: " + str(e))
+
     def browse_storage_path(self):
         current = self.storage_path_edit.text().strip() or self.storage_path_edit.placeholderText()
         directory = QFileDialog.getExistingDirectory(self, "Select Zotero Storage Folder", current)
         if directory:
             self.storage_path_edit.setText(directory)
 
+    def browse_pull_folder(self):
+        directory = QFileDialog.getExistingDirectory(self, "Select Folder for Pulled Documents",
+                                                     self.pull_folder_edit.text().strip())
+        if directory:
+            self.pull_folder_edit.setText(directory)
+
     def browse_db_path(self):
         current = self.db_path_edit.text().strip() or self.db_path_edit.placeholderText()
         db_file, _ = QFileDialog.getOpenFileName(
@@ -4,14 +4,41 @@ Entry point for the QuadernoGUI application.
 """
 
 import sys
-from PyQt5.QtWidgets import QApplication
-from quaderno_gui.gui.main_window import MainWindow
+
+from quaderno_gui.core.diagnostics import enable_diagnostics
+from quaderno_gui.core.startup import enable_startup_timing
+
 
 def main():
-    app = QApplication(sys.argv)
-    window = MainWindow()
-    window.show()
-    sys.exit(app.exec_())
+    timer = enable_startup_timing(sys.argv)
+    diagnostics = enable_diagnostics(sys.argv)
+
+    with timer.measure('import PyQt5'):
+        from PyQt5.QtCore import QTimer
+        from PyQt5.QtWidgets import QApplication
+    with timer.measure('import main window'):
+        from quaderno_gui.gui.main_window import MainWindow
+
+    with timer.measure('QApplication'):
+        app = QApplication(sys.argv)
+    with timer.measure('MainWindow'):
+        window = MainWindow()
+    with timer.measure('show'):
+        window.show()
+
+    def first_paint():
+        timer.mark('first event loop iteration (since start)')
+        timer.report()
+
+    if timer.enabled:
+        QTimer.singleShot(0, first_paint)
+
+    status = app.exec_()
+
+    if diagnostics.enabled:
+        print('Diagnostics bundle written to ' + str(diagnostics.dump_bundle()), file=sys.stderr)
+
+    sys.exit(status)
 
 if __name__ == '__main__':
     main()
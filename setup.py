@@ -12,7 +12,16 @@ setup(
         "PyQt5",
         "dpt-rp1-py",
     ],
-    entry_points={"console_scripts": ["quaderno-gui = quaderno_gui.main:main"]},
+    extras_require={
+        "optimize": ["pikepdf", "Pillow"],
+        "async": ["aiohttp"],
+    },
+    entry_points={
+        "console_scripts": [
+            "quaderno-gui = quaderno_gui.main:main",
+            "quaderno-sync = quaderno_gui.cli:main",
+        ]
+    },
     classifiers=[
         "Programming Language :: Python :: 3",
         "Operating System :: OS Independent",
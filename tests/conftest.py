@@ -0,0 +1,180 @@
+import os
+import sqlite3
+
+import pytest
+
+
+ZOTERO_SCHEMA = '''
+CREATE TABLE collections (collectionID INTEGER PRIMARY KEY, collectionName TEXT, parentCollectionID INT);
+CREATE TABLE deletedCollections (collectionID INT);
+CREATE TABLE collectionItems (collectionID INT, itemID INT);
+CREATE TABLE items (itemID INTEGER PRIMARY KEY, itemTypeID INT, key TEXT, dateAdded TEXT, dateModified TEXT);
+CREATE TABLE itemAttachments (itemID INT, parentItemID INT, contentType TEXT);
+CREATE TABLE deletedItems (itemID INT);
+CREATE TABLE tags (tagID INTEGER PRIMARY KEY, name TEXT);
+CREATE TABLE itemTags (itemID INT, tagID INT);
+'''
+
+# Parent items get their attachment's id plus this offset.
+PARENT_OFFSET = 100000
+
+
+class ZoteroLibrary:
+    """
+    Zotero data folder with the tables the sync reads and a storage folder.
+    """
+
+    def __init__(self, root):
+        self.storage = root / 'storage'
+        self.storage.mkdir(parents=True)
+        self.db_path = root / 'zotero.sqlite'
+        self.conn = sqlite3.connect(str(self.db_path))
+        self.conn.executescript(ZOTERO_SCHEMA)
+
+    def add_collection(self, collection_id, name, parent=None):
+        self.conn.execute('INSERT INTO collections VALUES (?, ?, ?)', (collection_id, name, parent))
+        self.conn.commit()
+
+    def add_attachment(
+        self,
+        item_id,
+        name='Paper.pdf',
+        collections=(),
+        parent_collections=(),
+        tags=(),
+        modified='2024-01-01 10:00:00',
+        content=b'%PDF-1.4 paper',
+    ):
+        """
+        Add a PDF attachment with a parent item and return its file in the storage folder.
+        """
+        key = f'KEY{item_id:05d}'
+        parent_id = item_id + PARENT_OFFSET
+        self.conn.execute('INSERT INTO items VALUES (?, 1, ?, ?, ?)', (parent_id, 'P' + key, modified, modified))
+        self.conn.execute('INSERT INTO items VALUES (?, 3, ?, ?, ?)', (item_id, key, modified, modified))
+        self.conn.execute("INSERT INTO itemAttachments VALUES (?, ?, 'application/pdf')", (item_id, parent_id))
+
+        for collection_id in collections:
+            self.conn.execute('INSERT INTO collectionItems VALUES (?, ?)', (collection_id, item_id))
+
+        for collection_id in parent_collections:
+            self.conn.execute('INSERT INTO collectionItems VALUES (?, ?)', (collection_id, parent_id))
+
+        for tag in tags:
+            row = self.conn.execute('SELECT tagID FROM tags WHERE name = ?', (tag,)).fetchone()
+            tag_id = row[0] if row else self.conn.execute('INSERT INTO tags (name) VALUES (?)', (tag,)).lastrowid
+            self.conn.execute('INSERT INTO itemTags VALUES (?, ?)', (parent_id, tag_id))
+
+        self.conn.commit()
+        path = self.storage / key / name
+        path.parent.mkdir()
+        path.write_bytes(content)
+        return path
+
+    def delete_item(self, item_id):
+        self.conn.execute('INSERT INTO deletedItems VALUES (?)', (item_id,))
+        self.conn.commit()
+
+    def delete_collection(self, collection_id):
+        self.conn.execute('INSERT INTO deletedCollections VALUES (?)', (collection_id,))
+        self.conn.commit()
+
+
+class MemoryDevice:
+    """
+    In-memory stand-in for a DigitalPaper session, keyed by device path.
+    """
+
+    def __init__(self):
+        self.folders = {'Document'}
+        self.documents = {}
+        self.fail_uploads = set()
+        self.available = 10 ** 9
+        self.listed = []
+
+    def list_all(self):
+        entries = [{'entry_type': 'folder', 'entry_path': path} for path in sorted(self.folders)]
+
+        for path, content in sorted(self.documents.items()):
+            entries.append({
+                'entry_type': 'document',
+                'entry_path': path,
+                'entry_id': 'doc:' + path,
+                'file_size': len(content),
+            })
+
+        return entries
+
+    def list_objects_in_folder(self, path):
+        self.listed.append(path)
+        return [entry for entry in self.list_all() if entry['entry_path'].rpartition('/')[0] == path]
+
+    def new_folder(self, path):
+        if path.rsplit('/', 1)[0] not in self.folders:
+            raise ValueError('parent folder missing: ' + path)
+
+        self.folders.add(path)
+
+    def delete_folder(self, path):
+        self.folders = {folder for folder in self.folders if folder != path and not folder.startswith(path + '/')}
+        self.documents = {doc: data for doc, data in self.documents.items() if not doc.startswith(path + '/')}
+
+    def delete_document(self, path):
+        del self.documents[path]
+
+    def upload_file(self, local_path, remote_path):
+        if remote_path in self.fail_uploads:
+            raise ValueError('upload rejected')
+
+        if remote_path.rsplit('/', 1)[0] not in self.folders:
+            raise ValueError('folder missing: ' + remote_path)
+
+        with open(local_path, 'rb') as fh:
+            self.documents[remote_path] = fh.read()
+
+    def get_storage(self):
+        return {'available': self.available}
+
+    def path_exists(self, path):
+        return path in self.folders or path in self.documents
+
+    def download(self, path):
+        return self.documents[path]
+
+
+@pytest.fixture(scope='session', autouse=True)
+def user_config(tmp_path_factory):
+    # QSettings reads the config location once, so it is set for the whole session.
+    os.environ['XDG_CONFIG_HOME'] = str(tmp_path_factory.mktemp('config'))
+
+
+@pytest.fixture(autouse=True)
+def user_dirs(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_DATA_HOME', str(tmp_path / 'data'))
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+
+
+@pytest.fixture(scope='session')
+def qapp():
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    # Imported here so that the Qt-free tests never load PyQt5.
+    from PyQt5.QtWidgets import QApplication
+
+    return QApplication.instance() or QApplication([])
+
+
+@pytest.fixture
+def zotero(tmp_path):
+    library = ZoteroLibrary(tmp_path / 'zotero')
+    yield library
+    library.conn.close()
+
+
+@pytest.fixture
+def device():
+    return MemoryDevice()
+
+
+@pytest.fixture
+def make_device():
+    return MemoryDevice
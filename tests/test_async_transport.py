@@ -0,0 +1,174 @@
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote_plus, urlsplit
+
+import pytest
+
+pytest.importorskip('aiohttp')
+
+from quaderno_gui.core import async_transport  # noqa: E402
+from quaderno_gui.core.async_transport import AsyncDigitalPaper, AsyncTransport, DeviceHTTPError  # noqa: E402
+from quaderno_gui.core.resilience import PERMANENT, TRANSIENT, classify_error  # noqa: E402
+
+
+class Handler(BaseHTTPRequestHandler):
+    """
+    Folder tree answering the DigitalPaper endpoints the transport uses.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *_args):
+        pass
+
+    def handle_request(self, entries, blobs, body):
+        path = urlsplit(self.path).path
+
+        if path.startswith('/resolve/entry/path/'):
+            entry = entries.get(unquote_plus(path[len('/resolve/entry/path/'):]))
+            return (200, entry) if entry else (404, {})
+
+        if path == '/documents2' and self.command == 'GET':
+            return 200, {'entry_list': list(entries.values())}
+
+        if path == '/system/status/storage':
+            return 503, {}
+
+        by_id = {entry['entry_id']: key for key, entry in entries.items()}
+
+        if path in ('/folders2', '/documents2'):
+            info = json.loads(body)
+            name = info.get('folder_name') or info.get('file_name')
+            new_path = by_id[info['parent_folder_id']] + '/' + name
+
+            if new_path in entries:
+                return 400, {}
+
+            kind = 'folder' if path == '/folders2' else 'document'
+            entries[new_path] = {'entry_path': new_path, 'entry_type': kind, 'entry_id': f'{kind}-{len(entries)}'}
+            return 200, {'folder_id' if kind == 'folder' else 'document_id': entries[new_path]['entry_id']}
+
+        match = re.fullmatch(r'/documents/([^/]+)/file', path)
+
+        if match:
+            document = by_id[match.group(1)]
+
+            if self.command == 'GET':
+                return 200, blobs[document]
+
+            start = body.index(b'\r\n\r\n') + 4
+            blobs[document] = body[start:body.rindex(b'\r\n--', 0, len(body) - 2)]
+            return 200, {}
+
+        match = re.fullmatch(r'/documents/([^/]+)', path)
+
+        if match and self.command == 'DELETE':
+            del entries[by_id[match.group(1)]]
+            return 204, b''
+
+        return 404, {}
+
+    def answer(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+        with self.server.lock:
+            status, payload = self.handle_request(self.server.entries, self.server.blobs, body)
+
+        data = payload if isinstance(payload, bytes) else json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = do_PUT = do_DELETE = answer
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.entries = {'Document': {'entry_path': 'Document', 'entry_type': 'folder', 'entry_id': 'root'}}
+    server.blobs = {}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def transport(server):
+    client = AsyncDigitalPaper(f'http://127.0.0.1:{server.server_port}', connections=2)
+    transport = AsyncTransport(None, client=client).start()
+    yield transport
+    transport.stop()
+
+
+def test_upload_creates_folders_and_downloads_the_same_bytes(transport, server, tmp_path):
+    path = tmp_path / 'paper.pdf'
+    content = bytes(range(256)) * 5000
+    path.write_bytes(content)
+    reports = []
+
+    transport.upload_file(str(path), 'Document/Zotero/Physics/My paper.pdf', lambda sent, size: reports.append(sent))
+
+    assert transport.path_exists('Document/Zotero/Physics')
+    assert transport.download('Document/Zotero/Physics/My paper.pdf') == content
+    assert reports[-1] == len(content)
+    assert 'Document/Zotero/Physics/My paper.pdf' in {entry['entry_path'] for entry in transport.list_all()}
+
+
+def test_upload_reads_the_file_off_the_event_loop(transport, tmp_path, monkeypatch):
+    path = tmp_path / 'paper.pdf'
+    path.write_bytes(b'x' * (3 * async_transport.CHUNK_SIZE))
+    readers = set()
+
+    class RecordingBody(async_transport.FileBody):
+        def read(self, size=-1):
+            readers.add(threading.get_ident())
+            return super().read(size)
+
+    monkeypatch.setattr(async_transport, 'FileBody', RecordingBody)
+
+    transport.upload_file(str(path), 'Document/paper.pdf')
+
+    assert readers
+    assert transport._thread.ident not in readers
+
+
+def test_map_runs_calls_concurrently_and_returns_failures_in_place(transport):
+    transport.new_folder('Document/A')
+
+    results = transport.map('path_exists', [('Document/A',), ('Document/B',)])
+    assert results == [True, False]
+
+    [error] = transport.map('entry_id', [('Document/B',)])
+    assert type(error).__name__ == 'ResolveObjectFailed'
+
+
+def test_error_answers_are_classified_for_retries(transport, server):
+    with pytest.raises(DeviceHTTPError) as info:
+        transport.get_storage()
+
+    assert info.value.status == 503
+    assert classify_error(info.value) == TRANSIENT
+    assert classify_error(DeviceHTTPError(404)) == PERMANENT
+
+
+def test_unreachable_device_raises_connection_error(server):
+    port = server.server_port
+    server.shutdown()
+    server.server_close()
+    transport = AsyncTransport(None, client=AsyncDigitalPaper(f'http://127.0.0.1:{port}', timeout=2)).start()
+
+    try:
+        with pytest.raises(ConnectionError):
+            transport.list_all()
+    finally:
+        transport.stop()
+
+    with pytest.raises(ConnectionError):
+        transport.list_all()
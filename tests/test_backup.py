@@ -0,0 +1,89 @@
+from quaderno_gui.core.backup import METADATA_FILE, DeviceBackup
+from quaderno_gui.core.sync_engine import SyncControl
+
+
+def fill(device):
+    device.folders |= {'Document/Notes', 'Document/Empty'}
+    device.documents = {'Document/Notes/a.pdf': b'aaa', 'Document/b.pdf': b'bb'}
+    device.downloads = []
+    download = device.download
+
+    def counted(path):
+        device.downloads.append(path)
+        return download(path)
+
+    device.download = counted
+
+
+def test_mirror_downloads_only_new_or_changed_documents(device, tmp_path):
+    fill(device)
+
+    summary = DeviceBackup(device, tmp_path).run()
+
+    assert (summary['downloaded'], summary['kept'], summary['bytes']) == (2, 0, 5)
+    assert (tmp_path / 'Notes' / 'a.pdf').read_bytes() == b'aaa'
+    assert (tmp_path / 'Empty').is_dir()
+    assert (tmp_path / METADATA_FILE).exists()
+
+    device.documents['Document/b.pdf'] = b'bbbb'
+    device.downloads.clear()
+    summary = DeviceBackup(device, tmp_path).run()
+
+    assert device.downloads == ['Document/b.pdf']
+    assert summary['kept'] == 1
+    assert (tmp_path / 'b.pdf').read_bytes() == b'bbbb'
+
+
+def test_mirror_deletes_documents_gone_from_the_device_but_not_other_files(device, tmp_path):
+    fill(device)
+    DeviceBackup(device, tmp_path).run()
+    (tmp_path / 'mine.txt').write_text('not from the device')
+
+    device.delete_folder('Document/Notes')
+    summary = DeviceBackup(device, tmp_path).run()
+
+    assert summary['removed'] == 1
+    assert not (tmp_path / 'Notes').exists()
+    assert (tmp_path / 'mine.txt').exists()
+
+
+def test_unchanged_documents_are_hard_linked_into_the_next_snapshot(device, tmp_path):
+    fill(device)
+    first = DeviceBackup(device, tmp_path, snapshots=True).run()
+
+    device.downloads.clear()
+    second = DeviceBackup(device, tmp_path, snapshots=True).run()
+
+    assert device.downloads == []
+    assert second['kept'] == 2
+    assert first['snapshot'] != second['snapshot']
+
+    old = tmp_path / first['snapshot'] / 'Notes' / 'a.pdf'
+    new = tmp_path / second['snapshot'] / 'Notes' / 'a.pdf'
+    assert old.stat().st_ino == new.stat().st_ino
+
+
+def test_oldest_snapshots_beyond_the_limit_are_pruned(device, tmp_path):
+    fill(device)
+    (tmp_path / '2020-01-01').mkdir()
+    (tmp_path / '2020-01-02').mkdir()
+    (tmp_path / 'unrelated').mkdir()
+
+    summary = DeviceBackup(device, tmp_path, snapshots=True, keep_snapshots=2).run()
+
+    assert sorted(path.name for path in tmp_path.iterdir() if path.is_dir()) == [
+        '2020-01-02', summary['snapshot'], 'unrelated',
+    ]
+
+
+def test_cancelled_snapshot_is_removed(device, tmp_path):
+    fill(device)
+    control = SyncControl()
+    control.cancel()
+
+    summary = DeviceBackup(device, tmp_path, snapshots=True, control=control).run()
+
+    assert summary['cancelled']
+    assert summary['snapshot'] is None
+    assert DeviceBackup(device, tmp_path).snapshot_names() == []
+    assert not list(tmp_path.glob('*.partial'))
@@ -0,0 +1,54 @@
+from quaderno_gui.core.bulk_delete import BulkDelete
+
+
+def fill(device):
+    device.folders |= {'Document/A', 'Document/A/B', 'Document/C'}
+    device.documents = {
+        'Document/A/a.pdf': b'a',
+        'Document/A/B/b.pdf': b'b',
+        'Document/C/c.pdf': b'c',
+        'Document/d.pdf': b'd',
+    }
+
+
+def test_paths_inside_a_deleted_folder_are_left_to_that_folder():
+    job = BulkDelete(None, documents=['Document/A/a.pdf', 'Document/d.pdf'], folders=['Document/A/B/', 'Document/A'])
+
+    assert job.folders == ['Document/A']
+    assert job.documents == ['Document/d.pdf']
+
+
+def test_documents_and_folders_are_deleted_and_progress_reported(device):
+    fill(device)
+    progress = []
+
+    summary = BulkDelete(
+        device, documents=['Document/d.pdf', 'Document/A/a.pdf'], folders=['Document/A'], workers=2,
+        progress=lambda done, total, path: progress.append((done, total)),
+    ).run()
+
+    assert sorted(summary['deleted']) == ['Document/A', 'Document/d.pdf']
+    assert summary['failed'] == [] and summary['remaining'] == []
+    assert progress == [(1, 2), (2, 2)]
+    assert device.documents == {'Document/C/c.pdf': b'c'}
+    assert device.folders == {'Document', 'Document/C'}
+
+
+def test_failures_and_paths_still_on_the_device_are_reported(device):
+    fill(device)
+    device.delete_folder = lambda path: None
+    logs = []
+
+    summary = BulkDelete(
+        device, documents=['Document/missing.pdf', 'Document/d.pdf'], folders=['Document/C'], log=logs.append,
+    ).run()
+
+    assert summary['deleted'] == ['Document/d.pdf']
+    assert [failure['path'] for failure in summary['failed']] == ['Document/missing.pdf']
+    assert summary['remaining'] == ['Document/C']
+    assert 'Warning: Still exists after deletion attempt: Document/C' in logs
+    assert logs[-1] == 'Deleted 1 of 3 items.'
+
+
+def test_empty_job_does_not_contact_the_device():
+    assert BulkDelete(None).run() == {'deleted': [], 'failed': [], 'remaining': []}
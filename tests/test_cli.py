@@ -0,0 +1,44 @@
+import subprocess
+import sys
+
+from quaderno_gui import cli
+
+
+def test_cli_does_not_import_qt():
+    code = 'import sys, quaderno_gui.cli; sys.exit("PyQt5" in sys.modules)'
+
+    assert subprocess.run([sys.executable, '-c', code]).returncode == 0
+
+
+def test_cli_requires_a_device_address(monkeypatch, capsys):
+    monkeypatch.delenv('QUADERNO_ADDRESS', raising=False)
+
+    assert cli.main([]) == 2
+    assert 'device address is required' in capsys.readouterr().err
+
+
+def test_checkpoint_file_round_trip(tmp_path):
+    path = str(tmp_path / 'checkpoint.json')
+    checkpoint = {'fingerprint': 'abc', 'operations': [{'op': 'upload'}]}
+
+    assert cli._load_checkpoints(path) == {}
+
+    cli._store_checkpoints(path, {'office': checkpoint, 'home': None})
+    assert cli._load_checkpoints(path) == {'office': checkpoint}
+
+    cli._store_checkpoints(path, {'office': None})
+    assert not (tmp_path / 'checkpoint.json').exists()
+
+
+def test_unreadable_checkpoint_is_ignored(tmp_path):
+    path = tmp_path / 'checkpoint.json'
+    path.write_text('{not json')
+
+    assert cli._load_checkpoints(str(path)) == {}
+
+
+def test_addresses_come_from_options_or_the_environment(monkeypatch):
+    monkeypatch.setenv('QUADERNO_ADDRESS', 'dpt-a.local, dpt-b.local')
+
+    assert cli._addresses(cli.build_parser().parse_args([])) == ['dpt-a.local', 'dpt-b.local']
+    assert cli._addresses(cli.build_parser().parse_args(['--address', 'x', '--address', 'y'])) == ['x', 'y']
@@ -0,0 +1,128 @@
+import threading
+import time
+
+from quaderno_gui.core.device_arbiter import BULK, INTERACTIVE, DeviceArbiter, request_slot, with_priority
+from quaderno_gui.core.resilience import ResilientDevice
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.005)
+
+
+def queued(arbiter, priority):
+    return arbiter.stats()[priority]['queued']
+
+
+def start_request(arbiter, priority, order):
+    def request():
+        with arbiter.slot(priority):
+            order.append(priority)
+
+    thread = threading.Thread(target=request)
+    thread.start()
+    return thread
+
+
+def test_waiting_interactive_requests_go_before_waiting_bulk_ones():
+    arbiter = DeviceArbiter(object(), limit=1)
+    release = threading.Event()
+    order = []
+
+    def hold():
+        with arbiter.slot(INTERACTIVE):
+            release.wait()
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    wait_until(lambda: arbiter.stats()[INTERACTIVE]['active'] == 1)
+
+    bulk = start_request(arbiter, BULK, order)
+    wait_until(lambda: queued(arbiter, BULK) == 1)
+    interactive = start_request(arbiter, INTERACTIVE, order)
+    wait_until(lambda: queued(arbiter, INTERACTIVE) == 1)
+
+    release.set()
+
+    for thread in (holder, bulk, interactive):
+        thread.join(5)
+
+    assert order == [INTERACTIVE, BULK]
+
+
+def test_bulk_traffic_never_takes_the_last_slot():
+    arbiter = DeviceArbiter(object(), limit=2, bulk_limit=1)
+    release = threading.Event()
+    order = []
+
+    def hold():
+        with arbiter.slot(BULK):
+            release.wait()
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    wait_until(lambda: arbiter.stats()[BULK]['active'] == 1)
+
+    second_bulk = start_request(arbiter, BULK, order)
+    wait_until(lambda: queued(arbiter, BULK) == 1)
+    start_request(arbiter, INTERACTIVE, order).join(5)
+
+    assert order == [INTERACTIVE]
+
+    release.set()
+    holder.join(5)
+    second_bulk.join(5)
+
+    assert order == [INTERACTIVE, BULK]
+
+
+def test_nested_calls_from_the_same_thread_do_not_queue_again():
+    arbiter = DeviceArbiter(object(), limit=1)
+
+    with arbiter.slot(BULK):
+        with arbiter.slot(BULK):
+            assert arbiter.stats()[BULK]['active'] == 1
+
+    stats = arbiter.stats()[BULK]
+    assert (stats['requests'], stats['active'], stats['queued']) == (1, 0, 0)
+
+
+class Device:
+    def __init__(self, arbiter_ref):
+        self.arbiter_ref = arbiter_ref
+        self.seen = []
+
+    def list_all(self):
+        arbiter = self.arbiter_ref[0]
+        self.seen.append((arbiter.stats()[BULK]['active'], arbiter.stats()[INTERACTIVE]['active']))
+        return []
+
+
+def test_session_views_call_the_device_in_a_slot_of_their_priority():
+    ref = []
+    device = Device(ref)
+    arbiter = DeviceArbiter(device)
+    ref.append(arbiter)
+    view = ResilientDevice(arbiter.session())
+
+    view.list_all()
+    bulk = with_priority(view, BULK)
+    bulk.list_all()
+
+    assert device.seen == [(0, 1), (1, 0)]
+    assert isinstance(bulk, ResilientDevice) and bulk.breaker is view.breaker
+
+    with request_slot(bulk):
+        assert arbiter.stats()[BULK]['active'] == 1
+
+
+def test_sessions_without_an_arbiter_are_unchanged():
+    device = object()
+
+    assert with_priority(device, BULK) is device
+
+    with request_slot(device):
+        pass
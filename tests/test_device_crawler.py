@@ -0,0 +1,79 @@
+import pytest
+
+from quaderno_gui.core.device_crawler import crawl_entries, crawl_folder
+from quaderno_gui.core.device_index import DeviceIndex
+from quaderno_gui.core.sync_engine import SyncControl, SyncEngine
+
+
+def fill(device):
+    device.folders |= {'Document/A', 'Document/A/B', 'Document/C', 'Other'}
+    device.documents = {
+        'Document/A/B/b.pdf': b'b',
+        'Document/C/c.pdf': b'c',
+        'Document/d.pdf': b'd',
+        'Other/o.pdf': b'o',
+    }
+
+
+def test_crawl_lists_the_subtree_one_folder_at_a_time(device):
+    fill(device)
+
+    batches = list(crawl_folder(device, '/Document/', workers=2))
+
+    assert batches[0] == [{'entry_path': 'Document', 'entry_type': 'folder', 'entry_id': None}]
+    assert sorted(device.listed) == ['Document', 'Document/A', 'Document/A/B', 'Document/C']
+    assert len(batches) == 5
+
+
+def test_crawled_index_matches_the_full_listing_below_the_root(device):
+    fill(device)
+
+    crawled = DeviceIndex.from_entries(crawl_entries(device, 'Document'))
+    full = DeviceIndex.from_entries(device.list_all())
+
+    assert crawled.documents_under('Document') == full.documents_under('Document')
+    assert 'Other' not in crawled.folder_ids
+
+
+def test_missing_root_yields_an_empty_listing(device):
+    assert list(crawl_folder(device, 'Document/Missing')) == [[]]
+
+
+def test_failed_folder_listing_is_raised(device):
+    fill(device)
+    list_objects_in_folder = device.list_objects_in_folder
+
+    def fail_for_c(path):
+        if path == 'Document/C':
+            raise ConnectionError('connection reset')
+
+        return list_objects_in_folder(path)
+
+    device.list_objects_in_folder = fail_for_c
+
+    with pytest.raises(ConnectionError):
+        list(crawl_entries(device, 'Document'))
+
+
+def test_cancelled_crawl_stops_listing(device):
+    fill(device)
+    control = SyncControl()
+    control.cancel()
+
+    assert list(crawl_folder(device, 'Document', control=control)) == [
+        [{'entry_path': 'Document', 'entry_type': 'folder', 'entry_id': None}],
+    ]
+    assert device.listed == []
+
+
+def test_crawling_sync_only_lists_the_remote_base(device, zotero):
+    fill(device)
+    device.folders.add('Document/Zotero')
+    zotero.add_collection(1, 'Physics')
+    zotero.add_attachment(1, collections=[1])
+
+    SyncEngine(device, 'Document/Zotero', storage_path=zotero.storage, db_path=zotero.db_path, crawl=True).run()
+
+    assert device.listed[0] == 'Document/Zotero'
+    assert 'Document' not in device.listed
+    assert 'Document/Zotero/Physics/Paper (itemID 1).pdf' in device.documents
@@ -0,0 +1,71 @@
+from quaderno_gui.core.device_index import KIND_DOCUMENT, KIND_FOLDER, DeviceIndex
+
+
+ENTRIES = [
+    {'entry_type': 'folder', 'entry_path': 'Document'},
+    {'entry_type': 'folder', 'entry_path': 'Document/Zotero'},
+    {'entry_type': 'folder', 'entry_path': 'Document/Zotero/Physics'},
+    {'entry_type': 'document', 'entry_path': 'Document/Zotero/Physics/a.pdf', 'file_size': 10, 'entry_id': 'a'},
+    {'entry_type': 'document', 'entry_path': 'Document\\Zotero\\b.pdf', 'file_size': '20', 'entry_id': 'b'},
+    {'entry_type': 'document', 'entry_path': 'Document/ZoteroOld/c.pdf', 'file_size': 30},
+    {'entry_type': 'document', 'entry_path': 'Document/Notes/Deep/d.pdf', 'file_size': 40},
+    {'entry_type': 'other', 'entry_path': 'Document/ignored'},
+]
+
+
+def test_entries_are_indexed_with_their_folders():
+    index = DeviceIndex.from_entries(ENTRIES)
+
+    assert len(index) == 7
+    assert index.path(4) == 'Document/Zotero/b.pdf'
+    assert index.kinds[0] == KIND_FOLDER and index.kinds[3] == KIND_DOCUMENT
+    assert index.entry_ids[3] == 'a' and index.sizes[4] == 20
+    assert 'Document/Notes/Deep' in index.folder_ids
+
+
+def test_documents_under_a_base_are_relative_to_it():
+    index = DeviceIndex.from_entries(ENTRIES)
+
+    assert index.documents_under('Document/Zotero') == {'Physics/a.pdf': 10, 'b.pdf': 20}
+    assert index.documents_under('/Document/Zotero/') == {'Physics/a.pdf': 10, 'b.pdf': 20}
+    assert index.documents_under('') == {
+        'Document/Zotero/Physics/a.pdf': 10,
+        'Document/Zotero/b.pdf': 20,
+        'Document/ZoteroOld/c.pdf': 30,
+        'Document/Notes/Deep/d.pdf': 40,
+    }
+
+
+def test_folders_under_a_base_and_whether_it_was_listed():
+    index = DeviceIndex.from_entries(ENTRIES)
+
+    assert index.folders_under('Document/Zotero') == ({'Physics'}, True)
+    # Folders only implied by a document path are known but were not listed.
+    assert index.folders_under('Document/Notes') == (set(), False)
+    assert index.folders_under('Document/Missing') == (set(), False)
+
+
+def test_folder_tree_totals_include_all_subfolders():
+    tree = DeviceIndex.from_entries(ENTRIES).folder_tree()
+    document = tree.folder_id('Document')
+    zotero = tree.folder_id('/Document/Zotero/')
+
+    assert [tree.name(child) for child in tree.children(document)] == ['Notes', 'Zotero', 'ZoteroOld']
+    assert tree.files(zotero) == [('b.pdf', 20)]
+    assert (tree.total_documents[zotero], tree.total_bytes[zotero]) == (2, 30)
+    assert (tree.total_documents[document], tree.total_bytes[document]) == (4, 100)
+    assert tree.folder_id('Document/Missing') is None
+
+
+def test_fingerprint_changes_with_the_entries_below_the_base():
+    index = DeviceIndex.from_entries(ENTRIES)
+    fingerprint = index.fingerprint('Document/Zotero')
+
+    assert DeviceIndex.from_entries(ENTRIES).fingerprint('Document/Zotero') == fingerprint
+    assert DeviceIndex.from_entries(ENTRIES[:-2]).fingerprint('Document/Zotero') == fingerprint
+    assert DeviceIndex.from_entries(ENTRIES[:3]).fingerprint('Document/Zotero') != fingerprint
+
+    resized = [dict(entry, file_size=99) if entry.get('entry_id') == 'b' else entry for entry in ENTRIES]
+    assert DeviceIndex.from_entries(resized).fingerprint('Document/Zotero') != fingerprint
+    empty_base = DeviceIndex.from_entries(ENTRIES[:2]).fingerprint('Document/Zotero')
+    assert empty_base != DeviceIndex.from_entries([]).fingerprint('Document/Zotero')
@@ -0,0 +1,126 @@
+import cProfile
+import json
+import threading
+
+import pytest
+
+from quaderno_gui.core.diagnostics import Diagnostics, enable_diagnostics
+
+
+@pytest.fixture
+def diagnostics():
+    diagnostics = Diagnostics()
+    diagnostics.enable()
+    yield diagnostics
+    diagnostics.disable()
+
+
+def profiled_labels(diagnostics):
+    return {section['label'] for section in diagnostics.sections if section['profiler'] is not None}
+
+
+def test_sections_are_not_recorded_while_disabled():
+    diagnostics = Diagnostics()
+
+    with diagnostics.profile('refresh'):
+        pass
+
+    assert not diagnostics.sections
+
+
+def test_nested_sections_are_timed_inside_the_outer_profile(diagnostics):
+    with diagnostics.profile('outer'):
+        with diagnostics.profile('inner'):
+            pass
+
+    assert [section['label'] for section in diagnostics.sections] == ['inner', 'outer']
+    assert profiled_labels(diagnostics) == {'outer'}
+
+
+def test_only_one_section_in_the_process_is_profiled_at_a_time(diagnostics):
+    started = threading.Event()
+    release = threading.Event()
+
+    def sync():
+        with diagnostics.profile('sync'):
+            started.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=sync)
+    thread.start()
+    started.wait(5)
+
+    with diagnostics.profile('refresh'):
+        pass
+
+    release.set()
+    thread.join(5)
+
+    assert profiled_labels(diagnostics) == {'sync'}
+
+    # The profiler is free again once the section is over.
+    with diagnostics.profile('later'):
+        pass
+
+    assert profiled_labels(diagnostics) == {'sync', 'later'}
+
+
+def test_sections_are_timed_when_another_profiler_is_active(diagnostics, monkeypatch):
+    def busy(self):
+        raise ValueError('Another profiling tool is already active')
+
+    monkeypatch.setattr(cProfile.Profile, 'enable', busy)
+
+    with diagnostics.profile('refresh'):
+        pass
+
+    monkeypatch.undo()
+
+    with diagnostics.profile('later'):
+        pass
+
+    assert [section['label'] for section in diagnostics.sections] == ['refresh', 'later']
+    assert profiled_labels(diagnostics) == {'later'}
+
+
+def test_summary_reports_latency_percentiles_and_stalls(diagnostics):
+    for seconds in (0.1, 0.2, 0.3, 0.4):
+        diagnostics.record_latency('list_all', seconds)
+
+    diagnostics.record_latency('list_all', 2.0, ok=False)
+    diagnostics.record_stall(0.5)
+
+    summary = diagnostics.summary()
+
+    assert summary['device_latency']['list_all'] == {'count': 5, 'failed': 1, 'p50': 0.3, 'p95': 2.0, 'max': 2.0}
+    assert summary['stalls'] == {'count': 1, 'total': 0.5, 'max': 0.5}
+
+
+def test_bundle_holds_the_profiles_memory_and_report(diagnostics, tmp_path):
+    @diagnostics.profiled('refresh')
+    def refresh():
+        return [bytes(1000) for _ in range(100)]
+
+    refresh()
+    bundle = diagnostics.dump_bundle(tmp_path, extra={'device': 'office'})
+
+    report = json.loads((bundle / 'diagnostics.json').read_text())
+    assert report['device'] == 'office'
+    assert report['sections'][0]['profile'] == 'profiles/001-refresh.prof'
+    assert (bundle / 'profiles' / '001-refresh.prof').exists()
+    assert '== 001 refresh' in (bundle / 'memory.txt').read_text()
+
+
+def test_diagnostics_flag_is_removed_from_the_arguments(monkeypatch, tmp_path):
+    monkeypatch.setenv('QUADERNO_DIAGNOSTICS', str(tmp_path))
+    argv = ['quaderno-sync', '--diagnostics', '--simulate']
+
+    diagnostics = enable_diagnostics(argv)
+
+    try:
+        assert diagnostics.enabled
+        assert diagnostics.output_dir == tmp_path
+        assert argv == ['quaderno-sync', '--simulate']
+    finally:
+        diagnostics.disable()
+        diagnostics.output_dir = None
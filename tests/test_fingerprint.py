@@ -0,0 +1,60 @@
+import hashlib
+import os
+
+from quaderno_gui.core.fingerprint import FingerprintService, HashCache, hash_file
+
+
+def make_service(tmp_path):
+    return FingerprintService(HashCache(str(tmp_path / 'hashes.sqlite')), workers=2)
+
+
+def test_hash_file_matches_hashlib(tmp_path):
+    path = tmp_path / 'paper.pdf'
+    path.write_bytes(b'%PDF' * 1000)
+    empty = tmp_path / 'empty.pdf'
+    empty.write_bytes(b'')
+
+    assert hash_file(str(path), chunk_size=4096) == hashlib.sha256(b'%PDF' * 1000).hexdigest()
+    assert hash_file(str(empty)) == hashlib.sha256(b'').hexdigest()
+
+
+def test_unchanged_files_are_served_from_the_cache(tmp_path):
+    paths = []
+
+    for i in range(3):
+        path = tmp_path / f'paper{i}.pdf'
+        path.write_bytes(b'%%PDF %d' % i)
+        paths.append(str(path))
+
+    first = make_service(tmp_path).fingerprint(paths + [str(tmp_path / 'missing.pdf')])
+    service = make_service(tmp_path)
+    second = service.fingerprint(paths)
+
+    assert first == second and len(second) == 3
+    assert service.stats['hits'] == 3 and service.stats['hashed_bytes'] == 0
+
+
+def test_cache_entry_is_invalidated_by_size_mtime_or_inode(tmp_path):
+    path = tmp_path / 'paper.pdf'
+    path.write_bytes(b'%PDF one')
+    service = make_service(tmp_path)
+    service.fingerprint([str(path)])
+    stat = path.stat()
+
+    # Same size, later mtime.
+    path.write_bytes(b'%PDF two')
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert service.fingerprint([str(path)])[str(path)] == hashlib.sha256(b'%PDF two').hexdigest()
+
+    # Same mtime as before, different size.
+    path.write_bytes(b'%PDF three')
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert service.fingerprint([str(path)])[str(path)] == hashlib.sha256(b'%PDF three').hexdigest()
+
+    # A file replaced by another with the same size and mtime has a new inode.
+    replacement = tmp_path / 'replacement.pdf'
+    replacement.write_bytes(b'%PDF thr33')
+    os.utime(replacement, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    os.replace(replacement, path)
+    assert service.fingerprint([str(path)])[str(path)] == hashlib.sha256(b'%PDF thr33').hexdigest()
+    assert service.stats['hits'] == 0
@@ -0,0 +1,52 @@
+from quaderno_gui.gui.folders_page import FoldersPage
+
+
+class FakeDevice:
+    def __init__(self, paths):
+        self.paths = set(paths)
+
+    def list_all(self):
+        return [
+            {
+                'entry_type': 'document' if path.endswith('.pdf') else 'folder',
+                'entry_path': path,
+                'file_size': 10 if path.endswith('.pdf') else 0,
+            }
+            for path in sorted(self.paths)
+        ]
+
+    def delete_folder(self, path):
+        self.paths = {p for p in self.paths if p != path and not p.startswith(path + '/')}
+
+
+def make_page(dp):
+    page = FoldersPage()
+    page.set_digital_paper(dp)
+    return page
+
+
+def test_root_documents_are_listed_in_the_tree(qapp):
+    page = make_page(FakeDevice(['Document/A', 'Document/A/in.pdf', 'Document/root.pdf']))
+    tree = page.folder_tree
+
+    assert [tree.topLevelItem(i).text(0) for i in range(tree.topLevelItemCount())] == ['A', 'root.pdf']
+
+    tree.topLevelItem(1).setSelected(True)
+
+    assert page.selected_folders() == []
+    assert page.selected_documents() == [('Document/root.pdf', 10)]
+
+
+def test_refresh_after_deleting_a_top_level_folder_selects_nothing(qapp):
+    dp = FakeDevice(['Document/A', 'Document/A/in.pdf', 'Document/B', 'Document/root.pdf'])
+    page = make_page(dp)
+    page.select_folder('A')
+
+    assert page.selected_folder() == 'A'
+
+    dp.delete_folder('Document/A')
+    page.refresh_folders()
+
+    assert page.selected_folders() == []
+    assert page.selected_documents() == []
+    assert page.folder_tree.selectedItems() == []
@@ -0,0 +1,139 @@
+import threading
+import time
+
+from quaderno_gui.core.device_arbiter import BULK, DeviceArbiter, parallel_slots
+from quaderno_gui.core.link_control import AdaptiveConcurrency, format_link_stats, request_kind
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def run_window(controller, clock, seconds=0.1, error=False, saturated=True, requests=5):
+    """
+    Record one window of requests, the last of which closes the window.
+    """
+    for _ in range(requests):
+        clock.now += controller.window / (requests - 1)
+        controller.record('list_all', seconds, error=error, saturated=saturated)
+
+
+def make_controller(**kwargs):
+    clock = FakeClock()
+    return AdaptiveConcurrency(clock=clock, **kwargs), clock
+
+
+def test_limit_grows_by_one_per_saturated_window_up_to_the_maximum():
+    controller, clock = make_controller(initial=2, max_limit=4)
+
+    for expected in (3, 4, 4):
+        run_window(controller, clock)
+        assert controller.limit == expected
+
+    stats = controller.stats()
+    assert stats['increases'] == 2 and stats['requests'] == 15
+
+
+def test_limit_stays_when_requests_were_not_queued():
+    controller, clock = make_controller(initial=2)
+
+    run_window(controller, clock, saturated=False)
+
+    assert controller.limit == 2
+
+
+def test_transient_errors_halve_the_limit():
+    controller, clock = make_controller(initial=8, max_limit=8)
+
+    run_window(controller, clock, error=True)
+
+    assert controller.limit == 4
+    assert controller.stats()['change'] == 'errors'
+    assert controller.stats()['error_rate'] == 1.0
+
+
+def test_slower_requests_than_usual_shrink_the_limit_without_going_below_the_minimum():
+    controller, clock = make_controller(initial=4, min_limit=2, max_limit=8)
+    run_window(controller, clock, seconds=0.1)
+    assert controller.limit == 5
+
+    run_window(controller, clock, seconds=0.5)
+    assert controller.limit == 3
+    assert controller.stats()['change'] == 'latency'
+
+    for _ in range(5):
+        run_window(controller, clock, seconds=5.0, error=True)
+
+    assert controller.limit == 2
+
+
+def test_transfers_are_compared_with_transfers_of_a_similar_size():
+    assert request_kind('upload_file', 1000) == request_kind('upload_file', 1020)
+    assert request_kind('upload_file', 1000) != request_kind('upload_file', 4000)
+    assert request_kind('list_all') == 'list_all'
+
+
+def test_link_statistics_are_formatted_on_one_line():
+    controller, clock = make_controller(initial=2)
+
+    assert format_link_stats(controller.stats()) == '2 parallel requests (max 8), idle'
+
+    run_window(controller, clock, saturated=False)
+
+    expected = '2 parallel requests (max 8), 100 ms, 4.5 requests/s, 0% errors'
+    assert format_link_stats(controller.stats()) == expected
+
+
+class Device:
+    def __init__(self):
+        self.release = threading.Event()
+        self.running = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def list_all(self):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+
+        self.release.wait(5)
+
+        with self.lock:
+            self.running -= 1
+
+        return []
+
+
+def test_arbiter_admits_requests_up_to_the_controller_limit():
+    device = Device()
+    controller = AdaptiveConcurrency(initial=3, max_limit=6)
+    arbiter = DeviceArbiter(device, controller=controller)
+    bulk = arbiter.session(BULK)
+    threads = [threading.Thread(target=bulk.list_all) for _ in range(4)]
+
+    for thread in threads:
+        thread.start()
+
+    try:
+        deadline = time.monotonic() + 5
+
+        while arbiter.stats()[BULK]['queued'] < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        assert arbiter.stats()[BULK]['active'] == 2
+        assert arbiter.limits() == (3, 2)
+        assert arbiter.link_stats()['in_flight'] == 2
+        assert parallel_slots(bulk) == 5
+    finally:
+        device.release.set()
+
+        for thread in threads:
+            thread.join(5)
+
+    assert device.peak == 2
+    assert controller.stats()['requests'] == 4
+    assert parallel_slots(device) == 1
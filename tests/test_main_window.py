@@ -0,0 +1,29 @@
+from quaderno_gui.gui.main_window import MainWindow
+
+
+class FakeDevice:
+    def list_all(self):
+        return []
+
+
+def test_pages_are_built_on_first_activation(qapp):
+    window = MainWindow()
+
+    assert window.connect_page is window.pages.currentWidget()
+    assert window.files_page is None and window.zotero_sync_page is None
+
+    window.sidebar.setCurrentRow(3)
+
+    assert window.zotero_sync_page is not None
+    assert window.pages.currentWidget() is window.zotero_sync_page
+    assert window.files_page is None
+
+
+def test_late_pages_receive_the_connected_device(qapp):
+    window = MainWindow()
+    dp = FakeDevice()
+    window.set_digital_paper(dp)
+
+    window.sidebar.setCurrentRow(3)
+
+    assert window.zotero_sync_page.dp is dp
@@ -0,0 +1,72 @@
+from quaderno_gui.core import sync_engine
+from quaderno_gui.core.multi_sync import MultiDeviceSync
+
+
+REMOTE_BASE = 'Document/Zotero'
+PAPER = REMOTE_BASE + '/Physics/Paper (itemID 7).pdf'
+
+
+class BrokenDevice:
+    def list_all(self):
+        raise ConnectionError('device went to sleep')
+
+
+def make_sync(devices, zotero, **kwargs):
+    return MultiDeviceSync(devices, REMOTE_BASE, storage_path=zotero.storage, db_path=zotero.db_path, **kwargs)
+
+
+def test_every_device_receives_the_library_read_once(zotero, make_device, monkeypatch):
+    zotero.add_collection(1, 'Physics')
+    zotero.add_attachment(7, collections=[1])
+    reads = []
+    build_mapping = sync_engine.build_zotero_file_mapping
+
+    def counting_build_mapping(*args, **kwargs):
+        reads.append(args)
+        return build_mapping(*args, **kwargs)
+
+    monkeypatch.setattr(sync_engine, 'build_zotero_file_mapping', counting_build_mapping)
+    devices = {'office': make_device(), 'home': make_device()}
+
+    result = make_sync(devices, zotero).run()
+
+    assert len(reads) == 1
+    assert set(result['devices']) == {'office', 'home'}
+    for device in devices.values():
+        assert set(device.documents) == {PAPER}
+
+
+def test_a_failing_device_does_not_stop_the_others(zotero, device):
+    zotero.add_collection(1, 'Physics')
+    zotero.add_attachment(7, collections=[1])
+    messages = []
+
+    result = make_sync({'good': device, 'broken': BrokenDevice()}, zotero, log=messages.append).run()
+
+    assert set(device.documents) == {PAPER}
+    assert result['devices']['broken']['aborted']
+    assert not result['devices']['good']['errors']
+    assert '[broken] Sync failed: device went to sleep' in messages
+
+
+def test_unreadable_library_aborts_before_any_device_is_touched(device, tmp_path):
+    result = MultiDeviceSync({'office': device}, REMOTE_BASE, storage_path=tmp_path, db_path=tmp_path / 'x').run()
+
+    assert result['aborted'] and result['devices'] == {}
+    assert device.folders == {'Document'}
+
+
+def test_simulated_plans_are_applied_without_reading_the_library(zotero, make_device, monkeypatch):
+    zotero.add_collection(1, 'Physics')
+    zotero.add_attachment(7, collections=[1])
+    devices = {'office': make_device(), 'home': make_device()}
+    simulated = make_sync(devices, zotero, simulate=True).run()['devices']
+    plans = {name: summary['applicable_plan'] for name, summary in simulated.items()}
+    monkeypatch.setattr(sync_engine, 'build_zotero_file_mapping', None)
+    messages = []
+
+    make_sync(devices, zotero, checkpoints=plans, log=messages.append).run()
+
+    assert 'Zotero library unchanged since the last plans; syncing 2 devices.' in messages
+    for device in devices.values():
+        assert set(device.documents) == {PAPER}
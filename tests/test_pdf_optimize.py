@@ -0,0 +1,108 @@
+import os
+
+import pytest
+
+from quaderno_gui.core import pdf_optimize
+from quaderno_gui.core.pdf_optimize import PdfOptimizer, _optimize_job
+
+
+SETTINGS = dict(pdf_optimize.DEFAULT_SETTINGS, max_image_px=100)
+
+
+def make_scan(path, side=400):
+    """
+    Write a one-page PDF holding a large uncompressed image.
+    """
+    pikepdf = pytest.importorskip('pikepdf')
+    pytest.importorskip('PIL')
+
+    pdf = pikepdf.new()
+    image = pikepdf.Stream(pdf, bytes(range(256)) * (side * side * 3 // 256))
+    image.Type = pikepdf.Name.XObject
+    image.Subtype = pikepdf.Name.Image
+    image.Width = image.Height = side
+    image.ColorSpace = pikepdf.Name.DeviceRGB
+    image.BitsPerComponent = 8
+    page = pdf.add_blank_page(page_size=(side, side))
+    page.Resources = pikepdf.Dictionary(XObject=pikepdf.Dictionary(Im0=image))
+    page.Contents = pdf.make_stream(f'q {side} 0 0 {side} 0 0 cm /Im0 Do Q'.encode())
+    pdf.save(path, compress_streams=False)
+    return str(path)
+
+
+def fake_optimizer(calls, output):
+    def optimize_file(source, target, _settings):
+        calls.append(source)
+        with open(target, 'wb') as fh:
+            fh.write(output)
+
+    return optimize_file
+
+
+def test_optimized_copy_is_cached_and_reused(tmp_path, monkeypatch):
+    source = tmp_path / 'paper.pdf'
+    source.write_bytes(b'%PDF' + b'x' * 1000)
+    calls = []
+    monkeypatch.setattr(pdf_optimize, '_optimize_file', fake_optimizer(calls, b'%PDF small'))
+
+    first = _optimize_job(str(source), str(tmp_path / 'cache'), SETTINGS)
+    second = _optimize_job(str(source), str(tmp_path / 'cache'), SETTINGS)
+
+    assert not first['hit'] and second['hit']
+    assert first['path'] == second['path'] != str(source)
+    assert second['size'] == len(b'%PDF small')
+    assert calls == [str(source)]
+
+
+def test_file_that_does_not_shrink_is_marked_and_not_retried(tmp_path, monkeypatch):
+    source = tmp_path / 'paper.pdf'
+    source.write_bytes(b'%PDF small')
+    calls = []
+    monkeypatch.setattr(pdf_optimize, '_optimize_file', fake_optimizer(calls, b'%PDF' + b'x' * 1000))
+
+    first = _optimize_job(str(source), str(tmp_path / 'cache'), SETTINGS)
+    second = _optimize_job(str(source), str(tmp_path / 'cache'), SETTINGS)
+
+    assert first['path'] == second['path'] == str(source)
+    assert second['hit'] and calls == [str(source)]
+    assert list((tmp_path / 'cache').glob('*/*.keep'))
+    assert not list((tmp_path / 'cache').glob('*/*.pdf'))
+
+
+def test_unreadable_source_is_returned_unchanged(tmp_path):
+    scan = make_scan(tmp_path / 'scan.pdf')
+    missing = str(tmp_path / 'missing.pdf')
+    optimizer = PdfOptimizer(tmp_path / 'cache', settings=SETTINGS, workers=2)
+
+    results = {result['source']: result for result in optimizer.optimize([missing, scan])}
+
+    assert results[missing]['path'] == missing
+    assert results[scan]['path'] != scan
+    assert results[scan]['size'] < os.path.getsize(scan)
+
+
+def test_second_optimization_hits_the_cache(tmp_path):
+    scan = make_scan(tmp_path / 'scan.pdf')
+    optimizer = PdfOptimizer(tmp_path / 'cache', settings=SETTINGS, workers=1)
+
+    first, = optimizer.optimize([scan])
+    second, = optimizer.optimize([scan])
+
+    assert not first['hit'] and second['hit']
+    assert first['path'] == second['path']
+
+
+def test_eviction_keeps_pinned_entries_until_they_are_released(tmp_path):
+    scans = [make_scan(tmp_path / f'scan{i}.pdf', side=300 + 10 * i) for i in range(3)]
+    optimizer = PdfOptimizer(tmp_path / 'cache', max_cache_bytes=0, settings=SETTINGS, workers=1)
+
+    results = optimizer.optimize(scans)
+    optimized = [result['path'] for result in results]
+
+    assert optimizer.evict() == 0
+    assert all(os.path.isfile(path) for path in optimized)
+
+    optimizer.release(optimized[:2])
+
+    assert optimizer.evict() == 2
+    assert [os.path.isfile(path) for path in optimized] == [False, False, True]
@@ -0,0 +1,75 @@
+import csv
+import json
+
+import pytest
+
+from quaderno_gui.core.plan_report import (
+    build_plan_report,
+    estimate_duration,
+    load_throughput,
+    record_throughput,
+    write_plan,
+)
+
+
+OPERATIONS = [
+    {'op': 'create_folder', 'rel': 'Physics', 'remote_path': 'Document/Zotero/Physics', 'reason': 'missing'},
+    {'op': 'delete_file', 'rel': 'Bio/old.pdf', 'remote_path': 'Document/Zotero/Bio/old.pdf'},
+    {'op': 'upload', 'rel': 'Physics/a.pdf', 'remote_path': 'Document/Zotero/Physics/a.pdf', 'size': 300,
+     'folder': 'Physics'},
+    {'op': 'upload', 'rel': 'Physics/b.pdf', 'remote_path': 'Document/Zotero/Physics/b.pdf', 'size': 100,
+     'folder': 'Physics', 'replace': True},
+]
+HISTORY = {'bytes_per_second': 100.0, 'seconds_per_operation': 0.5, 'runs': 2}
+
+
+def test_report_totals_by_operation_and_collection():
+    report = build_plan_report(OPERATIONS, 'Document/Zotero', HISTORY)
+    totals = report['totals']
+
+    assert totals['operations'] == 4 and totals['bytes'] == 400
+    assert totals['by_op'] == {
+        'create_folder': {'count': 1, 'bytes': 0},
+        'delete_file': {'count': 1, 'bytes': 0},
+        'upload': {'count': 1, 'bytes': 300},
+        'replace': {'count': 1, 'bytes': 100},
+    }
+    assert totals['by_collection'] == {'Physics': {'count': 3, 'bytes': 400}, 'Bio': {'count': 1, 'bytes': 0}}
+    assert report['estimate']['seconds'] == pytest.approx(400 / 100 + 2 * 0.5)
+
+
+def test_estimate_needs_history_and_respects_the_bandwidth_cap():
+    assert estimate_duration(1000, 0, None) is None
+    assert estimate_duration(1000, 2, HISTORY, rate_cap=50) == pytest.approx(1000 / 50 + 1.0)
+
+
+def test_throughput_history_is_blended_across_runs():
+    assert load_throughput('office', 'Document/Zotero') is None
+
+    record_throughput('office', 'Document/Zotero', {
+        'upload_bytes': 1000, 'upload_seconds': 10.0, 'other_count': 2, 'other_seconds': 1.0,
+    })
+    record_throughput('office', 'Document/Zotero', {
+        'upload_bytes': 3000, 'upload_seconds': 10.0, 'other_count': 0, 'other_seconds': 0.0,
+    })
+    history = load_throughput('office', 'Document/Zotero')
+
+    assert history['bytes_per_second'] == pytest.approx(200.0)
+    assert history['seconds_per_operation'] == pytest.approx(0.5)
+    assert history['runs'] == 2
+    assert load_throughput('home', 'Document/Zotero') is None
+
+
+def test_plans_are_written_as_csv_or_json(tmp_path):
+    skipped = [{'op': 'upload', 'remote_path': 'Document/Zotero/Physics/c.pdf', 'size': 900, 'folder': 'Physics'}]
+    report = build_plan_report(OPERATIONS, 'Document/Zotero', skipped=skipped)
+
+    write_plan(report, tmp_path / 'plan.csv')
+    write_plan(report, tmp_path / 'plan.json')
+
+    with open(tmp_path / 'plan.csv', newline='') as fh:
+        rows = list(csv.DictReader(fh))
+
+    assert [row['op'] for row in rows] == ['create_folder', 'delete_file', 'upload', 'replace', 'skip']
+    assert rows[0]['reason'] == 'missing'
+    assert json.loads((tmp_path / 'plan.json').read_text())['totals']['bytes'] == 400
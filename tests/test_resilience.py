@@ -0,0 +1,150 @@
+import pytest
+
+from quaderno_gui.core.resilience import (
+    PERMANENT,
+    TRANSIENT,
+    CircuitBreaker,
+    DeviceUnavailable,
+    ResilientDevice,
+    RetryPolicy,
+    classify_error,
+    resilient,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FlakyDevice:
+    """
+    Device whose calls fail with the queued errors before succeeding.
+    """
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+        self.folders = set()
+
+    def get_storage(self):
+        self.calls += 1
+
+        if self.errors:
+            raise self.errors.pop(0)
+
+        return {'available': 1}
+
+    def new_folder(self, path):
+        self.calls += 1
+        self.folders.add(path)
+
+        if self.errors:
+            # The folder was created, but the answer got lost.
+            raise self.errors.pop(0)
+
+    def path_exists(self, path):
+        return path in self.folders
+
+
+def make_resilient(dp, attempts=3, breaker=None):
+    return ResilientDevice(dp, RetryPolicy(max_attempts=attempts, base_delay=0), breaker, sleep=lambda _: None)
+
+
+def test_connection_errors_and_server_errors_are_transient():
+    requests = pytest.importorskip('requests')
+
+    def http_error(status):
+        response = requests.Response()
+        response.status_code = status
+        return requests.HTTPError(response=response)
+
+    assert classify_error(ConnectionResetError()) == TRANSIENT
+    assert classify_error(TimeoutError()) == TRANSIENT
+    assert classify_error(requests.ConnectionError()) == TRANSIENT
+    assert classify_error(http_error(503)) == TRANSIENT
+    assert classify_error(http_error(429)) == TRANSIENT
+    assert classify_error(http_error(404)) == PERMANENT
+    assert classify_error(FileNotFoundError()) == PERMANENT
+    assert classify_error(ValueError()) == PERMANENT
+
+
+def test_backoff_stays_within_the_growing_cap():
+    policy = RetryPolicy(base_delay=1.0, max_delay=5.0)
+
+    for _ in range(50):
+        assert 0 <= policy.delay(1) <= 1.0
+        assert 0 <= policy.delay(3) <= 4.0
+        assert 0 <= policy.delay(10) <= 5.0
+
+
+def test_breaker_opens_after_the_threshold_and_probes_after_the_timeout():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=clock)
+
+    breaker.record_failure()
+    assert breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert breaker.retry_after() == 10
+
+    clock.now = 10
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # Only one probe goes through while half-open.
+    assert not breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    clock.now = 20
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.is_closed
+
+
+def test_transient_failures_are_retried():
+    dp = FlakyDevice(ConnectionError('reset'), ConnectionError('reset'))
+
+    assert make_resilient(dp).get_storage() == {'available': 1}
+    assert dp.calls == 3
+
+
+def test_permanent_failures_are_not_retried_and_keep_the_breaker_closed():
+    dp = FlakyDevice(ValueError('bad request'))
+    device = make_resilient(dp)
+
+    with pytest.raises(ValueError):
+        device.get_storage()
+
+    assert dp.calls == 1
+    assert device.breaker.is_closed
+
+
+def test_open_breaker_fails_fast_for_every_view_of_the_device():
+    dp = FlakyDevice(*[ConnectionError('down')] * 10)
+    device = make_resilient(dp, attempts=5, breaker=CircuitBreaker(failure_threshold=2))
+
+    with pytest.raises(ConnectionError):
+        device.get_storage()
+
+    assert dp.calls == 2
+
+    with pytest.raises(DeviceUnavailable):
+        resilient(device).get_storage()
+
+    assert dp.calls == 2
+
+
+def test_retried_folder_creation_is_not_repeated_once_it_took_effect():
+    dp = FlakyDevice(ConnectionError('reset'))
+
+    make_resilient(dp).new_folder('Document/Zotero')
+
+    assert dp.calls == 1
+    assert dp.folders == {'Document/Zotero'}
@@ -0,0 +1,130 @@
+import sqlite3
+
+from quaderno_gui.core.reverse_sync import ReverseSync, parse_item_id
+
+
+REMOTE_BASE = 'Document/Zotero'
+REL = 'Papers/Paper (itemID 7).pdf'
+
+
+class FakeDevice:
+    def __init__(self, content, modified):
+        self.content = content
+        self.modified = modified
+        self.downloads = 0
+
+    def list_all(self):
+        return [
+            {'entry_type': 'folder', 'entry_path': REMOTE_BASE + '/Papers'},
+            {
+                'entry_type': 'document',
+                'entry_path': REMOTE_BASE + '/' + REL,
+                'entry_id': 'doc-7',
+                'file_size': len(self.content),
+                'modified_date': self.modified,
+            },
+        ]
+
+    def download(self, _remote_path):
+        self.downloads += 1
+        return self.content
+
+
+def make_library(tmp_path):
+    storage = tmp_path / 'storage'
+    attachment = storage / 'ABCD1234' / 'Paper.pdf'
+    attachment.parent.mkdir(parents=True)
+    attachment.write_bytes(b'%PDF original')
+    db_path = tmp_path / 'zotero.sqlite'
+    conn = sqlite3.connect(str(db_path))
+    conn.execute('CREATE TABLE items (itemID INTEGER, key TEXT)')
+    conn.execute("INSERT INTO items VALUES (7, 'ABCD1234')")
+    conn.commit()
+    conn.close()
+    return storage, db_path, attachment
+
+
+def pull(dp, tmp_path, storage, db_path, **options):
+    return ReverseSync(
+        dp,
+        REMOTE_BASE,
+        storage_path=storage,
+        db_path=db_path,
+        manifest_path=tmp_path / 'manifest.json',
+        **options,
+    ).run()
+
+
+def test_pull_leaves_the_attachment_untouched(tmp_path):
+    storage, db_path, attachment = make_library(tmp_path)
+    dp = FakeDevice(b'%PDF original', '2024-01-01T00:00:00Z')
+    pull(dp, tmp_path, storage, db_path)
+
+    dp.content = b'%PDF annotated'
+    dp.modified = '2024-01-02T00:00:00Z'
+    summary = pull(dp, tmp_path, storage, db_path)
+
+    annotated = attachment.with_name('Paper.annotated.pdf')
+    assert summary['pulled'] == [{'rel': REL, 'path': str(annotated), 'size': len(dp.content)}]
+    assert attachment.read_bytes() == b'%PDF original'
+    assert annotated.read_bytes() == b'%PDF annotated'
+    assert sorted(path.name for path in attachment.parent.iterdir()) == ['Paper.annotated.pdf', 'Paper.pdf']
+
+
+def test_pull_replaces_the_attachment_when_asked(tmp_path):
+    storage, db_path, attachment = make_library(tmp_path)
+    dp = FakeDevice(b'%PDF original', '2024-01-01T00:00:00Z')
+    pull(dp, tmp_path, storage, db_path, replace_attachments=True)
+
+    dp.content = b'%PDF annotated'
+    dp.modified = '2024-01-02T00:00:00Z'
+    pull(dp, tmp_path, storage, db_path, replace_attachments=True)
+
+    assert attachment.read_bytes() == b'%PDF annotated'
+    assert attachment.with_name('Paper.pdf.orig').read_bytes() == b'%PDF original'
+
+
+def test_item_id_is_parsed_from_synced_names():
+    assert parse_item_id('Papers/On Spin (itemID 42).pdf') == ('On Spin', 42)
+    assert parse_item_id('Papers/notes.pdf') is None
+
+
+def test_first_pass_only_records_documents(tmp_path):
+    storage, db_path, attachment = make_library(tmp_path)
+    dp = FakeDevice(b'%PDF original', '2024-01-01T00:00:00Z')
+
+    summary = pull(dp, tmp_path, storage, db_path)
+    again = pull(dp, tmp_path, storage, db_path)
+
+    assert summary['recorded'] == 1 and summary['pulled'] == []
+    assert again['unchanged'] == 1 and again['recorded'] == 0
+    assert dp.downloads == 0
+
+
+def test_changed_documents_can_be_pulled_into_a_folder(tmp_path):
+    storage, db_path, attachment = make_library(tmp_path)
+    dp = FakeDevice(b'%PDF original', '2024-01-01T00:00:00Z')
+    target_dir = tmp_path / 'pulled'
+    pull(dp, tmp_path, storage, db_path, target_dir=target_dir)
+
+    dp.content = b'%PDF annotated'
+    dp.modified = '2024-01-02T00:00:00Z'
+    pull(dp, tmp_path, storage, db_path, target_dir=target_dir)
+
+    assert (target_dir / REL).read_bytes() == b'%PDF annotated'
+    assert attachment.read_bytes() == b'%PDF original'
+
+
+def test_document_without_a_zotero_item_is_reported(tmp_path):
+    storage, db_path, _attachment = make_library(tmp_path)
+    conn = sqlite3.connect(str(db_path))
+    conn.execute('DELETE FROM items')
+    conn.commit()
+    conn.close()
+    dp = FakeDevice(b'%PDF original', '2024-01-01T00:00:00Z')
+    pull(dp, tmp_path, storage, db_path)
+
+    dp.modified = '2024-01-02T00:00:00Z'
+    summary = pull(dp, tmp_path, storage, db_path)
+
+    assert summary['unmatched'] == [REL] and summary['pulled'] == []
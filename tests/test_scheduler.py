@@ -0,0 +1,138 @@
+import pytest
+
+from quaderno_gui.core.scheduler import (
+    POLICY_ADDED,
+    POLICY_COLLECTIONS,
+    POLICY_PATH,
+    POLICY_RECENT,
+    POLICY_SMALLEST,
+    BandwidthLimiter,
+    ThroughputMeter,
+    fit_to_budget,
+    format_duration,
+    format_size,
+    order_operations,
+)
+
+
+def upload(name, size=0, mod_time=0, added_time=0, folder=''):
+    return {
+        'op': 'upload',
+        'remote_path': 'Document/Zotero/' + name,
+        'size': size,
+        'mod_time': mod_time,
+        'added_time': added_time,
+        'folder': folder,
+    }
+
+
+UPLOADS = [
+    upload('a.pdf', size=300, mod_time=1, added_time=3, folder='Bio'),
+    upload('b.pdf', size=100, mod_time=3, added_time=1, folder='Physics/Quantum'),
+    upload('c.pdf', size=200, mod_time=2, added_time=2, folder='Physics'),
+]
+FOLDER = {'op': 'create_folder', 'remote_path': 'Document/Zotero/Bio'}
+
+
+def names(operations):
+    return [op['remote_path'].rsplit('/', 1)[-1] for op in operations]
+
+
+@pytest.mark.parametrize('policy, expected', [
+    (POLICY_RECENT, ['b.pdf', 'c.pdf', 'a.pdf']),
+    (POLICY_ADDED, ['a.pdf', 'c.pdf', 'b.pdf']),
+    (POLICY_SMALLEST, ['b.pdf', 'c.pdf', 'a.pdf']),
+    (POLICY_PATH, ['a.pdf', 'b.pdf', 'c.pdf']),
+])
+def test_uploads_are_ordered_by_policy(policy, expected):
+    assert names(order_operations(UPLOADS, policy)) == expected
+
+
+def test_chosen_collections_and_their_subcollections_come_first():
+    ordered = order_operations(UPLOADS, POLICY_COLLECTIONS, ['physics/'])
+
+    assert names(ordered) == ['b.pdf', 'c.pdf', 'a.pdf']
+    assert names(order_operations(UPLOADS, POLICY_COLLECTIONS, ['Bio'])) == ['a.pdf', 'b.pdf', 'c.pdf']
+
+
+def test_folder_operations_stay_ahead_of_uploads():
+    ordered = order_operations(UPLOADS[:1] + [FOLDER] + UPLOADS[1:], POLICY_SMALLEST)
+
+    assert ordered[0] is FOLDER
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        order_operations(UPLOADS, 'random')
+
+
+def test_bandwidth_limiter_sleeps_once_the_burst_is_spent():
+    delays = []
+    limiter = BandwidthLimiter(1000, burst_seconds=1.0, sleep=delays.append)
+
+    limiter.consume(1000)
+    assert delays == []
+
+    limiter.consume(500)
+    assert len(delays) == 1 and delays[0] == pytest.approx(0.5, abs=0.05)
+
+
+def test_disabled_bandwidth_limiter_never_sleeps():
+    delays = []
+    limiter = BandwidthLimiter(None, sleep=delays.append)
+
+    limiter.consume(10 ** 9)
+
+    assert delays == []
+
+
+def test_throughput_meter_smooths_the_rate_and_estimates_the_rest():
+    meter = ThroughputMeter(total_bytes=1000, smoothing=0.5)
+
+    assert meter.eta() is None
+
+    meter.record(100, 1.0)
+    meter.record(300, 1.0)
+
+    assert meter.rate == pytest.approx(200)
+    assert meter.eta() == pytest.approx(3.0)
+    assert meter.stats()['bytes_done'] == 400
+
+
+def test_throughput_meter_eta_respects_the_bandwidth_cap():
+    meter = ThroughputMeter(total_bytes=1000, rate_cap=100)
+    meter.record(500, 0.5)
+
+    assert meter.eta() == pytest.approx(5.0)
+
+
+@pytest.mark.parametrize('seconds, text', [
+    (None, 'unknown'),
+    (42, '42s'),
+    (125, '2m 05s'),
+    (3720, '1h 02m'),
+])
+def test_format_duration(seconds, text):
+    assert format_duration(seconds) == text
+
+
+def test_fit_to_budget_keeps_uploads_in_priority_order_while_they_fit():
+    kept, skipped = fit_to_budget([FOLDER] + UPLOADS, 450)
+
+    assert names(kept) == ['Bio', 'a.pdf', 'b.pdf']
+    assert names(skipped) == ['c.pdf']
+
+
+def test_fit_to_budget_with_nothing_left_keeps_only_other_operations():
+    kept, skipped = fit_to_budget([FOLDER] + UPLOADS, 0)
+
+    assert kept == [FOLDER] and len(skipped) == 3
+
+
+@pytest.mark.parametrize('nbytes, text', [
+    (512, '512 B'),
+    (1536, '1.5 KiB'),
+    (5 * 1024 ** 3, '5.0 GiB'),
+])
+def test_format_size(nbytes, text):
+    assert format_size(nbytes) == text
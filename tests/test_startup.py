@@ -0,0 +1,60 @@
+import importlib
+import io
+
+from quaderno_gui.core import startup
+from quaderno_gui.core.startup import StartupTimer, enable_startup_timing
+
+
+def test_disabled_timer_records_nothing():
+    timer = StartupTimer()
+
+    with timer.measure('step'):
+        pass
+    timer.mark('mark')
+    stream = io.StringIO()
+    timer.report(stream)
+
+    assert timer.steps == [] and stream.getvalue() == ''
+
+
+def test_flag_enables_timing_and_is_removed_from_argv(monkeypatch):
+    monkeypatch.delenv(startup.ENV_VAR, raising=False)
+    monkeypatch.setattr(startup, '_timer', StartupTimer())
+    argv = ['quaderno-gui', '--startup-timing']
+
+    timer = enable_startup_timing(argv)
+    try:
+        assert timer.enabled and argv == ['quaderno-gui']
+        assert startup.get_startup_timer() is timer
+    finally:
+        timer.stop_import_timing()
+
+
+def test_environment_variable_enables_timing(monkeypatch):
+    monkeypatch.setenv(startup.ENV_VAR, '1')
+    monkeypatch.setattr(startup, '_timer', StartupTimer())
+
+    timer = enable_startup_timing([])
+    timer.stop_import_timing()
+
+    assert timer.enabled
+
+
+def test_report_lists_imports_and_steps(tmp_path, monkeypatch):
+    (tmp_path / 'timed_module.py').write_text('VALUE = 1\n')
+    monkeypatch.syspath_prepend(str(tmp_path))
+    timer = StartupTimer(enabled=True)
+    try:
+        importlib.import_module('timed_module')
+
+        with timer.measure('build window'):
+            pass
+    finally:
+        timer.stop_import_timing()
+
+    stream = io.StringIO()
+    timer.report(stream)
+    report = stream.getvalue()
+
+    assert 'timed_module' in timer.imports
+    assert 'build window' in report and 'Imports' in report
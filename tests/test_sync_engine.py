@@ -0,0 +1,471 @@
+import collections
+import threading
+import time
+
+from quaderno_gui.core.device_arbiter import INTERACTIVE, DeviceArbiter
+from quaderno_gui.core.link_control import AdaptiveConcurrency
+from quaderno_gui.core.resilience import CircuitBreaker, ResilientDevice
+from quaderno_gui.core.sync_engine import (
+    OP_CREATE_FOLDER,
+    OP_DELETE_FILE,
+    OP_DELETE_FOLDER,
+    OP_UPLOAD,
+    SyncControl,
+    SyncEngine,
+)
+
+
+REMOTE_BASE = 'Document/Zotero'
+
+
+def make_engine(device, zotero, **kwargs):
+    return SyncEngine(device, REMOTE_BASE, storage_path=zotero.storage, db_path=zotero.db_path, **kwargs)
+
+
+def test_plan_creates_the_base_folder_collections_and_uploads(device, zotero):
+    zotero.add_collection(1, 'Physics')
+    zotero.add_collection(2, 'Quantum', parent=1)
+    zotero.add_attachment(7, collections=[2])
+    zotero.add_attachment(8)
+
+    operations = make_engine(device, zotero).plan()
+
+    assert [(op['op'], op['remote_path']) for op in operations] == [
+        (OP_CREATE_FOLDER, REMOTE_BASE),
+        (OP_CREATE_FOLDER, REMOTE_BASE + '/Physics'),
+        (OP_CREATE_FOLDER, REMOTE_BASE + '/Physics/Quantum'),
+        (OP_UPLOAD, REMOTE_BASE + '/Physics/Quantum/Paper (itemID 7).pdf'),
+        (OP_UPLOAD, REMOTE_BASE + '/Uncategorized/Paper (itemID 8).pdf'),
+    ]
+
+
+def test_run_mirrors_the_library_and_a_second_plan_is_empty(device, zotero):
+    zotero.add_collection(1, 'Physics')
+    zotero.add_attachment(7, collections=[1], content=b'%PDF seven')
+
+    summary = make_engine(device, zotero).run()
+
+    assert not summary['aborted'] and not summary['errors']
+    assert device.documents == {REMOTE_BASE + '/Physics/Paper (itemID 7).pdf': b'%PDF seven'}
+    assert make_engine(device, zotero).plan() == []
+
+
+def test_plan_removes_device_files_and_folders_gone_from_zotero(device, zotero):
+    zotero.add_collection(1, 'Physics')
+    zotero.add_attachment(7, collections=[1])
+    device.folders.update({REMOTE_BASE, REMOTE_BASE + '/Physics', REMOTE_BASE + '/Old'})
+    device.documents[REMOTE_BASE + '/Physics/Paper (itemID 7).pdf'] = b'%PDF'
+    device.documents[REMOTE_BASE + '/Physics/Gone (itemID 3).pdf'] = b'%PDF'
+
+    operations = make_engine(device, zotero).plan()
+
+    assert {(op['op'], op['rel']) for op in operations} == {
+        (OP_DELETE_FOLDER, 'Old'),
+        (OP_DELETE_FILE, 'Physics/Gone (itemID 3).pdf'),
+    }
+
+
+def test_simulate_logs_operations_without_touching_the_device(device, zotero):
+    zotero.add_attachment(7)
+    messages = []
+
+    summary = make_engine(device, zotero, simulate=True, log=messages.append).run()
+
+    assert summary['simulate']
+    assert device.folders == {'Document'} and not device.documents
+    assert 'Simulate: Would upload file: ' + REMOTE_BASE + '/Uncategorized/Paper (itemID 7).pdf' in messages
+
+
+def test_failed_operations_are_reported_in_the_summary(device, zotero):
+    zotero.add_collection(1, 'Physics')
+    zotero.add_attachment(7, collections=[1])
+    zotero.add_attachment(8, collections=[1])
+    failing = REMOTE_BASE + '/Physics/Paper (itemID 7).pdf'
+    device.fail_uploads.add(failing)
+
+    summary = make_engine(device, zotero).run()
+
+    assert summary['errors'] == [{'op': OP_UPLOAD, 'remote_path': failing, 'error': 'upload rejected'}]
+    assert summary['counts'][OP_UPLOAD] == 1
+
+
+def test_missing_zotero_database_aborts_the_sync(device, tmp_path):
+    summary = SyncEngine(device, REMOTE_BASE, storage_path=tmp_path, db_path=tmp_path / 'missing.sqlite').run()
+
+    assert summary['aborted']
+    assert device.folders == {'Document'}
+
+
+def add_papers(zotero, count):
+    zotero.add_collection(1, 'Physics')
+
+    for item_id in range(1, count + 1):
+        zotero.add_attachment(item_id, collections=[1])
+
+
+def cancel_after_uploads(device, control, count):
+    upload_file = device.upload_file
+
+    def upload_and_cancel(local_path, remote_path):
+        upload_file(local_path, remote_path)
+
+        if len(device.documents) == count:
+            control.cancel()
+
+    device.upload_file = upload_and_cancel
+
+
+def test_cancelled_run_returns_a_checkpoint_with_the_remaining_operations(device, zotero):
+    add_papers(zotero, 4)
+    control = SyncControl()
+    cancel_after_uploads(device, control, 2)
+
+    summary = make_engine(device, zotero, control=control).run()
+
+    assert summary['cancelled']
+    assert len(device.documents) == 2
+    remaining = summary['checkpoint']['operations']
+    assert [op['op'] for op in remaining] == [OP_UPLOAD, OP_UPLOAD]
+    assert not {op['remote_path'] for op in remaining} & set(device.documents)
+
+
+def test_resuming_a_checkpoint_skips_planning_and_finishes_the_sync(device, zotero):
+    add_papers(zotero, 4)
+    control = SyncControl()
+    cancel_after_uploads(device, control, 2)
+    checkpoint = make_engine(device, zotero, control=control).run()['checkpoint']
+    device.list_all = None
+    messages = []
+
+    summary = make_engine(device, zotero, log=messages.append).run(checkpoint)
+
+    assert not summary['cancelled'] and summary['checkpoint'] is None
+    assert summary['counts'] == {OP_UPLOAD: 2}
+    assert len(device.documents) == 4
+    assert 'Resuming from checkpoint: 2 operations remaining.' in messages
+
+
+def test_checkpoint_is_discarded_when_the_library_changed(device, zotero):
+    add_papers(zotero, 3)
+    control = SyncControl()
+    cancel_after_uploads(device, control, 1)
+    checkpoint = make_engine(device, zotero, control=control).run()['checkpoint']
+    time.sleep(0.01)
+    zotero.add_attachment(9, collections=[1])
+
+    engine = make_engine(device, zotero)
+
+    assert not engine.checkpoint_is_valid(checkpoint)
+    assert engine.run(checkpoint)['counts'] == {OP_UPLOAD: 3}
+    assert len(device.documents) == 4
+
+
+def test_checkpoint_is_only_valid_for_the_same_base_and_mode(device, zotero):
+    add_papers(zotero, 1)
+    engine = make_engine(device, zotero)
+    checkpoint = {
+        'fingerprint': None,
+        'remote_base': REMOTE_BASE,
+        'simulate': False,
+        'operations': engine.plan(),
+    }
+    checkpoint['fingerprint'] = engine.fingerprint
+
+    assert engine.checkpoint_is_valid(checkpoint)
+    assert not engine.checkpoint_is_valid(dict(checkpoint, remote_base='Document/Other'))
+    assert not engine.checkpoint_is_valid(dict(checkpoint, simulate=True))
+    assert not engine.checkpoint_is_valid(dict(checkpoint, operations=[]))
+
+
+def test_paused_sync_waits_until_resumed(device, zotero):
+    add_papers(zotero, 2)
+    control = SyncControl()
+    control.pause()
+    result = {}
+    worker = threading.Thread(target=lambda: result.update(make_engine(device, zotero, control=control).run()))
+    worker.start()
+    time.sleep(0.1)
+
+    assert worker.is_alive() and not device.documents
+
+    control.resume()
+    worker.join(5)
+
+    assert result['counts'][OP_UPLOAD] == 2
+
+
+def test_cancel_releases_a_paused_sync(device, zotero):
+    add_papers(zotero, 2)
+    control = SyncControl()
+    control.pause()
+    control.cancel()
+
+    summary = make_engine(device, zotero, control=control).run()
+
+    assert summary['cancelled'] and not device.documents
+
+
+def test_uploads_follow_the_order_policy_and_report_progress(device, zotero):
+    zotero.add_collection(1, 'Physics')
+    zotero.add_attachment(1, collections=[1], modified='2024-01-01 10:00:00', content=b'%PDF old')
+    zotero.add_attachment(2, collections=[1], modified='2024-03-01 10:00:00', content=b'%PDF newest')
+    progress = []
+
+    def record(done, total, operation, stats):
+        progress.append((done, total, operation['rel'], stats['bytes_done']))
+
+    make_engine(device, zotero, progress=record, order='recent').run()
+
+    assert progress[-2:] == [
+        (3, 4, 'Physics/Paper (itemID 2).pdf', 11),
+        (4, 4, 'Physics/Paper (itemID 1).pdf', 19),
+    ]
+
+
+def test_uploads_that_do_not_fit_the_device_are_skipped(device, zotero):
+    zotero.add_collection(1, 'Physics')
+    zotero.add_attachment(1, collections=[1], content=b'%' * 600, modified='2024-03-01 10:00:00')
+    zotero.add_attachment(2, collections=[1], content=b'%' * 300, modified='2024-02-01 10:00:00')
+    zotero.add_attachment(3, collections=[1], content=b'%' * 200, modified='2024-01-01 10:00:00')
+    device.folders.update({REMOTE_BASE, REMOTE_BASE + '/Physics'})
+    device.documents[REMOTE_BASE + '/Physics/Old (itemID 9).pdf'] = b'%' * 100
+    device.available = 500
+
+    engine = make_engine(device, zotero, fit_to_storage=True, storage_reserve=100)
+    operations = engine.plan()
+
+    assert [op['rel'] for op in operations] == [
+        'Physics/Old (itemID 9).pdf',
+        'Physics/Paper (itemID 2).pdf',
+        'Physics/Paper (itemID 3).pdf',
+    ]
+    assert [op['rel'] for op in engine.skipped] == ['Physics/Paper (itemID 1).pdf']
+
+
+def test_filters_are_part_of_the_checkpoint_fingerprint(device, zotero):
+    zotero.add_attachment(1)
+
+    unfiltered = make_engine(device, zotero).snapshot_fingerprint()
+    filtered = make_engine(device, zotero, filters={'include_tags': ['toread']}).snapshot_fingerprint()
+
+    assert unfiltered != filtered
+
+
+class FakeOptimizer:
+    def __init__(self, tmp_path):
+        self.tmp_path = tmp_path
+        self.calls = []
+
+    def optimize(self, paths, should_continue=None):
+        results = []
+
+        for index, path in enumerate(paths):
+            copy = self.tmp_path / f'optimized{index}.pdf'
+            copy.write_bytes(b'%PDF small')
+            results.append({'source': path, 'path': str(copy), 'size': copy.stat().st_size, 'hit': False})
+
+        return results
+
+    def release(self, paths):
+        self.calls.append(('release', list(paths)))
+
+    def evict(self):
+        self.calls.append(('evict',))
+
+
+def test_optimized_copies_are_uploaded_and_released_after_the_run(device, zotero, tmp_path):
+    zotero.add_collection(1, 'Physics')
+    zotero.add_attachment(1, collections=[1], content=b'%PDF' + b'x' * 100)
+    optimizer = FakeOptimizer(tmp_path)
+
+    summary = make_engine(device, zotero, optimizer=optimizer).run()
+
+    assert device.documents == {REMOTE_BASE + '/Physics/Paper (itemID 1).pdf': b'%PDF small'}
+    assert summary['bytes_saved'] == 104 - 10
+    assert optimizer.calls == [('release', [str(tmp_path / 'optimized0.pdf')]), ('evict',)]
+
+
+def test_streamed_sync_uploads_while_reading_and_deletes_last(device, zotero):
+    zotero.add_collection(1, 'Physics')
+    zotero.add_attachment(1, collections=[1])
+    zotero.add_attachment(2, collections=[1])
+    device.folders.update({REMOTE_BASE, REMOTE_BASE + '/Physics'})
+    device.documents[REMOTE_BASE + '/Physics/Paper (itemID 1).pdf'] = b'%PDF'
+    device.documents[REMOTE_BASE + '/Physics/Gone (itemID 3).pdf'] = b'%PDF'
+    progress = []
+
+    def record(done, total, operation, _stats):
+        progress.append((done, total, operation and operation['op']))
+
+    summary = make_engine(device, zotero, stream=True, progress=record).run()
+
+    assert not summary['errors'] and summary['checkpoint'] is None
+    assert set(device.documents) == {
+        REMOTE_BASE + '/Physics/Paper (itemID 1).pdf',
+        REMOTE_BASE + '/Physics/Paper (itemID 2).pdf',
+    }
+    assert [op for _done, _total, op in progress] == [OP_UPLOAD, OP_DELETE_FILE, None]
+    assert progress[-1][:2] == (2, 2)
+
+
+def test_file_replaced_in_zotero_is_uploaded_again(device, zotero, tmp_path):
+    from quaderno_gui.core.fingerprint import FingerprintService, HashCache
+
+    zotero.add_collection(1, 'Physics')
+    attachment = zotero.add_attachment(1, collections=[1], content=b'%PDF first')
+    fingerprints = FingerprintService(HashCache(str(tmp_path / 'hashes.sqlite')))
+    make_engine(device, zotero, fingerprints=fingerprints).run()
+
+    attachment.write_bytes(b'%PDF second version')
+    summary = make_engine(device, zotero, fingerprints=fingerprints).run()
+
+    assert summary['counts'] == {OP_UPLOAD: 1}
+    assert device.documents == {REMOTE_BASE + '/Physics/Paper (itemID 1).pdf': b'%PDF second version'}
+    assert make_engine(device, zotero, fingerprints=fingerprints).plan() == []
+
+
+def test_simulation_returns_a_plan_estimated_from_earlier_runs(device, zotero):
+    zotero.add_collection(1, 'Physics')
+    zotero.add_attachment(1, collections=[1])
+    make_engine(device, zotero).run()
+    zotero.add_attachment(2, collections=[1], content=b'%PDF' * 100)
+
+    plan = make_engine(device, zotero, simulate=True).run()['plan']
+
+    assert [row['path'] for row in plan['operations']] == [REMOTE_BASE + '/Physics/Paper (itemID 2).pdf']
+    assert plan['operations'][0]['reason'] == 'not on device'
+    assert plan['estimate']['based_on_runs'] == 1
+    assert plan['estimate']['seconds'] is not None
+
+
+def test_sync_waits_out_a_device_outage_and_retries_the_failed_upload(device, zotero):
+    add_papers(zotero, 2)
+    upload_file = device.upload_file
+    outages = [ConnectionError('connection reset')]
+
+    def drop_first_upload(local_path, remote_path):
+        if outages:
+            raise outages.pop()
+
+        upload_file(local_path, remote_path)
+
+    device.upload_file = drop_first_upload
+    dp = ResilientDevice(device, breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0))
+    logs = []
+
+    summary = make_engine(dp, zotero, log=logs.append).run()
+
+    assert summary['errors'] == []
+    assert len(device.documents) == 2
+    assert 'Device unreachable; sync paused until it responds again.' in logs
+    assert 'Device reachable again; resuming sync.' in logs
+
+
+def test_simulated_plan_is_applied_when_nothing_changed(device, zotero, monkeypatch):
+    add_papers(zotero, 2)
+    plan = make_engine(device, zotero, simulate=True).run()['applicable_plan']
+    messages = []
+    engine = make_engine(device, zotero, log=messages.append)
+    monkeypatch.setattr(engine, 'read_snapshot', None)
+
+    summary = engine.run(plan)
+
+    assert summary['counts'] == {OP_CREATE_FOLDER: 2, OP_UPLOAD: 2}
+    assert len(device.documents) == 2
+    assert 'Nothing changed since the simulation; applying its 4 operations.' in messages
+
+
+def test_simulated_plan_is_discarded_when_the_device_or_options_changed(device, zotero):
+    add_papers(zotero, 2)
+    plan = make_engine(device, zotero, simulate=True).run()['applicable_plan']
+
+    assert make_engine(device, zotero).checkpoint_is_valid(plan)
+    assert not make_engine(device, zotero, fit_to_storage=True).checkpoint_is_valid(plan)
+
+    device.folders.add(REMOTE_BASE)
+    messages = []
+    summary = make_engine(device, zotero, log=messages.append).run(plan)
+
+    assert summary['counts'] == {OP_CREATE_FOLDER: 1, OP_UPLOAD: 2}
+    assert ('Zotero library, device or sync options changed since the simulation; planning from scratch.'
+            in messages)
+
+
+def test_partial_simulations_return_no_plan(device, zotero):
+    add_papers(zotero, 2)
+
+    assert 'applicable_plan' not in make_engine(device, zotero, simulate=True, stream=True).run()
+    assert 'applicable_plan' not in make_engine(device, zotero, simulate=True, item_keys={'KEY00001'}).run()
+
+
+class CancellingDevice:
+    """
+    Device whose first upload fails slowly and cancels the sync meanwhile.
+    """
+
+    def __init__(self, control, failing):
+        self.control = control
+        self.failing = failing
+        self.uploads = collections.Counter()
+        self.lock = threading.Lock()
+
+    def upload_file(self, _local_path, remote_path):
+        if remote_path == self.failing:
+            self.failing = None
+            time.sleep(0.2)
+            self.control.cancel()
+            raise ValueError('rejected')
+
+        time.sleep(0.01)
+
+        with self.lock:
+            self.uploads[remote_path] += 1
+
+
+def test_resume_after_cancel_skips_finished_parallel_uploads(tmp_path):
+    storage = tmp_path / 'storage'
+    storage.mkdir()
+    db_path = tmp_path / 'zotero.sqlite'
+    db_path.write_bytes(b'')
+    operations = []
+
+    for i in range(8):
+        local_path = storage / f'paper{i}.pdf'
+        local_path.write_bytes(b'%PDF')
+        operations.append({
+            'op': OP_UPLOAD,
+            'rel': f'paper{i}.pdf',
+            'remote_path': f'{REMOTE_BASE}/paper{i}.pdf',
+            'local_path': str(local_path),
+            'size': 4,
+        })
+
+    control = SyncControl()
+    device = CancellingDevice(control, operations[0]['remote_path'])
+    arbiter = DeviceArbiter(device, controller=AdaptiveConcurrency(initial=4, min_limit=4, max_limit=4))
+
+    def engine(control):
+        return SyncEngine(
+            arbiter.session(INTERACTIVE), REMOTE_BASE, storage_path=storage, db_path=db_path, control=control
+        )
+
+    first = engine(control)
+    checkpoint = {
+        'fingerprint': first.snapshot_fingerprint(),
+        'remote_base': REMOTE_BASE,
+        'simulate': False,
+        'operations': operations,
+    }
+    summary = first.run(checkpoint)
+
+    assert summary['cancelled']
+    finished = set(device.uploads)
+    assert finished
+    remaining = {op['remote_path'] for op in summary['checkpoint']['operations']}
+    assert operations[0]['remote_path'] in remaining
+    assert not remaining & finished
+
+    resumed = engine(SyncControl()).run(summary['checkpoint'])
+
+    assert not resumed['cancelled'] and not resumed['errors']
+    assert device.uploads == {op['remote_path']: 1 for op in operations}
@@ -0,0 +1,57 @@
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+
+SCRIPT = Path(__file__).resolve().parent.parent / 'benchmarks' / 'ui_benchmark.py'
+
+
+def load_benchmark():
+    spec = importlib.util.spec_from_file_location('ui_benchmark', SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def results(**metrics):
+    return {'revision': 'abc', 'runs': [{'documents': 1000, 'metrics': metrics}]}
+
+
+def test_slower_times_and_lower_throughput_are_regressions(capsys):
+    benchmark = load_benchmark()
+    baseline = results(**{'files.time_to_list_s': 1.0, 'sync_log.lines_per_s': 1000.0, 'files.rows': 1000})
+
+    assert benchmark.compare(baseline, baseline, 0.25) == 0
+    assert benchmark.compare(results(**{'files.time_to_list_s': 1.5}), baseline, 0.25) == 1
+    assert benchmark.compare(results(**{'sync_log.lines_per_s': 500.0}), baseline, 0.25) == 1
+    assert benchmark.compare(results(**{'sync_log.lines_per_s': 5000.0}), baseline, 0.25) == 0
+    assert 'REGRESSION' in capsys.readouterr().out
+
+
+def test_changes_below_the_noise_floor_are_not_regressions():
+    benchmark = load_benchmark()
+    baseline = results(**{'files.max_stall_s': 0.001})
+
+    assert benchmark.compare(results(**{'files.max_stall_s': 0.01}), baseline, 0.25) == 0
+
+
+def test_small_run_writes_results_and_compares_with_itself(tmp_path):
+    out = tmp_path / 'ui.json'
+    args = ['--documents', '200', '--sync-items', '10', '--switches', '2']
+    env = dict(os.environ, QT_QPA_PLATFORM='offscreen')
+
+    subprocess.run([sys.executable, str(SCRIPT), *args, '--out', str(out)], env=env, check=True,
+                   capture_output=True, timeout=300)
+    metrics = json.loads(out.read_text())['runs'][0]['metrics']
+
+    assert metrics['files.rows'] == 200
+    assert metrics['sync_log.lines'] > 0
+
+    compared = subprocess.run([sys.executable, str(SCRIPT), *args, '--compare', str(out), '--tolerance', '100'],
+                              env=env, capture_output=True, text=True, timeout=300)
+
+    assert compared.returncode == 0, compared.stdout + compared.stderr
+    assert 'Compared with' in compared.stdout
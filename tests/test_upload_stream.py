@@ -0,0 +1,133 @@
+from quaderno_gui.core import upload_stream
+from quaderno_gui.core.resilience import CircuitBreaker, ResilientDevice, RetryPolicy
+from quaderno_gui.core.sync_engine import SyncEngine
+from quaderno_gui.core.upload_stream import FileBody, Prefetcher, upload_file
+
+
+def multipart(body, filename, content):
+    return (
+        f'--{body.boundary}\r\n'
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        'Content-Type: rb\r\n\r\n'
+    ).encode() + content + f'\r\n--{body.boundary}--\r\n'.encode()
+
+
+def test_body_streams_the_file_as_one_multipart_part(tmp_path):
+    path = tmp_path / 'paper.pdf'
+    content = bytes(range(256)) * 1000
+    path.write_bytes(content)
+
+    with FileBody(path, 'paper.pdf') as body:
+        expected = multipart(body, 'paper.pdf', content)
+
+        assert len(body) == len(expected)
+        assert body.content_type == 'multipart/form-data; boundary=' + body.boundary
+        assert b''.join(iter(lambda: body.read(7777), b'')) == expected
+
+
+def test_body_of_an_empty_file(tmp_path):
+    path = tmp_path / 'empty.pdf'
+    path.write_bytes(b'')
+
+    with FileBody(path, 'empty.pdf') as body:
+        assert b''.join(body) == multipart(body, 'empty.pdf', b'')
+
+
+def test_progress_is_reported_in_steps_and_at_the_end(tmp_path, monkeypatch):
+    monkeypatch.setattr(upload_stream, 'PROGRESS_STEP', 1000)
+    path = tmp_path / 'paper.pdf'
+    path.write_bytes(b'x' * 2500)
+    reports = []
+
+    with FileBody(path, 'paper.pdf', progress=lambda sent, size: reports.append(sent)) as body:
+        while body.read(600):
+            pass
+
+    assert reports[-1] == 2500
+    assert all(b - a >= 1000 for a, b in zip(reports, reports[1:-1]))
+    assert len(reports) == 3
+
+
+class Response:
+    def raise_for_status(self):
+        pass
+
+
+class Session:
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.sent = []
+
+    def prepare_request(self, request):
+        return request.prepare()
+
+    def send(self, prepared):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError('connection reset')
+
+        self.sent.append((prepared.method, prepared.url, b''.join(prepared.body)))
+        return Response()
+
+
+class HttpDevice:
+    base_url = 'https://digitalpaper.local:8443/'
+
+    def __init__(self, session):
+        self.session = session
+
+    def _get_object_id(self, path):
+        return 'doc1'
+
+
+def test_streamed_upload_replaces_the_document_and_is_retried(tmp_path):
+    path = tmp_path / 'paper.pdf'
+    path.write_bytes(b'%PDF-1.4 paper')
+    session = Session(failures=1)
+    dp = ResilientDevice(HttpDevice(session), RetryPolicy(base_delay=0), CircuitBreaker(), sleep=lambda _: None)
+    reports = []
+
+    upload_file(dp, str(path), 'Document/Zotero/My paper.pdf', progress=lambda sent, size: reports.append(sent))
+
+    [(method, url, body)] = session.sent
+    assert (method, url) == ('PUT', 'https://digitalpaper.local:8443/documents/doc1/file')
+    assert b'filename="My+paper.pdf"' in body and b'%PDF-1.4 paper' in body
+    assert reports[-1] == 14
+
+
+def test_sessions_without_http_fall_back_to_upload_file(device, tmp_path):
+    path = tmp_path / 'paper.pdf'
+    path.write_bytes(b'%PDF')
+    reports = []
+
+    upload_file(device, str(path), 'Document/paper.pdf', progress=lambda sent, size: reports.append((sent, size)))
+
+    assert device.documents == {'Document/paper.pdf': b'%PDF'}
+    assert reports == [(4, 4)]
+
+
+def test_prefetcher_ignores_missing_files(tmp_path):
+    path = tmp_path / 'paper.pdf'
+    path.write_bytes(b'x' * 10)
+    prefetcher = Prefetcher(limit=4)
+    prefetcher.prefetch(str(tmp_path / 'missing.pdf'))
+    prefetcher.prefetch(str(path))
+    thread = prefetcher._thread
+    prefetcher.close()
+    thread.join(5)
+
+    assert not thread.is_alive()
+
+
+def test_sync_reports_the_progress_of_each_file(device, zotero):
+    zotero.add_collection(1, 'Physics')
+    paper = zotero.add_attachment(1, collections=[1])
+    reports = []
+
+    SyncEngine(
+        device, 'Document/Zotero', storage_path=zotero.storage, db_path=zotero.db_path,
+        file_progress=lambda operation, sent, size: reports.append((operation['remote_path'], sent, size)),
+    ).run()
+
+    size = paper.stat().st_size
+    assert reports == [('Document/Zotero/Physics/Paper (itemID 1).pdf', size, size)]
@@ -0,0 +1,148 @@
+import pytest
+
+from quaderno_gui.core.sync_engine import SyncControl
+from quaderno_gui.core.watch import WatchSync, ZoteroWatcher
+
+
+REMOTE_BASE = 'Document/Zotero'
+
+
+def make_watch(device, zotero, **kwargs):
+    return WatchSync(device, REMOTE_BASE, storage_path=zotero.storage, db_path=zotero.db_path, **kwargs)
+
+
+def add_papers(zotero, device, count):
+    zotero.add_collection(1, 'Physics')
+    device.folders |= {REMOTE_BASE, REMOTE_BASE + '/Physics'}
+
+    for item_id in range(1, count + 1):
+        zotero.add_attachment(item_id, collections=[1])
+
+
+class ListWatcher:
+    """
+    Watcher returning queued poll results, then cancelling the watch.
+    """
+
+    mode = 'test'
+
+    def __init__(self, control, *results):
+        self.control = control
+        self.results = list(results)
+
+    def poll(self, timeout):
+        if not self.results:
+            self.control.cancel()
+            return set(), False, False
+
+        return self.results.pop(0)
+
+
+def test_changed_items_are_synced_incrementally(device, zotero):
+    add_papers(zotero, device, 3)
+    summaries = []
+    watch = make_watch(device, zotero, on_sync=summaries.append)
+    watch.pending_keys = {'KEY00002'}
+    watch.pending_database = True
+
+    watch.flush()
+
+    assert list(device.documents) == [REMOTE_BASE + '/Physics/Paper (itemID 2).pdf']
+    assert [summary['item_keys'] for summary in summaries] == [['KEY00002']]
+    assert not watch.pending_keys and not watch.pending_database
+
+
+def test_removed_items_lead_to_a_full_sync(device, zotero):
+    add_papers(zotero, device, 2)
+    summaries = []
+    watch = make_watch(device, zotero, on_sync=summaries.append)
+    watch.pending_keys = {'KEY00001', 'KEY00099'}
+
+    watch.flush()
+
+    assert [summary['item_keys'] for summary in summaries] == [['KEY00001', 'KEY00099'], None]
+    assert summaries[0]['unresolved_keys'] == ['KEY00099']
+    assert len(device.documents) == 2
+
+
+def test_failed_changes_are_kept_for_the_next_flush(device, zotero):
+    add_papers(zotero, device, 1)
+    device.fail_uploads.add(REMOTE_BASE + '/Physics/Paper (itemID 1).pdf')
+    watch = make_watch(device, zotero)
+    watch.pending_keys = {'KEY00001'}
+
+    watch.flush()
+
+    assert watch.pending_keys == {'KEY00001'}
+
+    device.fail_uploads.clear()
+    watch.flush()
+
+    assert not watch.pending_keys
+    assert len(device.documents) == 1
+
+
+def test_database_changes_alone_are_rate_limited(device, zotero):
+    add_papers(zotero, device, 1)
+    summaries = []
+    watch = make_watch(device, zotero, on_sync=summaries.append, full_sync_interval=3600)
+    watch.pending_database = True
+
+    watch.flush()
+    watch.pending_database = True
+    watch.flush()
+
+    assert len(summaries) == 1
+    assert watch.pending_database
+
+
+def test_run_debounces_changes_until_the_watch_is_cancelled(device, zotero):
+    add_papers(zotero, device, 2)
+    control = SyncControl()
+    watcher = ListWatcher(control, ({'KEY00001'}, False, False), ({'KEY00002'}, True, False))
+    summaries = []
+    logs = []
+
+    make_watch(
+        device, zotero, control=control, watcher=watcher, interval=0, debounce=0,
+        on_sync=summaries.append, log=logs.append,
+    ).run()
+
+    assert [summary['item_keys'] for summary in summaries] == [['KEY00001'], ['KEY00002']]
+    assert len(device.documents) == 2
+    assert logs[0] == 'Watching Zotero for changes (test).'
+    assert logs[-1] == 'Stopped watching Zotero.'
+
+
+def test_polling_watcher_reports_added_items_and_database_changes(zotero):
+    watcher = ZoteroWatcher(zotero.storage, zotero.db_path, rescan_interval=0, use_inotify=False)
+
+    try:
+        assert watcher.mode == 'polling'
+        assert watcher.poll(0) == (set(), False, False)
+
+        zotero.add_attachment(1)
+        keys, database_changed, rescan = watcher.poll(0)
+
+        assert keys == {'KEY00001'}
+        assert database_changed
+        assert not rescan
+        assert watcher.poll(0) == (set(), False, False)
+    finally:
+        watcher.close()
+
+
+def test_inotify_watcher_reports_the_changed_item_folder(zotero):
+    watcher = ZoteroWatcher(zotero.storage, zotero.db_path)
+
+    try:
+        if watcher.mode != 'inotify':
+            pytest.skip('inotify is not available')
+
+        zotero.add_attachment(1)
+        keys, _database_changed, rescan = watcher.poll(1)
+
+        assert keys == {'KEY00001'}
+        assert not rescan
+    finally:
+        watcher.close()
@@ -0,0 +1,142 @@
+import pytest
+
+from quaderno_gui.core.zotero import (
+    build_zotero_file_mapping,
+    build_zotero_folder_set,
+    count_zotero_attachments,
+    iter_zotero_files,
+    normalize_sync_filters,
+)
+
+
+def synced(zotero, **filters):
+    return sorted(build_zotero_file_mapping(zotero.storage, zotero.db_path, filters))
+
+
+def make_library(zotero):
+    zotero.add_collection(1, 'Physics')
+    zotero.add_collection(2, 'Quantum', parent=1)
+    zotero.add_collection(3, 'Biology')
+    zotero.add_attachment(1, collections=[2], tags=['toread'])
+    zotero.add_attachment(2, collections=[3], tags=['done'], modified='2000-01-01 10:00:00')
+    zotero.add_attachment(3, content=b'%PDF ' + b'x' * 100)
+
+
+def test_filters_are_normalized():
+    filters = normalize_sync_filters({'include_collections': [' Physics/Quantum/ ', ''], 'max_size': '10'})
+
+    assert filters['include_collections'] == ['physics/quantum']
+    assert filters['exclude_tags'] == [] and filters['max_size'] == 10
+
+
+def test_without_filters_every_attachment_is_synced(zotero):
+    make_library(zotero)
+
+    assert synced(zotero) == [
+        'Biology/Paper (itemID 2).pdf',
+        'Physics/Quantum/Paper (itemID 1).pdf',
+        'Uncategorized/Paper (itemID 3).pdf',
+    ]
+
+
+def test_included_collections_match_their_subcollections(zotero):
+    make_library(zotero)
+
+    assert synced(zotero, include_collections=['physics']) == ['Physics/Quantum/Paper (itemID 1).pdf']
+
+
+def test_excluded_collections_are_left_out(zotero):
+    make_library(zotero)
+
+    assert synced(zotero, exclude_collections=['Physics/Quantum', 'Uncategorized']) == ['Biology/Paper (itemID 2).pdf']
+
+
+def test_tag_date_and_size_filters(zotero):
+    make_library(zotero)
+
+    assert synced(zotero, include_tags=['ToRead']) == ['Physics/Quantum/Paper (itemID 1).pdf']
+    assert synced(zotero, exclude_tags=['done', 'toread']) == ['Uncategorized/Paper (itemID 3).pdf']
+    assert 'Biology/Paper (itemID 2).pdf' not in synced(zotero, modified_days=30)
+    assert 'Uncategorized/Paper (itemID 3).pdf' not in synced(zotero, max_size=50)
+
+
+def test_item_in_two_collections_is_selected_by_either_of_them(zotero):
+    zotero.add_collection(1, 'Physics')
+    zotero.add_collection(2, 'Teaching')
+    zotero.add_attachment(7, collections=[1, 2])
+
+    assert synced(zotero) == ['Physics/Paper (itemID 7).pdf']
+    assert synced(zotero, include_collections=['Teaching']) == ['Teaching/Paper (itemID 7).pdf']
+    assert synced(zotero, exclude_collections=['Teaching']) == []
+    assert synced(zotero, include_collections=['Physics'], exclude_collections=['Teaching']) == []
+
+
+def test_collections_of_the_parent_item_are_checked_as_well(zotero):
+    zotero.add_collection(1, 'Physics')
+    zotero.add_collection(2, 'Archive')
+    zotero.add_attachment(7, collections=[1], parent_collections=[2])
+
+    assert synced(zotero, include_collections=['Archive']) == ['Archive/Paper (itemID 7).pdf']
+    assert synced(zotero, exclude_collections=['Archive']) == []
+
+
+def test_deleted_collections_do_not_count(zotero):
+    zotero.add_collection(1, 'Old')
+    zotero.add_collection(2, 'Physics')
+    zotero.add_attachment(7, collections=[1, 2])
+    zotero.delete_collection(1)
+
+    assert synced(zotero, exclude_collections=['Old']) == ['Physics/Paper (itemID 7).pdf']
+
+
+def test_folder_set_holds_the_folder_of_every_synced_attachment(zotero):
+    zotero.add_collection(1, 'Physics')
+    zotero.add_collection(2, 'Quantum', parent=1)
+    zotero.add_collection(3, 'Teaching')
+    zotero.add_attachment(7, collections=[2, 3])
+    filters = {'include_collections': ['Teaching', 'Physics/Quantum']}
+
+    folders = build_zotero_folder_set(zotero.db_path, filters)
+    mapping = build_zotero_file_mapping(zotero.storage, zotero.db_path, filters)
+
+    assert folders == {'Physics', 'Physics/Quantum', 'Teaching'}
+    assert {info['folder'] for info in mapping.values()} <= folders
+    assert build_zotero_folder_set(zotero.db_path, {'exclude_collections': ['Physics']}) == {'Teaching'}
+
+
+def test_pulled_annotated_copies_are_not_synced(zotero):
+    attachment = zotero.add_attachment(7, name='A Paper.pdf')
+    attachment.with_name('A Paper.annotated.pdf').write_bytes(b'%PDF annotated')
+
+    mapping = build_zotero_file_mapping(zotero.storage, zotero.db_path)
+
+    assert [info['abs_path'] for info in mapping.values()] == [str(attachment)]
+
+
+def test_attachments_are_streamed_in_batches(zotero):
+    for item_id in range(1, 6):
+        zotero.add_attachment(item_id)
+
+    attachments = iter_zotero_files(zotero.storage, zotero.db_path, batch_size=2)
+    first_rel, first_info = next(attachments)
+
+    assert first_rel == 'Uncategorized/Paper (itemID 1).pdf'
+    assert first_info['size'] == len(b'%PDF-1.4 paper')
+    assert len(list(attachments)) == 4
+
+
+def test_missing_paths_are_reported_before_streaming(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        iter_zotero_files(tmp_path, tmp_path / 'missing.sqlite')
+
+
+def test_attachment_count_is_an_upper_bound(zotero):
+    zotero.add_collection(1, 'Physics')
+    zotero.add_attachment(1, collections=[1], tags=['toread'])
+    zotero.add_attachment(2, tags=['toread'])
+    zotero.add_attachment(3)
+    zotero.delete_item(3)
+
+    assert count_zotero_attachments(zotero.db_path) == 2
+    assert count_zotero_attachments(zotero.db_path, {'include_collections': ['Physics']}) == 2
+    assert count_zotero_attachments(zotero.db_path, {'exclude_tags': ['toread']}) == 0